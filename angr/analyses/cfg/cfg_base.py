@@ -1,4 +1,5 @@
 
+import itertools
 import logging
 from collections import defaultdict
 
@@ -25,6 +26,96 @@ from .indirect_jump_resolvers.default_resolvers import default_indirect_jump_res
 l = logging.getLogger(name=__name__)
 
 
+class _BlockFunctionMap(dict):
+    """
+    The mapping between block addresses and functions that is used when only some of the functions are rebuilt. Blocks
+    of the functions that are kept are looked up on the fly instead of being added to the mapping beforehand.
+    """
+
+    def __init__(self, functions, model, rebuilt):
+        super(_BlockFunctionMap, self).__init__()
+        self._functions = functions
+        self._model = model
+        self._rebuilt = rebuilt
+
+    def kept_function(self, addr):
+        """
+        Get the kept function that the block at the given address belongs to, or None if there is no such function.
+        """
+        n = self._model.get_any_node(addr)
+        if n is None or n.function_address is None or n.function_address in self._rebuilt:
+            return None
+        f = self._functions.function(addr=n.function_address)
+        if f is not None and addr in f.block_addrs_set:
+            return f
+        return None
+
+    def __contains__(self, addr):
+        return super(_BlockFunctionMap, self).__contains__(addr) or self.kept_function(addr) is not None
+
+    def __getitem__(self, addr):
+        try:
+            return super(_BlockFunctionMap, self).__getitem__(addr)
+        except KeyError:
+            f = self.kept_function(addr)
+            if f is None:
+                raise
+            return f
+
+
+class _TraversedNodes(set):
+    """
+    The set of traversed CFG nodes that is used when only some of the functions are rebuilt. Blocks of the functions
+    that are kept are considered traversed, so that the traversal stops at them.
+    """
+
+    def __init__(self, blockaddr_to_function):
+        super(_TraversedNodes, self).__init__()
+        self._blockaddr_to_function = blockaddr_to_function
+
+    def __contains__(self, node):
+        return super(_TraversedNodes, self).__contains__(node) or \
+               self._blockaddr_to_function.kept_function(node.addr) is not None
+
+
+class _KnownFunctions:
+    """
+    The functions that are known before some of the functions are rebuilt: the kept functions, and the old versions of
+    the rebuilt ones. The old versions can be enumerated and removed like in a FunctionManager, so that irrational
+    functions among them can be merged.
+    """
+
+    def __init__(self, functions, old_functions, blockaddr_to_function, rebuilt):
+        self._functions = functions
+        self._old_functions = old_functions
+        self._blockaddr_to_function = blockaddr_to_function
+        self._rebuilt = rebuilt
+
+    def __contains__(self, addr):
+        if addr in self._old_functions:
+            return True
+        # functions that are created during rebuilding are not known yet
+        return addr not in self._rebuilt and self._functions.contains_addr(addr) and \
+            not dict.__contains__(self._blockaddr_to_function, addr)
+
+    def __getitem__(self, addr):
+        return self._old_functions[addr]
+
+    def __delitem__(self, addr):
+        del self._old_functions[addr]
+
+    def keys(self):
+        return self._old_functions.keys()
+
+    def items(self):
+        return self._old_functions.items()
+
+    def function(self, addr):
+        if addr in self._old_functions:
+            return self._old_functions[addr]
+        return self._functions.function(addr=addr)
+
+
 class CFGBase(Analysis):
     """
     The base class for control flow graphs.
@@ -88,6 +179,9 @@ class CFGBase(Analysis):
         # Store all the functions analyzed before the set is cleared
         # Used for performance optimization
         self._updated_nonreturning_functions = None
+        # Edges on the call graph from kept functions to functions that are removed to be rebuilt by
+        # remake_functions()
+        self._detached_call_edges = [ ]
 
         self._normalize = normalize
         # Flag, whether the CFG has been normalized or not
@@ -149,10 +243,6 @@ class CFGBase(Analysis):
         # addresses of functions that have been completely recovered (i.e. all of its blocks are identified) so far
         self._completed_functions = set()
 
-        # TODO: A segment tree to speed up CFG node lookups
-        self._node_lookup_index = None
-        self._node_lookup_index_warned = False
-
         self._function_addresses_from_symbols = self._load_func_addrs_from_symbols()
         self._function_addresses_from_eh_frame = self._load_func_addrs_from_eh_frame()
 
@@ -221,7 +311,11 @@ class CFGBase(Analysis):
         self._jobs_to_analyze_per_function = defaultdict(set)
         self._completed_functions = set()
 
-    def _post_analysis(self):
+    def _post_analysis(self, functions=None):  # pylint:disable=arguments-differ
+        """
+        :param list functions:  Functions that are rebuilt after an incremental update, or None to process all
+                                functions.
+        """
 
         if self._normalize:
 
@@ -229,7 +323,7 @@ class CFGBase(Analysis):
                 self.normalize()
 
             # Call normalize() on each function
-            for f in self.kb.functions.values():
+            for f in (self.kb.functions.values() if functions is None else functions):
                 if not self.project.is_hooked(f.addr):
                     f.normalize()
 
@@ -260,7 +354,7 @@ class CFGBase(Analysis):
         :return: None
         """
 
-        raise NotImplementedError("I'm too lazy to implement it right now")
+        self._model.generate_index()
 
     @deprecated(replacement="self.model.get_predecessors()")
     def get_predecessors(self, cfgnode, excluding_fakeret=True, jumpkind=None):
@@ -344,16 +438,8 @@ class CFGBase(Analysis):
         new_node = cfgnode_0.merge(cfgnode_1)
 
         # Update the graph and the nodes dict accordingly
-        if addr1 in self._nodes_by_addr:
-            self._nodes_by_addr[addr1].remove(cfgnode_1)
-            if not self._nodes_by_addr[addr1]:
-                del self._nodes_by_addr[addr1]
-        del self._nodes[cfgnode_1.block_id]
-
-        self._nodes_by_addr[addr0].remove(cfgnode_0)
-        if not self._nodes_by_addr[addr0]:
-            del self._nodes_by_addr[addr0]
-        del self._nodes[cfgnode_0.block_id]
+        self._model.remove_node(cfgnode_1.block_id, cfgnode_1)
+        self._model.remove_node(cfgnode_0.block_id, cfgnode_0)
 
         in_edges = list(self.graph.in_edges(cfgnode_0, data=True))
         out_edges = list(self.graph.out_edges(cfgnode_1, data=True))
@@ -368,8 +454,7 @@ class CFGBase(Analysis):
             self.graph.add_edge(new_node, dst, **data)
 
         # Put the new node into node dicts
-        self._nodes[new_node.block_id] = new_node
-        self._nodes_by_addr[addr0].append(new_node)
+        self._model.add_node(new_node.block_id, new_node)
 
     def _to_snippet(self, cfg_node=None, addr=None, size=None, thumb=False, jumpkind=None, base_state=None):
         """
@@ -947,13 +1032,15 @@ class CFGBase(Analysis):
 
         return changes
 
-    def normalize(self):
+    def normalize(self, nodes=None):
         """
         Normalize the CFG, making sure that there are no overlapping basic blocks.
 
         Note that this method will not alter transition graphs of each function in self.kb.functions. You may call
         normalize() on each Function object to normalize their transition graphs.
 
+        :param iterable nodes:  Only normalize these nodes against each other, e.g., nodes that are added by an
+                                incremental update and the nodes that overlap with them. None to normalize all nodes.
         :return: None
         """
 
@@ -962,7 +1049,7 @@ class CFGBase(Analysis):
         smallest_nodes = { }  # indexed by end address of the node
         end_addresses_to_nodes = defaultdict(set)
 
-        for n in graph.nodes():
+        for n in (graph.nodes() if nodes is None else nodes):
             if n.is_simprocedure:
                 continue
             end_addr = n.addr + n.size
@@ -1121,10 +1208,7 @@ class CFGBase(Analysis):
                 graph.remove_node(n)
 
             # Update nodes dict
-            self._nodes[n.block_id] = new_node
-            if n in self._nodes_by_addr[n.addr]:
-                self._nodes_by_addr[n.addr] = [node for node in self._nodes_by_addr[n.addr] if node is not n]
-                self._nodes_by_addr[n.addr].append(new_node)
+            self._model.replace_node(n.block_id, n, new_node)
 
             for p, _, data in original_predecessors:
                 # Consider the following case: two basic blocks ending at the same position, where A is larger, and
@@ -1224,7 +1308,7 @@ class CFGBase(Analysis):
     # Function identification and such
     #
 
-    def mark_function_alignments(self):
+    def mark_function_alignments(self, func_addrs=None):
         """
         Find all potential function alignments and mark them.
 
@@ -1234,6 +1318,7 @@ class CFGBase(Analysis):
         0x4051b0). If the indirect jump cannot be correctly resolved, removing function 0x40541d will cause a missing
         label failure in reassembler.
 
+        :param iterable func_addrs: Addresses of functions to check, or None to check all functions.
         :return: None
         """
 
@@ -1241,8 +1326,10 @@ class CFGBase(Analysis):
         if not self.project.arch.capstone_support:
             return
 
-        for func_addr in self.kb.functions.keys():
-            function = self.kb.functions[func_addr]
+        for func_addr in (self.kb.functions.keys() if func_addrs is None else func_addrs):
+            function = self.kb.functions.function(addr=func_addr)
+            if function is None:
+                continue
             if function.is_simprocedure or function.is_syscall:
                 continue
             if len(function.block_addrs_set) == 1:
@@ -1390,6 +1477,166 @@ class CFGBase(Analysis):
             if node.addr in blockaddr_to_function:
                 node.function_address = blockaddr_to_function[node.addr].addr
 
+    def _remove_functions(self, func_addrs):
+        """
+        Remove functions that are going to be rebuilt by remake_functions(). Edges on the call graph that lead from
+        other functions to them are restored by remake_functions().
+
+        :param set func_addrs:  Addresses of the functions to remove.
+        :return:                None
+        """
+
+        functions = self.kb.functions
+        for addr in func_addrs:
+            if addr in functions.callgraph:
+                self._detached_call_edges.extend((src, addr, data) for src, _, data
+                                                 in functions.callgraph.in_edges(addr, data=True)
+                                                 if src not in func_addrs)
+            if functions.contains_addr(addr):
+                del functions[addr]
+
+    def remake_functions(self, nodes, func_addrs):
+        """
+        Rebuild some of the functions after the control flow graph is updated incrementally, following the same rules as
+        make_functions(). Functions that contain any of the given nodes and the functions at the given addresses are
+        rebuilt, and all other functions are kept as they are. The graph is only traversed from the rebuilt functions,
+        and the traversal stops at blocks of the kept functions.
+
+        Irrational functions are only merged among the rebuilt functions and the kept functions that begin right after
+        them. Dummy PLT stubs are only removed by make_functions().
+
+        :param iterable nodes:      CFGNodes that are added to or changed in the graph by the update.
+        :param iterable func_addrs: Addresses of the functions to rebuild.
+        :return:                    Addresses of the rebuilt functions.
+        :rtype:                     set
+        """
+
+        functions = self.kb.functions
+        nodes = [ n for n in nodes if n in self.graph ]
+        rebuilt = set(func_addrs)
+        rebuilt.update(n.function_address for n in nodes if n.function_address is not None)
+
+        # keep them sorted by address, like in a FunctionManager
+        old_functions = { }
+        old_block_addrs = set()
+        for addr in sorted(rebuilt):
+            func = functions.function(addr=addr)
+            if func is not None:
+                func.mark_nonreturning_calls_endpoints()
+                old_functions[addr] = func
+                old_block_addrs |= func.block_addrs_set
+        self._remove_functions(rebuilt)
+
+        blockaddr_to_function = _BlockFunctionMap(functions, self.model, rebuilt)
+        known_functions = _KnownFunctions(functions, old_functions, blockaddr_to_function, rebuilt)
+
+        # kept functions that begin right after the first block of a rebuilt function may be merged into it
+        kept_neighbors = { }
+        for addr in old_functions:
+            n = self.model.get_any_node(addr)
+            if n is not None and n.size:
+                func = functions.function(addr=n.addr + n.size)
+                if func is not None and func.addr not in rebuilt:
+                    kept_neighbors[func.addr] = func
+
+        predetermined_function_addrs = set()
+        for addr in itertools.chain(old_functions, kept_neighbors):
+            n = self.model.get_any_node(addr)
+            if n is not None and any(data.get('jumpkind', "") == 'Ijk_Call' or
+                                     data.get('jumpkind', "").startswith('Ijk_Sys')
+                                     for _, _, data in self.graph.in_edges(n, data=True)):
+                predetermined_function_addrs.add(addr)
+        predetermined_function_addrs |= self._function_addresses_from_symbols
+
+        self._process_irrational_functions(known_functions, predetermined_function_addrs, blockaddr_to_function)
+
+        merge_candidates = sorted(itertools.chain(old_functions.items(), kept_neighbors.items()),
+                                  key=lambda item: item[0])
+        old_functions.clear()
+        old_functions.update(merge_candidates)
+        self._process_irrational_function_starts(known_functions, predetermined_function_addrs, blockaddr_to_function)
+        for addr, func in kept_neighbors.items():
+            if addr in old_functions:
+                del old_functions[addr]
+            else:
+                # it is merged
+                rebuilt.add(addr)
+                old_block_addrs |= func.block_addrs_set
+                self._remove_functions({ addr })
+
+        nodes = [ n for n in nodes if n in self.graph ]
+        function_nodes = set()
+        for addr in rebuilt:
+            n = self.model.get_any_node(addr)
+            if n is not None:
+                function_nodes.add(n)
+        for n in nodes:
+            for _, _, data in self.graph.in_edges(n, data=True):
+                jumpkind = data.get('jumpkind', "")
+                if jumpkind == 'Ijk_Call' or jumpkind.startswith('Ijk_Sys'):
+                    function_nodes.add(n)
+                    break
+
+        traversed_cfg_nodes = _TraversedNodes(blockaddr_to_function)
+        for fn in sorted(function_nodes, key=lambda n: n.addr):
+            self._graph_bfs_custom(self.graph, [ fn ], self._graph_traversal_handler, blockaddr_to_function,
+                                   known_functions, traversed_cfg_nodes
+                                   )
+
+        # function chunks and blocks that cannot be reached from the beginning of any function
+        secondary_function_nodes = set()
+        for addr in old_functions:
+            n = self.model.get_any_node(addr)
+            if n is not None and not dict.__contains__(blockaddr_to_function, n.addr):
+                secondary_function_nodes.add(n)
+        for block_addr in old_block_addrs:
+            nodes.extend(self.model.get_all_nodes(block_addr))
+        secondary_function_nodes.update(n for n in nodes if n.function_address is not None
+                                        and not set.__contains__(traversed_cfg_nodes, n)
+                                        and blockaddr_to_function.kept_function(n.addr) is None)
+        for fn in sorted(secondary_function_nodes, key=lambda n: n.addr):
+            self._graph_bfs_custom(self.graph, [ fn ], self._graph_traversal_handler, blockaddr_to_function,
+                                   known_functions, _TraversedNodes(blockaddr_to_function)
+                                   )
+
+        rebuilt.update(f.addr for f in blockaddr_to_function.values())
+
+        # remove empty functions
+        for addr in rebuilt:
+            func = functions.function(addr=addr)
+            if func is not None and func.startpoint is None:
+                del functions[addr]
+
+        # restore edges from the kept functions on the call graph. transitions lead to the functions that the target
+        # blocks belong to now
+        call_edges = [ ]
+        transition_srcs = set()
+        for src, dst, data in self._detached_call_edges:
+            if src in rebuilt or not functions.contains_addr(src):
+                continue
+            if data.get('type', None) == 'transition':
+                transition_srcs.add(src)
+            elif functions.contains_addr(dst):
+                call_edges.append((src, dst, data))
+        for src in sorted(transition_srcs):
+            for _, to_node, data in functions.function(addr=src).transition_graph.edges(data=True):
+                if data.get('type', None) == 'transition' and data.get('outside', False):
+                    dst_function = dict.get(blockaddr_to_function, to_node.addr, None)
+                    if dst_function is not None and functions.contains_addr(dst_function.addr):
+                        call_edges.append((src, dst_function.addr, {'type': 'transition'}))
+        for src, dst, data in call_edges:
+            if src not in functions.callgraph or dst not in functions.callgraph[src] or \
+                    data not in functions.callgraph[src][dst].values():
+                functions.callgraph.add_edge(src, dst, **data)
+        self._detached_call_edges = [ ]
+
+        # Update CFGNode.function_address
+        for block_addr, func in blockaddr_to_function.items():
+            for node in self.model.get_all_nodes(block_addr):
+                node.function_address = func.addr
+
+        return { addr for addr in rebuilt if functions.contains_addr(addr) }
+
     def _remove_dummy_plt_stubs(self, functions):
 
         def _is_function_a_plt_stub(arch_, func):
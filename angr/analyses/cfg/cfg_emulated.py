@@ -1151,8 +1151,7 @@ class CFGEmulated(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-metho
                                             depth=depth
                                             )
 
-            self._nodes[block_id] = cfg_node
-            self._nodes_by_addr[cfg_node.addr].append(cfg_node)
+            self.model.add_node(block_id, cfg_node)
 
         else:
             # each block_id should only correspond to one CFGNode
@@ -1826,7 +1825,8 @@ class CFGEmulated(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-metho
             # remove all existing jobs that has the same block ID
             if next((en for en in self.jobs if en.block_id == pw.block_id), None):
                 # TODO: this is very hackish. Reimplement this logic later
-                self._job_info_queue = [entry for entry in self._job_info_queue if entry.job.block_id != pw.block_id]
+                for job_info in [ entry for entry in self._job_info_queue if entry.job.block_id == pw.block_id ]:
+                    self._job_info_queue.remove(job_info)
 
         # register the job
         self._register_analysis_job(pw.func_addr, pw)
@@ -1948,8 +1948,7 @@ class CFGEmulated(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-metho
                 # PathTerminator). This is just a trick to make get_any_irsb() happy.
                 pt.input_state = self.project.factory.entry_state()
                 pt.input_state.ip = pt.addr
-            self._nodes[node_key] = pt
-            self._nodes_by_addr[pt.addr].append(pt)
+            self.model.add_node(node_key, pt)
 
             if is_thumb:
                 self._thumb_addrs.add(addr)
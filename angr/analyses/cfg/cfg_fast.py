@@ -1,8 +1,13 @@
+import concurrent.futures
+import io
 import itertools
 import logging
 import math
+import multiprocessing
+import pickle
 import re
 import string
+from bisect import bisect_left, bisect_right
 from collections import defaultdict, OrderedDict
 
 from sortedcontainers import SortedDict
@@ -34,6 +39,36 @@ VEX_IRSB_MAX_SIZE = 400
 l = logging.getLogger(name=__name__)
 
 
+# the CFGFast instance that is recovering a CFG in parallel. worker processes inherit it through fork.
+_parallel_cfg = None
+
+
+class _PartitionPickler(pickle.Pickler):
+    """
+    Pickles the CFG of a partition without the project and the knowledge base, which the parent process has as well.
+    """
+
+    def __init__(self, file, kb):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._shared = { id(kb._project): 'project', id(kb): 'kb', id(kb.functions): 'functions', id(kb.cfgs): 'cfgs' }
+
+    def persistent_id(self, obj):
+        return self._shared.get(id(obj), None)
+
+
+class _PartitionUnpickler(pickle.Unpickler):
+    """
+    Loads the CFG of a partition into the project and the knowledge base of the parent process.
+    """
+
+    def __init__(self, file, kb):
+        super().__init__(file)
+        self._shared = { 'project': kb._project, 'kb': kb, 'functions': kb.functions, 'cfgs': kb.cfgs }
+
+    def persistent_load(self, pid):
+        return self._shared[pid]
+
+
 class FunctionReturn:
     """
     FunctionReturn describes a function call in a specific location and its return location. Hashable and equatable
@@ -446,6 +481,7 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
                  model=None,
                  use_patches=False,
                  elf_eh_frame=True,
+                 workers=None,
                  start=None,  # deprecated
                  end=None,  # deprecated
                  collect_data_references=None, # deprecated
@@ -491,6 +527,10 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
         :param bool detect_tail_calls:  Enable aggressive tail-call optimization detection.
         :param bool elf_eh_frame:       Retrieve function starts (and maybe sizes later) from the .eh_frame of ELF
                                         binaries.
+        :param int workers:             Number of worker processes that recover the CFG of disjoint partitions of the
+                                        regions in parallel. The partial CFGs are merged, and functions and jump tables
+                                        that cross partition boundaries are recovered again. None or 1 recovers the CFG
+                                        in a single process.
         :param int start:               (Deprecated) The beginning address of CFG recovery.
         :param int end:                 (Deprecated) The end address of CFG recovery.
         :param CFGArchOptions arch_options: Architecture-specific options.
@@ -610,6 +650,17 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
 
         self._cfb = cfb
 
+        self._workers = workers
+        # lists of regions that are recovered by each worker process, or None if the CFG is recovered in this process
+        self._partitions = None
+        self._partition_starts = None
+        # returning status of functions as each worker process determined it
+        self._partition_returning = None
+        # function starts that do not come from scanning
+        self._partition_function_starts = None
+        # transitions into function starts that worker processes know of
+        self._partition_transitions = None
+
         l.debug("CFG recovery covers %d regions:", len(self._regions))
         for start_addr in self._regions:
             l.debug("... %#x - %#x", start_addr, self._regions[start_addr])
@@ -619,6 +670,8 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
 
         self._initial_state = None
         self._next_addr = None
+        # memory ranges that are released by an incremental update and should be scanned again
+        self._rescan_ranges = [ ]
 
         # Create the segment list
         self._seg_list = SegmentList()
@@ -645,6 +698,8 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
 
         # Start working!
         self._analyze()
+        if self._partitions is not None:
+            self._reconcile_partitions()
 
     def __getstate__(self):
         d = dict(self.__dict__)
@@ -774,6 +829,11 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
         :return: An address to process next, or None if all addresses have been processed
         """
 
+        if self._rescan_ranges:
+            addr = self._next_unscanned_addr_in_rescan_ranges(alignment=alignment)
+            if addr is not None:
+                return addr
+
         # TODO: Take care of those functions that are already generated
         if self._next_addr is None:
             self._next_addr = self._get_min_addr()
@@ -820,6 +880,31 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
         l.debug("%#x is beyond the ending point. Returning None.", curr_addr)
         return None
 
+    def _next_unscanned_addr_in_rescan_ranges(self, alignment=None):
+        """
+        Find the next address that we haven't processed in the memory ranges that are released by an incremental
+        update.
+
+        :param alignment: Assures the address returns must be aligned by this number
+        :return: An address to process next, or None if all addresses in these ranges have been processed
+        """
+
+        while self._rescan_ranges:
+            start, end = self._rescan_ranges[0]
+            curr_addr = start
+            if not self._inside_regions(curr_addr):
+                curr_addr = self._next_address_in_regions(curr_addr)
+            if curr_addr is not None:
+                curr_addr = self._seg_list.next_free_pos(curr_addr)
+                if alignment is not None and curr_addr % alignment > 0:
+                    curr_addr = curr_addr - (curr_addr % alignment) + alignment
+            if curr_addr is not None and curr_addr < end and self._inside_regions(curr_addr):
+                self._rescan_ranges[0] = (curr_addr + 1, end)
+                return curr_addr
+            self._rescan_ranges.pop(0)
+
+        return None
+
     def _load_a_byte_as_int(self, addr):
         if self._base_state is not None:
             try:
@@ -1002,13 +1087,6 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
             # make sure self.project.entry is inserted
             starting_points = [ self.project.entry ] + starting_points
 
-        # Create jobs for all starting points
-        for sp in starting_points:
-            job = CFGJob(sp, sp, 'Ijk_Boring')
-            self._insert_job(job)
-            # register the job to function `sp`
-            self._register_analysis_job(sp, job)
-
         self._updated_nonreturning_functions = set()
 
         if self._use_function_prologues and self.project.concrete_target is None:
@@ -1019,6 +1097,19 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
             # make function_prologue_addrs a set for faster lookups
             self._function_prologue_addrs = set(self._function_prologue_addrs)
 
+        if self._workers is not None and self._workers > 1:
+            self._recover_partitions(starting_points)
+
+        # Create jobs for all starting points
+        for sp in starting_points:
+            if get_real_address_if_arm(self.project.arch, sp) in self._traced_addresses:
+                # a worker process has recovered it
+                continue
+            job = CFGJob(sp, sp, 'Ijk_Boring')
+            self._insert_job(job)
+            # register the job to function `sp`
+            self._register_analysis_job(sp, job)
+
     def _pre_job_handling(self, job):  # pylint:disable=arguments-differ
         """
         Some pre job-processing tasks, like update progress bar.
@@ -1184,25 +1275,49 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
                 self._insert_job(job)
                 self._register_analysis_job(addr, job)
 
-    def _post_analysis(self):
+    def _post_analysis(self, updated_blocks=None, updated_functions=None):  # pylint:disable=arguments-differ
+        """
+        :param set updated_blocks:      Addresses of the blocks that are recovered by an incremental update, or None if
+                                        the entire CFG is recovered.
+        :param set updated_functions:   Addresses of the functions that are invalidated by an incremental update. Only
+                                        these functions and the functions containing updated blocks are processed.
+        """
 
         self._make_completed_functions()
 
+        # after an incremental update, only the updated blocks and the blocks that overlap with them are revisited.
+        # nodes may be split or replaced on the way, so they are looked up again after each step
+        nodes = None if updated_blocks is None else self._nodes_overlapping(self._nodes_at(updated_blocks))
+
         if self._normalize:
             # Normalize the control flow graph first before rediscovering all functions
-            self.normalize()
+            self.normalize(nodes=nodes)
+            if nodes is not None:
+                nodes = self._nodes_overlapping(nodes)
 
         if self.project.arch.name in ('X86', 'AMD64', 'MIPS32'):
-            self._remove_redundant_overlapping_blocks()
+            self._remove_redundant_overlapping_blocks(nodes=nodes)
+            if nodes is not None:
+                nodes = self._nodes_overlapping(nodes)
 
         self._updated_nonreturning_functions = set()
-        # Revisit all edges and rebuild all functions to correctly handle returning/non-returning functions.
-        self.make_functions()
+        if nodes is None:
+            # Revisit all edges and rebuild all functions to correctly handle returning/non-returning functions.
+            self.make_functions()
+            func_addrs = None
+            functions = list(self.functions.values())
+        else:
+            # Only rebuild the functions that the update touches
+            func_addrs = set(updated_functions or ())
+            func_addrs.update(n.function_address for n in nodes if n.function_address is not None)
+            called_functions = self._remove_return_edges(func_addrs)
+            func_addrs = self.remake_functions(nodes, func_addrs)
+            functions = [ self.functions.function(addr=addr) for addr in sorted(func_addrs) ]
 
         self._analyze_all_function_features(all_funcs_completed=True)
 
         # Scan all functions, and make sure all fake ret edges are either confirmed or removed
-        for f in self.functions.values():
+        for f in functions:
             all_edges = f.transition_graph.edges(data=True)
 
             callsites_to_functions = defaultdict(list) # callsites to functions mapping
@@ -1235,19 +1350,30 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
             f._local_transition_graph = None
 
         # Scan all functions, and make sure .returning for all functions are either True or False
-        for f in self.functions.values():
+        for f in functions:
             if f.returning is None:
                 f.returning = len(f.endpoints) > 0  # pylint:disable=len-as-condition
 
         # Finally, mark endpoints of every single function
-        for function in self.kb.functions.values():
+        for function in functions:
             function.mark_nonreturning_calls_endpoints()
 
         # optional: remove functions that must be alignments
-        self.mark_function_alignments()
+        self.mark_function_alignments(func_addrs=func_addrs)
 
         # make return edges
-        self._make_return_edges()
+        if func_addrs is None:
+            self._make_return_edges()
+        else:
+            # the rebuilt functions return to their callers, and their callees return to them. functions that jump to
+            # the rebuilt functions return from their endpoints as well
+            related = called_functions
+            for func_addr in func_addrs:
+                if func_addr in self.functions.callgraph:
+                    related.update(self.functions.callgraph.successors(func_addr))
+                    related.update(src for src, _, data in self.functions.callgraph.in_edges(func_addr, data=True)
+                                   if data.get('type', None) == 'transition')
+            self._make_return_edges(func_addrs=func_addrs | related)
 
         if self.project.arch.name != 'Soot':
             if self.project.loader.main_object.sections:
@@ -1266,21 +1392,21 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
 
         # If they asked for it, give it to them.  All of it.
         if self._cross_references:
-            self._do_full_xrefs()
+            self._do_full_xrefs(func_addrs=func_addrs)
 
         r = True
         while r:
             r = self._tidy_data_references()
 
-        CFGBase._post_analysis(self)
+        CFGBase._post_analysis(self, functions=None if func_addrs is None else functions)
 
         self._finish_progress()
 
-    def _do_full_xrefs(self):
+    def _do_full_xrefs(self, func_addrs=None):
         l.info("Building cross-references...")
         # Time to make our CPU hurt
         state = self.project.factory.blank_state()
-        for f_addr in self.functions:
+        for f_addr in (self.functions if func_addrs is None else sorted(func_addrs)):
             f = None
             try:
                 f = self.functions[f_addr]
@@ -1408,8 +1534,7 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
                                    block_id=addr,
                                    )
 
-                self._nodes[addr] = cfg_node
-                self._nodes_by_addr[addr].append(cfg_node)
+                self.model.add_node(addr, cfg_node)
 
             else:
                 cfg_node = self._nodes[addr]
@@ -2537,8 +2662,7 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
 
         # add the dst_node to self._nodes
         if unresolvable_target_addr not in self._nodes:
-            self._nodes[unresolvable_target_addr] = dst_node
-            self._nodes_by_addr[unresolvable_target_addr].append(dst_node)
+            self.model.add_node(unresolvable_target_addr, dst_node)
 
         self._graph_add_edge(dst_node, src_node, jump.jumpkind, jump.ins_addr, jump.stmt_idx)
         # mark it as a jumpout site for that function
@@ -2553,9 +2677,620 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
 
         CFGBase._indirect_jump_unresolved(self, jump)
 
+    # Incremental updates
+
+    def _invalidate_functions(self, func_addrs, ranges=(), dropped_func_addrs=()):
+        """
+        Remove the blocks of the given functions, and all blocks that overlap with the given memory ranges, from the
+        CFG, and create jobs to recover them again.
+
+        :param set func_addrs:          Addresses of functions to invalidate and to recover again from their entries.
+        :param list ranges:             A list of (start, end) tuples of memory ranges that have changed.
+        :param set dropped_func_addrs:  Addresses of functions to invalidate that are not recovered again. Their blocks
+                                        are recovered again as part of the functions that reach them.
+        :return:                        None
+        """
+
+        removed = set()
+        for func_addr in set(func_addrs) | set(dropped_func_addrs):
+            func = self.kb.functions.function(addr=func_addr)
+            if func is not None:
+                for block_addr in func.block_addrs_set:
+                    removed.update(self.model.get_all_nodes(block_addr))
+        for start, end in ranges:
+            removed.update(self.model.nodes_in_range(start, end))
+        removed_addrs = { n.addr for n in removed }
+
+        # edges from the rest of the CFG to the removed blocks are followed again once the blocks are recovered
+        incoming = [ ]
+        for node in removed:
+            if node not in self.graph:
+                continue
+            for src, _, data in self.graph.in_edges(node, data=True):
+                # return edges are recreated by _make_return_edges()
+                if src not in removed and data.get('jumpkind', None) != 'Ijk_Ret':
+                    incoming.append((src, node, data))
+
+        released = list(ranges)
+        orphan_data = set()
+        for node in removed:
+            if node in self.graph:
+                self.graph.remove_node(node)
+            self.model.remove_node(node.block_id, node)
+            real_addr = get_real_address_if_arm(self.project.arch, node.addr)
+            self._traced_addresses.discard(real_addr)
+            if node.size:
+                released.append((real_addr, real_addr + node.size))
+
+            for ins_addr in node.instruction_addrs:
+                self.kb.xrefs.remove_xrefs_by_ins_addr(ins_addr)
+                data = self.insn_addr_to_memory_data.pop(ins_addr, None)
+                if data is not None:
+                    orphan_data.add(data.address)
+
+            jump = self.indirect_jumps.pop(node.addr, None)
+            if jump is not None:
+                self._indirect_jumps_to_resolve.discard(jump)
+                if jump.jumptable and jump.jumptable_addr is not None and jump.jumptable_size:
+                    released.append((jump.jumptable_addr, jump.jumptable_addr + jump.jumptable_size))
+            self.jump_tables.pop(node.addr, None)
+            self.kb.resolved_indirect_jumps.discard(node.addr)
+            self.kb.unresolved_indirect_jumps.discard(node.addr)
+
+        # remove data that is no longer referenced by any instruction
+        if orphan_data:
+            orphan_data.difference_update(data.address for data in self.insn_addr_to_memory_data.values())
+            for data_addr in orphan_data:
+                data = self._memory_data.get(data_addr, None)
+                if data is None or data.pointer_addr is not None:
+                    continue
+                del self._memory_data[data_addr]
+                if data.size:
+                    released.append((data_addr, data_addr + data.size))
+
+        self._remove_functions(set(func_addrs) | set(dropped_func_addrs))
+        for func_addr in set(func_addrs) | set(dropped_func_addrs):
+            self._function_exits.pop(func_addr, None)
+            self._jobs_to_analyze_per_function.pop(func_addr, None)
+            self._completed_functions.discard(func_addr)
+        for callee_addr in list(self._function_returns):
+            frs = { fr for fr in self._function_returns[callee_addr] if fr.call_site_addr not in removed_addrs }
+            if frs:
+                self._function_returns[callee_addr] = frs
+            else:
+                del self._function_returns[callee_addr]
+
+        # the released memory may be scanned again, except for blocks that overlap with it and are kept
+        for start, end in released:
+            self._seg_list.release(start, end - start)
+        for start, end in released:
+            for node in self.model.nodes_in_range(start, end):
+                if node.size:
+                    self._seg_list.occupy(get_real_address_if_arm(self.project.arch, node.addr), node.size, 'code')
+
+        if released:
+            if self._force_complete_scan:
+                self._rescan_ranges = sorted(self._rescan_ranges + released)
+            if self._use_function_prologues and self._function_prologue_addrs:
+                prologue_addrs = set(self._remaining_function_prologue_addrs)
+                for addr in self._function_prologue_addrs:
+                    if any(start <= addr < end for start, end in released):
+                        prologue_addrs.add(addr)
+                self._remaining_function_prologue_addrs = sorted(prologue_addrs)
+
+        for func_addr in sorted(func_addrs):
+            job = CFGJob(func_addr, func_addr, 'Ijk_Boring')
+            self._insert_job(job)
+            self._register_analysis_job(func_addr, job)
+
+        for src, node, data in incoming:
+            jumpkind = data.get('jumpkind', 'Ijk_Boring')
+            if jumpkind == 'Ijk_Call' or jumpkind.startswith('Ijk_Sys'):
+                func_addr = node.addr
+            elif jumpkind == 'Ijk_FakeRet' or node.function_address in dropped_func_addrs:
+                func_addr = src.function_address
+            else:
+                func_addr = node.function_address
+            job = CFGJob(node.addr, func_addr, jumpkind, last_addr=src.addr, src_node=src,
+                         src_ins_addr=data.get('ins_addr', None), src_stmt_idx=data.get('stmt_idx', None))
+            self._insert_job(job)
+            self._register_analysis_job(func_addr, job)
+
+    def _recover_invalidated_functions(self, func_addrs, returning, updated_functions):
+        """
+        Recover functions that _invalidate_functions() removed from the CFG. Callers of functions whose returning status
+        changes are invalidated and recovered again as well.
+
+        :param set func_addrs:          Addresses of the invalidated functions.
+        :param dict returning:          Returning status of the updated functions before they were invalidated.
+        :param set updated_functions:   Addresses of all functions that are updated.
+        :return:                        None
+        """
+
+        invalidated = set(func_addrs)
+        while True:
+            traced_addresses = set(self._traced_addresses)
+            self._analysis_core_baremetal()
+            self._post_analysis(updated_blocks=self._traced_addresses - traced_addresses,
+                                updated_functions=updated_functions)
+
+            # callers of functions whose returning status changed must be recovered again
+            callers = set()
+            for addr, was_returning in returning.items():
+                func = self.kb.functions.function(addr=addr)
+                if func is not None and func.returning != was_returning and addr in self.kb.functions.callgraph:
+                    callers.update(self.kb.functions.callgraph.predecessors(addr))
+            callers.difference_update(invalidated)
+            if not callers:
+                break
+
+            invalidated |= callers
+            returning = self._functions_returning(callers)
+            self._invalidate_functions(callers)
+            updated_functions = callers
+
+    def _functions_returning(self, func_addrs):
+        """
+        Get the returning status of the given functions.
+
+        :param set func_addrs:  Addresses of functions.
+        :return:                A dict mapping addresses of existing functions to their returning status.
+        :rtype:                 dict
+        """
+
+        returning = { }
+        for addr in func_addrs:
+            func = self.kb.functions.function(addr=addr)
+            if func is not None:
+                returning[addr] = func.returning
+        return returning
+
+    def _nodes_at(self, block_addrs):
+        """
+        Get all CFG nodes at the given block addresses.
+
+        :param iterable block_addrs:    Real addresses of blocks.
+        :return:                        A list of CFGNodes.
+        :rtype:                         list
+        """
+
+        nodes = [ ]
+        for addr in block_addrs:
+            nodes.extend(self.model.get_all_nodes(addr))
+            if is_arm_arch(self.project.arch):
+                nodes.extend(self.model.get_all_nodes(addr + 1))
+        return nodes
+
+    def _nodes_overlapping(self, nodes):
+        """
+        Get the given CFG nodes and all CFG nodes that overlap with any of them. Nodes that are no longer in the graph
+        are replaced by the nodes that cover the same range.
+
+        :param iterable nodes:  CFGNodes.
+        :return:                A set of CFGNodes.
+        :rtype:                 set
+        """
+
+        overlapping = set()
+        for node in nodes:
+            overlapping.add(node)
+            if node.size:
+                overlapping.update(self.model.nodes_in_range(node.addr, node.addr + node.size))
+        return { n for n in overlapping if n in self.graph and not n.is_simprocedure }
+
+    def _remove_return_edges(self, func_addrs):
+        """
+        Remove return edges that leave the given functions or lead to the return sites of calls to them. They are
+        created again after the functions are rebuilt, and must not be followed while rebuilding them.
+
+        :param set func_addrs:  Addresses of functions.
+        :return:                Addresses of all functions that are called at these call sites, whose return edges must
+                                be created again.
+        :rtype:                 set
+        """
+
+        edges = [ ]
+        callees = set()
+        for func_addr in func_addrs:
+            func = self.functions.function(addr=func_addr)
+            if func is None:
+                continue
+            for block_addr in func.block_addrs_set:
+                for node in self.model.get_all_nodes(block_addr):
+                    edges.extend((src, dst) for src, dst, data in self.graph.out_edges(node, data=True)
+                                 if data.get('jumpkind', None) == 'Ijk_Ret')
+            startpoint = self.model.get_any_node(func_addr)
+            if startpoint is None:
+                continue
+            for caller in self.model.get_predecessors(startpoint, jumpkind='Ijk_Call'):
+                callees.update(n.addr for n in self.model.get_successors(caller, jumpkind='Ijk_Call'))
+                for return_target in self.model.get_successors(caller, excluding_fakeret=False,
+                                                               jumpkind='Ijk_FakeRet'):
+                    edges.extend((src, dst) for src, dst, data in self.graph.in_edges(return_target, data=True)
+                                 if data.get('jumpkind', None) == 'Ijk_Ret')
+        self.graph.remove_edges_from(edges)
+        return callees
+
+    def _add_indirect_jump_targets(self, block_addr, targets):
+        """
+        Add extra targets to an indirect jump, and create jobs to recover them.
+
+        :param int block_addr:  Address of the block that ends with the indirect jump.
+        :param list targets:    Extra targets of the indirect jump.
+        :return:                None
+        """
+
+        jump = self.indirect_jumps.get(block_addr, None)
+        src_node = self.model.get_any_node(block_addr)
+        if jump is None or src_node is None:
+            l.warning("There is no indirect jump at block %#x. Ignore its targets.", block_addr)
+            return
+
+        # the indirect jump is no longer unresolved
+        for dst in list(self.graph.successors(src_node)):
+            if dst.addr in (self._unresolvable_jump_target_addr, self._unresolvable_call_target_addr):
+                self.graph.remove_edge(src_node, dst)
+        self.kb.unresolved_indirect_jumps.discard(block_addr)
+
+        all_targets = list(jump.resolved_targets) + [ t for t in targets if t not in jump.resolved_targets ]
+        # _indirect_jump_resolved() deregisters the indirect jump
+        self._register_analysis_job(jump.func_addr, jump)
+        self._indirect_jump_resolved(jump, block_addr, None, all_targets)
+
+    # Parallel recovery
+
+    def _partition_regions(self, n, function_starts):
+        """
+        Split the regions into at most `n` partitions of contiguous memory that cover roughly the same number of bytes.
+        Partitions only start at known function starts, so that few functions cross partition boundaries.
+
+        :param int n:                       Number of partitions.
+        :param iterable function_starts:    Known function starts.
+        :return:                            A list of lists of (start, end) tuples.
+        :rtype:                             list
+        """
+
+        starts = sorted(set(get_real_address_if_arm(self.project.arch, addr) for addr in function_starts
+                            if self._inside_regions(addr)))
+        partition_size = max(1, self._regions_size // n)
+
+        # split at the first function start after every partition_size bytes
+        splits = [ ]
+        covered = 0
+        target = partition_size
+        for start, end in self._regions.items():
+            for addr in starts[bisect_left(starts, start):bisect_left(starts, end)]:
+                if len(splits) == n - 1:
+                    break
+                if covered + addr - start >= target:
+                    splits.append(addr)
+                    target = covered + addr - start + partition_size
+            covered += end - start
+
+        partitions = [ [ ] ]
+        for start, end in self._regions.items():
+            while splits and splits[0] < end:
+                if start < splits[0]:
+                    partitions[-1].append((start, splits[0]))
+                    start = splits[0]
+                partitions.append([ ])
+                splits.pop(0)
+            partitions[-1].append((start, end))
+        return [ regions for regions in partitions if regions ]
+
+    def _partition_of(self, addr):
+        """
+        Get the partition that an address belongs to.
+
+        :param int addr:    The address.
+        :return:            Index of the partition, or None if the address is outside of all regions.
+        :rtype:             int or None
+        """
+
+        addr = get_real_address_if_arm(self.project.arch, addr)
+        if not self._inside_regions(addr):
+            return None
+        return bisect_right(self._partition_starts, addr) - 1
+
+    def _block_to_function(self):
+        """
+        Map blocks to the functions that they belong to.
+
+        :return:    A dict mapping addresses of blocks to addresses of functions.
+        :rtype:     dict
+        """
+
+        block_to_function = { }
+        for func in self.kb.functions.values():
+            for block_addr in func.block_addrs_set:
+                block_to_function[block_addr] = func.addr
+        return block_to_function
+
+    def _recover_partitions(self, starting_points):
+        """
+        Recover the CFGs of disjoint partitions of the regions in worker processes, and merge them into this CFG. The
+        transitions from one partition to another are followed by this analysis afterwards.
+
+        :param list starting_points:    Known function starts, except for those that are found by prologue scanning.
+        :return:                        None
+        """
+
+        global _parallel_cfg  # pylint:disable=global-statement
+
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            l.warning("Parallel CFG recovery requires fork(). Falling back to a single process.")
+            return
+
+        function_starts = set(starting_points)
+        if self._function_prologue_addrs:
+            function_starts |= self._function_prologue_addrs
+        partitions = self._partition_regions(self._workers, function_starts)
+        if len(partitions) < 2:
+            return
+
+        self._partitions = partitions
+        self._partition_starts = [ regions[0][0] for regions in partitions ]
+        self._partition_returning = [ ]
+        self._partition_function_starts = set(starting_points)
+        self._partition_transitions = set()
+        # workers inherit this analysis, including the project, the base state, and custom resolvers, through fork
+        _parallel_cfg = self
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=len(partitions),
+                                                        mp_context=multiprocessing.get_context('fork')) as executor:
+                results = list(executor.map(_recover_partition, range(len(partitions))))
+        except Exception:  # pylint:disable=broad-except
+            l.warning("Parallel CFG recovery failed. Falling back to a single process.", exc_info=True)
+            self._partitions = None
+            self._partition_starts = None
+            self._partition_returning = None
+            self._partition_function_starts = None
+            self._partition_transitions = None
+            return
+        finally:
+            _parallel_cfg = None
+
+        # merge the partitions in order, so that the result does not depend on which worker finished first
+        exits = [ ]
+        for idx, data in enumerate(results):
+            exits.extend(self._merge_partition(idx, data))
+        self._reconcile_partition_exits(exits)
+
+    def _merge_partition(self, idx, data):
+        """
+        Merge the CFG of a partition, which a worker process recovered, into this CFG.
+
+        :param int idx:     Index of the partition.
+        :param bytes data:  The pickled CFG of the partition.
+        :return:            Jobs of transitions from the partition to other partitions.
+        :rtype:             list
+        """
+
+        model, functions, callgraph, traced_addresses, segments, indirect_jumps, resolved_indirect_jumps, \
+            unresolved_indirect_jumps, xrefs, function_returns, function_exits, completed_functions, exits = \
+            _PartitionUnpickler(io.BytesIO(data), self.kb).load()
+
+        # nodes outside of all partitions, e.g., nodes of SimProcedures, may be in more than one partition
+        replaced = { }
+        for node in model.graph:
+            existing = self._nodes.get(node.block_id, None)
+            if existing is None:
+                node._cfg_model = self.model
+                self.model.add_node(node.block_id, node)
+                self.graph.add_node(node)
+            else:
+                replaced[node] = existing
+        for src, dst, edge_data in model.graph.edges(data=True):
+            if edge_data.get('jumpkind', None) == 'Ijk_Ret':
+                # return edges are added again once the returning status of all functions is known
+                continue
+            self.graph.add_edge(replaced.get(src, src), replaced.get(dst, dst), **edge_data)
+            if dst.addr in functions:
+                self._partition_transitions.add((src.addr, dst.addr))
+        # blocks that post-processing splits are not traced, but they must not be traced again either
+        self._traced_addresses |= traced_addresses
+        self._traced_addresses.update(get_real_address_if_arm(self.project.arch, node.addr) for node in model.graph)
+        for start, end, sort in segments:
+            self._seg_list.occupy(start, end - start, sort)
+
+        for addr, jump in indirect_jumps.items():
+            self.indirect_jumps.setdefault(addr, jump)
+        for addr, jump in model.jump_tables.items():
+            self.jump_tables.setdefault(addr, jump)
+        self.kb.resolved_indirect_jumps.update(resolved_indirect_jumps)
+        self.kb.unresolved_indirect_jumps.update(unresolved_indirect_jumps)
+
+        # data may be referenced from more than one partition
+        for addr, memory_data in model.memory_data.items():
+            self._memory_data.setdefault(addr, memory_data)
+        for ins_addr, memory_data in model.insn_addr_to_memory_data.items():
+            self.insn_addr_to_memory_data[ins_addr] = self._memory_data.get(memory_data.addr, memory_data)
+        for xrefs_ in xrefs.values():
+            for xref in xrefs_:
+                if xref.memory_data is not None:
+                    xref.memory_data = self._memory_data.get(xref.memory_data.addr, xref.memory_data)
+                self.kb.xrefs.add_xref(xref)
+
+        # a function is taken from the partition that it starts in
+        self._partition_returning.append({ addr: func.returning for addr, func in functions.items() })
+        for addr, func in functions.items():
+            existing = self.kb.functions.function(addr=addr)
+            if existing is None or self._partition_of(addr) == idx or \
+                    (existing.returning is None and func.returning is not None):
+                self.kb.functions[addr] = func
+        for src, dst, edge_data in callgraph.edges(data=True):
+            if src not in self.kb.functions.callgraph or dst not in self.kb.functions.callgraph[src] or \
+                    edge_data not in self.kb.functions.callgraph[src][dst].values():
+                self.kb.functions.callgraph.add_edge(src, dst, **edge_data)
+        for callee_addr, frs in function_returns.items():
+            self._function_returns[callee_addr] |= frs
+        for func_addr, exit_addrs in function_exits.items():
+            self._function_exits[func_addr] |= exit_addrs
+        self._completed_functions |= completed_functions
+
+        for job in exits:
+            job.src_node = replaced.get(job.src_node, job.src_node)
+            for edge in job._func_edges or [ ]:
+                if isinstance(edge, (FunctionTransitionEdge, FunctionCallEdge, FunctionFakeRetEdge)):
+                    edge.src_node = replaced.get(edge.src_node, edge.src_node)
+        return exits
+
+    def _known_function_starts(self):
+        """
+        Get function starts that are known without scanning: Starting points of the analysis and called addresses.
+
+        :return:    A set of addresses.
+        :rtype:     set
+        """
+
+        function_starts = set(self._partition_function_starts)
+        function_starts.update(dst.addr for _, dst, jumpkind in self.graph.edges(data='jumpkind')
+                               if jumpkind == 'Ijk_Call')
+        return function_starts
+
+    def _scanned_functions_at(self, addr, function_starts, block_to_function):
+        """
+        Get functions that have a block at the given address and that are only known from scanning. A worker process
+        may find such functions in code that the CFG of another partition reaches.
+
+        :param int addr:                The address.
+        :param set function_starts:     Function starts that are known without scanning.
+        :param dict block_to_function:  A dict mapping addresses of blocks to addresses of functions.
+        :return:                        A set of function addresses.
+        :rtype:                         set
+        """
+
+        func_addrs = set()
+        for node in self.model.get_all_nodes(addr, anyaddr=True):
+            func_addr = block_to_function.get(node.addr, None)
+            if func_addr is not None and func_addr not in function_starts:
+                func_addrs.add(func_addr)
+        return func_addrs
+
+    def _reconcile_partition_exits(self, exits):
+        """
+        Prepare the merged CFG for following transitions between partitions. A worker process does not know whether
+        code that is reached from another partition belongs to a function that it found by scanning, so such functions
+        are removed, and so is code that overlaps with jump tables and data that other partitions reference. Then jobs
+        are created for all transitions between partitions.
+
+        :param list exits:  Jobs of transitions from one partition to another.
+        :return:            None
+        """
+
+        function_starts = self._known_function_starts()
+        function_starts.update(job.addr for job in exits if job.jumpkind == 'Ijk_Call')
+        block_to_function = self._block_to_function()
+
+        func_addrs = set()
+        for job in exits:
+            func_addrs |= self._scanned_functions_at(job.addr, function_starts, block_to_function)
+
+        data_ranges = set()
+        for jump in self.jump_tables.values():
+            if jump.jumptable_addr is not None and jump.jumptable_size and \
+                    self._partition_of(jump.jumptable_addr) not in (None, self._partition_of(jump.addr)):
+                data_ranges.add((jump.jumptable_addr, jump.jumptable_addr + jump.jumptable_size))
+        for ins_addr, data in self.insn_addr_to_memory_data.items():
+            if data.size and data.sort != MemoryDataSort.CodeReference and \
+                    self._partition_of(data.addr) not in (None, self._partition_of(ins_addr)):
+                data_ranges.add((data.addr, data.addr + data.size))
+
+        ranges = [ ]
+        for start, end in sorted(data_ranges):
+            nodes = [ n for n in self.model.nodes_in_range(start, end) if n.size ]
+            if nodes:
+                ranges.append((start, end))
+                for node in nodes:
+                    func_addrs |= self._scanned_functions_at(node.addr, function_starts, block_to_function)
+
+        if func_addrs or ranges:
+            self._invalidate_functions((), ranges=ranges, dropped_func_addrs=func_addrs)
+            for start, end in ranges:
+                self._seg_list.occupy(start, end - start, "data")
+
+        for job in exits:
+            if job.src_node not in self.graph:
+                # the source is removed. the transition is found again when the source is recovered again
+                continue
+            self._insert_job(job)
+            self._register_analysis_job(job.func_addr, job)
+
+    def _reconcile_partitions(self):
+        """
+        Recover functions again that a single partition may not have recovered correctly: Functions that cross partition
+        boundaries, whose indirect jumps and returning status depend on more than one partition, functions that call
+        functions whose returning status differs from what the partition of the call assumed, and functions that a
+        partition found by scanning code that the merged CFG reaches from other functions.
+
+        :return:    None
+        """
+
+        func_addrs = set()
+        for func in self.kb.functions.values():
+            partitions = { self._partition_of(addr) for addr in func.block_addrs_set }
+            partitions.discard(None)
+            if len(partitions) > 1:
+                func_addrs.add(func.addr)
+
+        block_to_function = self._block_to_function()
+        for src, dst, jumpkind in self.graph.edges(data='jumpkind'):
+            if jumpkind != 'Ijk_Call':
+                continue
+            src_partition = self._partition_of(src.addr)
+            callee = self.kb.functions.function(addr=dst.addr)
+            if src_partition is None or callee is None or src.addr not in block_to_function:
+                continue
+            # a partition assumes that functions in other partitions return
+            assumed_returning = self._partition_returning[src_partition].get(dst.addr, None) is not False
+            if assumed_returning != (callee.returning is not False):
+                func_addrs.add(block_to_function[src.addr])
+
+        # recovering functions again may reach more scanned functions. each of them is only removed once, so that
+        # functions that are reached from other functions and that are found again are kept
+        removed = set()
+        while True:
+            scanned_func_addrs = self._entered_scanned_functions() - removed - func_addrs
+            if not func_addrs and not scanned_func_addrs:
+                break
+            removed |= scanned_func_addrs
+
+            returning = self._functions_returning(func_addrs)
+            self._invalidate_functions(func_addrs, dropped_func_addrs=scanned_func_addrs)
+            self._recover_invalidated_functions(func_addrs | scanned_func_addrs, returning,
+                                                func_addrs | scanned_func_addrs)
+            func_addrs = set()
+
+    def _entered_scanned_functions(self):
+        """
+        Get functions that a partition found by scanning and that are entered from other functions through transitions
+        that the partition did not know of, except for calls and returns.
+
+        :return:    A set of function addresses.
+        :rtype:     set
+        """
+
+        function_starts = self._known_function_starts()
+        block_to_function = self._block_to_function()
+
+        func_addrs = set()
+        for func in self.kb.functions.values():
+            if func.addr in function_starts or self._partition_of(func.addr) is None:
+                continue
+            node = self.model.get_any_node(func.addr)
+            if node is None:
+                continue
+            for pred, _, jumpkind in self.graph.in_edges(node, data='jumpkind'):
+                if jumpkind not in ('Ijk_Call', 'Ijk_Ret') and \
+                        block_to_function.get(pred.addr, func.addr) != func.addr and \
+                        (pred.addr, node.addr) not in self._partition_transitions:
+                    func_addrs.add(func.addr)
+                    break
+        return func_addrs
+
     # Removers
 
-    def _remove_redundant_overlapping_blocks(self):
+    def _remove_redundant_overlapping_blocks(self, nodes=None):
         """
         On some architectures there are sometimes garbage bytes (usually nops) between functions in order to properly
         align the succeeding function. CFGFast does a linear sweeping which might create duplicated blocks for
@@ -2564,10 +3299,12 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
         This method enumerates all blocks and remove overlapping blocks if one of them is aligned to 0x10 and the other
         contains only garbage bytes.
 
+        :param iterable nodes:  Only check these blocks against each other, or None to check all blocks.
         :return: None
         """
 
-        sorted_nodes = sorted(self.graph.nodes(), key=lambda n: n.addr if n is not None else 0)
+        sorted_nodes = sorted(self.graph.nodes() if nodes is None else nodes,
+                              key=lambda n: n.addr if n is not None else 0)
 
         all_plt_stub_addrs = set(itertools.chain.from_iterable(obj.reverse_plt.keys() for obj in self.project.loader.all_objects if isinstance(obj, cle.MetaELF)))
 
@@ -2673,8 +3410,7 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
                     # It's a big nop - no function starts with nop
 
                     # add b to indices
-                    self._nodes[b.addr] = b
-                    self._nodes_by_addr[b.addr].append(b)
+                    self.model.add_node(b.addr, b)
 
                     # shrink a
                     self._shrink_node(a, b.addr - a.addr, remove_function=False)
@@ -2698,8 +3434,7 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
 
                         if b.addr in self._nodes:
                             del self._nodes[b.addr]
-                        if b.addr in self._nodes_by_addr and b in self._nodes_by_addr[b.addr]:
-                            self._nodes_by_addr[b.addr].remove(b)
+                        self.model.remove_node(b.addr, b)
 
                         self.graph.remove_node(b)
 
@@ -2723,8 +3458,7 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
                     # totally remove b
                     if b.addr in self._nodes:
                         del self._nodes[b.addr]
-                    if b.addr in self._nodes_by_addr and b in self._nodes_by_addr[b.addr]:
-                        self._nodes_by_addr[b.addr].remove(b)
+                    self.model.remove_node(b.addr, b)
 
                     self.graph.remove_node(b)
 
@@ -2819,17 +3553,13 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
                 self.graph.add_edge(successor, dst, **data)
 
         # remove the old node from indices
-        if node.addr in self._nodes and self._nodes[node.addr] is node:
-            del self._nodes[node.addr]
-        if node.addr in self._nodes_by_addr and node in self._nodes_by_addr[node.addr]:
-            self._nodes_by_addr[node.addr].remove(node)
+        self.model.remove_node(node.addr, node)
 
         # remove the old node form the graph
         self.graph.remove_node(node)
 
         # add the new node to indices
-        self._nodes[new_node.addr] = new_node
-        self._nodes_by_addr[new_node.addr].append(new_node)
+        self.model.add_node(new_node.addr, new_node)
 
         # the function starting at this point is probably totally incorrect
         # hopefull future call to `make_functions()` will correct everything
@@ -2974,15 +3704,21 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
 
         return endpoints
 
-    def _make_return_edges(self):
+    def _make_return_edges(self, func_addrs=None):
         """
         For each returning function, create return edges in self.graph.
 
+        :param iterable func_addrs: Addresses of the functions to create return edges for, or None for all functions.
         :return: None
         """
 
-        for func_addr, func in self.functions.items():
-            if func.returning is False:
+        if func_addrs is None:
+            items = self.functions.items()
+        else:
+            items = ((addr, self.functions.function(addr=addr)) for addr in sorted(func_addrs))
+
+        for func_addr, func in items:
+            if func is None or func.returning is False:
                 continue
 
             # get the node on CFG
@@ -3510,8 +4246,7 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
             if self._cfb is not None:
                 self._cfb.add_obj(addr, lifted_block)
 
-            self._nodes[addr] = cfg_node
-            self._nodes_by_addr[addr].append(cfg_node)
+            self.model.add_node(addr, cfg_node)
 
             return addr, current_function_addr, cfg_node, irsb
 
@@ -3641,6 +4376,66 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
 
         return n
 
+    def update(self, patches=None, function_starts=None, indirect_jumps=None):
+        """
+        Incrementally update the CFG after the binary is patched, or when new function starts or targets of indirect
+        jumps become known. Only functions that contain changed code are recovered again, starting from their entries
+        and from all edges that lead into them. The CFG model, the function manager, and cross-references are updated
+        in place. If a function starts or stops returning, its callers are recovered again as well.
+
+        Patched code is read from the patch manager of the knowledge base if `use_patches` is enabled, and from the
+        memory of the loader otherwise.
+
+        :param iterable patches:            Patch instances, or (address, size) tuples of memory ranges, that have
+                                            changed since the CFG was recovered.
+        :param iterable function_starts:    A list of new function starts.
+        :param dict indirect_jumps:         A dict mapping addresses of blocks that end with an indirect jump to lists of
+                                            new targets of each indirect jump.
+        :return: None
+        """
+
+        ranges = [ ]
+        for patch in patches or [ ]:
+            if isinstance(patch, tuple):
+                addr, size = patch
+            else:
+                addr, size = patch.addr, len(patch)
+            if size > 0:
+                ranges.append((addr, addr + size))
+
+        func_addrs = set()
+        for start, end in ranges:
+            for node in self.model.nodes_in_range(start, end):
+                if node.function_address is not None:
+                    func_addrs.add(node.function_address)
+
+        updated_functions = set(func_addrs)
+        for addr in function_starts or [ ]:
+            # the function that holds the new start is split
+            node = self.model.get_any_node(addr)
+            if node is not None and node.function_address is not None:
+                updated_functions.add(node.function_address)
+            updated_functions.add(addr)
+        if indirect_jumps:
+            for block_addr in indirect_jumps:
+                jump = self.indirect_jumps.get(block_addr, None)
+                if jump is not None and jump.func_addr is not None:
+                    updated_functions.add(jump.func_addr)
+
+        returning = self._functions_returning(updated_functions)
+        self._invalidate_functions(func_addrs, ranges=ranges)
+
+        for addr in function_starts or [ ]:
+            job = CFGJob(addr, addr, 'Ijk_Boring')
+            self._insert_job(job)
+            self._register_analysis_job(addr, job)
+
+        if indirect_jumps:
+            for block_addr, targets in indirect_jumps.items():
+                self._add_indirect_jump_targets(block_addr, targets)
+
+        self._recover_invalidated_functions(func_addrs, returning, updated_functions)
+
     def output(self):
         s = "%s" % self._graph.edges(data=True)
 
@@ -3661,5 +4456,85 @@ class CFGFast(ForwardAnalysis, CFGBase):    # pylint: disable=abstract-method
         return lst
 
 
+class _CFGFastPartition(CFGFast):  # pylint: disable=abstract-method
+    """
+    Recovers the CFG of one partition of the regions in a worker process of a parallel CFG recovery. Transitions to other
+    partitions are recorded instead of being dropped, so that the parent process can follow them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # jobs of transitions to other partitions
+        self.exits = [ ]
+        super().__init__(*args, **kwargs)
+
+    def _pre_job_handling(self, job):  # pylint:disable=arguments-differ
+        try:
+            super()._pre_job_handling(job)
+        except AngrSkipJobNotice:
+            if job.src_node is not None and _parallel_cfg._inside_regions(job.addr):
+                self.exits.append(job)
+            raise
+
+    def _func_addrs_from_prologues(self):
+        # the parent process has scanned the binary already
+        return [ addr for addr in _parallel_cfg._function_prologue_addrs if self._inside_regions(addr) ]
+
+
+def _recover_partition(idx):
+    """
+    Recover the CFG of one partition of the regions in a worker process.
+
+    :param int idx: Index of the partition.
+    :return:        The pickled CFG of the partition, which CFGFast._merge_partition() loads.
+    :rtype:         bytes
+    """
+
+    from ...knowledge_base import KnowledgeBase  # pylint:disable=import-outside-toplevel
+    from ..analysis import AnalysisFactory  # pylint:disable=import-outside-toplevel
+
+    parent = _parallel_cfg
+    kb = KnowledgeBase(parent.project)
+    if parent._use_patches:
+        kb.register_plugin('patches', parent.kb.patches)
+
+    cfg = AnalysisFactory(parent.project, _CFGFastPartition)(
+        kb=kb,
+        binary=parent._binary,
+        regions=parent._partitions[idx],
+        symbols=parent._use_symbols,
+        function_prologues=parent._use_function_prologues,
+        resolve_indirect_jumps=parent._resolve_indirect_jumps,
+        force_segment=parent._force_segment,
+        force_complete_scan=parent._force_complete_scan,
+        indirect_jump_target_limit=parent._indirect_jump_target_limit,
+        # cross-references are collected after the partitions are merged
+        data_references=parent._collect_data_ref,
+        normalize=parent._normalize,
+        start_at_entry=parent._start_at_entry,
+        function_starts=parent._extra_function_starts,
+        extra_memory_regions=parent._extra_memory_regions,
+        data_type_guessing_handlers=parent._data_type_guessing_handlers,
+        arch_options=parent._arch_options,
+        indirect_jump_resolvers=parent.timeless_indirect_jump_resolvers + parent.indirect_jump_resolvers,
+        base_state=parent._base_state,
+        exclude_sparse_regions=False,
+        skip_specific_regions=False,
+        heuristic_plt_resolving=parent._heuristic_plt_resolving,
+        detect_tail_calls=parent._detect_tail_calls,
+        low_priority=parent._low_priority,
+        use_patches=parent._use_patches,
+        elf_eh_frame=parent._use_elf_eh_frame,
+    )
+
+    result = (cfg.model, dict(kb.functions.items()), kb.functions.callgraph, cfg._traced_addresses,
+              [ (seg.start, seg.end, seg.sort) for seg in cfg._seg_list._list ], cfg.indirect_jumps,
+              set(kb.resolved_indirect_jumps), set(kb.unresolved_indirect_jumps), kb.xrefs.xrefs_by_ins_addr,
+              cfg._function_returns, cfg._function_exits, cfg._completed_functions, cfg.exits,
+              )
+    f = io.BytesIO()
+    _PartitionPickler(f, kb).dump(result)
+    return f.getvalue()
+
+
 from angr.analyses import AnalysesHub
 AnalysesHub.register_default('CFGFast', CFGFast)
@@ -417,6 +417,34 @@ class SegmentList:
 
         # self._debug_check()
 
+    def release(self, address, size):
+        """
+        Remove a block, specified by (address, size), from this segment list. Segments that partially overlap with the
+        block are shrunk or split.
+
+        :param int address:     The starting address of the block.
+        :param int size:        Size of the block.
+        :return: None
+        """
+
+        if size is None or size <= 0 or not self._list:
+            return
+
+        end = address + size
+        idx = self._search(address)
+        new_segments = [ ]
+        i = idx
+        while i < len(self._list) and self._list[i].start < end:
+            segment = self._list[i]
+            if segment.start < address:
+                new_segments.append(Segment(segment.start, address, segment.sort))
+            if segment.end > end:
+                new_segments.append(Segment(end, segment.end, segment.sort))
+            self._bytes_occupied -= min(segment.end, end) - max(segment.start, address)
+            i += 1
+
+        self._list[idx:i] = new_segments
+
     def copy(self):
         """
         Make a copy of the SegmentList.
@@ -1,12 +1,13 @@
-import networkx
-
+from collections import defaultdict
 from functools import reduce
 
+import networkx
+
 from ...errors import AngrForwardAnalysisError
 from ...errors import AngrSkipJobNotice, AngrDelayJobNotice, AngrJobMergingFailureNotice, AngrJobWideningFailureNotice
 
 
-from .job_info import JobInfo
+from .job_info import JobInfo, JobInfoQueue
 
 class ForwardAnalysis:
     """
@@ -56,7 +57,7 @@ class ForwardAnalysis:
         self._should_abort = False
 
         # All remaining jobs
-        self._job_info_queue = [ ]
+        self._job_info_queue = JobInfoQueue(key=self._job_info_sorting_key if order_jobs else None)
 
         # A map between job key to job. Jobs with the same key will be merged by calling _merge_jobs()
         self._job_map = { }
@@ -64,6 +65,9 @@ class ForwardAnalysis:
         # A mapping between node and abstract state
         self._state_map = { }
 
+        # Number of times each node (or job key, if there is no graph to traverse) is visited
+        self._visit_counts = defaultdict(int)
+
         # The graph!
         # Analysis results (nodes) are stored here
         self._graph = networkx.DiGraph()
@@ -90,6 +94,18 @@ class ForwardAnalysis:
         for job_info in self._job_info_queue:
             yield job_info.job
 
+    @property
+    def visit_counts(self):
+        """
+        Get the number of times each node is visited until the analysis converges. If there is no graph to traverse,
+        visits are counted per job key.
+
+        :return: A dict mapping nodes or job keys to the number of visits.
+        :rtype:  dict
+        """
+
+        return dict(self._visit_counts)
+
     #
     # Public methods
     #
@@ -233,6 +249,8 @@ class ForwardAnalysis:
             if n is None:
                 break
 
+            self._visit_counts[n] += 1
+
             job_state = self._get_input_state(n)
             if job_state is None:
                 job_state = self._initial_abstract_state(n)
@@ -347,7 +365,7 @@ class ForwardAnalysis:
                 # still no job available
                 break
 
-            job_info = self._job_info_queue[0]
+            job_info = self._job_info_queue.peek()
 
             try:
                 self._pre_job_handling(job_info.job)
@@ -356,14 +374,16 @@ class ForwardAnalysis:
                 continue
             except AngrSkipJobNotice:
                 # consume and skip this job
-                self._job_info_queue = self._job_info_queue[1:]
+                self._job_info_queue.remove(job_info)
                 self._job_map.pop(self._job_key(job_info.job), None)
                 continue
 
             # remove the job info from the map
             self._job_map.pop(self._job_key(job_info.job), None)
 
-            self._job_info_queue = self._job_info_queue[1:]
+            self._job_info_queue.remove(job_info)
+
+            self._visit_counts[job_info.key] += 1
 
             self._process_job_and_get_successors(job_info)
 
@@ -421,8 +441,7 @@ class ForwardAnalysis:
                     try:
                         widened_job = self._widen_jobs(job_info.job, job)
                         # remove the old job since now we have a widened one
-                        if job_info in self._job_info_queue:
-                            self._job_info_queue.remove(job_info)
+                        self._job_info_queue.remove(job_info)
                         job_info.add_job(widened_job, widened=True)
                         job_added = True
                     except AngrJobWideningFailureNotice:
@@ -434,8 +453,7 @@ class ForwardAnalysis:
                     try:
                         merged_job = self._merge_jobs(job_info.job, job)
                         # remove the old job since now we have a merged one
-                        if job_info in self._job_info_queue:
-                            self._job_info_queue.remove(job_info)
+                        self._job_info_queue.remove(job_info)
                         job_info.add_job(merged_job, merged=True)
                     except AngrJobMergingFailureNotice:
                         # merging failed
@@ -451,11 +469,11 @@ class ForwardAnalysis:
             job_info = JobInfo(key, job)
             self._job_map[key] = job_info
 
-        if self._order_jobs:
-            self._binary_insert(self._job_info_queue, job_info, lambda elem: self._job_sorting_key(elem.job))
+        # the queue is ordered by job sorting keys if jobs should be ordered
+        self._job_info_queue.push(job_info)
 
-        else:
-            self._job_info_queue.append(job_info)
+    def _job_info_sorting_key(self, job_info):
+        return self._job_sorting_key(job_info.job)
 
     def _peek_job(self, pos):
         """
@@ -466,42 +484,4 @@ class ForwardAnalysis:
         :return:        The job
         """
 
-        if pos < len(self._job_info_queue):
-            return self._job_info_queue[pos].job
-
-        raise IndexError()
-
-    #
-    # Utils
-    #
-
-    @staticmethod
-    def _binary_insert(lst, elem, key, lo=0, hi=None):
-        """
-        Insert an element into a sorted list, and keep the list sorted.
-
-        The major difference from bisect.bisect_left is that this function supports a key method, so user doesn't have
-        to create the key array for each insertion.
-
-        :param list lst: The list. Must be pre-ordered.
-        :param object element: An element to insert into the list.
-        :param func key: A method to get the key for each element in the list.
-        :param int lo: Lower bound of the search.
-        :param int hi: Upper bound of the search.
-        :return: None
-        """
-
-        if lo < 0:
-            raise ValueError("lo must be a non-negative number")
-
-        if hi is None:
-            hi = len(lst)
-
-        while lo < hi:
-            mid = (lo + hi) // 2
-            if key(lst[mid]) < key(elem):
-                lo = mid + 1
-            else:
-                hi = mid
-
-        lst.insert(lo, elem)
+        return self._job_info_queue[pos].job
@@ -1,3 +1,7 @@
+import heapq
+import itertools
+
+
 class JobInfo:
     """
     Stores information of each job.
@@ -56,3 +60,118 @@ class JobInfo:
         elif widened:
             job_type = 'widened'
         self.jobs.append((job, job_type))
+
+
+class JobInfoQueue:
+    """
+    The queue of remaining jobs of a forward analysis, implemented as a binary heap.
+
+    With a key function, jobs are popped in ascending order of their keys, and among jobs with the same key, the job
+    that was inserted last is popped first. Without a key function, jobs are popped in the order they are inserted.
+    Removing a job only marks its heap entry as removed, so that insertions and removals both take O(log n) time.
+    """
+
+    __slots__ = ('_key', '_heap', '_entries', '_counter', )
+
+    def __init__(self, key=None):
+        """
+        :param key: A function that takes a JobInfo instance and returns its sorting key, or None.
+        """
+        self._key = key
+        self._heap = [ ]
+        # maps the ID of each JobInfo instance in the queue to its heap entry
+        self._entries = { }
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        """
+        Iterate through all JobInfo instances in the order they will be popped.
+        """
+        for entry in sorted(self._entries.values()):
+            yield entry[2]
+
+    def __contains__(self, job_info):
+        return id(job_info) in self._entries
+
+    def __getitem__(self, pos):
+        if pos == 0:
+            return self.peek()
+        if not 0 <= pos < len(self._entries):
+            raise IndexError(pos)
+        return heapq.nsmallest(pos + 1, self._entries.values())[pos][2]
+
+    def __repr__(self):
+        return "<JobInfoQueue with %d jobs>" % len(self._entries)
+
+    def push(self, job_info):
+        """
+        Insert a JobInfo instance into the queue. It replaces its previous entry if it is already in the queue.
+
+        :param JobInfo job_info: The JobInfo instance to insert.
+        :return:                 None
+        """
+
+        self.remove(job_info)
+        if self._key is None:
+            entry = [ 0, next(self._counter), job_info ]
+        else:
+            entry = [ self._key(job_info), -next(self._counter), job_info ]
+        self._entries[id(job_info)] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, job_info):
+        """
+        Remove a JobInfo instance from the queue if it is in the queue.
+
+        :param JobInfo job_info: The JobInfo instance to remove.
+        :return:                 True if it was in the queue, False otherwise.
+        :rtype:                  bool
+        """
+
+        entry = self._entries.pop(id(job_info), None)
+        if entry is None:
+            return False
+        entry[2] = None
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            # too many removed entries are lying around
+            self._heap = [ e for e in self._heap if e[2] is not None ]
+            heapq.heapify(self._heap)
+        return True
+
+    def peek(self):
+        """
+        Get the first JobInfo instance in the queue without removing it.
+
+        :return: The JobInfo instance.
+        :rtype:  JobInfo
+        """
+
+        heap = self._heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+        if not heap:
+            raise IndexError("peek from an empty job queue")
+        return heap[0][2]
+
+    def pop(self):
+        """
+        Remove and return the first JobInfo instance in the queue.
+
+        :return: The JobInfo instance.
+        :rtype:  JobInfo
+        """
+
+        heap = self._heap
+        while heap:
+            job_info = heapq.heappop(heap)[2]
+            if job_info is not None:
+                del self._entries[id(job_info)]
+                return job_info
+        raise IndexError("pop from an empty job queue")
+
+    def clear(self):
+        self._heap = [ ]
+        self._entries.clear()
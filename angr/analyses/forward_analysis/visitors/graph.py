@@ -1,4 +1,4 @@
-from claripy.utils.orderedset import OrderedSet
+import heapq
 
 from ....misc.ux import deprecated
 
@@ -9,7 +9,10 @@ class GraphVisitor:
     returns successors of a CFGNode each time. This is the base class of all graph visitors.
     """
     def __init__(self):
-        self._sorted_nodes = OrderedSet()
+        # the worklist is a heap of indices of nodes in the optimal traversal order
+        self._sorted_nodes = [ ]
+        self._pending_indices = set()
+        self._nodes_by_index = [ ]
         self._node_to_index = { }
         self._reached_fixedpoint = set()
 
@@ -81,13 +84,15 @@ class GraphVisitor:
         :return: None
         """
 
-        self._sorted_nodes.clear()
         self._node_to_index.clear()
         self._reached_fixedpoint.clear()
 
-        for i, n in enumerate(self.sort_nodes()):
+        self._nodes_by_index = list(self.sort_nodes())
+        for i, n in enumerate(self._nodes_by_index):
             self._node_to_index[n] = i
-            self._sorted_nodes.add(n)
+        # a sorted list is a valid heap
+        self._sorted_nodes = list(range(len(self._nodes_by_index)))
+        self._pending_indices = set(self._sorted_nodes)
 
     def next_node(self):
         """
@@ -99,7 +104,9 @@ class GraphVisitor:
         if not self._sorted_nodes:
             return None
 
-        return self._sorted_nodes.pop(last=False)
+        idx = heapq.heappop(self._sorted_nodes)
+        self._pending_indices.discard(idx)
+        return self._nodes_by_index[idx]
 
     def all_successors(self, node, skip_reached_fixedpoint=False):
         """
@@ -134,12 +141,10 @@ class GraphVisitor:
         successors = self.successors(node) #, skip_reached_fixedpoint=True)
 
         if include_self:
-            self._sorted_nodes.add(node)
+            self._add_to_worklist(node)
 
         for succ in successors:
-            self._sorted_nodes.add(succ)
-
-        self._sorted_nodes = OrderedSet(sorted(self._sorted_nodes, key=lambda n: self._node_to_index[n]))
+            self._add_to_worklist(succ)
 
     def revisit_node(self, node):
         """
@@ -149,8 +154,7 @@ class GraphVisitor:
         :return:        None
         """
 
-        self._sorted_nodes.add(node)
-        self._sorted_nodes = OrderedSet(sorted(self._sorted_nodes, key=lambda n: self._node_to_index[n]))
+        self._add_to_worklist(node)
 
     def reached_fixedpoint(self, node):
         """
@@ -161,3 +165,20 @@ class GraphVisitor:
         """
 
         self._reached_fixedpoint.add(node)
+
+    #
+    # Private methods
+    #
+
+    def _add_to_worklist(self, node):
+        """
+        Add a node to the worklist if it is not there yet.
+
+        :param node: The node to add.
+        :return:     None
+        """
+
+        idx = self._node_to_index[node]
+        if idx not in self._pending_indices:
+            self._pending_indices.add(idx)
+            heapq.heappush(self._sorted_nodes, idx)
@@ -131,7 +131,14 @@ class AngrDB:
 
         return version == self.VERSION
 
-    def dump(self, db_path):
+    def dump(self, db_path, columnar_cfg=False):
+        """
+        Dump the project and its knowledge base to a database.
+
+        :param str db_path:         Path to the database file.
+        :param bool columnar_cfg:   Store CFG models in the columnar format, which is loaded lazily.
+        :return:                    None
+        """
 
         db_str = "sqlite:///%s" % db_path
 
@@ -140,7 +147,7 @@ class AngrDB:
                 # Dump the loader
                 LoaderSerializer.dump(session, self.project.loader)
                 # Dump the knowledge base
-                KnowledgeBaseSerializer.dump(session, self.project.kb)
+                KnowledgeBaseSerializer.dump(session, self.project.kb, columnar_cfg=columnar_cfg)
                 # Update the information
                 self.update_dbinfo(session)
 
@@ -1,6 +1,7 @@
 # pylint:disable=unused-import
 from ..models import DbCFGModel, DbKnowledgeBase
 from ...knowledge_plugins.cfg.cfg_model import CFGModel
+from ...knowledge_plugins.cfg.cfg_columns import CFGColumns
 
 
 class CFGModelSerializer:
@@ -9,13 +10,14 @@ class CFGModelSerializer:
     """
 
     @staticmethod
-    def dump(session, db_kb, ident, cfg_model):
+    def dump(session, db_kb, ident, cfg_model, columnar=False):
         """
 
         :param session:
         :param DbKnowledgeBase db_kb:   The database object for KnowledgeBase.
         :param str ident:               Identifier of the CFG model.
         :param CFGModel cfg_model:      The CFG model to dump.
+        :param bool columnar:           Store the CFG model in the columnar format, which is loaded lazily.
         :return:                        None
         """
 
@@ -27,7 +29,7 @@ class CFGModelSerializer:
         db_cfg = DbCFGModel(
             kb=db_kb,
             ident=ident,
-            blob=cfg_model.serialize(),
+            blob=cfg_model.serialize_columnar() if columnar else cfg_model.serialize(),
         )
         session.add(db_cfg)
 
@@ -38,5 +40,8 @@ class CFGModelSerializer:
         if db_cfg is None:
             return None
 
-        cfg_model = CFGModel.parse(db_cfg.blob, cfg_manager=cfg_manager, loader=loader)
+        if db_cfg.blob[:len(CFGColumns.MAGIC)] == CFGColumns.MAGIC:
+            cfg_model = CFGModel.parse_columnar(db_cfg.blob, cfg_manager=cfg_manager, loader=loader)
+        else:
+            cfg_model = CFGModel.parse(db_cfg.blob, cfg_manager=cfg_manager, loader=loader)
         return cfg_model
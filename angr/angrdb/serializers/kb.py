@@ -14,11 +14,12 @@ class KnowledgeBaseSerializer:
     """
 
     @staticmethod
-    def dump(session, kb):
+    def dump(session, kb, columnar_cfg=False):
         """
 
         :param session:             The database session object.
         :param KnowledgeBase kb:    The KnowledgeBase instance to serialize.
+        :param bool columnar_cfg:   Store CFG models in the columnar format.
         :return:                    None
         """
 
@@ -31,7 +32,7 @@ class KnowledgeBaseSerializer:
         if 'CFGFast' in kb.cfgs:
             cfg_model = kb.cfgs['CFGFast']
             if cfg_model is not None:
-                CFGModelSerializer.dump(session, db_kb, 'CFGFast', cfg_model)
+                CFGModelSerializer.dump(session, db_kb, 'CFGFast', cfg_model, columnar=columnar_cfg)
 
         FunctionManagerSerializer.dump(session, db_kb, kb.functions)
         XRefsSerializer.dump(session, db_kb, kb.xrefs)
@@ -77,12 +78,13 @@ class KnowledgeBaseSerializer:
         if labels is not None:
             kb.labels = labels
 
-        # fill in CFGNode.function_address
-        for func in funcs.values():
-            for block_addr in func.block_addrs_set:
-                node = cfg_model.get_any_node(block_addr)
-                if node is not None:
-                    node.function_address = func.addr
+        # fill in CFGNode.function_address. CFG models in the columnar format have them already
+        if not cfg_model.lazy:
+            for func in funcs.values():
+                for block_addr in func.block_addrs_set:
+                    node = cfg_model.get_any_node(block_addr)
+                    if node is not None:
+                        node.function_address = func.addr
 
         # re-initialize CFGModel.insn_addr_to_memory_data
         # fill in insn_addr_to_memory_data
@@ -9,6 +9,25 @@ from ..state_plugins.inspect import BP_AFTER
 l = logging.getLogger(name=__name__)
 
 
+class TraceCheck:
+    """
+    A segment of a concrete basic block trace that blocks executed in unicorn are checked against, natively.
+
+    :ivar entries:      A writable buffer of uint64 trace entries in native byte order, e.g., a memoryview. The first
+                        entry is the address of the block that the state is at, plus the slide.
+    :ivar int slide:    The difference between the addresses in the trace and the addresses in the state.
+    :ivar int checked:  The number of entries that the blocks executed in unicorn followed, i.e., the index of the entry
+                        of the block that the successor is at. None if the state was not executed in unicorn.
+    """
+
+    __slots__ = ('entries', 'slide', 'checked', )
+
+    def __init__(self, entries, slide):
+        self.entries = entries
+        self.slide = slide
+        self.checked = None
+
+
 class SimEngineUnicorn(SuccessorsMixin):
     """
     Concrete execution in the Unicorn Engine, a fork of qemu.
@@ -17,6 +36,8 @@ class SimEngineUnicorn(SuccessorsMixin):
 
     - step:                How many basic blocks we want to execute
     - extra_stop_points:   A collection of addresses at which execution should halt
+    - trace_check:         A TraceCheck. Execution halts before the first block that does not follow the trace, and
+                           after the end of the trace.
     """
 
     def __check(self, num_inst=None, **kwargs):
@@ -91,6 +112,7 @@ class SimEngineUnicorn(SuccessorsMixin):
 
         extra_stop_points = kwargs.get('extra_stop_points', None)
         step = kwargs.get('step', None)
+        trace_check = kwargs.get('trace_check', None)
         if extra_stop_points is None:
             extra_stop_points = set(self.project._sim_procedures)
         else:
@@ -128,6 +150,8 @@ class SimEngineUnicorn(SuccessorsMixin):
 
         try:
             state.unicorn.set_stops(extra_stop_points)
+            if trace_check is not None:
+                trace_entries = state.unicorn.set_trace(trace_check.entries, trace_check.slide)  # pylint:disable=unused-variable
             state.unicorn.set_tracking(track_bbls=o.UNICORN_TRACK_BBL_ADDRS in state.options,
                                        track_stack=o.UNICORN_TRACK_STACK_POINTERS in state.options)
             state.unicorn.hook()
@@ -142,6 +166,9 @@ class SimEngineUnicorn(SuccessorsMixin):
             # TODO: idk what the consequences of this might be. If this failed step can actually change non-unicorn state then this is bad news.
             return super().process_successors(successors, **kwargs)
 
+        if trace_check is not None:
+            trace_check.checked = state.unicorn.trace_idx
+
         description = 'Unicorn (%s after %d steps)' % (STOP.name_stop(state.unicorn.stop_reason), state.unicorn.steps)
 
         state.history.recent_block_count += state.unicorn.steps
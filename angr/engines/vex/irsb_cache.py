@@ -0,0 +1,179 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+
+import pyvex
+
+l = logging.getLogger(name=__name__)
+
+
+class PersistentIRSBCache:
+    """
+    An on-disk cache of lifted IRSBs, backed by a sqlite database.
+
+    The cache is keyed by the digest of the bytes that were lifted together with every lifting parameter that affects
+    the resulting IRSB (address, architecture, THUMB mode, optimization level, strict block end, size limits, whether
+    data references are collected, and whether VEX optimizes across instructions).
+    Since the key is derived from the content of the block, the cache can be safely shared between different Projects,
+    different runs, and different processes. The database is opened in WAL mode, so that multiple processes may read
+    from it while another one is writing.
+
+    Once the total size of the cached IRSBs exceeds `max_size` bytes, the oldest entries are evicted.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path, max_size=512 * 1024 * 1024, evict_interval=1000):
+        """
+        :param str path:            Path of the database file. It is created if it does not exist.
+        :param int max_size:        Maximum size of all cached IRSBs, in bytes.
+        :param int evict_interval:  Number of insertions between two checks of the total cache size.
+        """
+
+        self.path = path
+        self.max_size = max_size
+        self.evict_interval = evict_interval
+
+        self._db = None
+        self._pid = None
+        self._stores_since_eviction = 0
+
+    #
+    # Pickling
+    #
+
+    def __getstate__(self):
+        return self.path, self.max_size, self.evict_interval
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    #
+    # Public methods
+    #
+
+    @staticmethod
+    def make_key(data, addr, arch, thumb, opt_level, strict_block_end, max_bytes, max_inst, traceflags,
+                 collect_data_refs=False, cross_insn_opt=True):
+        """
+        Generate the cache key of a block.
+
+        :param bytes data:  The bytes that are going to be lifted.
+        :return:            The cache key.
+        :rtype:             bytes
+        """
+
+        h = hashlib.sha256(data)
+        h.update(repr((PersistentIRSBCache.VERSION, pyvex.__version__, addr, arch.name, arch.memory_endness, thumb,
+                       opt_level, strict_block_end, max_bytes, max_inst, traceflags, collect_data_refs,
+                       cross_insn_opt)).encode())
+        return h.digest()
+
+    def get(self, key):
+        """
+        Look up an IRSB in the cache.
+
+        :param bytes key:   The cache key, as returned by make_key().
+        :return:            The cached IRSB, or None if it is not cached.
+        """
+
+        try:
+            row = self._connection().execute("SELECT data FROM irsbs WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            l.warning("Failed to read from the IRSB cache at %s.", self.path, exc_info=True)
+            return None
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception:  # pylint:disable=broad-except
+            l.warning("Corrupted IRSB cache entry in %s.", self.path, exc_info=True)
+            return None
+
+    def put(self, key, irsb):
+        """
+        Store an IRSB in the cache.
+
+        :param bytes key:           The cache key, as returned by make_key().
+        :param pyvex.IRSB irsb:     The IRSB to store.
+        :return:                    None
+        """
+
+        data = pickle.dumps(irsb, pickle.HIGHEST_PROTOCOL)
+        try:
+            db = self._connection()
+            db.execute("INSERT OR REPLACE INTO irsbs (key, data, size, ctime) VALUES (?, ?, ?, ?)",
+                       (key, data, len(data), time.time()))
+        except sqlite3.Error:
+            l.warning("Failed to write to the IRSB cache at %s.", self.path, exc_info=True)
+            return
+
+        self._stores_since_eviction += 1
+        if self._stores_since_eviction >= self.evict_interval:
+            self._stores_since_eviction = 0
+            try:
+                self.evict()
+            except sqlite3.Error:
+                l.warning("Failed to evict entries from the IRSB cache at %s.", self.path, exc_info=True)
+
+    def evict(self):
+        """
+        Remove the oldest entries from the cache until its total size is below `max_size`.
+
+        :return:    The number of removed entries.
+        :rtype:     int
+        """
+
+        db = self._connection()
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM irsbs").fetchone()[0]
+        if total <= self.max_size:
+            return 0
+
+        to_free = total - self.max_size
+        victims = [ ]
+        for rowid, size in db.execute("SELECT rowid, size FROM irsbs ORDER BY ctime"):
+            if to_free <= 0:
+                break
+            victims.append((rowid,))
+            to_free -= size
+
+        db.executemany("DELETE FROM irsbs WHERE rowid = ?", victims)
+        return len(victims)
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+        """
+
+        self._connection().execute("DELETE FROM irsbs")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+        self._db = None
+        self._pid = None
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM irsbs").fetchone()[0]
+
+    #
+    # Private methods
+    #
+
+    def _connection(self):
+        # sqlite connections must not be shared across a fork
+        pid = os.getpid()
+        if self._db is None or self._pid != pid:
+            db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS irsbs "
+                       "(key BLOB PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, ctime REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS irsbs_ctime ON irsbs (ctime)")
+            self._db = db
+            self._pid = pid
+            self._stores_since_eviction = 0
+        return self._db
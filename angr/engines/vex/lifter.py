@@ -6,6 +6,7 @@ from cachetools import LRUCache
 import logging
 
 from ..engine import SimEngineBase
+from .irsb_cache import PersistentIRSBCache
 from ...state_plugins.inspect import BP_AFTER, BP_BEFORE
 from ...misc.ux import once
 from ...errors import SimEngineError, SimTranslationError, SimError
@@ -23,7 +24,8 @@ class VEXLifter(SimEngineBase):
                  default_opt_level=1,
                  support_selfmodifying_code=None,
                  single_step=False,
-                 default_strict_block_end=False, **kwargs):
+                 default_strict_block_end=False,
+                 persistent_cache=None, **kwargs):
 
         super().__init__(project, **kwargs)
 
@@ -33,6 +35,7 @@ class VEXLifter(SimEngineBase):
         self._support_selfmodifying_code = support_selfmodifying_code
         self._single_step = single_step
         self.default_strict_block_end = default_strict_block_end
+        self._persistent_cache = persistent_cache
 
         if self._use_cache is None:
             if self.project is not None:
@@ -44,11 +47,17 @@ class VEXLifter(SimEngineBase):
                 self._support_selfmodifying_code = self.project._support_selfmodifying_code
             else:
                 self._support_selfmodifying_code = False
+        if self._persistent_cache is None and self.project is not None:
+            self._persistent_cache = getattr(self.project, '_persistent_translation_cache', None)
+        if isinstance(self._persistent_cache, str):
+            self._persistent_cache = PersistentIRSBCache(self._persistent_cache)
 
         # block cache
         self._block_cache = None
         self._block_cache_hits = 0
         self._block_cache_misses = 0
+        self._persistent_cache_hits = 0
+        self._persistent_cache_misses = 0
 
         self._initialize_block_cache()
 
@@ -56,12 +65,16 @@ class VEXLifter(SimEngineBase):
         self._block_cache = LRUCache(maxsize=self._cache_size)
         self._block_cache_hits = 0
         self._block_cache_misses = 0
+        self._persistent_cache_hits = 0
+        self._persistent_cache_misses = 0
 
     def clear_cache(self):
         self._block_cache = LRUCache(maxsize=self._cache_size)
 
         self._block_cache_hits = 0
         self._block_cache_misses = 0
+        self._persistent_cache_hits = 0
+        self._persistent_cache_misses = 0
 
 
     def lift_vex(self,
@@ -78,7 +91,8 @@ class VEXLifter(SimEngineBase):
              opt_level=None,
              strict_block_end=None,
              skip_stmts=False,
-             collect_data_refs=False):
+             collect_data_refs=False,
+             cross_insn_opt=True):
 
         """
         Lift an IRSB.
@@ -106,6 +120,8 @@ class VEXLifter(SimEngineBase):
         :param num_inst:        The maximum number of instructions.
         :param traceflags:      traceflags to be passed to VEX. (default: 0)
         :param strict_block_end:   Whether to force blocks to end at all conditional branches (default: false)
+        :param collect_data_refs:  Whether to collect the data references of the block. (default: False)
+        :param cross_insn_opt:     Whether VEX may optimize across instructions. (default: True)
         """
 
         # phase 0: sanity check
@@ -151,9 +167,13 @@ class VEXLifter(SimEngineBase):
             skip_stmts = False
 
         use_cache = self._use_cache
-        if skip_stmts or collect_data_refs:
-            # Do not cache the blocks if skip_stmts or collect_data_refs are enabled
+        use_persistent_cache = self._persistent_cache is not None
+        if skip_stmts or collect_data_refs or not cross_insn_opt:
+            # Do not cache the blocks in memory if skip_stmts or collect_data_refs are enabled, or if cross_insn_opt is
+            # disabled. The persistent cache keys blocks by collect_data_refs and cross_insn_opt as well
             use_cache = False
+        if skip_stmts:
+            use_persistent_cache = False
 
         # phase 2: thumb normalization
         thumb = int(thumb)
@@ -214,16 +234,33 @@ class VEXLifter(SimEngineBase):
         try:
             for subphase in range(2):
 
-                irsb = pyvex.lift(buff, addr + thumb, arch,
-                                  max_bytes=size,
-                                  max_inst=num_inst,
-                                  bytes_offset=thumb,
-                                  traceflags=traceflags,
-                                  opt_level=opt_level,
-                                  strict_block_end=strict_block_end,
-                                  skip_stmts=skip_stmts,
-                                  collect_data_refs=collect_data_refs,
-                                  )
+                persistent_key = None
+                irsb = None
+                if use_persistent_cache:
+                    data = buff[:size] if isinstance(buff, bytes) else pyvex.ffi.buffer(buff, size)[:]
+                    persistent_key = PersistentIRSBCache.make_key(data, addr, arch, thumb, opt_level,
+                                                                  strict_block_end, size, num_inst, traceflags,
+                                                                  collect_data_refs, cross_insn_opt)
+                    irsb = self._persistent_cache.get(persistent_key)
+                    if irsb is not None:
+                        self._persistent_cache_hits += 1
+                    else:
+                        self._persistent_cache_misses += 1
+
+                if irsb is None:
+                    irsb = pyvex.lift(buff, addr + thumb, arch,
+                                      max_bytes=size,
+                                      max_inst=num_inst,
+                                      bytes_offset=thumb,
+                                      traceflags=traceflags,
+                                      opt_level=opt_level,
+                                      strict_block_end=strict_block_end,
+                                      skip_stmts=skip_stmts,
+                                      collect_data_refs=collect_data_refs,
+                                      cross_insn_opt=cross_insn_opt,
+                                      )
+                    if persistent_key is not None:
+                        self._persistent_cache.put(persistent_key, irsb)
 
                 if subphase == 0 and irsb.statements is not None:
                     # check for possible stop points
@@ -353,7 +390,8 @@ class VEXLifter(SimEngineBase):
              '_support_selfmodifying_code': self._support_selfmodifying_code,
              '_single_step': self._single_step,
              '_cache_size': self._cache_size,
-             'default_strict_block_end': self.default_strict_block_end
+             'default_strict_block_end': self.default_strict_block_end,
+             '_persistent_cache': self._persistent_cache,
         }
 
         return (s, ostate)
@@ -366,6 +404,7 @@ class VEXLifter(SimEngineBase):
         self._single_step = s['_single_step']
         self._cache_size = s['_cache_size']
         self.default_strict_block_end = s['default_strict_block_end']
+        self._persistent_cache = s.get('_persistent_cache', None)
 
         # rebuild block cache
         self._initialize_block_cache()
@@ -1,4 +1,5 @@
 import os
+import pickle
 import string
 import hashlib
 import tempfile
@@ -6,6 +7,7 @@ import logging
 
 from . import ExplorationTechnique
 from .common import condition_to_lambda
+from ..state_serializer import StateSerializer
 
 
 l = logging.getLogger(name=__name__)
@@ -19,7 +21,7 @@ class Cacher(ExplorationTechnique):
     """
 
     def __init__(self, when=None, dump_cache=True, load_cache=True, container=None,
-                 lookup=None, dump_func=None, load_func=None):
+                 lookup=None, dump_func=None, load_func=None, compact=False):
         """
         :param dump_cache: Whether to dump data to cache.
         :param load_cache: Whether to load data from cache.
@@ -31,14 +33,20 @@ class Cacher(ExplorationTechnique):
                            SimulationManager. Default to caching the active stash.
         :param load_func:  If provided, should be a function that defines how Cacher should uncache the
                            SimulationManager. Default to uncaching the stash to be stepped.
+        :param compact:    Whether the default dump and load functions should store only the states, with a
+                           StateSerializer, instead of pickling the project along with them.
         """
         super(Cacher, self).__init__()
         self._dump_cond, _ = condition_to_lambda(when)
         self._dump_cache = dump_cache
         self._load_cache = load_cache
         self._cache_lookup = self._lookup if lookup is None else lookup
-        self._dump_func = self._dump_stash if dump_func is None else dump_func
-        self._load_func = self._load_stash if load_func is None else load_func
+        if dump_func is None:
+            dump_func = self._dump_stash_compact if compact else self._dump_stash
+        if load_func is None:
+            load_func = self._load_stash_compact if compact else self._load_stash
+        self._dump_func = dump_func
+        self._load_func = load_func
 
         self.container = container
         self.container_pickle_str = isinstance(container, str) and not all(c in string.printable for c in container)
@@ -134,3 +142,19 @@ class Cacher(ExplorationTechnique):
 
         for s in simgr.stashes[stash]:
             s.project = project
+
+    @staticmethod
+    def _load_stash_compact(container, simgr):
+        with open(container, 'rb') as f:
+            store, states = pickle.load(f)
+
+        serializer = StateSerializer(store=store, project=simgr._project)
+        simgr.stashes['active'] = [ serializer.loads(s) for s in states ]
+
+    @staticmethod
+    def _dump_stash_compact(container, simgr, stash):
+        serializer = StateSerializer()
+        states = [ serializer.dumps(s) for s in simgr.stashes[stash] ]
+
+        with open(container, 'wb') as f:
+            pickle.dump((serializer.store, states), f, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,296 @@
+import io
+import pickle
+import copyreg
+import logging
+import itertools
+import traceback
+import multiprocessing
+import concurrent.futures
+
+import claripy
+import claripy.ast.base
+
+from . import ExplorationTechnique
+from ..engines.successors import SimSuccessors
+
+l = logging.getLogger(name=__name__)
+
+
+class _Pickler(pickle.Pickler):
+    """
+    Pickle objects, replacing the objects in `refs` with references that are resolved when unpickling.
+
+    References go through the dispatch table rather than persistent_id(), so that pickling the many objects that are
+    not referenced does not call back into Python.
+    """
+
+    def __init__(self, file, refs):
+        super(_Pickler, self).__init__(file, pickle.HIGHEST_PROTOCOL)
+        self._refs = { id(o): ref for ref, o in refs }
+        self.dispatch_table = copyreg.dispatch_table.copy()
+        for _, o in refs:
+            self.dispatch_table[type(o)] = self._reduce
+
+    def _reduce(self, obj):
+        ref = self._refs.get(id(obj), None)
+        if ref is None:
+            return obj.__reduce_ex__(pickle.HIGHEST_PROTOCOL)
+        return _resolve_ref, ref
+
+
+_current_refs = None
+
+
+def _resolve_ref(*ref):
+    return _current_refs[ref]
+
+
+def _dumps(obj, refs):
+    f = io.BytesIO()
+    _Pickler(f, refs).dump(obj)
+    return f.getvalue()
+
+
+def _loads(data, refs):
+    global _current_refs  # pylint:disable=global-statement
+    _current_refs = dict(refs)
+    try:
+        return pickle.loads(data)
+    finally:
+        _current_refs = None
+
+
+def _shared_refs(project):
+    """
+    Get references to the objects that are owned by the project and that are referenced by states. They are never sent
+    between the manager and the workers, since each worker holds an identical copy of the project.
+
+    References are keyed by what the objects are rather than by their positions, so that an object that only exists on
+    one side fails to resolve instead of resolving to a different object.
+    """
+    refs = [ (('project', name), o) for name, o in (('project', project), ('loader', project.loader),
+                                                     ('memory', project.loader.memory), ('arch', project.arch),
+                                                     ('simos', project.simos), ('factory', project.factory),
+                                                     ('kb', project.kb)) ]
+    refs.extend((('object', type(o).__name__, o.mapped_base), o) for o in project.loader.all_objects)
+    refs.extend((('procedure', addr), proc) for addr, proc in project._sim_procedures.items())
+    return refs
+
+
+def _state_refs(state):
+    """
+    Get references to the objects of a stepped state that its successors may share with it: its histories, and the
+    pages of its memories.
+    """
+    refs = [ ]
+    h = state.history
+    i = 0
+    while h is not None:
+        refs.append((('history', i), h))
+        h = h.parent
+        i += 1
+    for name in ('memory', 'registers'):
+        if state.has_plugin(name):
+            pages = getattr(getattr(state.plugins[name], 'mem', None), '_pages', None)
+            if pages is not None:
+                refs.extend((('page', name, n), page) for n, page in pages.items())
+    return refs
+
+
+#
+# Worker side
+#
+
+_worker_project = None
+
+
+def _init_worker(project):
+    global _worker_project  # pylint:disable=global-statement
+    _worker_project = project
+
+
+def _step_batch(data):
+    """
+    Step a batch of states in a worker process.
+
+    :param bytes data:  The pickled batch, a list of (state, variable counter base) tuples and the arguments to
+                        project.factory.successors().
+    :return:            A list holding the pickled outcome of each step, or None if it could not be pickled.
+    """
+    shared = _shared_refs(_worker_project)
+    batch, run_args = _loads(data, shared)
+    results = [ ]
+    for state, counter_base in batch:
+        claripy.ast.base.var_counter = itertools.count(counter_base)
+        try:
+            succ = _worker_project.factory.successors(state, **run_args)
+            outcome = ('ok', next(claripy.ast.base.var_counter) - counter_base,
+                       (succ.addr, succ.description, succ.sort, succ.processed, succ.artifacts, succ.successors,
+                        succ.all_successors, succ.flat_successors, succ.unsat_successors,
+                        succ.unconstrained_successors))
+        except Exception as e:  # pylint:disable=broad-except
+            outcome = ('error', next(claripy.ast.base.var_counter) - counter_base, (e, traceback.format_exc()))
+
+        # successors share histories and pages with the state that was sent to us. they are sent back as references,
+        # so that the manager links the successors to its own copies.
+        try:
+            results.append(_dumps(outcome, shared + _state_refs(state)))
+        except Exception:  # pylint:disable=broad-except
+            results.append(None)
+    return results
+
+
+class ProcessPool(ExplorationTechnique):
+    """
+    Step states in a pool of worker processes.
+
+    Unlike the Threading exploration technique, this is not bound by the GIL. Each worker holds its own copy of the
+    project, which is inherited through fork() where possible. At every step, the states of the stepped stash are
+    pickled in batches and sent to the workers, which compute their successors and stream them back one batch at a time
+    while the simulation manager consumes them in order. Since states are pickled, this pays off when steps are
+    expensive, e.g. when most of the time is spent in constraint solving.
+
+    Only the computation of successors is moved to the workers. Filtering, selection, and categorization of the
+    successors still happen in the simulation manager, in the same order as without this technique, so the hooks of
+    the other exploration techniques keep their semantics. To keep the names of symbolic variables deterministic and
+    unique across workers, every stepped state is given its own range of variable numbers. Workers only receive the
+    last two histories of each state.
+
+    States that are filtered out or not selected are stepped speculatively and their successors are discarded. A
+    state is stepped in the simulation manager's process if the user provides a successor_func, if another exploration
+    technique hooks successors(), or if its step could not be shipped to or from a worker.
+    """
+
+    def __init__(self, workers=None, batch_size=8, variable_stride=1 << 16, mp_context=None):
+        """
+        :param int workers:         Number of worker processes. Defaults to the number of CPUs.
+        :param int batch_size:      Number of states that are sent to a worker at once.
+        :param int variable_stride: Number of symbolic variable names reserved for the step of each state.
+        :param mp_context:          The multiprocessing context to start workers with. Defaults to fork if it is
+                                    available.
+        """
+        super(ProcessPool, self).__init__()
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.batch_size = batch_size
+        self.variable_stride = variable_stride
+
+        if mp_context is None and 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        self._mp_context = mp_context
+
+        self.executor = None
+        self._shared = None
+        self._pending = { }
+        self._next_counter = None
+
+    def setup(self, simgr):
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=self._mp_context,
+                                                               initializer=_init_worker, initargs=(self.project,))
+
+    def shutdown(self, wait=True):
+        """
+        Stop all worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+
+    def step(self, simgr, stash='active', **kwargs):
+        if kwargs.get('successor_func', None) is not None or self.executor is None \
+                or any(tech is not self and tech._is_overriden('successors') for tech in simgr._techniques):
+            return simgr.step(stash=stash, **kwargs)
+
+        states = simgr.stashes[stash]
+        run_args = { k: v for k, v in kwargs.items()
+                     if k not in ('selector_func', 'step_func', 'successor_func', 'filter_func', 'n', 'until') }
+
+        self._shared = _shared_refs(self.project)
+        counter_start = next(claripy.ast.base.var_counter)
+        self._next_counter = counter_start + len(states) * self.variable_stride
+        try:
+            self._dispatch(states, run_args, counter_start)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            l.warning("Failed to pickle the states of stash %s. Stepping them locally.", stash, exc_info=True)
+            self._pending.clear()
+
+        try:
+            simgr = simgr.step(stash=stash, **kwargs)
+        finally:
+            for _, _, future, _ in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            claripy.ast.base.var_counter = itertools.count(self._next_counter)
+        return simgr
+
+    def successors(self, simgr, state, successor_func=None, **run_args):
+        pending = self._pending.pop(id(state), None)
+        if pending is None or pending[0] is not state or successor_func is not None:
+            return simgr.successors(state, successor_func=successor_func, **run_args)
+
+        _, batch_idx, future, counter_base = pending
+        outcome = None
+        try:
+            data = future.result()[batch_idx]
+        except Exception:  # pylint:disable=broad-except
+            l.warning("A worker process failed to step %s. Stepping it locally.", state, exc_info=True)
+            data = None
+        if data is not None:
+            try:
+                outcome = _loads(data, self._shared + _state_refs(state))
+            except Exception:  # pylint:disable=broad-except
+                # e.g., the successors refer to an object that only exists in the worker
+                l.warning("Failed to load the successors of %s from a worker process. Stepping it locally.", state,
+                          exc_info=True)
+                outcome = None
+        if outcome is None or outcome[1] > self.variable_stride:
+            # the worker could not send the result back, or it used more variable names than reserved for it
+            claripy.ast.base.var_counter = itertools.count(counter_base)
+            succ = simgr.successors(state, successor_func=successor_func, **run_args)
+            self._next_counter = max(self._next_counter, next(claripy.ast.base.var_counter))
+            return succ
+
+        kind, _, result = outcome
+        if kind == 'error':
+            e, tb = result
+            l.debug("Step of %s failed in a worker process:\n%s", state, tb)
+            raise e
+
+        succ = SimSuccessors(result[0], state)
+        succ.description, succ.sort, succ.processed, succ.artifacts = result[1:5]
+        succ.successors, succ.all_successors, succ.flat_successors, succ.unsat_successors, \
+            succ.unconstrained_successors = result[5:]
+
+        # the successors share pages with the state now. neither side may modify them in place anymore.
+        for st in [ state ] + succ.all_successors + succ.unsat_successors + succ.unconstrained_successors:
+            self._freeze_pages(st)
+        return succ
+
+    @staticmethod
+    def _freeze_pages(state):
+        for name in ('memory', 'registers'):
+            if state.has_plugin(name):
+                mem = getattr(state.plugins[name], 'mem', None)
+                if mem is not None and hasattr(mem, 'freeze_pages'):
+                    mem.freeze_pages()
+
+    def _dispatch(self, states, run_args, counter_start):
+        for batch_start in range(0, len(states), self.batch_size):
+            batch = [ (state, counter_start + (batch_start + i) * self.variable_stride)
+                      for i, state in enumerate(states[batch_start:batch_start + self.batch_size]) ]
+            future = self.executor.submit(_step_batch, self._dump_batch(batch, run_args))
+            for i, (state, counter_base) in enumerate(batch):
+                self._pending[id(state)] = (state, i, future, counter_base)
+
+    def _dump_batch(self, batch, run_args):
+        # a step only looks at the last two histories of a state. do not send the older ones.
+        cut = { }
+        for state, _ in batch:
+            h = state.history.parent
+            if h is not None and h.parent is not None and id(h) not in cut:
+                cut[id(h)] = (h, h.parent)
+                h.parent = None
+        try:
+            return _dumps((batch, run_args), self._shared)
+        finally:
+            for h, parent in cut.values():
+                h.parent = parent
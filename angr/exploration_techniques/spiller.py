@@ -1,6 +1,11 @@
 
 import logging
 import datetime
+import tempfile
+import shelve
+import concurrent.futures
+
+import psutil
 
 try:
     import sqlalchemy
@@ -125,7 +130,8 @@ class Spiller(ExplorationTechnique):
         src_stash="active", min=5, max=10, #pylint:disable=redefined-builtin
         staging_stash="spill_stage", staging_min=10, staging_max=20,
         pickle_callback=None, unpickle_callback=None, post_pickle_callback=None,
-        priority_key=None, vault=None, states_collection=None,
+        priority_key=None, vault=None, states_collection=None, state_serializer=None,
+        background_threads=0, prefetch=10, max_rss=None, rss_sample_interval=10,
     ):
         """
         Initializes the spiller.
@@ -136,6 +142,11 @@ class Spiller(ExplorationTechnique):
         @param staging_max: the number of states that can be in the staging stash before things get spilled to ANA (default: None. If staging_stash is set, then this means unlimited, and ANA will not be used).
         @param priority_key: a function that takes a state and returns its numberical priority (MAX_INT is lowest priority). By default, self.state_priority will be used, which prioritizes by object ID.
         @param vault: an angr.Vault object to handle storing and loading of states. If not provided, an angr.vaults.VaultShelf will be created with a temporary file.
+        @param state_serializer: an angr.state_serializer.StateSerializer for the vault to store states with. If neither a vault nor a serializer is provided, a serializer is created that keeps the objects shared between states in a temporary shelf.
+        @param background_threads: the number of threads that write states to and read states from the vault in the background, so that spilling overlaps with stepping (default: 0, spill synchronously). States are still serialized and deserialized on the stepping thread, since they share objects with the states that are being stepped.
+        @param prefetch: the number of states that are read from the vault in the background ahead of time, if background_threads is set (default: 10). Prefetched states are only loaded when they have the best priorities among the spilled states.
+        @param max_rss: the number of bytes of resident memory above which states are spilled down to min and staging_min, and no states are loaded, unless src_stash is empty (default: None, only count states).
+        @param rss_sample_interval: the number of steps after which resident memory is measured again (default: 10).
         """
         super(Spiller, self).__init__()
         self.max = max
@@ -155,11 +166,41 @@ class Spiller(ExplorationTechnique):
         self._pickled_states = PickledStatesList() if states_collection is None else states_collection
         self._ever_pickled = 0
         self._ever_unpickled = 0
-        self._vault = vaults.VaultShelf() if vault is None else vault
+        if vault is None:
+            vault = vaults.VaultShelf()
+            if state_serializer is None:
+                state_serializer = StateSerializer(store=shelve.open(tempfile.mktemp(), protocol=-1))
+        if state_serializer is not None:
+            vault.state_serializer = state_serializer
+        self._vault = vault
+
+        # background spilling
+        self.prefetch = prefetch
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=background_threads) if background_threads \
+            else None
+        # state ID -> future of writing the state to the vault
+        self._writes = { }
+        # (priority, state ID, future of reading the state) of prefetched states, sorted by priority
+        self._prefetched = [ ]
+
+        # spilling by resident memory
+        self.max_rss = max_rss
+        self.rss_sample_interval = rss_sample_interval
+        self._process = None
+        self._rss = None
+        self._steps = 0
 
     def _unpickle(self, n):
         self._pickled_states.sort()
-        unpickled = [ (sid, self._load_state(sid)) for _,sid in self._pickled_states.pop_n(n) ]
+        candidates = [ (prio, sid, None) for prio, sid in self._pickled_states.pop_n(n) ]
+        if self._prefetched:
+            # prefetched states are taken in the order of priorities, together with the other spilled states. the
+            # spilled states that are not taken now are prefetched instead
+            candidates = sorted(self._prefetched + candidates, key=lambda c: c[0])
+            self._prefetched = [ (prio, sid, read if read is not None else self._executor.submit(self._read_state, sid))
+                                 for prio, sid, read in candidates[n:] ]
+            candidates = candidates[:n]
+        unpickled = [ (sid, self._load_state(sid, read)) for _, sid, read in candidates ]
         self._ever_unpickled += len(unpickled)
         if self.unpickle_callback:
             for sid,u in unpickled:
@@ -181,10 +222,52 @@ class Spiller(ExplorationTechnique):
             self._pickled_states.add(prio, state_oid)
 
     def _store_state(self, state):
-        return self._vault.store(state)
+        if self._executor is None:
+            return self._vault.store(state)
+
+        sid, data = self._vault.serialize(state)
+        self._writes[sid] = self._executor.submit(self._vault.write, sid, data)
+        return sid
+
+    def _load_state(self, sid, read=None):
+        if self._executor is None:
+            return self._vault.load(sid)
+
+        data = self._read_state(sid) if read is None else read.result()
+        return self._vault.deserialize(sid, data)
+
+    def _read_state(self, sid):
+        write = self._writes.pop(sid, None)
+        if write is not None:
+            write.result()
+        return self._vault.read(sid)
+
+    def _prefetch_states(self):
+        if self._executor is None or len(self._prefetched) >= self.prefetch:
+            return
+        self._pickled_states.sort()
+        for prio, sid in self._pickled_states.pop_n(self.prefetch - len(self._prefetched)):
+            self._prefetched.append((prio, sid, self._executor.submit(self._read_state, sid)))
+        self._prefetched.sort(key=lambda c: c[0])
 
-    def _load_state(self, sid):
-        return self._vault.load(sid)
+    def flush(self):
+        """
+        Wait until all states that are being written in the background are in the vault.
+        """
+        for write in list(self._writes.values()):
+            write.result()
+
+    def _memory_pressure(self):
+        """
+        Check whether the resident memory exceeds max_rss, which is measured every rss_sample_interval steps.
+        """
+        if self.max_rss is None:
+            return False
+        if self._rss is None or self._steps % self.rss_sample_interval == 0:
+            if self._process is None:
+                self._process = psutil.Process()
+            self._rss = self._process.memory_info().rss
+        return self._rss > self.max_rss
 
     def step(self, simgr, stash='active', **kwargs):
         simgr = simgr.step(stash=stash, **kwargs)
@@ -194,6 +277,14 @@ class Spiller(ExplorationTechnique):
         states = simgr.stashes[self.src_stash]
         staged_states = simgr.stashes.setdefault(self.staging_stash, [ ]) if self.staging_stash else [ ]
 
+        # under memory pressure, states are spilled down to the minimums, and only loaded if there is nothing to step
+        pressure = self._memory_pressure()
+        self._steps += 1
+        max_states = self.min if pressure else self.max
+        staging_max = self.staging_min if pressure else self.staging_max
+        if pressure:
+            l.debug("Resident memory (%d bytes) exceeds %d bytes.", self._rss, self.max_rss)
+
         if len(states) < self.min:
             missing = (self.max + self.min) // 2 - len(states)
             l.debug("Too few states (%d/%d) in stash %s.", len(states), self.min, self.src_stash)
@@ -202,25 +293,28 @@ class Spiller(ExplorationTechnique):
                 staged_states.sort(key=self.priority_key or self.state_priority)
                 states += staged_states[:missing]
                 staged_states[:missing] = [ ]
-            else:
+            elif not pressure or not states:
                 l.debug("... staging stash disabled; unpickling states")
                 states += self._unpickle(missing)
 
-        if len(states) > self.max:
-            l.debug("Too many states (%d/%d) in stash %s", len(states), self.max, self.src_stash)
+        if len(states) > max_states:
+            l.debug("Too many states (%d/%d) in stash %s", len(states), max_states, self.src_stash)
             states.sort(key=self.priority_key or self.state_priority)
-            staged_states += states[self.max:]
-            states[self.max:] = [ ]
+            staged_states += states[max_states:]
+            states[max_states:] = [ ]
 
         # if we have too few staged states, unpickle up to halfway between max and min
-        if len(staged_states) < self.staging_min:
+        if len(staged_states) < self.staging_min and (not pressure or not states):
             l.debug("Too few states in staging stash (%s)", self.staging_stash)
             staged_states += self._unpickle((self.staging_min + self.staging_max) // 2 - len(staged_states))
 
-        if len(staged_states) > self.staging_max:
+        if len(staged_states) > staging_max:
             l.debug("Too many states in staging stash (%s)", self.staging_stash)
-            self._pickle(staged_states[self.staging_max:])
-            staged_states[self.staging_max:] = [ ]
+            self._pickle(staged_states[staging_max:])
+            staged_states[staging_max:] = [ ]
+
+        if not pressure:
+            self._prefetch_states()
 
         simgr.stashes[self.src_stash] = states
         simgr.stashes[self.staging_stash] = staged_states
@@ -231,3 +325,4 @@ class Spiller(ExplorationTechnique):
         return id(state)
 
 from .. import vaults
+from ..state_serializer import StateSerializer
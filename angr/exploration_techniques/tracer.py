@@ -1,9 +1,12 @@
 from typing import List
+import array
 import logging
 
 from . import ExplorationTechnique
 from .. import BP_BEFORE, BP_AFTER, sim_options
 from ..errors import AngrTracerError
+from ..misc.trace_file import TraceFile
+from ..engines.unicorn import TraceCheck
 
 l = logging.getLogger(name=__name__)
 
@@ -112,7 +115,8 @@ class Tracer(ExplorationTechnique):
     If the given concrete input makes the program crash, you should provide crash_addr, and the
     crashing state will be found in the 'crashed' stash.
 
-    :param trace:               The basic block trace.
+    :param trace:               The basic block trace. It may be a list of addresses, a TraceFile, or the path of a
+                                trace file, which is opened as a TraceFile.
     :param resiliency:          Should we continue to step forward even if qemu and angr disagree?
     :param keep_predecessors:   Number of states before the final state we should log.
     :param crash_addr:          If the trace resulted in a crash, provide the crashing instruction
@@ -137,6 +141,8 @@ class Tracer(ExplorationTechnique):
             copy_states=False,
             mode=TracingMode.Strict):
         super(Tracer, self).__init__()
+        if isinstance(trace, str):
+            trace = TraceFile(trace)
         self._trace = trace
         self._resiliency = resiliency
         self._crash_addr = crash_addr
@@ -145,6 +151,8 @@ class Tracer(ExplorationTechnique):
 
         self._aslr_slides = {}
         self._current_slide = None
+        # the trace as an array, if it is a list, for checking it in unicorn
+        self._trace_array = None
 
         # keep track of the last basic block we hit
         self.predecessors = [None] * keep_predecessors # type: List[angr.SimState]
@@ -168,19 +176,7 @@ class Tracer(ExplorationTechnique):
             raise AngrTracerError("Tracer is being invoked on a SimulationManager without exactly one active state")
 
         # calc ASLR slide for main binary and find the entry point in one fell swoop
-        # ...via heuristics
-        for idx, addr in enumerate(self._trace):
-            if self.project.loader.main_object.pic:
-                if ((addr - self.project.entry) & 0xfff) == 0 and (idx == 0 or abs(self._trace[idx-1] - addr) > 0x100000):
-                    break
-            else:
-                if addr == self.project.entry:
-                    break
-        else:
-            raise AngrTracerError("Could not identify program entry point in trace!")
-
-        # pylint: disable=undefined-loop-variable
-        # pylint doesn't know jack shit
+        idx = self._find_entry()
         self._current_slide = self._aslr_slides[self.project.loader.main_object] = self._trace[idx] - self.project.entry
 
         # step to entry point
@@ -203,6 +199,25 @@ class Tracer(ExplorationTechnique):
             simgr.active[0] = simgr.active[0].copy()
             simgr.active[0].options.remove(sim_options.COPY_STATES)
 
+    def _find_entry(self):
+        """
+        Find the index of the program entry point in the trace.
+        """
+        entry = self.project.entry
+        if not self.project.loader.main_object.pic:
+            try:
+                return self._trace.index(entry)
+            except ValueError:
+                raise AngrTracerError("Could not identify program entry point in trace!") from None
+
+        # ...via heuristics
+        prev_addr = None
+        for idx, addr in enumerate(self._trace):
+            if ((addr - entry) & 0xfff) == 0 and (prev_addr is None or abs(prev_addr - addr) > 0x100000):
+                return idx
+            prev_addr = addr
+        raise AngrTracerError("Could not identify program entry point in trace!")
+
     def complete(self, simgr):
         return bool(simgr.traced)
 
@@ -249,7 +264,8 @@ class Tracer(ExplorationTechnique):
 
         # perform the step. ask qemu to stop at the termination point.
         stops = set(kwargs.pop('extra_stop_points', ())) | {self._trace[-1]}
-        succs_dict = simgr.step_state(state, extra_stop_points=stops, **kwargs)
+        trace_check = self._trace_check(state)
+        succs_dict = simgr.step_state(state, extra_stop_points=stops, trace_check=trace_check, **kwargs)
         sat_succs = succs_dict[None]  # satisfiable states
         succs = sat_succs + succs_dict['unsat']  # both satisfiable and unsatisfiable states
 
@@ -257,7 +273,7 @@ class Tracer(ExplorationTechnique):
             # permissive mode
             if len(sat_succs) == 1:
                 try:
-                    self._update_state_tracking(sat_succs[0])
+                    self._update_state_tracking(sat_succs[0], trace_check=trace_check)
                 except TracerDesyncError as ex:
                     if self._mode == TracingMode.Permissive:
                         succs_dict = self._force_resync(simgr, state, ex.deviating_trace_idx, ex.deviating_addr, kwargs)
@@ -272,7 +288,7 @@ class Tracer(ExplorationTechnique):
         else:
             # strict mode
             if len(succs) == 1:
-                self._update_state_tracking(succs[0])
+                self._update_state_tracking(succs[0], trace_check=trace_check)
             elif len(succs) == 0:
                 raise Exception("All states disappeared!")
             else:
@@ -283,6 +299,34 @@ class Tracer(ExplorationTechnique):
         assert len(succs_dict[None]) == 1
         return succs_dict
 
+    def _trace_check(self, state):
+        """
+        Get the segment of the trace that unicorn should check the blocks of the next step against, if the state is
+        executed in unicorn.
+
+        :param state:   The state that is about to be stepped.
+        :return:        A TraceCheck, or None if the trace cannot be checked natively.
+        """
+
+        if sim_options.UNICORN not in state.options or state.globals['sync_idx'] is not None:
+            return None
+        slide = self._aslr_slides.get(self.project.loader.find_object_containing(state.addr), None)
+        if slide is None:
+            return None
+
+        idx = state.globals['trace_idx']
+        if isinstance(self._trace, TraceFile):
+            start, entries = self._trace.segment(idx)
+        else:
+            if self._trace_array is None:
+                self._trace_array = array.array('Q', self._trace)
+            start, entries = 0, memoryview(self._trace_array)
+        # the last entry of the trace is not executed, see filter()
+        end = min(start + len(entries), len(self._trace) - 1)
+        if end <= idx:
+            return None
+        return TraceCheck(entries[idx - start:end - start], slide)
+
     def _force_resync(self, simgr, state, deviating_trace_idx, deviating_addr, kwargs):
         """
         When a deviation happens, force the tracer to take the branch specified in the trace by manually setting the
@@ -358,12 +402,16 @@ class Tracer(ExplorationTechnique):
         self._update_state_tracking(res[0])
         return res[0]
 
-    def _update_state_tracking(self, state: 'angr.SimState'):
+    def _update_state_tracking(self, state: 'angr.SimState', trace_check=None):
         idx = state.globals['trace_idx']
         sync = state.globals['sync_idx']
         timer = state.globals['sync_timer']
 
-        if state.history.recent_block_count > 1:
+        if trace_check is not None and trace_check.checked is not None:
+            # unicorn has checked the executed blocks against the trace already
+            idx += trace_check.checked - 1 # use normal code to do the last synchronization
+
+        elif state.history.recent_block_count > 1:
             # multiple blocks were executed this step. they should follow the trace *perfectly*
             # or else something is up
             # "something else" so far only includes concrete transmits, or...
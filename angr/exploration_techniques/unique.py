@@ -1,35 +1,225 @@
+import heapq
+import random
+import weakref
+import itertools
 from difflib import SequenceMatcher
 from collections import Counter
 
 from . import ExplorationTechnique
 
+
+# a Mersenne prime, which is the modulus of the MinHash permutations
+_PRIME = (1 << 61) - 1
+
+
+class _MinHash:
+    """
+    A family of hash functions of the form (a * x + b) mod p, that MinHash signatures are computed with.
+    """
+
+    def __init__(self, num_perm, seed=0):
+        rng = random.Random(seed)
+        self.params = [ (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm) ]
+        self.empty = (_PRIME, ) * num_perm
+
+    def update(self, signature, elements):
+        """
+        Add elements to a set, given the signature of the set.
+
+        :param tuple signature: The MinHash signature of the set.
+        :param elements:        The elements to add. They must be hashable.
+        :return:                The MinHash signature of the union of the set and the elements.
+        :rtype:                 tuple
+        """
+
+        if not elements:
+            return signature
+        signature = list(signature)
+        for element in elements:
+            x = hash(element) & _PRIME
+            for i, (a, b) in enumerate(self.params):
+                h = (a * x + b) % _PRIME
+                if h < signature[i]:
+                    signature[i] = h
+        return tuple(signature)
+
+
+class _Counts:
+    """
+    A persistent map from block addresses to their counts. Each map only holds the counts that it changes, and refers
+    to its parent for the others, so that the maps of sibling histories share those of their ancestors. Chains are
+    flattened every MAX_DEPTH maps, which keeps lookups cheap.
+    """
+
+    MAX_DEPTH = 32
+
+    __slots__ = ('parent', 'delta', 'depth', )
+
+    def __init__(self, parent=None, delta=None):
+        delta = { } if delta is None else delta
+        if parent is not None and parent.depth + 1 >= self.MAX_DEPTH:
+            flat = parent.to_dict()
+            flat.update(delta)
+            parent, delta = None, flat
+        self.parent = parent
+        self.delta = delta
+        self.depth = 0 if parent is None else parent.depth + 1
+
+    def __getitem__(self, addr):
+        node = self
+        while node is not None:
+            count = node.delta.get(addr, None)
+            if count is not None:
+                return count
+            node = node.parent
+        return 0
+
+    def to_dict(self):
+        """
+        :return:    All counts, as a dict.
+        :rtype:     dict
+        """
+        deltas = [ ]
+        node = self
+        while node is not None:
+            deltas.append(node.delta)
+            node = node.parent
+        out = { }
+        for delta in reversed(deltas):
+            out.update(delta)
+        return out
+
+
+class _Sketch:
+    """
+    The histogram of the block addresses in a history, together with the MinHash signature of its features.
+
+    The features of a histogram are (addr, k) for every address and every k with 2 ** k <= the count of the address.
+    Since block counts only ever grow along a history, so does the set of features, and the signature of a history can
+    be computed from the signature of its parent and the features that the history adds.
+    """
+
+    __slots__ = ('counts', 'signature', )
+
+    def __init__(self, counts, signature):
+        self.counts = counts
+        self.signature = signature
+
+    def child(self, addrs, minhash):
+        """
+        Compute the sketch of a history from the sketch of its parent.
+
+        :param addrs:           The block addresses that the history adds.
+        :param _MinHash minhash: The hash functions of the signature.
+        :return:                The sketch of the history.
+        :rtype:                 _Sketch
+        """
+
+        if not addrs:
+            return self
+        delta = { }
+        features = [ ]
+        for addr in addrs:
+            count = delta.get(addr, None)
+            count = (self.counts[addr] if count is None else count) + 1
+            delta[addr] = count
+            if count & (count - 1) == 0:
+                features.append((addr, count.bit_length() - 1))
+        return _Sketch(_Counts(self.counts, delta), minhash.update(self.signature, features))
+
+
 class UniqueSearch(ExplorationTechnique):
     """
     Unique Search.
 
     Will only keep one path active at a time, any others will be deferred.
     The state that is explored depends on how unique it is relative to the other deferred states.
-    A path's uniqueness is determined by its average similarity between the other (deferred) paths.
-    Similarity is calculated based on the supplied `similarity_func`, which by default is:
+
+    By default, the uniqueness of a state is estimated with locality-sensitive hashing. The histogram of the block
+    addresses in the history of each state is summarized in a MinHash signature, which is split into bands. Each band
+    is hashed into a bucket, and the score of a state is the number of times that its bands collide with those of all
+    states seen so far (deferred, stepped, or deadended). The expected number of collisions with a state grows with the
+    Jaccard similarity of the (logarithmically bucketed) block counts of both states. The state with the fewest
+    collisions is explored next, which costs O(log n) in the number of deferred states. Histograms and signatures are
+    updated incrementally from those of the parent history.
+
+    If a `similarity_func` is supplied, every new state is compared to every deferred state instead, and its uniqueness
+    is its average similarity to the other (deferred) paths. This is quadratic in the number of states. To get exact
+    results with the default similarity, pass `similarity_func=UniqueSearch.similarity`, which is:
     The (L2) distance between the counts of the state addresses in the history of the path.
     """
 
-    def __init__(self, similarity_func=None, deferred_stash='deferred'):
+    def __init__(self, similarity_func=None, deferred_stash='deferred', num_perm=64, bands=16, seed=0):
         """
-        :param similarity_func: How to calculate similarity between two states.
+        :param similarity_func: How to calculate similarity between two states. Locality-sensitive hashing is used if
+                                it is not supplied.
         :param deferred_stash:  Where to store the deferred states.
+        :param num_perm:        The number of hash functions in a MinHash signature.
+        :param bands:           The number of bands that MinHash signatures are split into. It must divide num_perm.
+                                With fewer rows per band, less similar states collide.
+        :param seed:            The seed of the hash functions.
         """
         super(UniqueSearch, self).__init__()
+        if num_perm % bands:
+            raise AngrExplorationTechniqueError("The number of bands must divide the number of hash functions.")
+
+        self.exact = similarity_func is not None
         self.similarity_func = similarity_func or UniqueSearch.similarity
         self.deferred_stash = deferred_stash
         self.uniqueness = dict()
         self.num_deadended = 0
 
+        self.bands = bands
+        self._rows = num_perm // bands
+        self._minhash = _MinHash(num_perm, seed=seed)
+        # sketches of the histories of deferred states, and of states that are being stepped
+        self._sketches = weakref.WeakKeyDictionary()
+        # the number of states seen so far, by the hashes of their bands
+        self._buckets = Counter()
+        # a heap of (score, index, weak reference to the state, band hashes) for deferred states. scores only grow as
+        # states are added, so an outdated score is a lower bound of the current one. states that are dropped from the
+        # deferred stash are dropped from the heap when they reach the top.
+        self._queue = [ ]
+        self._index = itertools.count()
+        # the positions of deferred states in the deferred stash, by their IDs
+        self._positions = { }
+
     def setup(self, simgr):
         if self.deferred_stash not in simgr.stashes:
             simgr.stashes[self.deferred_stash] = []
 
     def step(self, simgr, stash='active', **kwargs):
+        if self.exact:
+            return self._step_exact(simgr, stash=stash, **kwargs)
+
+        stepped = [ state.history for state in simgr.stashes[stash] ]
+        simgr = simgr.step(stash=stash, **kwargs)
+
+        for state in simgr.stashes[stash]:
+            self._add(state, defer=True)
+        deferred = simgr.stashes[self.deferred_stash]
+        first = len(deferred)
+        simgr.move(from_stash=stash, to_stash=self.deferred_stash)
+        for pos in range(first, len(deferred)):
+            self._positions[id(deferred[pos])] = pos
+        for state in simgr.deadended[self.num_deadended:]:
+            self._add(state, defer=False)
+            self._sketches.pop(state.history, None)
+        self.num_deadended = len(simgr.deadended)
+
+        # the successors of stepped states have their own sketches now
+        for history in stepped:
+            self._sketches.pop(history, None)
+
+        unique_state = self._pop(deferred)
+        if unique_state is not None:
+            simgr.stashes[stash].append(unique_state)
+        if not deferred:
+            self._positions.clear()
+
+        return simgr
+
+    def _step_exact(self, simgr, stash='active', **kwargs):
         simgr = simgr.step(stash=stash, **kwargs)
 
         old_states = simgr.stashes[self.deferred_stash][:]
@@ -74,6 +264,92 @@ class UniqueSearch(ExplorationTechnique):
 
         return simgr
 
+    #
+    # Locality-sensitive hashing
+    #
+
+    def _sketch(self, history):
+        """
+        Get the sketch of a history, computing it from the closest ancestor that has one.
+        """
+        sketch = self._sketches.get(history, None)
+        if sketch is not None:
+            return sketch
+
+        path = [ ]
+        node = history
+        while node is not None and node not in self._sketches:
+            path.append(node)
+            node = node.parent
+        sketch = self._sketches[node] if node is not None else _Sketch(_Counts(), self._minhash.empty)
+        for node in reversed(path):
+            sketch = sketch.child(node.recent_bbl_addrs, self._minhash)
+
+        self._sketches[history] = sketch
+        return sketch
+
+    def _band_hashes(self, signature):
+        rows = self._rows
+        return tuple(hash((i, ) + signature[i * rows:(i + 1) * rows]) for i in range(self.bands))
+
+    def _score(self, keys):
+        # collisions with all other states
+        return sum(self._buckets[key] for key in keys) - len(keys)
+
+    def _add(self, state, defer=True):
+        """
+        Add a state to the buckets.
+
+        :param SimState state:  The state.
+        :param bool defer:      Whether the state is deferred, and may be explored later.
+        """
+        keys = self._band_hashes(self._sketch(state.history).signature)
+        self._buckets.update(keys)
+        if defer:
+            heapq.heappush(self._queue, (self._score(keys), next(self._index), weakref.ref(state), keys))
+
+    def _pop(self, deferred):
+        """
+        Take the deferred state with the fewest collisions off the queue, and out of the deferred stash.
+
+        :param list deferred:   The deferred stash. States that are not in it anymore are dropped from the queue.
+        :return:                The state, or None if there are no deferred states in the queue.
+        """
+        while self._queue:
+            score, index, ref, keys = self._queue[0]
+            state = ref()
+            if state is None:
+                heapq.heappop(self._queue)
+                continue
+            current = self._score(keys)
+            if current > score:
+                heapq.heapreplace(self._queue, (current, index, ref, keys))
+                continue
+            heapq.heappop(self._queue)
+            if self._take(deferred, state):
+                return state
+            self._sketches.pop(state.history, None)
+        return None
+
+    def _take(self, deferred, state):
+        """
+        Remove a state from the deferred stash, by moving the last deferred state into its place.
+
+        :return:    Whether the state was in the deferred stash.
+        :rtype:     bool
+        """
+        pos = self._positions.pop(id(state), None)
+        if pos is None or pos >= len(deferred) or deferred[pos] is not state:
+            # the stash was changed outside of this technique
+            pos = next((i for i, s in enumerate(deferred) if s is state), None)
+            if pos is None:
+                return False
+        last = deferred.pop()
+        if last is not state:
+            deferred[pos] = last
+            self._positions[id(last)] = pos
+        return True
+
     @staticmethod
     def similarity(state_a, state_b):
         """
@@ -97,3 +373,6 @@ class UniqueSearch(ExplorationTechnique):
         addrs_a = tuple(state_a.history.bbl_addrs)
         addrs_b = tuple(state_b.history.bbl_addrs)
         return SequenceMatcher(a=addrs_a, b=addrs_b).ratio()
+
+
+from ..errors import AngrExplorationTechniqueError
@@ -0,0 +1,376 @@
+import sys
+import json
+import array
+import struct
+from bisect import bisect_left
+from collections import defaultdict
+
+from ...errors import AngrCFGError
+from .cfg_node import CFGNode
+from .memory_data import MemoryData
+
+
+class CFGColumns:
+    """
+    A columnar representation of a CFGModel.
+
+    Nodes, edges, and memory data are stored as packed arrays, one array per attribute, after a small JSON header. The
+    arrays are aligned so that they can be used directly from a memory-mapped file without being copied or parsed.
+    CFGNode objects are only created when they are accessed.
+
+    Nodes are sorted by their addresses, and edges refer to nodes by their indices in the node arrays.
+    """
+
+    MAGIC = b'ANGRCFGC'
+    VERSION = 2
+
+    # used in place of None in unsigned columns
+    NONE = 0xffffffffffffffff
+
+    # node flags
+    NO_RET = 1
+    IS_SYSCALL = 2
+    THUMB = 4
+    HAS_RETURN = 8
+
+    # used in place of None in the statement index column. DEFAULT_STATEMENT is -2
+    STMT_IDX_NONE = -1
+
+    # kinds of values of other edge attributes
+    EXTRA_NONE = 0
+    EXTRA_FALSE = 1
+    EXTRA_TRUE = 2
+    EXTRA_INT = 3
+    EXTRA_NEG_INT = 4
+    EXTRA_STR = 5
+
+    # name: typecode
+    COLUMNS = {
+        'node_addr': 'Q',
+        'node_size': 'I',
+        'node_block_id': 'Q',
+        'node_func_addr': 'Q',
+        'node_flags': 'B',
+        'node_name': 'I',
+        'node_insn_start': 'I',
+        'insn_addr': 'Q',
+        'edge_src': 'I',
+        'edge_dst': 'I',
+        'edge_jumpkind': 'B',
+        'edge_ins_addr': 'Q',
+        'edge_stmt_idx': 'q',
+        'data_addr': 'Q',
+        'data_size': 'Q',
+        'data_max_size': 'Q',
+        'data_pointer_addr': 'Q',
+        'data_sort': 'B',
+        'extra_edge': 'I',
+        'extra_key': 'I',
+        'extra_kind': 'B',
+        'extra_value': 'Q',
+    }
+
+    def __init__(self, buf):
+        """
+        :param buf: A bytes-like object holding the columnar representation, e.g., an mmap object.
+        """
+
+        self._buf = buf
+        view = memoryview(buf)
+        if bytes(view[:len(self.MAGIC)]) != self.MAGIC:
+            raise AngrCFGError("The buffer does not hold a columnar CFG.")
+        version, header_size = struct.unpack_from('<II', view, len(self.MAGIC))
+        if version != self.VERSION:
+            raise AngrCFGError("Unsupported version %d of the columnar CFG format." % version)
+        offset = len(self.MAGIC) + 8
+        header = json.loads(bytes(view[offset:offset + header_size]).decode('utf-8'))
+        data_start = self._align(offset + header_size)
+
+        self.ident = header['ident']
+        self.strings = header['strings']
+        self.jumpkinds = header['jumpkinds']
+        self.sorts = header['sorts']
+        self._block_id_is_addr = header['block_id_is_addr']
+
+        swap = header['byteorder'] != sys.byteorder
+        self._columns = { }
+        for name, (col_offset, count) in header['columns'].items():
+            typecode = self.COLUMNS[name]
+            size = array.array(typecode).itemsize * count
+            col_offset += data_start
+            col = view[col_offset:col_offset + size].cast(typecode)
+            if swap and typecode != 'B':
+                col = array.array(typecode, col)
+                col.byteswap()
+            self._columns[name] = col
+
+        # materialized nodes, indexed by their indices
+        self._nodes = { }
+        # maps block IDs to node indices if block IDs are not the addresses of nodes
+        self._block_id_to_idx = None
+
+    def __getattr__(self, name):
+        try:
+            return self.__getattribute__('_columns')[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.node_addr)
+
+    def release(self):
+        """
+        Release all views on the underlying buffer, so that it can be closed.
+        """
+        for col in self._columns.values():
+            if isinstance(col, memoryview):
+                col.release()
+        self._columns = { }
+        self._buf = None
+
+    #
+    # Node access
+    #
+
+    def node(self, idx, model):
+        """
+        Get the CFGNode at a given index, creating it upon its first access.
+
+        :param int idx:         Index of the node.
+        :param CFGModel model:  The CFG model that the node belongs to.
+        :return:                The CFGNode.
+        :rtype:                 CFGNode
+        """
+
+        node = self._nodes.get(idx, None)
+        if node is not None:
+            return node
+
+        flags = self.node_flags[idx]
+        func_addr = self.node_func_addr[idx]
+        name_idx = self.node_name[idx]
+        node = CFGNode(self.node_addr[idx], self.node_size[idx], model,
+                       simprocedure_name=self.strings[name_idx - 1] if name_idx else None,
+                       no_ret=bool(flags & self.NO_RET),
+                       function_address=None if func_addr == self.NONE else func_addr,
+                       block_id=self.node_block_id[idx],
+                       instruction_addrs=self.insn_addr[self.node_insn_start[idx]:self.node_insn_start[idx + 1]],
+                       thumb=bool(flags & self.THUMB),
+                       is_syscall=bool(flags & self.IS_SYSCALL),
+                       )
+        node.has_return = bool(flags & self.HAS_RETURN)
+        self._nodes[idx] = node
+        return node
+
+    def nodes_at(self, addr):
+        """
+        Get the indices of all nodes at a given address.
+
+        :param int addr:    The address.
+        :return:            A range of node indices.
+        :rtype:             range
+        """
+
+        addrs = self.node_addr
+        start = bisect_left(addrs, addr)
+        end = start
+        while end < len(addrs) and addrs[end] == addr:
+            end += 1
+        return range(start, end)
+
+    def node_by_block_id(self, block_id):
+        """
+        Get the index of the node with a given block ID.
+
+        :param int block_id:    The block ID.
+        :return:                Index of the node, or None if there is no such node.
+        """
+
+        if not isinstance(block_id, int):
+            return None
+        if self._block_id_is_addr:
+            for idx in self.nodes_at(block_id):
+                return idx
+            return None
+        if self._block_id_to_idx is None:
+            self._block_id_to_idx = dict((node_block_id, idx) for idx, node_block_id in enumerate(self.node_block_id))
+        return self._block_id_to_idx.get(block_id, None)
+
+    def edges(self, nodes):
+        """
+        Iterate through all edges.
+
+        :param list nodes:  A list of all CFGNodes.
+        :return:            An iterator of (src, dst, data) tuples.
+        """
+
+        extra = defaultdict(dict)
+        for edge_idx, key, kind, value in zip(self.extra_edge, self.extra_key, self.extra_kind, self.extra_value):
+            extra[edge_idx][self.strings[key]] = self._extra_value(kind, value)
+        jumpkinds = self.jumpkinds
+        for i, (src, dst, jk, ins_addr, stmt_idx) in enumerate(zip(self.edge_src, self.edge_dst, self.edge_jumpkind,
+                                                                   self.edge_ins_addr, self.edge_stmt_idx)):
+            data = extra.pop(i, { })
+            data['jumpkind'] = jumpkinds[jk]
+            data['ins_addr'] = None if ins_addr == self.NONE else ins_addr
+            data['stmt_idx'] = None if stmt_idx == self.STMT_IDX_NONE else stmt_idx
+            yield nodes[src], nodes[dst], data
+
+    def memory_data(self):
+        """
+        Iterate through all MemoryData objects.
+
+        :return:    An iterator of MemoryData instances.
+        """
+
+        NONE = self.NONE
+        for addr, size, max_size, pointer_addr, sort in zip(self.data_addr, self.data_size, self.data_max_size,
+                                                           self.data_pointer_addr, self.data_sort):
+            yield MemoryData(addr, None if size == NONE else size, self.sorts[sort],
+                             pointer_addr=None if pointer_addr == NONE else pointer_addr,
+                             max_size=None if max_size == NONE else max_size)
+
+    #
+    # Serialization
+    #
+
+    @classmethod
+    def serialize(cls, model):
+        """
+        Serialize a CFGModel into the columnar representation.
+
+        :param CFGModel model:  The CFG model to serialize.
+        :return:                The serialized bytes.
+        :rtype:                 bytes
+        """
+
+        NONE = cls.NONE
+        nodes = sorted(model.graph.nodes(), key=lambda n: (n.addr, n.size))
+        if any(not isinstance(n.addr, int) or not isinstance(n.block_id, int) for n in nodes):
+            raise NotImplementedError("Only CFGs whose nodes have integer addresses and block IDs are supported.")
+        node_to_idx = dict((n, i) for i, n in enumerate(nodes))
+
+        strings = { }
+        jumpkinds = { }
+        sorts = { }
+        cols = dict((name, array.array(typecode)) for name, typecode in cls.COLUMNS.items())
+
+        for n in nodes:
+            cols['node_addr'].append(n.addr)
+            cols['node_size'].append(n.size)
+            cols['node_block_id'].append(n.block_id)
+            cols['node_func_addr'].append(NONE if n.function_address is None else n.function_address)
+            cols['node_flags'].append((cls.NO_RET if n.no_ret else 0) |
+                                      (cls.IS_SYSCALL if n.is_syscall else 0) |
+                                      (cls.THUMB if n.thumb else 0) |
+                                      (cls.HAS_RETURN if n.has_return else 0))
+            if n.simprocedure_name is None:
+                cols['node_name'].append(0)
+            else:
+                cols['node_name'].append(strings.setdefault(n.simprocedure_name, len(strings)) + 1)
+            cols['node_insn_start'].append(len(cols['insn_addr']))
+            cols['insn_addr'].extend(n.instruction_addrs)
+        cols['node_insn_start'].append(len(cols['insn_addr']))
+
+        for i, (src, dst, data) in enumerate(model.graph.edges(data=True)):
+            cols['edge_src'].append(node_to_idx[src])
+            cols['edge_dst'].append(node_to_idx[dst])
+            cols['edge_jumpkind'].append(jumpkinds.setdefault(data.get('jumpkind', None), len(jumpkinds)))
+            ins_addr = data.get('ins_addr', None)
+            cols['edge_ins_addr'].append(NONE if ins_addr is None else ins_addr)
+            stmt_idx = data.get('stmt_idx', None)
+            cols['edge_stmt_idx'].append(cls.STMT_IDX_NONE if stmt_idx is None else stmt_idx)
+            for k, v in data.items():
+                if k in ('jumpkind', 'ins_addr', 'stmt_idx'):
+                    continue
+                kind, value = cls._extra_kind(v, strings)
+                cols['extra_edge'].append(i)
+                cols['extra_key'].append(strings.setdefault(k, len(strings)))
+                cols['extra_kind'].append(kind)
+                cols['extra_value'].append(value)
+
+        for addr in sorted(model.memory_data):
+            md = model.memory_data[addr]
+            cols['data_addr'].append(md.addr)
+            cols['data_size'].append(NONE if md.size is None else md.size)
+            cols['data_max_size'].append(NONE if md.max_size is None else md.max_size)
+            cols['data_pointer_addr'].append(NONE if md.pointer_addr is None else md.pointer_addr)
+            cols['data_sort'].append(sorts.setdefault(md.sort, len(sorts)))
+
+        if len(jumpkinds) > 0xff or len(sorts) > 0xff:
+            raise AngrCFGError("Too many distinct jumpkinds or memory data sorts.")
+
+        header = {
+            'ident': model.ident,
+            'byteorder': sys.byteorder,
+            'strings': sorted(strings, key=strings.get),
+            'jumpkinds': sorted(jumpkinds, key=jumpkinds.get),
+            'sorts': sorted(sorts, key=sorts.get),
+            'block_id_is_addr': all(n.block_id == n.addr for n in nodes) and
+                                len(set(cols['node_addr'])) == len(nodes),
+            'columns': { },
+        }
+
+        # offsets of the columns are relative to the aligned end of the header
+        offset = 0
+        for name, col in cols.items():
+            header['columns'][name] = (offset, len(col))
+            offset = cls._align(offset + len(col) * col.itemsize)
+
+        header_bytes = json.dumps(header).encode('utf-8')
+        out = bytearray(cls.MAGIC)
+        out += struct.pack('<II', cls.VERSION, len(header_bytes))
+        out += header_bytes
+        data_start = cls._align(len(out))
+        for name, col in cols.items():
+            out += b'\x00' * (data_start + header['columns'][name][0] - len(out))
+            out += col.tobytes()
+        return bytes(out)
+
+    @classmethod
+    def _extra_kind(cls, value, strings):
+        """
+        Get the kind and the column value of an edge attribute.
+
+        :param value:           Value of the attribute.
+        :param dict strings:    The string table, which string values are added to.
+        :return:                A tuple of the kind and the column value.
+        :rtype:                 tuple
+        """
+
+        if value is None:
+            return cls.EXTRA_NONE, 0
+        if value is True:
+            return cls.EXTRA_TRUE, 0
+        if value is False:
+            return cls.EXTRA_FALSE, 0
+        if isinstance(value, int) and 0 <= value <= cls.NONE:
+            return cls.EXTRA_INT, value
+        if isinstance(value, int) and -cls.NONE <= value < 0:
+            return cls.EXTRA_NEG_INT, -value
+        if isinstance(value, str):
+            return cls.EXTRA_STR, strings.setdefault(value, len(strings))
+        raise NotImplementedError("Edge attributes of type %s are not supported." % type(value).__name__)
+
+    def _extra_value(self, kind, value):
+        """
+        Get the value of an edge attribute from its kind and its column value.
+        """
+
+        if kind == self.EXTRA_NONE:
+            return None
+        if kind == self.EXTRA_TRUE:
+            return True
+        if kind == self.EXTRA_FALSE:
+            return False
+        if kind == self.EXTRA_INT:
+            return value
+        if kind == self.EXTRA_NEG_INT:
+            return -value
+        if kind == self.EXTRA_STR:
+            return self.strings[value]
+        raise AngrCFGError("Unknown kind %d of an edge attribute." % kind)
+
+    @staticmethod
+    def _align(offset, alignment=8):
+        return (offset + alignment - 1) // alignment * alignment
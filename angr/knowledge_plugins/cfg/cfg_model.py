@@ -1,6 +1,8 @@
 # pylint:disable=no-member
+import mmap
 import pickle
 import logging
+from bisect import bisect_right, insort
 from collections import defaultdict
 
 import networkx
@@ -10,6 +12,7 @@ from ...serializable import Serializable
 from ...utils.enums_conv import cfg_jumpkind_to_pb, cfg_jumpkind_from_pb
 from ...errors import AngrCFGError
 from .cfg_node import CFGNode
+from .cfg_columns import CFGColumns
 from .memory_data import MemoryData
 from ...misc.ux import once
 
@@ -17,13 +20,311 @@ from ...misc.ux import once
 l = logging.getLogger(name=__name__)
 
 
+class CFGNodeRangeIndex:
+    """
+    An index of CFGNodes by their start addresses, which supports fast lookups of nodes containing an address or
+    overlapping an address range.
+
+    Start addresses are the leaves of a 16-ary tree. Each inner node of the tree keeps the running maximum of the end
+    addresses of all nodes starting in its children, from the first child to the last one. A lookup only descends into
+    the children that may contain matching nodes, and finds the first of them with a binary search over the running
+    maxima, so a few large nodes do not slow down lookups elsewhere. The end addresses are recomputed when nodes are
+    removed.
+    """
+
+    __slots__ = ('_starts', '_leaf_ends', '_inner', '_roots', )
+
+    _BITS = 4
+    _FANOUT = 1 << _BITS
+    # each tree covers 32 bits of addresses. higher addresses are split into multiple trees
+    _TOP = 32 // _BITS
+
+    def __init__(self, nodes=None):
+        self._starts = { }
+        # start address -> the largest end address of all nodes starting there
+        self._leaf_ends = { }
+        # (level, address >> (level * _BITS)) -> the running maximum of the end addresses of its children
+        self._inner = { }
+        # sorted prefixes of the trees
+        self._roots = [ ]
+
+        if nodes is not None:
+            self._build(nodes)
+
+    def __len__(self):
+        return sum(len(nodes) for nodes in self._starts.values())
+
+    def _build(self, nodes):
+        """
+        Index many nodes at once, computing the tree bottom-up.
+        """
+        for node in nodes:
+            nodes_ = self._starts.setdefault(node.addr, [ ])
+            if any(n is node for n in nodes_):
+                continue
+            nodes_.append(node)
+            end = self._end(node)
+            if self._leaf_ends.get(node.addr, 0) < end:
+                self._leaf_ends[node.addr] = end
+
+        mask = self._FANOUT - 1
+        subtree_ends = self._leaf_ends
+        for level in range(1, self._TOP + 1):
+            inner = { }
+            for prefix, end in subtree_ends.items():
+                key = (level, prefix >> self._BITS)
+                ends = inner.get(key, None)
+                if ends is None:
+                    ends = inner[key] = [ 0 ] * self._FANOUT
+                ends[prefix & mask] = end
+            subtree_ends = { }
+            for key, ends in inner.items():
+                running = 0
+                for i, end in enumerate(ends):
+                    if end > running:
+                        running = end
+                    ends[i] = running
+                subtree_ends[key[1]] = running
+            self._inner.update(inner)
+        self._roots = sorted(subtree_ends)
+
+    @staticmethod
+    def _end(node):
+        # nodes without a size still cover their own address
+        return node.addr + max(node.size or 0, 1)
+
+    def _subtree_end(self, level, prefix):
+        if level == 0:
+            return self._leaf_ends.get(prefix, 0)
+        ends = self._inner.get((level, prefix), None)
+        return 0 if ends is None else ends[-1]
+
+    def add(self, node):
+        addr = node.addr
+        try:
+            nodes = self._starts[addr]
+        except KeyError:
+            nodes = self._starts[addr] = [ ]
+        if any(n is node for n in nodes):
+            return
+        nodes.append(node)
+
+        end = self._end(node)
+        if self._leaf_ends.get(addr, 0) >= end:
+            return
+        self._leaf_ends[addr] = end
+
+        for level in range(1, self._TOP + 1):
+            key = (level, addr >> (level * self._BITS))
+            ends = self._inner.get(key, None)
+            if ends is None:
+                ends = self._inner[key] = [ 0 ] * self._FANOUT
+                if level == self._TOP:
+                    insort(self._roots, key[1])
+            i = (addr >> ((level - 1) * self._BITS)) & (self._FANOUT - 1)
+            while i < self._FANOUT and ends[i] < end:
+                ends[i] = end
+                i += 1
+            if i < self._FANOUT:
+                # the largest end address of this subtree did not change
+                break
+
+    def clear(self):
+        self._starts.clear()
+        self._leaf_ends.clear()
+        self._inner.clear()
+        self._roots = [ ]
+
+    def discard(self, node):
+        addr = node.addr
+        nodes = self._starts.get(addr, None)
+        if nodes is None:
+            return
+        remaining = [ n for n in nodes if n is not node ]
+        if len(remaining) == len(nodes):
+            return
+
+        end = self._end(node)
+        if remaining:
+            self._starts[addr] = remaining
+            new = max(self._end(n) for n in remaining)
+            old = self._leaf_ends[addr]
+            self._leaf_ends[addr] = new
+        else:
+            del self._starts[addr]
+            new = 0
+            old = self._leaf_ends.pop(addr)
+        if new == old:
+            return
+
+        for level in range(1, self._TOP + 1):
+            key = (level, addr >> (level * self._BITS))
+            ends = self._inner[key]
+            old = ends[-1]
+            lower = level - 1
+            base = key[1] << self._BITS
+            i = (addr >> (lower * self._BITS)) & (self._FANOUT - 1)
+            running = ends[i - 1] if i > 0 else 0
+            for j in range(i, self._FANOUT):
+                child_end = new if j == i else self._subtree_end(lower, base | j)
+                if child_end > running:
+                    running = child_end
+                ends[j] = running
+            if running == old:
+                break
+            new = running
+            if running == 0:
+                # the subtree is empty now
+                del self._inner[key]
+                if level == self._TOP:
+                    self._roots.remove(key[1])
+
+    def _starts_ending_after(self, last, threshold):
+        """
+        Get all start addresses up to `last` (inclusive) of which at least one node ends after `threshold`, in
+        ascending order.
+        """
+        starts = [ ]
+        if last < 0:
+            return starts
+        # all nodes end after 0, and children without nodes have an end address of 0
+        threshold = max(threshold, 0)
+        inner = self._inner
+        leaf_ends = self._leaf_ends
+        bits = self._BITS
+        last_child = self._FANOUT - 1
+
+        top = self._TOP
+        # subtrees that are known to end after threshold, in reversed order
+        stack = [ (top, root) for root in reversed(self._roots)
+                  if root << (top * bits) <= last and inner[(top, root)][-1] > threshold ]
+        while stack:
+            level, prefix = stack.pop()
+            ends = inner[(level, prefix)]
+            level -= 1
+            base = prefix << bits
+            hi = min((last >> (level * bits)) - base, last_child)
+            # the first child that ends after threshold
+            i = bisect_right(ends, threshold, 0, hi + 1)
+            if level == 0:
+                for j in range(i, hi + 1):
+                    if j == i or leaf_ends.get(base | j, 0) > threshold:
+                        starts.append(base | j)
+            else:
+                for j in range(hi, i - 1, -1):
+                    if j == i or inner.get((level, base | j), (0, ))[-1] > threshold:
+                        stack.append((level, base | j))
+        return starts
+
+    def at(self, addr):
+        """
+        Get all nodes starting at the given address.
+        """
+        return self._starts.get(addr, [ ])
+
+    def containing(self, addr):
+        """
+        Iterate over all nodes that start at or contain the given address, ordered by their start addresses.
+        """
+        for start in self._starts_ending_after(addr, addr):
+            for n in self._starts[start]:
+                if n.addr == addr or (n.size is not None and addr < n.addr + n.size):
+                    yield n
+
+    def overlapping(self, start, end):
+        """
+        Iterate over all nodes that overlap with [start, end), ordered by their start addresses. Nodes with a size of
+        zero are returned if their addresses are inside the range.
+        """
+        if end <= start:
+            return
+        for node_start in self._starts_ending_after(end - 1, start):
+            for n in self._starts[node_start]:
+                if n.addr >= start or (n.size is not None and start < n.addr + n.size):
+                    yield n
+
+
+class CFGGraph(networkx.DiGraph):
+    """
+    The graph of a CFGModel. Once the model has generated its address lookup index, every node that is added to or
+    removed from the graph is added to or removed from the index as well, no matter which code path mutates the graph.
+    """
+
+    def __init__(self, incoming_graph_data=None, **attr):
+        self.node_index = None
+        super().__init__(incoming_graph_data, **attr)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['node_index'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def add_node(self, node_for_adding, **attr):
+        super().add_node(node_for_adding, **attr)
+        if self.node_index is not None:
+            self.node_index.add(node_for_adding)
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        if self.node_index is None:
+            super().add_nodes_from(nodes_for_adding, **attr)
+            return
+        nodes_for_adding = list(nodes_for_adding)
+        super().add_nodes_from(nodes_for_adding, **attr)
+        for n in nodes_for_adding:
+            try:
+                hash(n)
+            except TypeError:
+                # a (node, attribute dict) tuple
+                n = n[0]
+            self.node_index.add(n)
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        super().add_edge(u_of_edge, v_of_edge, **attr)
+        if self.node_index is not None:
+            self.node_index.add(u_of_edge)
+            self.node_index.add(v_of_edge)
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        if self.node_index is None:
+            super().add_edges_from(ebunch_to_add, **attr)
+            return
+        ebunch_to_add = list(ebunch_to_add)
+        super().add_edges_from(ebunch_to_add, **attr)
+        for e in ebunch_to_add:
+            self.node_index.add(e[0])
+            self.node_index.add(e[1])
+
+    def remove_node(self, n):
+        super().remove_node(n)
+        if self.node_index is not None:
+            self.node_index.discard(n)
+
+    def remove_nodes_from(self, nodes):
+        if self.node_index is None:
+            super().remove_nodes_from(nodes)
+            return
+        nodes = list(nodes)
+        super().remove_nodes_from(nodes)
+        for n in nodes:
+            if n not in self._node:
+                self.node_index.discard(n)
+
+    def clear(self):
+        super().clear()
+        if self.node_index is not None:
+            self.node_index.clear()
+
+
 class CFGModel(Serializable):
     """
     This class describes a Control Flow Graph for a specific range of code.
     """
 
-    __slots__ = ('ident', 'graph', 'jump_tables', 'memory_data', 'insn_addr_to_memory_data', '_nodes_by_addr',
-                 '_nodes', '_cfg_manager', '_iropt_level', )
+    __slots__ = ('ident', '_graph', 'jump_tables', 'memory_data', 'insn_addr_to_memory_data', '_nodes_by_addr',
+                 '_nodes', '_cfg_manager', '_iropt_level', '_node_lookup_index', '_columns', )
 
     def __init__(self, ident, cfg_manager=None):
 
@@ -34,7 +335,7 @@ class CFGModel(Serializable):
         self._iropt_level = None
 
         # The graph
-        self.graph = networkx.DiGraph()
+        self._graph = CFGGraph()
 
         # Jump tables
         self.jump_tables = { }
@@ -49,6 +350,19 @@ class CFGModel(Serializable):
         self._nodes_by_addr = defaultdict(list)
         # CFGNodes dict indexed by block ID. Don't serialize
         self._nodes = { }
+        # An index of CFGNodes in the graph sorted by their addresses. It is created upon the first lookup with an
+        # arbitrary address and kept up-to-date by the graph afterwards. Don't serialize
+        self._node_lookup_index = None
+        # The columnar representation that this model is loaded from, until its nodes and edges are materialized. Don't
+        # serialize
+        self._columns = None
+
+    def __getattr__(self, name):
+        # the graph and the node dicts of a model loaded from a columnar representation are created upon first access
+        if name in ('_graph', '_nodes', '_nodes_by_addr') and self._columns is not None:
+            self._materialize()
+            return getattr(self, name)
+        raise AttributeError(name)
 
     #
     # Properties
@@ -60,15 +374,44 @@ class CFGModel(Serializable):
             return None
         return self._cfg_manager._kb._project
 
+    @property
+    def graph(self):
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        if not isinstance(graph, CFGGraph):
+            graph = CFGGraph(graph)
+        try:
+            old_graph = object.__getattribute__(self, '_graph')
+        except AttributeError:
+            old_graph = None
+        if old_graph is not None:
+            old_graph.node_index = None
+        self._graph = graph
+        self._node_lookup_index = None
+
+    @property
+    def lazy(self):
+        """
+        Whether this model is loaded from a columnar representation and its graph has not been created yet.
+        """
+        return self._columns is not None
+
     #
     # Serialization
     #
 
     def __getstate__(self):
+        if self._columns is not None:
+            # the columnar buffer may be a view into a database file, so it is never pickled
+            self._materialize()
         state = dict(map(
             lambda x: (x, self.__getattribute__(x)),
             self.__slots__
         ))
+        state['_node_lookup_index'] = None
+        state['_columns'] = None
 
         return state
 
@@ -165,13 +508,100 @@ class CFGModel(Serializable):
 
         return model
 
+    def serialize_columnar(self):
+        """
+        Serialize this model into a columnar representation, which can be loaded lazily, and directly from a
+        memory-mapped file. See CFGColumns.
+
+        :return:    The serialized bytes.
+        :rtype:     bytes
+        """
+
+        if "Emulated" in self.ident:
+            raise NotImplementedError("Serializing a CFGEmulated instance is currently not supported.")
+        return CFGColumns.serialize(self)
+
+    @classmethod
+    def parse_columnar(cls, buf, cfg_manager=None, loader=None):
+        """
+        Load a model from its columnar representation. Only memory data is loaded immediately. A CFGNode is created
+        when it is looked up through get_node() or get_any_node(), and the graph is created when it is first accessed.
+
+        :param buf:         A bytes-like object, e.g., an mmap object. It must not be modified while the model is lazy.
+        :param cfg_manager: The CFGManager that the new model belongs to.
+        :param loader:      The loader to fill in the content of memory data with.
+        :return:            The CFG model.
+        :rtype:             CFGModel
+        """
+
+        columns = CFGColumns(buf)
+        if cfg_manager is None:
+            # create a new model unassociated from any project
+            model = cls(columns.ident)
+        else:
+            model = cfg_manager.new_model(columns.ident)
+
+        del model._graph
+        del model._nodes
+        del model._nodes_by_addr
+        model._columns = columns
+
+        # memory data
+        for md in columns.memory_data():
+            if loader is not None and md.content is None:
+                # fill in the content
+                md.fill_content(loader)
+            model.memory_data[md.addr] = md
+
+        return model
+
+    @classmethod
+    def load_columnar(cls, path, cfg_manager=None, loader=None):
+        """
+        Load a model from a file holding its columnar representation, by memory-mapping the file.
+
+        :param str path:    Path to the file.
+        :param cfg_manager: The CFGManager that the new model belongs to.
+        :param loader:      The loader to fill in the content of memory data with.
+        :return:            The CFG model.
+        :rtype:             CFGModel
+        """
+
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.parse_columnar(buf, cfg_manager=cfg_manager, loader=loader)
+
+    def _materialize(self):
+        """
+        Create all nodes and edges of a model that is loaded from a columnar representation.
+
+        :return:    None
+        """
+
+        columns = self._columns
+        self._columns = None
+
+        nodes = [ columns.node(i, self) for i in range(len(columns)) ]
+        graph = CFGGraph()
+        graph.add_nodes_from(nodes)
+        graph.add_edges_from(columns.edges(nodes))
+        self._graph = graph
+
+        self._nodes = { }
+        self._nodes_by_addr = defaultdict(list)
+        for node in nodes:
+            self._nodes[node.block_id] = node
+            self._nodes_by_addr[node.addr].append(node)
+
+        columns.release()
+
     #
     # Other methods
     #
 
     def copy(self):
         model = CFGModel(self.ident, cfg_manager=self._cfg_manager)
-        model.graph = networkx.DiGraph(self.graph)
+        model.graph = CFGGraph(self.graph)
         model.jump_tables = self.jump_tables.copy()
         model.memory_data = self.memory_data.copy()
         model.insn_addr_to_memory_data = self.insn_addr_to_memory_data.copy()
@@ -180,6 +610,70 @@ class CFGModel(Serializable):
 
         return model
 
+    #
+    # Node indices
+    #
+
+    def add_node(self, block_id, node):
+        """
+        Add a CFGNode to the node dicts. The graph is not modified.
+
+        :param block_id:        Block ID of the node.
+        :param CFGNode node:    The CFGNode to add.
+        :return:                None
+        """
+
+        self._nodes[block_id] = node
+        self._nodes_by_addr[node.addr].append(node)
+
+    def remove_node(self, block_id, node):
+        """
+        Remove a CFGNode from the node dicts. The graph is not modified.
+
+        :param block_id:        Block ID of the node.
+        :param CFGNode node:    The CFGNode to remove.
+        :return:                None
+        """
+
+        if block_id in self._nodes and self._nodes[block_id] is node:
+            del self._nodes[block_id]
+        if node.addr in self._nodes_by_addr:
+            nodes = [ n for n in self._nodes_by_addr[node.addr] if n is not node ]
+            if nodes:
+                self._nodes_by_addr[node.addr] = nodes
+            else:
+                del self._nodes_by_addr[node.addr]
+
+    def replace_node(self, block_id, old_node, new_node):
+        """
+        Replace a CFGNode in the node dicts with another one. The graph is not modified.
+
+        :param block_id:            Block ID of the nodes.
+        :param CFGNode old_node:    The CFGNode to remove.
+        :param CFGNode new_node:    The CFGNode to add.
+        :return:                    None
+        """
+
+        self.remove_node(block_id, old_node)
+        self.add_node(block_id, new_node)
+
+    def generate_index(self):
+        """
+        Generate the address lookup index of all nodes in the graph, which speeds up queries of nodes containing
+        arbitrary addresses. The graph keeps the index up-to-date afterwards.
+
+        :return:    None
+        """
+
+        index = CFGNodeRangeIndex(self.graph.nodes())
+        self.graph.node_index = index
+        self._node_lookup_index = index
+
+    def _lookup_index(self):
+        if self._node_lookup_index is None:
+            self.generate_index()
+        return self._node_lookup_index
+
     #
     # CFG View
     #
@@ -192,6 +686,9 @@ class CFGModel(Serializable):
         :return:                 The CFGNode
         :rtype:                  CFGNode
         """
+        if self._columns is not None:
+            idx = self._columns.node_by_block_id(block_id)
+            return None if idx is None else self._columns.node(idx, self)
         if block_id in self._nodes:
             return self._nodes[block_id]
         return None
@@ -207,16 +704,18 @@ class CFGModel(Serializable):
                                 None means get either, True means get a syscall node, False means get something that isn't
                                 a syscall node.
         :param bool anyaddr:    If anyaddr is True, then addr doesn't have to be the beginning address of a basic
-                                block. By default the entire graph.nodes() will be iterated, and the first node
-                                containing the specific address is returned, which is slow. If you need to do many such
-                                queries, you may first call `generate_index()` to create some indices that may speed up the
-                                query.
+                                block. The first node (ordered by addresses) containing the specific address is
+                                returned. An address index is generated upon the first such query, and it is kept
+                                up-to-date when nodes are added to or removed from the graph.
         :param bool force_fastpath: If force_fastpath is True, it will only perform a dict lookup in the _nodes_by_addr
                                     dict.
         :return: A CFGNode if there is any that satisfies given conditions, or None otherwise
         """
 
         # fastpath: directly look in the nodes list
+        if not anyaddr and self._columns is not None:
+            indices = self._columns.nodes_at(addr)
+            return self._columns.node(indices[0], self) if indices else None
         if not anyaddr:
             try:
                 return self._nodes_by_addr[addr][0]
@@ -226,33 +725,19 @@ class CFGModel(Serializable):
         if force_fastpath:
             return None
 
-        # slower path
-        #if self._node_lookup_index is not None:
-        #    pass
-
-        # the slowest path
-        # try to show a warning first
-        # TODO: re-enable it once the segment tree is implemented
-        #if self._node_lookup_index_warned == False:
-        #    l.warning('Calling get_any_node() with anyaddr=True is slow on large programs. '
-        #              'For better performance, you may first call generate_index() to generate some indices that may '
-        #              'speed the node lookup.')
-        #    self._node_lookup_index_warned = True
+        # use the address index
+        if anyaddr:
+            candidates = self._lookup_index().containing(addr)
+        else:
+            candidates = self._lookup_index().at(addr)
 
-        for n in self.graph.nodes():
-            if self.ident == "CFGEmulated":
-                cond = n.looping_times == 0
-            else:
-                cond = True
-            if anyaddr and n.size is not None:
-                cond = cond and (addr == n.addr or n.addr <= addr < n.addr + n.size)
-            else:
-                cond = cond and (addr == n.addr)
-            if cond:
-                if is_syscall is None:
-                    return n
-                if n.is_syscall == is_syscall:
-                    return n
+        for n in candidates:
+            if self.ident == "CFGEmulated" and n.looping_times != 0:
+                continue
+            if is_syscall is None:
+                return n
+            if n.is_syscall == is_syscall:
+                return n
 
         return None
 
@@ -266,20 +751,33 @@ class CFGModel(Serializable):
         """
         results = [ ]
 
-        for cfg_node in self.graph.nodes():
-            if cfg_node.addr == addr or (anyaddr and
-                                         cfg_node.size is not None and
-                                         cfg_node.addr <= addr < (cfg_node.addr + cfg_node.size)
-                                         ):
-                if is_syscall and cfg_node.is_syscall:
-                    results.append(cfg_node)
-                elif is_syscall is False and not cfg_node.is_syscall:
-                    results.append(cfg_node)
-                else:
-                    results.append(cfg_node)
+        if anyaddr:
+            candidates = self._lookup_index().containing(addr)
+        else:
+            candidates = self._lookup_index().at(addr)
+
+        for cfg_node in candidates:
+            if is_syscall and cfg_node.is_syscall:
+                results.append(cfg_node)
+            elif is_syscall is False and not cfg_node.is_syscall:
+                results.append(cfg_node)
+            else:
+                results.append(cfg_node)
 
         return results
 
+    def nodes_in_range(self, start, end):
+        """
+        Get all CFGNodes that overlap with the address range [start, end).
+
+        :param int start:   Start address of the range.
+        :param int end:     End address of the range (exclusive).
+        :return:            A list of CFGNodes sorted by their addresses.
+        :rtype:             list
+        """
+
+        return list(self._lookup_index().overlapping(start, end))
+
     def nodes(self):
         """
         An iterator of all nodes in the graph.
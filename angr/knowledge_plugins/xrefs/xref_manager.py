@@ -49,6 +49,20 @@ class XRefManager(KnowledgeBasePlugin, Serializable):
         for xref in xrefs:
             self.add_xref(xref)
 
+    def remove_xrefs_by_ins_addr(self, ins_addr):
+        """
+        Remove all XRef objects that originate at a given instruction address.
+        """
+        xrefs = self.xrefs_by_ins_addr.pop(ins_addr, None)
+        if not xrefs:
+            return
+        for xref in xrefs:
+            d = self.xrefs_by_dst.get(xref.dst, None)
+            if d is not None:
+                d.discard(xref)
+                if not d:
+                    del self.xrefs_by_dst[xref.dst]
+
     def get_xrefs_by_ins_addr(self, ins_addr):
         return self.xrefs_by_ins_addr.get(ins_addr, set())
 
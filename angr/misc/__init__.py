@@ -5,3 +5,4 @@ from .loggers import Loggers
 from .range import IRange
 from .plugins import PluginHub, PluginPreset
 from .hookset import HookSet
+from .trace_file import TraceFile
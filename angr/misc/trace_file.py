@@ -0,0 +1,277 @@
+import os
+import sys
+import mmap
+import array
+import struct
+import zlib
+import itertools
+from collections import OrderedDict
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+from ..errors import AngrTracerError
+
+
+class TraceFile:
+    """
+    A basic block trace that is read from a file on demand, so that traces with billions of entries can be followed
+    without loading them into memory. It behaves like a read-only list of addresses: it supports len(), indexing,
+    iteration, and index(), which searches the file without converting its entries to Python ints.
+
+    Two formats are supported:
+
+    - Raw traces, which are just packed little-endian uint64 addresses. The file is memory-mapped and its entries are
+      read through a memoryview of the mapping.
+    - Chunked traces, as written by TraceFile.write(). Entries are stored in chunks of a fixed number of entries,
+      which may be compressed with zlib or lz4. Chunks are decompressed when they are accessed, and the most recently
+      used ones are kept in memory.
+
+    :ivar str path:     The path of the trace file.
+    """
+
+    MAGIC = b'ANGRTRCE'
+    VERSION = 1
+
+    CODEC_NONE = 0
+    CODEC_ZLIB = 1
+    CODEC_LZ4 = 2
+
+    # version, codec, entries per chunk, number of entries, offset of the chunk index
+    _HEADER = struct.Struct('<HHIQQ')
+    _ENTRY = struct.Struct('<Q')
+
+    def __init__(self, path, cached_chunks=4):
+        """
+        :param str path:            The path of the trace file.
+        :param int cached_chunks:   The number of decompressed chunks to keep in memory.
+        """
+
+        self.path = path
+        self.cached_chunks = cached_chunks
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # empty files cannot be mapped. the mapping is copy-on-write rather than read-only, so that native code can get
+        # pointers to it through ctypes.
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_COPY) if size else b''
+        self._chunks = OrderedDict()
+
+        if self._mmap[:len(self.MAGIC)] == self.MAGIC:
+            version, self.codec, self.chunk_size, self._len, index_offset = \
+                self._HEADER.unpack_from(self._mmap, len(self.MAGIC))
+            if version != self.VERSION:
+                raise AngrTracerError("Unsupported version %d of the trace file format." % version)
+            if self.codec == self.CODEC_LZ4 and lz4 is None:
+                raise ImportError("Cannot import lz4. Please install lz4 to read traces that are compressed with lz4.")
+            num_chunks = -(-self._len // self.chunk_size)
+            self._offsets = self._entries(self._mmap, index_offset, index_offset + (num_chunks + 1) * 8)
+        else:
+            if size % 8:
+                raise AngrTracerError("The size of the raw trace %s is not a multiple of 8." % self.path)
+            # the whole file is a single uncompressed chunk
+            self.codec = self.CODEC_NONE
+            self.chunk_size = self._len = size // 8
+            self._offsets = (0, size)
+
+    def close(self):
+        self._chunks.clear()
+        self._offsets = ()
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getstate__(self):
+        return self.path, self.cached_chunks
+
+    def __setstate__(self, s):
+        self.path, self.cached_chunks = s
+        self._open()
+
+    def __repr__(self):
+        return "<TraceFile %s with %d entries>" % (self.path, self._len)
+
+    #
+    # Sequence interface
+    #
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [ self[i] for i in range(*k.indices(self._len)) ]
+        if k < 0:
+            k += self._len
+        if not 0 <= k < self._len:
+            raise IndexError("Trace index out of range")
+        n, i = divmod(k, self.chunk_size)
+        return self._chunk(n)[2][i]
+
+    def __iter__(self):
+        for n in range(len(self._offsets) - 1):
+            yield from self._chunk(n)[2]
+
+    def index(self, value, start=0, end=None):
+        """
+        Find the first occurrence of an address in the trace, like list.index().
+
+        :param int value:   The address.
+        :param int start:   The index to start searching at.
+        :param int end:     The index to stop searching at.
+        :return:            The index of the address.
+        :rtype:             int
+        :raises ValueError: If the address is not in the trace.
+        """
+
+        start, end, _ = slice(start, end).indices(self._len)
+        needle = self._ENTRY.pack(value)
+        n = start // self.chunk_size
+        while start < end:
+            buf, base, _ = self._chunk(n)
+            chunk_start = n * self.chunk_size
+            chunk_end = min(end, chunk_start + self.chunk_size)
+            lo = base + (start - chunk_start) * 8
+            hi = base + (chunk_end - chunk_start) * 8
+            while True:
+                pos = buf.find(needle, lo, hi)
+                if pos == -1:
+                    break
+                if (pos - base) % 8 == 0:
+                    return chunk_start + (pos - base) // 8
+                lo = pos + 1
+            start = chunk_end
+            n += 1
+        raise ValueError("%#x is not in the trace" % value)
+
+    def segment(self, k):
+        """
+        Get the entries of the chunk that holds an entry, e.g., to pass them to native code. The entries are not
+        copied, unless the chunk is compressed.
+
+        :param int k:   The index of the entry.
+        :return:        A tuple of the index of the first entry of the chunk, and a writable buffer of the entries of
+                        the chunk in native byte order. Writes to the buffer are not written back to the file.
+        """
+
+        if k < 0:
+            k += self._len
+        if not 0 <= k < self._len:
+            raise IndexError("Trace index out of range")
+        n = k // self.chunk_size
+        buf, base, entries = self._chunk(n)
+        if isinstance(buf, bytes):
+            # decompressed chunks are immutable
+            buf = bytearray(buf)
+            entries = self._entries(buf, 0, len(buf))
+            self._chunks[n] = buf, base, entries
+        return n * self.chunk_size, entries
+
+    #
+    # Chunks
+    #
+
+    @staticmethod
+    def _entries(buf, start, end):
+        if sys.byteorder == 'little':
+            return memoryview(buf)[start:end].cast('Q')
+        entries = array.array('Q', buf[start:end])
+        entries.byteswap()
+        return entries
+
+    def _chunk(self, n):
+        """
+        Get a chunk of the trace.
+
+        :param int n:   The index of the chunk.
+        :return:        A tuple of a buffer that holds the entries of the chunk, the offset of the entries in the
+                        buffer, and the entries.
+        """
+
+        chunk = self._chunks.get(n, None)
+        if chunk is not None:
+            self._chunks.move_to_end(n)
+            return chunk
+
+        start, end = self._offsets[n], self._offsets[n + 1]
+        if self.codec == self.CODEC_NONE:
+            chunk = self._mmap, start, self._entries(self._mmap, start, end)
+        else:
+            data = memoryview(self._mmap)[start:end]
+            if self.codec == self.CODEC_LZ4:
+                data = lz4.frame.decompress(data)
+            elif self.codec == self.CODEC_ZLIB:
+                data = zlib.decompress(data)
+            else:
+                raise AngrTracerError("Unknown codec %d in trace %s." % (self.codec, self.path))
+            chunk = data, 0, self._entries(data, 0, len(data))
+
+        self._chunks[n] = chunk
+        if len(self._chunks) > self.cached_chunks:
+            self._chunks.popitem(last=False)
+        return chunk
+
+    #
+    # Writing
+    #
+
+    @classmethod
+    def write(cls, path, addrs, chunk_size=1 << 20, codec=None, compression_level=1, cached_chunks=4):
+        """
+        Write a trace in the chunked format.
+
+        :param str path:            The path of the trace file.
+        :param addrs:               An iterable of addresses. It is consumed one chunk at a time.
+        :param int chunk_size:      The number of entries per chunk.
+        :param int codec:           The compression codec, one of the CODEC_* constants. lz4 if it is installed and zlib
+                                    otherwise by default.
+        :param int compression_level: The zlib compression level.
+        :param int cached_chunks:   The number of decompressed chunks that the returned trace file keeps in memory.
+        :return:                    The trace file.
+        :rtype:                     TraceFile
+        """
+
+        if codec is None:
+            codec = cls.CODEC_ZLIB if lz4 is None else cls.CODEC_LZ4
+        if codec == cls.CODEC_LZ4 and lz4 is None:
+            raise ImportError("Cannot import lz4. Please install lz4 to use the lz4 codec.")
+
+        header_size = len(cls.MAGIC) + cls._HEADER.size
+        offsets = array.array('Q', [ header_size ])
+        length = 0
+        addrs = iter(addrs)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * header_size)
+            while True:
+                entries = array.array('Q', itertools.islice(addrs, chunk_size))
+                if not entries:
+                    break
+                length += len(entries)
+                if sys.byteorder != 'little':
+                    entries.byteswap()
+                data = entries.tobytes()
+                if codec == cls.CODEC_LZ4:
+                    data = lz4.frame.compress(data)
+                elif codec == cls.CODEC_ZLIB:
+                    data = zlib.compress(data, compression_level)
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+
+            index_offset = offsets[-1]
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+            f.write(offsets.tobytes())
+            f.seek(0)
+            f.write(cls.MAGIC + cls._HEADER.pack(cls.VERSION, codec, chunk_size, length, index_offset))
+
+        return cls(path, cached_chunks=cached_chunks)
@@ -2,6 +2,8 @@ import copy
 import os
 import archinfo
 from collections import defaultdict
+from collections.abc import MutableMapping
+import importlib
 import logging
 import inspect
 
@@ -9,12 +11,11 @@ import itanium_demangler
 
 from ...calling_conventions import DEFAULT_CC
 from ...misc import autoimport
-from ...sim_type import parse_file
+from ...sim_type import parse_file, intern_type
 from ..stubs.ReturnUnconstrained import ReturnUnconstrained
 from ..stubs.syscall_stub import syscall as stub_syscall
 
 l = logging.getLogger(name=__name__)
-SIM_LIBRARIES = {}
 
 
 class SimLibrary:
@@ -22,7 +23,8 @@ class SimLibrary:
     A SimLibrary is the mechanism for describing a dynamic library's API, its functions and metadata.
 
     Any instance of this class (or its subclasses) found in the ``angr.procedures.definitions`` package will be
-    automatically picked up and added to ``angr.SIM_LIBRARIES`` via all its names.
+    automatically picked up and added to ``angr.SIM_LIBRARIES`` via all its names. The module defining it must be listed
+    in ``angr.procedures.definitions.library_index``, otherwise it is imported eagerly with ``angr``.
 
     :ivar fallback_cc:      A mapping from architecture to the default calling convention that should be used if no
                             other information is present. Contains some sane defaults for linux.
@@ -106,7 +108,7 @@ class SimLibrary:
         :param name:    The name of the function as a string
         :param proto:   The prototype of the function as a SimTypeFunction
         """
-        self.prototypes[name] = proto
+        self.prototypes[name] = intern_type(proto)
 
     def set_prototypes(self, protos):
         """
@@ -114,7 +116,7 @@ class SimLibrary:
 
         :param protos:   Dictionary mapping function names to SimTypeFunction objects
         """
-        self.prototypes.update(protos)
+        self.prototypes.update((name, intern_type(proto)) for name, proto in protos.items())
 
     def set_c_prototype(self, c_decl):
         """
@@ -491,5 +493,130 @@ class SimSyscallLibrary(SimLibrary):
         name, _, _ = self._canonicalize(number, arch, abi_list)
         return super(SimSyscallLibrary, self).has_implementation(name)
 
-for _ in autoimport.auto_import_modules('angr.procedures.definitions', os.path.dirname(os.path.realpath(__file__))):
-    pass
+
+class SimLibraries(MutableMapping):
+    """
+    The mapping from library names to SimLibrary objects, i.e., ``angr.SIM_LIBRARIES``.
+
+    Definitions modules in this package are imported only when one of the libraries they define is requested. The names
+    of the libraries each module defines are taken from a prebuilt index (see
+    ``angr.procedures.definitions.library_index``), so that listing or testing for library names does not import any
+    definitions. Modules that are not covered by the index, or all modules if the version of the index is not
+    supported, are imported right away.
+    """
+
+    INDEX_VERSION = 1
+
+    def __init__(self, base_module, base_path):
+        self._base_module = base_module
+        self._base_path = base_path
+        # library name -> SimLibrary, for all libraries that are loaded
+        self._libraries = { }
+        # library name -> name of the module defining it, for all libraries that are not loaded yet
+        self._index = { }
+        # definitions modules that are not in the index
+        self._unindexed_modules = [ ]
+
+        from .library_index import VERSION, LIBRARY_INDEX
+        if VERSION != self.INDEX_VERSION:
+            l.warning("Unsupported version %d of the library index. All library definitions will be loaded.", VERSION)
+            LIBRARY_INDEX = { }
+
+        for module_name in self._module_names():
+            if module_name in LIBRARY_INDEX:
+                for name in LIBRARY_INDEX[module_name]:
+                    self._index.setdefault(name, module_name)
+            else:
+                self._unindexed_modules.append(module_name)
+
+    def __getitem__(self, name):
+        try:
+            return self._libraries[name]
+        except KeyError:
+            pass
+        module_name = self._index.get(name, None)
+        if module_name is None:
+            raise KeyError(name)
+        self._load_module(module_name)
+        return self._libraries[name]
+
+    def __setitem__(self, name, library):
+        self._libraries[name] = library
+        self._index.pop(name, None)
+
+    def __delitem__(self, name):
+        if name in self._libraries:
+            del self._libraries[name]
+            self._index.pop(name, None)
+        else:
+            del self._index[name]
+
+    def __contains__(self, name):
+        return name in self._libraries or name in self._index
+
+    def __iter__(self):
+        # loaded names are never in the index. take a snapshot, since iterating through values loads libraries
+        return iter(list(self._libraries) + list(self._index))
+
+    def __len__(self):
+        return len(self._libraries) + len(self._index)
+
+    def __repr__(self):
+        return "<SimLibraries: %d loaded, %d not loaded>" % (len(self._libraries), len(self._index))
+
+    def is_loaded(self, name):
+        """
+        Check if a library is loaded, without loading it.
+
+        :param str name:    Name of the library.
+        :return:            True if the library is loaded, False otherwise.
+        :rtype:             bool
+        """
+        return name in self._libraries
+
+    def load_all(self):
+        """
+        Load all library definitions.
+        """
+        for module_name in sorted(set(self._index.values())):
+            self._load_module(module_name)
+
+    def build_index(self):
+        """
+        Build the library index by loading all definitions modules in this package. The result is what should be
+        written to ``angr.procedures.definitions.library_index``.
+
+        :return:    A dict mapping names of definitions modules to the names of the libraries they define.
+        :rtype:     dict
+        """
+        index = { }
+        for module_name in self._module_names():
+            mod = importlib.import_module(".%s" % module_name, self._base_module)
+            names = index[module_name] = [ ]
+            for _, lib in autoimport.filter_module(mod, type_req=SimLibrary):
+                names.extend(name for name in lib.names if name not in names)
+        return index
+
+    def _load_unindexed_modules(self):
+        while self._unindexed_modules:
+            module_name = self._unindexed_modules.pop(0)
+            l.debug("%s.%s is not in the library index. Load it now.", self._base_module, module_name)
+            self._load_module(module_name)
+
+    def _module_names(self):
+        for file_name in sorted(os.listdir(self._base_path)):
+            if file_name.endswith('.py') and file_name not in ('__init__.py', 'library_index.py'):
+                yield file_name[:-3]
+
+    def _load_module(self, module_name):
+        try:
+            importlib.import_module(".%s" % module_name, self._base_module)
+        except ImportError:
+            l.warning("Unable to import module %s.%s", self._base_module, module_name, exc_info=True)
+        # drop the names that the module should have defined but did not, so that we do not try loading them again
+        for name in [ name for name, mod in self._index.items() if mod == module_name ]:
+            del self._index[name]
+
+
+SIM_LIBRARIES = SimLibraries('angr.procedures.definitions', os.path.dirname(os.path.realpath(__file__)))
+SIM_LIBRARIES._load_unindexed_modules()
@@ -0,0 +1,28 @@
+# The index of all library definitions in this package, mapping each definitions module to the names of the libraries
+# that it defines. angr.SIM_LIBRARIES uses it to import a definitions module only when one of its libraries is
+# requested.
+#
+# Whenever a definitions module is added or the names of its libraries change, regenerate this index with
+#
+#     angr.SIM_LIBRARIES.build_index()
+#
+# and bump VERSION. Modules that are missing from the index are always imported eagerly.
+
+VERSION = 1
+
+LIBRARY_INDEX = {
+    'advapi32': [ 'advapi32.dll' ],
+    'cgc': [ 'cgcabi', 'cgcabi_tracer' ],
+    'glibc': [ 'libc.so.0', 'libc.so.1', 'libc.so.2', 'libc.so.3', 'libc.so.4', 'libc.so.5', 'libc.so.6', 'libc.so.7',
+               'libc.so' ],
+    'kernel32': [ 'kernel32.dll' ],
+    'libstdcpp': [ 'libstdc++.so', 'libstdc++.so.6' ],
+    'linux_kernel': [ 'linux' ],
+    'linux_loader': [ 'ld.so', 'ld-linux.so', 'ld.so.2', 'ld-linux.so.2', 'ld-linux-x86-64.so.2' ],
+    'msvcr': [ 'msvcrt.dll', 'msvcr71.dll', 'msvcr100.dll', 'msvcr110.dll', 'msvcrt20.dll', 'msvcrt40.dll',
+               'msvcr120.dll' ],
+    'ntdll': [ 'ntdll.dll' ],
+    'user32': [ 'user32.dll' ],
+    # not a library definition
+    'parse_syscalls_from_local_system': [ ],
+}
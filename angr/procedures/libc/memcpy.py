@@ -23,6 +23,11 @@ class memcpy(angr.SimProcedure):
         l.debug("Memcpy running with conditional_size %#x", conditional_size)
 
         if conditional_size > 0:
+            if not self.state.solver.symbolic(limit) and FAST_MEMORY not in self.state.options:
+                # move the contents without building the expression of the source, where the memory supports it
+                self.state.memory.copy_contents(dst_addr, src_addr, limit, return_data=False)
+                return dst_addr
+
             src_mem = self.state.memory.load(src_addr, conditional_size, endness='Iend_BE')
             if ABSTRACT_MEMORY in self.state.options:
                 self.state.memory.store(dst_addr, src_mem, size=conditional_size, endness='Iend_BE')
@@ -32,4 +37,4 @@ class memcpy(angr.SimProcedure):
 
         return dst_addr
 
-from ...sim_options import ABSTRACT_MEMORY
+from ...sim_options import ABSTRACT_MEMORY, FAST_MEMORY
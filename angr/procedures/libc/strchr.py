@@ -24,6 +24,11 @@ class strchr(angr.SimProcedure):
         else:
             l.debug("concrete strlen")
             max_search = self.state.solver.eval(s_strlen.ret_expr)+1
+            if not self.state.solver.symbolic(c):
+                data = self.state.memory.load_concrete_bytes(s_addr, max_search)
+                if data is not None and len(data) == max_search:
+                    i = data.find(bytes((self.state.solver.eval(c),)))
+                    return s_addr + i if i != -1 else self.state.solver.BVV(0, self.state.arch.bits)
             a, c, i = self.state.memory.find(s_addr, c, max_search, default=0, chunk_size=chunk_size)
 
         if len(i) > 1:
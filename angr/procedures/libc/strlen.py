@@ -47,6 +47,11 @@ class strlen(angr.SimProcedure):
             return length
 
         else:
+            null_index = self._concrete_null_index(s, step)
+            if null_index is not None:
+                self.max_null_index = null_index
+                return self.state.solver.BVV(null_index, self.state.arch.bits)
+
             search_len = max_str_len
             r, c, i = self.state.memory.find(s, null_seq, search_len, max_symbolic_bytes=max_symbolic_bytes, step=step, chunk_size=chunk_size)
 
@@ -68,3 +73,28 @@ class strlen(angr.SimProcedure):
                 self.state.solver.add(result == rresult)
                 result = rresult
             return result
+
+    def _concrete_null_index(self, s, step):
+        """
+        Find the terminating null character of a string whose bytes are all concrete, using native bytes operations.
+
+        :param s:           Address of the string.
+        :param int step:    Size of a character.
+        :return:            Offset of the null character, or None if the string is not concrete up to its end.
+        """
+
+        search_len = self.state.libc.max_str_len
+        null_seq = b'\x00' * step
+        while True:
+            data = self.state.memory.load_concrete_bytes(s, search_len)
+            if data is None:
+                return None
+            i = data.find(null_seq)
+            while i != -1 and i % step != 0:
+                i = data.find(null_seq, i + 1)
+            if i != -1:
+                return i
+            if len(data) < search_len or search_len > 0x10000:
+                # let the symbolic path take over
+                return None
+            search_len *= 2
@@ -63,6 +63,11 @@ class strncmp(angr.SimProcedure):
                 else:
                     return self.state.solver.BVV(1, self.state.arch.bits, variables=variables)
 
+        if concrete_run:
+            ret = self._concrete_compare(a_addr, b_addr, maxlen, ignore_case)
+            if ret is not None:
+                return self.state.solver.BVV(ret, self.state.arch.bits, variables=variables)
+
         # the bytes
         a_bytes = self.state.memory.load(a_addr, maxlen, endness='Iend_BE')
         b_bytes = self.state.memory.load(b_addr, maxlen, endness='Iend_BE')
@@ -156,3 +161,26 @@ class strncmp(angr.SimProcedure):
             self.state.add_constraints(self.state.solver.Or(match_case, nomatch_case, l0_case, empty_case))
 
         return ret_expr
+
+    def _concrete_compare(self, a_addr, b_addr, maxlen, ignore_case):
+        """
+        Compare the first `maxlen` bytes of two strings using native bytes operations, if all of them are concrete.
+
+        :return:    -1, 0, or 1, or None if any of the bytes is not concrete.
+        """
+
+        a_data = self.state.memory.load_concrete_bytes(a_addr, maxlen)
+        b_data = self.state.memory.load_concrete_bytes(b_addr, maxlen)
+        if a_data is None or b_data is None or len(a_data) != maxlen or len(b_data) != maxlen:
+            return None
+
+        if ignore_case:
+            a_data, b_data = a_data.upper(), b_data.upper()
+        if a_data == b_data:
+            l.debug("concrete run made it to the end!")
+            return 0
+        for a_conc, b_conc in zip(a_data, b_data):
+            if a_conc != b_conc:
+                l.debug("... found mis-matching concrete bytes 0x%x and 0x%x", a_conc, b_conc)
+                return -1 if a_conc < b_conc else 1
+        return 0
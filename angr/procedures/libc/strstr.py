@@ -56,6 +56,15 @@ class strstr(angr.SimProcedure):
             c = [ self.state.solver.Or(*[c for c,_ in cases]) ]
         else:
             needle_length = self.state.solver.eval(needle_strlen.ret_expr)
+            if not self.state.solver.symbolic(haystack_strlen.ret_expr):
+                haystack = self.state.memory.load_concrete_bytes(haystack_addr, haystack_maxlen)
+                needle = self.state.memory.load_concrete_bytes(needle_addr, needle_length)
+                if haystack is not None and needle is not None and \
+                        len(haystack) == haystack_maxlen and len(needle) == needle_length:
+                    l.debug("... concrete haystack and needle.")
+                    i = haystack.find(needle)
+                    return haystack_addr + i if i != -1 else self.state.solver.BVV(0, self.state.arch.bits)
+
             needle_str = self.state.memory.load(needle_addr, needle_length)
 
             chunk_size = None
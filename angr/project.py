@@ -64,6 +64,8 @@ class Project:
     :param simos:                       a SimOS class to use for this project.
     :param engine:                      The SimEngine class to use for this project.
     :param bool translation_cache:      If True, cache translated basic blocks rather than re-translating them.
+    :param persistent_translation_cache: Path to an on-disk cache of translated basic blocks (or a
+                                        PersistentIRSBCache instance) that is shared across Projects and processes.
     :param support_selfmodifying_code:  Whether we aggressively support self-modifying code. When enabled, emulation
                                         will try to read code from the current state instead of the original memory,
                                         regardless of the current memory protections.
@@ -97,6 +99,7 @@ class Project:
                  engine=None,
                  load_options=None,
                  translation_cache=True,
+                 persistent_translation_cache=None,
                  support_selfmodifying_code=False,
                  store_function=None,
                  load_function=None,
@@ -171,6 +174,7 @@ class Project:
         self._ignore_functions = ignore_functions
         self._support_selfmodifying_code = support_selfmodifying_code
         self._translation_cache = translation_cache
+        self._persistent_translation_cache = persistent_translation_cache
         self._executing = False # this is a flag for the convenience API, exec() and terminate_execution() below
 
         if self._support_selfmodifying_code:
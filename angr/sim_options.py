@@ -206,6 +206,9 @@ REPLACEMENT_SOLVER = "REPLACEMENT_SOLVER"
 # use a cache-less solver in claripy
 CACHELESS_SOLVER = "CACHELESS_SOLVER"
 
+# share the results of solver queries between all states in the process through a bounded cache
+GLOBAL_SOLVER_CACHE = "GLOBAL_SOLVER_CACHE"
+
 # IR optimization
 OPTIMIZE_IR = "OPTIMIZE_IR"
 
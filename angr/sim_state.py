@@ -1,5 +1,6 @@
 import functools
 import itertools
+import collections
 import contextlib
 import weakref
 
@@ -59,6 +60,8 @@ class SimState(PluginHub):
         if kwargs:
             l.warning("Unused keyword arguments passed to SimState: %s", " ".join(kwargs))
         super(SimState, self).__init__()
+        # plugins that are shared with other states until they are accessed, see _share_plugins()
+        self._shared_plugins = { }
         self.project = project
 
         # Java & Java JNI
@@ -110,6 +113,9 @@ class SimState(PluginHub):
         self._global_condition = None
         self.ip_constraints = []
 
+        # the latest checkpoint, see checkpoint()
+        self._checkpoint = None
+
         # plugins. lord help us
         if plugin_preset is not None:
             self.use_plugin_preset(plugin_preset)
@@ -203,11 +209,14 @@ class SimState(PluginHub):
             p.init_state()
 
     def __getstate__(self):
-        s = { k:v for k,v in self.__dict__.items() if k not in ('inspect', 'regs', 'mem')}
+        self._unshare_plugins()
+        s = { k:v for k,v in self.__dict__.items() if k not in ('inspect', 'regs', 'mem', '_checkpoint')}
         s['_active_plugins'] = { k:v for k,v in s['_active_plugins'].items() if k not in ('inspect', 'regs', 'mem') }
         return s
 
     def __setstate__(self, s):
+        self._checkpoint = None
+        self._shared_plugins = { }
         self.__dict__.update(s)
         for p in self.plugins.values():
             p.set_state(self)
@@ -255,6 +264,7 @@ class SimState(PluginHub):
     @property
     def plugins(self):
         # TODO: This shouldn't be access directly.
+        self._unshare_plugins()
         return self._active_plugins
 
     @property
@@ -352,19 +362,29 @@ class SimState(PluginHub):
             # twice; one for the native and one for the java view of the state.
             suffix = '_soot' if self.ip_is_soot_addr else '_vex'
             name = name + suffix if self.has_plugin(name + suffix) else name
+        if name in self._shared_plugins:
+            return self._unshare_plugin(name)
         return super(SimState, self).get_plugin(name)
 
     def has_plugin(self, name):
         if self._is_java_jni_project:
             # In case of the JavaVM with JNI support, also check for toggled plugins.
-            return super(SimState, self).has_plugin(name) or super(SimState, self).has_plugin(name + '_soot')
-        return super(SimState, self).has_plugin(name)
+            return super(SimState, self).has_plugin(name) or super(SimState, self).has_plugin(name + '_soot') or \
+                   name in self._shared_plugins or name + '_soot' in self._shared_plugins
+        return name in self._shared_plugins or super(SimState, self).has_plugin(name)
 
     def register_plugin(self, name, plugin, inhibit_init=False): # pylint: disable=arguments-differ
         #l.debug("Adding plugin %s of type %s", name, plugin.__class__.__name__)
         self._set_plugin_state(plugin, inhibit_init=inhibit_init)
         return super(SimState, self).register_plugin(name, plugin)
 
+    def release_plugin(self, name):
+        if name in self._shared_plugins:
+            shared, _ = self._shared_plugins.pop(name)
+            shared.refs -= 1
+            return
+        super(SimState, self).release_plugin(name)
+
     def _init_plugin(self, plugin_cls):
         plugin = plugin_cls()
         self._set_plugin_state(plugin)
@@ -517,7 +537,7 @@ class SimState(PluginHub):
         Clean up after the solver engine. Calling this when a state no longer needs to be solved on will reduce memory
         usage.
         """
-        if 'solver' in self.plugins:
+        if 'solver' in self._active_plugins:
             self.solver.downsize()
 
     #
@@ -557,6 +577,54 @@ class SimState(PluginHub):
 
         return out
 
+    def _share_plugins(self):
+        """
+        Stop owning all active plugins that can be copied lazily, so that they can be shared with a copy of the state.
+
+        :return: A dict of the plugins that are shared with the copy.
+        """
+
+        counts = collections.Counter(id(p) for p in self._active_plugins.values())
+        for n, p in list(self._active_plugins.items()):
+            # plugins that are registered under several names are copied with the memo
+            if p.LAZY_COPY and counts[id(p)] == 1:
+                super(SimState, self).release_plugin(n)
+                self._shared_plugins[n] = (_SharedPlugin(p), False)
+
+        out = { }
+        for n, (shared, _) in self._shared_plugins.items():
+            shared.refs += 1
+            # plugins of a copied state are initialized when they are added to it
+            out[n] = (shared, True)
+            lazy_copy_counters.deferred[n] += 1
+        return out
+
+    def _unshare_plugin(self, name):
+        """
+        Take a plugin that is shared with other states. It is copied, unless no other state refers to it anymore.
+
+        :param str name:    Name of the plugin.
+        :return:            The plugin, which is owned by this state afterwards.
+        """
+
+        shared, init = self._shared_plugins.pop(name)
+        shared.refs -= 1
+        if shared.refs == 0:
+            plugin = shared.plugin
+            lazy_copy_counters.taken[name] += 1
+        else:
+            plugin = shared.plugin.copy({ })
+            lazy_copy_counters.copied[name] += 1
+        return self.register_plugin(name, plugin, inhibit_init=not init)
+
+    def _unshare_plugins(self):
+        """
+        Take all plugins that are shared with other states.
+        """
+
+        for name in list(self._shared_plugins):
+            self._unshare_plugin(name)
+
     def copy(self):
         """
         Returns a copy of the state.
@@ -565,9 +633,11 @@ class SimState(PluginHub):
         if self._global_condition is not None:
             raise SimStateError("global condition was not cleared before state.copy().")
 
+        shared_plugins = self._share_plugins()
         c_plugins = self._copy_plugins()
         state = SimState(project=self.project, arch=self.arch, plugins=c_plugins, options=self.options.copy(),
                          mode=self.mode, os_name=self.os_name)
+        state._shared_plugins = shared_plugins
 
         if self._is_java_jni_project:
             state.ip_is_soot_addr = self.ip_is_soot_addr
@@ -578,6 +648,96 @@ class SimState(PluginHub):
 
         return state
 
+    def checkpoint(self):
+        """
+        Record the state, so that all changes made to it afterwards can be undone with rollback().
+
+        This is meant for trying out changes to a state and backing out again, without copying the state each time.
+        Memory, registers, and the solver are rolled back in place, and neither recording nor rolling back copies any
+        page of memory: pages are shared with the checkpoint until they are written to, and rolling back only discards
+        the pages that have been written to since the checkpoint. Plugins that are copied lazily are shared with the
+        checkpoint until they are accessed, and all other plugins and the options are copied.
+
+        Memory models that cannot record their contents, e.g., abstract memory, are not supported.
+
+        :return: The checkpoint, which can be rolled back to any number of times.
+        :rtype: SimStateCheckpoint
+        """
+
+        plugins = { }
+        for name in ('memory', 'registers', 'solver'):
+            if self.has_plugin(name):
+                plugin = self.get_plugin(name)
+                if not hasattr(plugin, 'checkpoint'):
+                    raise SimStateError("Checkpoints are not supported for %s plugins." % type(plugin).__name__)
+                plugins[name] = (plugin, plugin.checkpoint())
+
+        # the copies keep referring to the plugins that are rolled back in place
+        memo = dict((id(plugin), plugin) for plugin, _ in plugins.values())
+        counts = collections.Counter(id(p) for p in self._active_plugins.values())
+        copied_plugins = { }
+        for name, plugin in list(self._active_plugins.items()):
+            if name in plugins:
+                continue
+            if plugin.LAZY_COPY and counts[id(plugin)] == 1:
+                super(SimState, self).release_plugin(name)
+                self._shared_plugins[name] = (_SharedPlugin(plugin), False)
+            else:
+                copied_plugins[name] = plugin.copy(memo)
+
+        shared_plugins = { }
+        for name, (shared, init) in self._shared_plugins.items():
+            # the checkpoint holds a reference, so the plugin is copied before it is changed
+            shared.refs += 1
+            shared_plugins[name] = (shared, init)
+
+        self._checkpoint = SimStateCheckpoint(plugins, self.options.copy(), shared_plugins, copied_plugins)
+        return self._checkpoint
+
+    def rollback(self, checkpoint=None):
+        """
+        Undo all changes made to the state since a checkpoint.
+
+        :param SimStateCheckpoint checkpoint:   The checkpoint to roll back to, or None to roll back to the latest
+                                                checkpoint of this state.
+        """
+
+        if checkpoint is None:
+            checkpoint = self._checkpoint
+            if checkpoint is None:
+                raise SimStateError("There is no checkpoint to roll back to.")
+
+        # plugins that have been added since the checkpoint are dropped
+        for name in list(self._active_plugins) + list(self._shared_plugins):
+            if name not in checkpoint.plugins and name not in checkpoint.shared_plugins and \
+                    name not in checkpoint.copied_plugins:
+                self.release_plugin(name)
+
+        for name, (plugin, saved) in checkpoint.plugins.items():
+            plugin.rollback(saved)
+            if self._active_plugins.get(name, None) is not plugin:
+                self.register_plugin(name, plugin, inhibit_init=True)
+
+        for name, (shared, init) in checkpoint.shared_plugins.items():
+            current = self._shared_plugins.get(name, None)
+            if current is not None and current[0] is shared:
+                # not accessed since the checkpoint
+                continue
+            if self.has_plugin(name):
+                self.release_plugin(name)
+            shared.refs += 1
+            self._shared_plugins[name] = (shared, init)
+
+        # the recorded copies are taken over, and copied again for the next rollback. plugins are only copied once they
+        # are part of a state
+        for name, plugin in checkpoint.copied_plugins.items():
+            self.register_plugin(name, plugin, inhibit_init=True)
+        memo = dict((id(plugin), plugin) for plugin, _ in checkpoint.plugins.values())
+        checkpoint.copied_plugins = dict((name, plugin.copy(memo))
+                                         for name, plugin in checkpoint.copied_plugins.items())
+
+        self.options = checkpoint.options.copy()
+
     def merge(self, *others, **kwargs):
         """
         Merges this state with the other states. Returns the merging result, merged state, and the merge flag.
@@ -910,6 +1070,70 @@ class SimState(PluginHub):
         else:
             return conditions.__class__((self._adjust_condition(self.solver.And(*conditions)),))
 
+class SimStateCheckpoint:
+    """
+    A checkpoint of a SimState, created by SimState.checkpoint().
+    """
+
+    __slots__ = ('plugins', 'options', 'shared_plugins', 'copied_plugins', )
+
+    def __init__(self, plugins, options, shared_plugins, copied_plugins):
+        # plugin name -> (plugin, checkpoint of the plugin), for plugins that are rolled back in place
+        self.plugins = plugins
+        self.options = options
+        # plugin name -> (shared plugin, whether the plugin is initialized when it is taken), for plugins that are
+        # shared with the checkpoint
+        self.shared_plugins = shared_plugins
+        # plugin name -> copy of the plugin, for all other plugins
+        self.copied_plugins = copied_plugins
+
+class _SharedPlugin:
+    """
+    A plugin that is shared between states, which is copied when one of them accesses it.
+    """
+
+    __slots__ = ('plugin', 'refs', )
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        # the number of states that share the plugin
+        self.refs = 1
+
+
+class LazyCopyCounters:
+    """
+    Counts how often plugins that are copied lazily with their states are actually copied, per plugin name.
+
+    :ivar deferred: The number of times that copying a plugin was deferred by copying a state.
+    :ivar copied:   The number of times that a shared plugin was copied upon its first access.
+    :ivar taken:    The number of times that a shared plugin was taken by the last state sharing it, without a copy.
+    """
+
+    def __init__(self):
+        self.deferred = collections.Counter()
+        self.copied = collections.Counter()
+        self.taken = collections.Counter()
+
+    def clear(self):
+        self.deferred.clear()
+        self.copied.clear()
+        self.taken.clear()
+
+    def copy_rate(self, name):
+        """
+        Get the fraction of deferred copies of a plugin that turned out to be needed.
+
+        :param str name:    Name of the plugin.
+        :rtype:             float
+        """
+
+        if not self.deferred[name]:
+            return 0.
+        return self.copied[name] / self.deferred[name]
+
+
+lazy_copy_counters = LazyCopyCounters()
+
 default_state_plugin_preset = PluginPreset()
 SimState.register_preset('default', default_state_plugin_preset)
 
@@ -2,7 +2,11 @@ from collections import OrderedDict, defaultdict
 from .misc.ux import deprecated
 import copy
 import re
+import os
+import pickle
+import hashlib
 import logging
+import weakref
 from typing import Optional
 
 import claripy
@@ -315,23 +319,29 @@ class SimTypeChar(SimTypeReg):
     def __repr__(self):
         return 'char'
 
+    def _with_byte_width(self, state):
+        # FIXME: This is a hack. Types may be shared, so the size is never changed in place.
+        if self._size == state.arch.byte_width:
+            return self
+        ty = copy.copy(self)
+        ty._size = state.arch.byte_width
+        return ty
+
     def store(self, state, addr, value):
-        # FIXME: This is a hack.
-        self._size = state.arch.byte_width
+        ty = self._with_byte_width(state)
         try:
-            super(SimTypeChar, self).store(state, addr, value)
+            super(SimTypeChar, ty).store(state, addr, value)
         except TypeError:
             if isinstance(value, bytes) and len(value) == 1:
                 value = state.solver.BVV(value[0], state.arch.byte_width)
-                super(SimTypeChar, self).store(state, addr, value)
+                super(SimTypeChar, ty).store(state, addr, value)
             else:
                 raise
 
     def extract(self, state, addr, concrete=False):
-        # FIXME: This is a hack.
-        self._size = state.arch.byte_width
+        ty = self._with_byte_width(state)
 
-        out = super(SimTypeChar, self).extract(state, addr, concrete)
+        out = super(SimTypeChar, ty).extract(state, addr, concrete)
         if concrete:
             return bytes([out])
         return out
@@ -1078,6 +1088,7 @@ def define_struct(defn):
     struct = parse_type(defn)
     ALL_TYPES[struct.name] = struct
     ALL_TYPES['struct ' + struct.name] = struct
+    _registered_types_changed()
     return struct
 
 
@@ -1101,6 +1112,17 @@ def register_types(types):
         ALL_TYPES['union ' + types.name] = types
     else:
         ALL_TYPES.update(types)
+    _registered_types_changed()
+
+
+# bumped whenever the types registered in ALL_TYPES are replaced or modified, so that parse_cache knows when to describe
+# them again. types that are modified in place by anyone else must be registered again.
+_registered_types_version = 0
+
+
+def _registered_types_changed():
+    global _registered_types_version  # pylint:disable=global-statement
+    _registered_types_version += 1
 
 
 def do_preprocess(defn):
@@ -1138,12 +1160,18 @@ def parse_file(defn, preprocess=True):
     if pycparser is None:
         raise ImportError("Please install pycparser in order to parse C definitions")
 
+    preamble, ignoreme = make_preamble()
+    keys = parse_cache.make_keys('file', defn, preprocess, preamble)
+    cached = parse_cache.get(keys)
+    if cached is not None:
+        out, extra_types = _copy_type_tree(cached)
+        return dict(out), dict(extra_types)
+
     defn = '\n'.join(x for x in defn.split('\n') if _include_re.match(x) is None)
 
     if preprocess:
         defn = do_preprocess(defn)
 
-    preamble, ignoreme = make_preamble()
     node = pycparser.c_parser.CParser().parse(preamble + defn)
     if not isinstance(node, pycparser.c_ast.FileAST):
         raise ValueError("Something went horribly wrong using pycparser")
@@ -1162,7 +1190,9 @@ def parse_file(defn, preprocess=True):
 
     for ty in ignoreme:
         del extra_types[ty]
-    return out, extra_types
+
+    out, extra_types = _copy_type_tree(parse_cache.put(keys, (out, extra_types)))
+    return dict(out), dict(extra_types)
 
 
 def parse_type(defn, preprocess=True):  # pylint:disable=unused-argument
@@ -1176,6 +1206,12 @@ def parse_type(defn, preprocess=True):  # pylint:disable=unused-argument
 
     defn = re.sub(r"/\*.*?\*/", r"", defn)
 
+    scope_stack = _make_scope()
+    keys = parse_cache.make_keys('type', defn, False, ' '.join(scope_stack[0]))
+    cached = parse_cache.get(keys)
+    if cached is not None:
+        return _copy_type_tree(cached)
+
     parser = pycparser.CParser()
 
     parser.cparser = pycparser.ply.yacc.yacc(module=parser,
@@ -1184,13 +1220,13 @@ def parse_type(defn, preprocess=True):  # pylint:disable=unused-argument
                                              optimize=False,
                                              errorlog=errorlog)
 
-    node = parser.parse(text=defn, scope_stack=_make_scope())
+    node = parser.parse(text=defn, scope_stack=scope_stack)
     if not isinstance(node, pycparser.c_ast.Typename) and \
             not isinstance(node, pycparser.c_ast.Decl):
         raise ValueError("Something went horribly wrong using pycparser")
 
     decl = node.type
-    return _decl_to_type(decl)
+    return _copy_type_tree(parse_cache.put(keys, _decl_to_type(decl)))
 
 
 def _accepts_scope_stack():
@@ -1260,6 +1296,7 @@ def _decl_to_type(decl, extra_types=None):
                 struct = SimStruct(fields, decl.name)
             elif not struct.fields:
                 struct.fields = fields
+                _registered_types_changed()
             elif fields and struct.fields != fields:
                 raise ValueError("Redefining body of " + key)
 
@@ -1287,6 +1324,7 @@ def _decl_to_type(decl, extra_types=None):
                 union = SimUnion(fields, decl.name)
             elif not union.members:
                 union.members = fields
+                _registered_types_changed()
             elif fields and union.members != fields:
                 raise ValueError("Redefining body of " + key)
 
@@ -1323,6 +1361,308 @@ def _parse_const(c):
     else:
         raise ValueError(c)
 
+#
+# Type interning and the cache of parsed types
+#
+
+_interned_types = weakref.WeakValueDictionary()
+
+
+def intern_type(ty):
+    """
+    Get the canonical instance of a type, so that identical types share one instance. The type itself is never
+    modified: if any type it contains is replaced by its canonical instance, a copy of the type is made. Named structs
+    and unions are never merged with other instances, since they may be completed later, and their members are left
+    alone.
+
+    Canonical instances are shared, so they must not be modified. Copy them first.
+
+    >>> intern_type(SimTypePointer(SimTypeInt())) is intern_type(SimTypePointer(SimTypeInt()))
+    True
+
+    :param SimType ty:  The type to intern.
+    :return:            The canonical instance of the type.
+    :rtype:             SimType
+    """
+    return _intern_type(ty, { }, False)
+
+
+def _intern_type(ty, memo, relink):
+    """
+    :param ty:          The type to intern.
+    :param dict memo:   Types that are interned during this run, keyed by their IDs.
+    :param bool relink: Replace named structs and unions with the ones in ALL_TYPES, e.g., for unpickled types.
+    """
+
+    if not isinstance(ty, SimType):
+        return ty
+    interned = memo.get(id(ty), None)
+    if interned is not None:
+        return interned
+
+    if isinstance(ty, (SimStruct, SimUnion)):
+        return _intern_aggregate(ty, memo, relink)
+
+    # a type can only refer to itself through a named struct or union, which is never copied
+    memo[id(ty)] = ty
+    attrs = { }
+    changed = False
+    key = [ type(ty) ]
+    for name, val in vars(ty).items():
+        if isinstance(val, SimType):
+            attrs[name] = new_val = _intern_type(val, memo, relink)
+            changed |= new_val is not val
+            key.append((name, id(new_val)))
+        elif type(val) is list or type(val) is tuple:
+            if val:
+                attrs[name] = new_val = type(val)([ _intern_type(v, memo, relink) for v in val ])
+                changed |= any(a is not b for a, b in zip(new_val, val))
+                key.append((name, tuple([ id(v) if isinstance(v, SimType) else v for v in new_val ])))
+            else:
+                key.append((name, ()))
+        else:
+            key.append((name, val))
+
+    try:
+        interned = _interned_types.get(tuple(key), None)
+    except TypeError:
+        # unhashable attributes
+        key = None
+        interned = None
+    if interned is None:
+        interned = ty
+        if changed:
+            interned = copy.copy(ty)
+            vars(interned).update(attrs)
+        if key is not None:
+            _interned_types[tuple(key)] = interned
+    memo[id(ty)] = interned
+    return interned
+
+
+def _intern_aggregate(ty, memo, relink):
+    attr = 'fields' if isinstance(ty, SimStruct) else 'members'
+    members = getattr(ty, attr)
+
+    if ty.name != '<anon>':
+        if relink:
+            registered = ALL_TYPES.get(('struct ' if attr == 'fields' else 'union ') + ty.name, None)
+            if type(registered) is type(ty):
+                if not getattr(registered, attr) and members:
+                    # the definition completed a forward-declared type when it was parsed
+                    setattr(registered, attr, members)
+                ty = registered
+        memo[id(ty)] = ty
+        return ty
+
+    memo[id(ty)] = ty
+    if not members:
+        return ty
+    interned_members = type(members)((name, _intern_type(member, memo, relink)) for name, member in members.items())
+    if all(interned_members[name] is members[name] for name in members):
+        return ty
+    interned = copy.copy(ty)
+    setattr(interned, attr, interned_members)
+    memo[id(ty)] = interned
+    return interned
+
+
+class SimTypeParseCache:
+    """
+    A cache of the results of parse_file() and parse_type(), so that repeated declarations do not run pycparser again.
+
+    Results are keyed by the digest of the parsed text, together with everything else that affects the result: the
+    types that are registered in ALL_TYPES, the parsing options, and the version of pycparser. The registered types are
+    described once per change to them, see register_types(). Cached types are interned. Recently used results are kept
+    in memory. If `path` is set, results are also stored on disk as pickles in that directory, so that they can be
+    shared between runs and processes. The directory is taken from the ANGR_SIMTYPE_CACHE_DIR environment variable by
+    default. Files on disk are only loaded if they hold SimTypes, and were written by the same version of the cache for
+    the same key.
+
+    Cached results are shared, so parse_file() and parse_type() hand out copies of them.
+    """
+
+    VERSION = 3
+
+    def __init__(self, path=None, max_entries=4096):
+        """
+        :param str path:        The directory to store results in, or None to only keep results in memory.
+        :param int max_entries: Maximum number of results kept in memory.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._results = OrderedDict()
+        # (version of the registered types, their identities, the digest of their descriptions)
+        self._registered = None
+
+    def clear(self):
+        """
+        Drop all results kept in memory, and reset the statistics. Results on disk are kept.
+        """
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def make_keys(self, kind, defn, preprocess, context):
+        """
+        Generate the cache keys of a parsing request.
+
+        :param str kind:        The kind of the request, 'file' or 'type'.
+        :param str defn:        The text to parse.
+        :param bool preprocess: Whether the text is preprocessed.
+        :param str context:     Anything else that is fed to the parser, e.g., the preamble.
+        :return:                A tuple of the key of the result in memory and the key of the result on disk.
+        :rtype:                 tuple
+        """
+
+        # names are resolved to the registered types themselves, so results depend on both their identities and their
+        # contents
+        registered = tuple((name, id(ty)) for name, ty in ALL_TYPES.items())
+        if self._registered is None or self._registered[:2] != (_registered_types_version, registered):
+            self._registered = (_registered_types_version, registered, self._describe_registered())
+        h = hashlib.sha256(defn.encode())
+        h.update(repr((self.VERSION, pycparser.__version__, kind, preprocess, context)).encode())
+        h.update(self._registered[2])
+        disk_key = h.hexdigest()
+        return (disk_key, registered), disk_key
+
+    @staticmethod
+    def _describe_registered():
+        h = hashlib.sha256()
+        for name, ty in ALL_TYPES.items():
+            # the types that a registered type refers to are described by their reprs
+            attrs = sorted((attr, repr(value)) for attr, value in vars(ty).items() if not attr.startswith('_arch'))
+            h.update(repr((name, type(ty).__name__, attrs)).encode())
+        return h.digest()
+
+    def get(self, keys):
+        """
+        Get a cached result.
+
+        :param tuple keys:  Keys generated by make_keys().
+        :return:            The result, or None if it is not cached.
+        """
+
+        mem_key, disk_key = keys
+        result = self._results.get(mem_key, None)
+        if result is not None:
+            self._results.move_to_end(mem_key)
+            self.hits += 1
+            return result
+
+        if self.path is not None:
+            try:
+                with open(os.path.join(self.path, disk_key + '.pickle'), 'rb') as f:
+                    version, key, result = _SimTypeUnpickler(f).load()
+                if version != self.VERSION or key != disk_key or not _is_type_tree(result):
+                    raise ValueError("Unexpected contents")
+            except FileNotFoundError:
+                pass
+            except Exception:  # pylint:disable=broad-except
+                l.warning("Failed to load cached types from %s.", self.path, exc_info=True)
+            else:
+                result = self._store(mem_key, _intern_type_tree(result, relink=True))
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    def put(self, keys, result):
+        """
+        Cache a result.
+
+        :param tuple keys:  Keys generated by make_keys().
+        :param result:      The result, i.e., a SimType or a tuple of mappings from names to SimTypes.
+        :return:            The interned result, which should be returned to the caller instead.
+        """
+
+        mem_key, disk_key = keys
+        result = self._store(mem_key, _intern_type_tree(result, relink=False))
+
+        if self.path is not None:
+            filename = os.path.join(self.path, disk_key + '.pickle')
+            tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                with open(tmp_filename, 'wb') as f:
+                    _SimTypePickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump((self.VERSION, disk_key, result))
+                os.replace(tmp_filename, filename)
+            except Exception:  # pylint:disable=broad-except
+                l.warning("Failed to cache types in %s.", self.path, exc_info=True)
+
+        return result
+
+    def _store(self, mem_key, result):
+        self._results[mem_key] = result
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+        return result
+
+
+class _SimTypePickler(pickle.Pickler):
+    """
+    Stores types that are registered in ALL_TYPES by their names.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._registered = dict((id(ty), name) for name, ty in ALL_TYPES.items())
+
+    def persistent_id(self, obj):
+        return self._registered.get(id(obj), None)
+
+
+class _SimTypeUnpickler(pickle.Unpickler):
+    """
+    Only allows SimTypes and the containers they use to be unpickled.
+    """
+
+    def persistent_load(self, pid):
+        ty = ALL_TYPES.get(pid, None) if isinstance(pid, str) else None
+        if not isinstance(ty, SimType):
+            raise pickle.UnpicklingError("Unknown registered type %r" % (pid, ))
+        return ty
+
+    def find_class(self, module, name):
+        if module == __name__:
+            cls = globals().get(name, None)
+            if isinstance(cls, type) and issubclass(cls, SimType):
+                return cls
+        elif module == 'collections' and name == 'OrderedDict':
+            return OrderedDict
+        raise pickle.UnpicklingError("%s.%s is not allowed in cached types" % (module, name))
+
+
+def _is_type_tree(result):
+    if isinstance(result, tuple):
+        return len(result) == 2 and all(isinstance(mapping, dict) and
+                                        all(isinstance(name, str) and isinstance(ty, SimType)
+                                            for name, ty in mapping.items())
+                                        for mapping in result)
+    return isinstance(result, SimType)
+
+
+def _copy_type_tree(result):
+    # types registered in ALL_TYPES keep their identity, just like what the parser returns
+    memo = dict((id(ty), ty) for ty in ALL_TYPES.values())
+    return copy.deepcopy(result, memo)
+
+
+def _intern_type_tree(result, relink):
+    memo = { }
+    if isinstance(result, tuple):
+        return tuple(OrderedDict((name, _intern_type(ty, memo, relink)) for name, ty in mapping.items())
+                     for mapping in result)
+    return _intern_type(result, memo, relink)
+
+
+parse_cache = SimTypeParseCache(path=os.environ.get('ANGR_SIMTYPE_CACHE_DIR', None))
+
+
 if pycparser is not None:
     _accepts_scope_stack()
 
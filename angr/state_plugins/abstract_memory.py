@@ -504,7 +504,7 @@ class SimAbstractMemory(SimMemory): #pylint:disable=abstract-method
         return addr
 
     def _copy_contents(self, dst, src, size, condition=None, src_memory=None, dst_memory=None, inspect=True,
-                      disable_actions=False):
+                      disable_actions=False, return_data=True):
         src_memory = self if src_memory is None else src_memory
         dst_memory = self if dst_memory is None else dst_memory
 
@@ -514,7 +514,7 @@ class SimAbstractMemory(SimMemory): #pylint:disable=abstract-method
 
         data = src_memory.load(src, max_size, inspect=inspect, disable_actions=disable_actions)
         dst_memory.store(dst, data, size=size, condition=condition, inspect=inspect, disable_actions=disable_actions)
-        return data
+        return data if return_data else None
 
     def find(self, addr, what, max_search=None, max_symbolic_bytes=None, default=None, step=1,
              disable_actions=False, inspect=True, chunk_size=None):
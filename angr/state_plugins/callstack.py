@@ -13,6 +13,9 @@ class CallStack(SimStatePlugin):
     Stores the address of the function you're in and the value of SP
     at the VERY BOTTOM of the stack, i.e. points to the return address.
     """
+
+    LAZY_COPY = True
+
     def __init__(self, call_site_addr=0, func_addr=0, stack_ptr=0, ret_addr=0, jumpkind='Ijk_Call', next_frame=None,
                  invoke_return_variable=None):
         super(CallStack, self).__init__()
@@ -6,6 +6,8 @@ class SimStateCGC(SimStatePlugin):
     This state plugin keeps track of CGC state.
     """
 
+    LAZY_COPY = True
+
     #__slots__ = [ 'heap_location', 'max_str_symbolic_bytes' ]
 
     def __init__(self):
@@ -197,7 +197,8 @@ class SimFastMemory(SimMemory):
     def _find(self, addr, what, max_search=None, max_symbolic_bytes=None, default=None, step=1, chunk_size=None): # pylint: disable=unused-argument
         raise SimFastMemoryError("find unsupported")
 
-    def _copy_contents(self, dst, src, size, condition=None, src_memory=None, dst_memory=None): # pylint: disable=unused-argument
+    def _copy_contents(self, dst, src, size, condition=None, src_memory=None, dst_memory=None, inspect=True,
+                       disable_actions=False, return_data=True): # pylint: disable=unused-argument
         raise SimFastMemoryError("copy unsupported")
 
     @SimMemory.memo
@@ -7,6 +7,8 @@ l = logging.getLogger(name=__name__)
 
 
 class SimStateGlobals(SimStatePlugin):
+    LAZY_COPY = True
+
     def __init__(self, backer=None):
         super(SimStateGlobals, self).__init__()
         self._backer = backer if backer is not None else {}
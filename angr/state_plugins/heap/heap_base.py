@@ -23,6 +23,8 @@ class SimHeapBase(SimStatePlugin):
     :ivar mmap_base: the address of the region from which large mmap allocations will be made
     """
 
+    LAZY_COPY = True
+
     def __init__(self, heap_base=None, heap_size=None):
         SimStatePlugin.__init__(self)
 
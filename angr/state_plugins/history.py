@@ -42,7 +42,9 @@ class SimStateHistory(SimStatePlugin):
 
         # the execution log for this history
         self.recent_events = [ ] if clone is None else list(clone.recent_events)
-        self.recent_bbl_addrs = [ ] if clone is None else list(clone.recent_bbl_addrs)
+        # blocks that were executed in unicorn are stored as an array('Q') rather than as a list of ints. slicing
+        # copies either one without changing its type.
+        self.recent_bbl_addrs = [ ] if clone is None else clone.recent_bbl_addrs[:]
         self.recent_ins_addrs = [ ] if clone is None else list(clone.recent_ins_addrs)
         self.recent_stack_actions = [ ] if clone is None else list(clone.recent_stack_actions)
         self.last_stmt_idx = None if clone is None else clone.last_stmt_idx
@@ -5,6 +5,8 @@ class SimStateLibc(SimStatePlugin):
     This state plugin keeps track of various libc stuff:
     """
 
+    LAZY_COPY = True
+
     #__slots__ = [ 'heap_location', 'max_str_symbolic_bytes' ]
 
     LOCALE_ARRAY = [
@@ -5,6 +5,8 @@ import itertools
 
 from .plugin import SimStatePlugin
 class SimStateLog(SimStatePlugin):
+    LAZY_COPY = True
+
     def __init__(self, log=None):
         SimStatePlugin.__init__(self)
 
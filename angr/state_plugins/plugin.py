@@ -14,6 +14,11 @@ class SimStatePlugin(object):
 
     STRONGREF_STATE = False
 
+    # When a state is copied, plugins with LAZY_COPY set are not copied right away. Instead, they are shared between
+    # the state and its copy, and copied when either state accesses them for the first time. This is only correct for
+    # plugins that do not share any objects with other plugins, since each of them is copied with its own memo.
+    LAZY_COPY = False
+
     def __init__(self):
         self.state = None # type: angr.SimState
 
@@ -16,6 +16,8 @@ class SimStatePreconstrainer(SimStatePlugin):
     :param constrained_addrs : SimActions for memory operations whose addresses should be constrained during crash analysis
     """
 
+    LAZY_COPY = True
+
     def __init__(self, constrained_addrs=None):
         SimStatePlugin.__init__(self)
 
@@ -2,8 +2,10 @@ import binascii
 import functools
 import time
 import logging
+from collections import OrderedDict
 
 from claripy import backend_manager
+from claripy.frontend_mixins.model_cache_mixin import ModelCache
 
 from .plugin import SimStatePlugin
 from .sim_action_object import ast_stripping_decorator, SimActionObject
@@ -27,6 +29,7 @@ def timed_function(f):
             the_solver = args[0] if the_solver is None else the_solver
             s = the_solver.state
 
+            hits, time_saved = global_solver_cache.hits, global_solver_cache.time_saved
             start = time.time()
             r = f(*args, **kwargs)
             end = time.time()
@@ -47,6 +50,10 @@ def timed_function(f):
                 l.error("Got exception while generating timer message:", exc_info=True)
                 location = "unknown"
             lt.log(int((end-start)*10), '%s took %s seconds at %s', f.__name__, round(duration, 2), location)
+            if global_solver_cache.hits > hits:
+                lt.log(1, '%s hit the global solver cache, saving %s seconds (hit rate %.2f, %s seconds saved in total)',
+                       f.__name__, round(global_solver_cache.time_saved - time_saved, 2), global_solver_cache.hit_rate,
+                       round(global_solver_cache.time_saved, 2))
 
             if break_time >= 0 and duration > break_time:
                 import ipdb; ipdb.set_trace()
@@ -166,6 +173,138 @@ def concrete_path_list(f):
             return [ v ]
     return concrete_shortcut_list
 
+#
+# Global solver cache
+#
+
+class SolverResultCache:
+    """
+    A process-wide bounded cache of solver results, shared by all states that enable the GLOBAL_SOLVER_CACHE option.
+
+    Results are keyed by the fingerprint of the constraints of the solver, the query, and the extra constraints, so that
+    sibling states that end up with the same constraints do not ask the same questions again. The models that a solver
+    has found for a constraint set are kept as well, and are used to answer eval() and satisfiable() queries with extra
+    constraints that these models satisfy.
+    """
+
+    def __init__(self, max_size=10000, max_models=8):
+        """
+        :param int max_size:    The maximum number of cached results and of constraint sets whose models are kept.
+        :param int max_models:  The maximum number of models kept per constraint set.
+        """
+        self.max_size = max_size
+        self.max_models = max_models
+
+        self._results = OrderedDict()
+        self._models = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.
+
+    def __repr__(self):
+        return "<SolverResultCache with %d results, hit rate %.2f>" % (len(self._results), self.hit_rate)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def clear(self):
+        """
+        Remove all cached results and models, and reset the statistics.
+        """
+        self._results.clear()
+        self._models.clear()
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.
+
+    @staticmethod
+    def fingerprint(constraints):
+        """
+        Get the fingerprint of a set of constraints, which does not depend on their order.
+
+        :param constraints: A list of constraints.
+        :return:            A hashable fingerprint.
+        """
+        return frozenset(hash(c) for c in constraints)
+
+    def query(self, key, fingerprint, compute, e=None, extra_constraints=()):
+        """
+        Answer a query from the cache, or compute and cache its result.
+
+        :param tuple key:           The key of the query, including the fingerprint of the constraints.
+        :param fingerprint:         The fingerprint of the constraints of the solver.
+        :param compute:             A function that takes no argument and computes the result of the query.
+        :param e:                   The expression to evaluate if the query is an eval() query with a single solution.
+                                    A cached model is only used to answer it if this is provided.
+        :param extra_constraints:   The extra constraints of an eval() or satisfiable() query.
+        :return:                    The result of the query.
+        """
+
+        entry = self._results.get(key, None)
+        if entry is not None:
+            self._results.move_to_end(key)
+            self.hits += 1
+            self.time_saved += entry[1]
+            return entry[0]
+
+        kind = key[0]
+        if kind in ('eval', 'satisfiable') and (kind == 'satisfiable' or e is not None):
+            r = self._query_models(fingerprint, e, extra_constraints, kind == 'satisfiable')
+            if r is not None:
+                self.hits += 1
+                return r
+
+        self.misses += 1
+        start = time.time()
+        r = compute()
+        self._store(key, (r, time.time() - start))
+        return r
+
+    def add_models(self, fingerprint, models):
+        """
+        Keep some models that satisfy a set of constraints.
+
+        :param fingerprint: The fingerprint of the constraints.
+        :param models:      An iterable of claripy ModelCache objects.
+        :return:            None
+        """
+
+        kept = self._models.get(fingerprint, None)
+        if kept is None:
+            kept = [ ]
+        for m in models:
+            if len(kept) >= self.max_models:
+                break
+            if m not in kept:
+                kept.append(m)
+        if kept:
+            self._models[fingerprint] = kept
+            self._models.move_to_end(fingerprint)
+            while len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+
+    def _query_models(self, fingerprint, e, extra_constraints, satisfiable):
+        for m in self._models.get(fingerprint, ()):
+            try:
+                if not m.eval_constraints(extra_constraints):
+                    continue
+                return True if satisfiable else (m.eval_ast(e), )
+            except claripy.ClaripyError:
+                continue
+        return None
+
+    def _store(self, key, entry):
+        self._results[key] = entry
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+
+global_solver_cache = SolverResultCache()
+
+
 #
 # The main event
 #
@@ -300,6 +439,53 @@ class SimSolver(SimStatePlugin):
 
         return self._stored_solver
 
+    def _cached_query(self, kind, compute, e=None, n=None, extra_constraints=(), exact=None):
+        """
+        Answer a query through the global solver cache if it is enabled.
+
+        :param str kind:            The kind of the query.
+        :param compute:             A function that takes no argument and computes the result of the query.
+        :param e:                   The expression in the query, or None.
+        :param int n:               The number of solutions in an eval() query, or None.
+        :param extra_constraints:   The adjusted extra constraints.
+        :param exact:               If False, approximate results are asked for.
+        :return:                    The result of the query.
+        """
+
+        if o.GLOBAL_SOLVER_CACHE not in self.state.options:
+            return compute()
+
+        solver = self._solver
+        fingerprint = global_solver_cache.fingerprint(solver.constraints)
+        key = (kind, type(solver), fingerprint, None if e is None else hash(e), n,
+               global_solver_cache.fingerprint(extra_constraints), exact)
+        r = global_solver_cache.query(key, fingerprint, compute, e=e if n == 1 else None,
+                                      extra_constraints=extra_constraints)
+
+        models = self._solver_models(solver)
+        if models:
+            global_solver_cache.add_models(fingerprint, models)
+        return r
+
+    @staticmethod
+    def _solver_models(solver):
+        """
+        Get the models that a claripy solver has found for its constraints.
+
+        :param solver:  The claripy solver.
+        :return:        A collection of claripy ModelCache objects.
+        """
+
+        models = getattr(solver, '_models', None)
+        if models is not None:
+            return models
+        if isinstance(solver, claripy.SolverComposite):
+            # a model of the composite solver combines one model of each child solver
+            child_models = [ getattr(child, '_models', None) for child in solver._solver_list ]
+            if child_models and all(child_models):
+                return [ ModelCache.combine(*(next(iter(m)) for m in child_models)) ]
+        return ()
+
     #
     # Get unconstrained stuff
     #
@@ -415,6 +601,29 @@ class SimSolver(SimStatePlugin):
     def copy(self, memo): # pylint: disable=unused-argument
         return type(self)(solver=self._solver.branch(), all_variables=self.all_variables, temporal_tracked_variables=self.temporal_tracked_variables, eternal_tracked_variables=self.eternal_tracked_variables)
 
+    def checkpoint(self):
+        """
+        Record the constraints and the tracked variables for SimState.checkpoint(), so that all changes made to them
+        afterwards can be undone with rollback().
+
+        :return: The checkpoint, which is only passed to rollback().
+        """
+        return self._solver.branch(), list(self.all_variables), dict(self.temporal_tracked_variables), \
+               dict(self.eternal_tracked_variables)
+
+    def rollback(self, checkpoint):
+        """
+        Undo all changes made to the constraints and the tracked variables since checkpoint(). A checkpoint may be
+        rolled back to any number of times.
+
+        :param checkpoint: The checkpoint returned by checkpoint().
+        """
+        solver, all_variables, temporal_tracked_variables, eternal_tracked_variables = checkpoint
+        self._stored_solver = solver.branch()
+        self.all_variables = list(all_variables)
+        self.temporal_tracked_variables = dict(temporal_tracked_variables)
+        self.eternal_tracked_variables = dict(eternal_tracked_variables)
+
     @error_converter
     def merge(self, others, merge_conditions, common_ancestor=None): # pylint: disable=W0613
         merging_occurred, self._stored_solver = self._solver.merge(
@@ -496,7 +705,10 @@ class SimSolver(SimStatePlugin):
         :return: a tuple of the solutions, in the form of Python primitives
         :rtype: tuple
         """
-        return self._solver.eval(e, n, extra_constraints=self._adjust_constraint_list(extra_constraints), exact=exact)
+        extra_constraints = self._adjust_constraint_list(extra_constraints)
+        return self._cached_query('eval',
+                                  lambda: self._solver.eval(e, n, extra_constraints=extra_constraints, exact=exact),
+                                  e=e, n=n, extra_constraints=extra_constraints, exact=exact)
 
     @concrete_path_scalar
     @timed_function
@@ -516,7 +728,9 @@ class SimSolver(SimStatePlugin):
             er = self._solver.max(e, extra_constraints=self._adjust_constraint_list(extra_constraints))
             assert er <= ar
             return ar
-        return self._solver.max(e, extra_constraints=self._adjust_constraint_list(extra_constraints), exact=exact)
+        extra_constraints = self._adjust_constraint_list(extra_constraints)
+        return self._cached_query('max', lambda: self._solver.max(e, extra_constraints=extra_constraints, exact=exact),
+                                  e=e, extra_constraints=extra_constraints, exact=exact)
 
     @concrete_path_scalar
     @timed_function
@@ -536,7 +750,9 @@ class SimSolver(SimStatePlugin):
             er = self._solver.min(e, extra_constraints=self._adjust_constraint_list(extra_constraints))
             assert ar <= er
             return ar
-        return self._solver.min(e, extra_constraints=self._adjust_constraint_list(extra_constraints), exact=exact)
+        extra_constraints = self._adjust_constraint_list(extra_constraints)
+        return self._cached_query('min', lambda: self._solver.min(e, extra_constraints=extra_constraints, exact=exact),
+                                  e=e, extra_constraints=extra_constraints, exact=exact)
 
     @timed_function
     @ast_stripping_decorator
@@ -637,7 +853,10 @@ class SimSolver(SimStatePlugin):
             if er is True:
                 assert ar is True
             return ar
-        return self._solver.satisfiable(extra_constraints=self._adjust_constraint_list(extra_constraints), exact=exact)
+        extra_constraints = self._adjust_constraint_list(extra_constraints)
+        return self._cached_query('satisfiable',
+                                  lambda: self._solver.satisfiable(extra_constraints=extra_constraints, exact=exact),
+                                  extra_constraints=extra_constraints, exact=exact)
 
     @timed_function
     @ast_stripping_decorator
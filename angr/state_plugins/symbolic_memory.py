@@ -83,6 +83,16 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
 
         return c
 
+    def checkpoint(self):
+        return self.mem.checkpoint(), [ s.copy() for s in self.read_strategies ], \
+               [ s.copy() for s in self.write_strategies ]
+
+    def rollback(self, checkpoint):
+        mem_checkpoint, read_strategies, write_strategies = checkpoint
+        self.mem.rollback(mem_checkpoint)
+        self.read_strategies = [ s.copy() for s in read_strategies ]
+        self.write_strategies = [ s.copy() for s in write_strategies ]
+
     #
     # Merging stuff
     #
@@ -611,6 +621,70 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
 
         return addrs, read_value, load_constraint
 
+    def load_concrete_bytes(self, addr, size, inspect=True, disable_actions=False):
+        if self.state.mode == 'static':
+            return None
+        if not isinstance(addr, int):
+            addr = _raw_ast(addr)
+            if addr.symbolic:
+                return None
+            addr = self.state.solver.eval(addr)
+        if self._is_observed('read', inspect=inspect, disable_actions=disable_actions):
+            return None
+        return self.mem.load_concrete(addr, size)
+
+    def _is_observed(self, access, inspect=True, disable_actions=False):
+        """
+        Check whether SimInspect breakpoints or SimActions would observe an access to this memory, in which case fast
+        paths that bypass load() and store() must not be taken.
+
+        :param str access:  Either 'read' or 'write'.
+        """
+        if inspect and self.state.supports_inspect and \
+                self.state.inspect._breakpoints[('reg_' if self.category == 'reg' else 'mem_') + access]:
+            return True
+        return not disable_actions and options.AUTO_REFS in self.state.options
+
+    def _find_concrete(self, start, what, max_search, step, disable_actions=False, inspect=True):
+        """
+        Search for a concrete value through the concrete bytes at the beginning of a memory range with bytes.find(),
+        without building any claripy expression.
+
+        :param start:                   The start address.
+        :param what:                    The concrete value to search for.
+        :param int max_search:          Search at most this many bytes.
+        :param int step:                The stride of the search.
+        :param bool disable_actions:    Whether the search would avoid creating SimActions.
+        :param bool inspect:            Whether the search would trigger SimInspect breakpoints.
+        :return:                        A tuple of the offset of the first match, or None if there is no match in the
+                                        concrete bytes, and the first offset that has not been searched.
+        """
+
+        needle = self.state.solver.eval(what, cast_to=bytes)
+        last_offset = max_search - len(needle)
+        if last_offset < 0:
+            return None, 0
+
+        size = min(0x100, max_search)
+        pos = 0
+        while True:
+            data = self.load_concrete_bytes(start, size, inspect=inspect, disable_actions=disable_actions)
+            if data is None:
+                return None, 0
+            pos = data.find(needle, pos)
+            while pos != -1 and pos % step != 0:
+                pos = data.find(needle, pos + 1)
+            if pos != -1:
+                return (pos, pos) if pos <= last_offset else (None, pos)
+            if len(data) < size or size == max_search:
+                break
+            # continue with the offsets that the current data cannot fully cover
+            pos = max(0, len(data) - len(needle) + 1)
+            size = min(size * 4, max_search)
+
+        searched = max(0, len(data) - len(needle) + 1)
+        return None, (searched + step - 1) // step * step
+
     def _find(self, start, what, max_search=None, max_symbolic_bytes=None, default=None, step=1,
               disable_actions=False, inspect=True, chunk_size=None):
         if max_search is None:
@@ -619,6 +693,17 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
         if isinstance(start, int):
             start = self.state.solver.BVV(start, self.state.arch.bits)
 
+        # fast path: search the concrete bytes at the beginning natively, and build symbolic conditions only from the
+        # first offset that they do not cover
+        first_offset = 0
+        if self.state.mode != 'static' and not self.state.solver.symbolic(what) and \
+                len(what) % self.state.arch.byte_width == 0:
+            match, first_offset = self._find_concrete(start, what, max_search, step, disable_actions=disable_actions,
+                                                      inspect=inspect)
+            if match is not None:
+                l.debug("... found concrete at offset %d", match)
+                return start + match, [ ], [ match ]
+
         constraints = [ ]
         remaining_symbolic = max_symbolic_bytes
         seek_size = len(what)//self.state.arch.byte_width
@@ -626,11 +711,11 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
 
         l.debug("Search for %d bytes in a max of %d...", seek_size, max_search)
 
-        chunk_start = 0
+        chunk_start = first_offset
         if chunk_size is None:
             chunk_size = max(0x100, seek_size + 0x80)
 
-        chunk = self.load(start, chunk_size, endness="Iend_BE",
+        chunk = self.load(start + chunk_start, chunk_size, endness="Iend_BE",
                           disable_actions=disable_actions, inspect=inspect)
 
         cases = [ ]
@@ -645,7 +730,7 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
         else:
             cond_falseness_test = lambda cond: cond.is_false()
 
-        for i in itertools.count(step=step):
+        for i in itertools.count(start=first_offset, step=step):
             l.debug("... checking offset %d", i)
             if i > max_search - seek_size:
                 l.debug("... hit max size")
@@ -1241,7 +1326,7 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
             print("%s..." % (" " * indent))
 
     def _copy_contents(self, dst, src, size, condition=None, src_memory=None, dst_memory=None, inspect=True,
-                      disable_actions=False):
+                      disable_actions=False, return_data=True):
         src_memory = self if src_memory is None else src_memory
         dst_memory = self if dst_memory is None else dst_memory
 
@@ -1249,9 +1334,32 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
         if max_size == 0:
             return None, [ ]
 
+        # fast path: move the contents between pages directly
+        if not self.state.solver.symbolic(size) and \
+                self._can_copy_directly(dst, src, condition, src_memory, dst_memory, inspect, disable_actions):
+            dst, src = self.state.solver.eval(dst), self.state.solver.eval(src)
+            if dst_memory.mem.copy_contents(dst, src, max_size, src_memory=src_memory.mem):
+                if dst_memory.category == 'mem':
+                    dst_memory.state.scratch.dirty_addrs.update(range(dst, dst + max_size))
+                if not return_data:
+                    return None
+                # the destination now holds what the source held before the copy
+                return dst_memory.load(dst, max_size, inspect=False, disable_actions=True)
+
         data = src_memory.load(src, max_size, inspect=inspect, disable_actions=disable_actions)
         dst_memory.store(dst, data, size=size, condition=condition, inspect=inspect, disable_actions=disable_actions)
-        return data
+        return data if return_data else None
+
+    def _can_copy_directly(self, dst, src, condition, src_memory, dst_memory, inspect, disable_actions):
+        if self.state.mode == 'static' or self.state.solver.symbolic(dst) or self.state.solver.symbolic(src):
+            return False
+        if condition is not None and not self.state.solver.is_true(condition):
+            return False
+        if not isinstance(src_memory, SimSymbolicMemory) or not isinstance(dst_memory, SimSymbolicMemory) or \
+                src_memory.endness != dst_memory.endness:
+            return False
+        return not src_memory._is_observed('read', inspect=inspect, disable_actions=disable_actions) and \
+               not dst_memory._is_observed('write', inspect=inspect, disable_actions=disable_actions)
 
     #
     # Things that are actually handled by SimPagedMemory
@@ -1376,4 +1484,5 @@ SimState.register_default('sym_memory', SimSymbolicMemory)
 from ..errors import SimUnsatError, SimMemoryError, SimMemoryLimitError, SimMemoryAddressError, SimMergeError
 from .. import sim_options as options
 from .inspect import BP_AFTER, BP_BEFORE
+from .sim_action_object import _raw_ast
 from .. import concretization_strategies
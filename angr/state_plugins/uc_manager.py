@@ -6,6 +6,8 @@ from .plugin import SimStatePlugin
 from ..errors import SimUCManagerAllocationError
 
 class SimUCManager(SimStatePlugin):
+    LAZY_COPY = True
+
     def __init__(self, man=None):
 
         SimStatePlugin.__init__(self)
@@ -1,6 +1,7 @@
 import os
 import sys
 import copy
+import array
 import ctypes
 import threading
 import itertools
@@ -10,6 +11,7 @@ import pyvex
 import claripy
 import time
 import binascii
+from collections import OrderedDict
 
 from ..sim_options import UNICORN_HANDLE_TRANSMIT_SYSCALL
 from ..errors import SimValueError, SimUnicornUnsupport, SimSegfaultError, SimMemoryError, SimMemoryMissingError, SimUnicornError
@@ -55,6 +57,8 @@ class STOP:  # stop_t
     STOP_ZERO_DIV       = 10
     STOP_NODECODE       = 11
     STOP_HLT            = 12
+    STOP_TRACE_DIVERGED = 13
+    STOP_TRACE_END      = 14
 
     @staticmethod
     def name_stop(num):
@@ -92,11 +96,14 @@ class AggressiveConcretizationAnnotation(claripy.SimplificationAvoidanceAnnotati
         self.unicorn_start_addr = addr
 
 #
-# Because Unicorn leaks like crazy, we use one Uc object per thread...
+# Because Unicorn leaks like crazy, we use a small pool of Uc objects per thread...
 #
 
 _unicounter = itertools.count()
 
+# the number of Uc objects that are kept per thread
+UC_POOL_SIZE = 4
+
 class Uniwrapper(unicorn.Uc if unicorn is not None else object):
     # pylint: disable=non-parent-init-called
     def __init__(self, arch, cache_key):
@@ -105,6 +112,9 @@ class Uniwrapper(unicorn.Uc if unicorn is not None else object):
         self.cache_key = cache_key
         self.wrapped_mapped = set()
         self.wrapped_hooks = set()
+        # regions that stay mapped between runs, mapped to the versions and permissions of their pages in the memory of
+        # the state that last ran on this object. see Unicorn._resident_key().
+        self.resident = { }
         self.id = None
         unicorn.Uc.__init__(self, arch.uc_arch, arch.uc_mode)
 
@@ -130,14 +140,21 @@ class Uniwrapper(unicorn.Uc if unicorn is not None else object):
         #l.debug("Unmapping %d bytes at %#x", size, addr)
         m = unicorn.Uc.mem_unmap(self, addr, size)
         self.wrapped_mapped.discard((addr, size))
+        self.resident.pop((addr, size), None)
         return m
 
-    def mem_reset(self):
+    def mem_reset(self, keep_resident=False):
         #l.debug("Resetting memory.")
         for addr,size in self.wrapped_mapped:
+            if keep_resident and (addr, size) in self.resident:
+                continue
             #l.debug("Unmapping %d bytes at %#x", size, addr)
             unicorn.Uc.mem_unmap(self, addr, size)
-        self.wrapped_mapped.clear()
+        if keep_resident:
+            self.wrapped_mapped.intersection_update(self.resident)
+        else:
+            self.wrapped_mapped.clear()
+            self.resident.clear()
 
     def hook_reset(self):
         #l.debug("Resetting hooks.")
@@ -146,13 +163,12 @@ class Uniwrapper(unicorn.Uc if unicorn is not None else object):
             unicorn.Uc.hook_del(self, h)
         self.wrapped_hooks.clear()
 
-    def reset(self):
-        self.mem_reset()
+    def reset(self, keep_resident=False):
+        self.mem_reset(keep_resident=keep_resident)
         #self.hook_reset()
         #l.debug("Reset complete.")
 
 _unicorn_tls = threading.local()
-_unicorn_tls.uc = None
 
 class _VexCacheInfo(ctypes.Structure):
     _fields_ = [
@@ -234,6 +250,8 @@ def _load_native():
         _setup_prototype(h, 'set_tracking', None, state_t, ctypes.c_bool, ctypes.c_bool)
         _setup_prototype(h, 'executed_pages', ctypes.c_uint64, state_t)
         _setup_prototype(h, 'in_cache', ctypes.c_bool, state_t, ctypes.c_uint64)
+        _setup_prototype(h, 'set_trace', None, state_t, ctypes.POINTER(ctypes.c_uint64), ctypes.c_uint64, ctypes.c_uint64)
+        _setup_prototype(h, 'trace_idx', ctypes.c_uint64, state_t)
 
         l.info('native plugin is enabled')
 
@@ -249,11 +267,30 @@ except ImportError:
     _UC_NATIVE = None
 
 
+def _uint64_array(ptr, count):
+    """
+    Copy a native array of uint64_t into an array('Q') with a single memmove, without going through Python ints. The
+    native memory belongs to the unicorn state, and is freed when the state is destroyed.
+
+    :param ptr:         A ctypes pointer to the first element.
+    :param int count:   The number of elements.
+    :return:            The elements.
+    :rtype:             array.array
+    """
+
+    arr = array.array('Q', (0, )) * count
+    if count:
+        ctypes.memmove(arr.buffer_info()[0], ptr, count * arr.itemsize)
+    return arr
+
+
 class Unicorn(SimStatePlugin):
     '''
     setup the unicorn engine for a state
     '''
 
+    LAZY_COPY = True
+
     UC_CONFIG = {} # config cache for each arch
 
     def __init__(
@@ -309,7 +346,11 @@ class Unicorn(SimStatePlugin):
         self.max_steps = max_steps
 
         self.steps = 0
+        # the number of trace entries that the executed blocks followed, see set_trace()
+        self.trace_idx = 0
         self._mapped = 0
+        # whether the memory of the state has been synchronized with the resident regions after the last run
+        self._resident_synced = False
         self._uncache_regions = []
         self.gdt = None
 
@@ -462,7 +503,6 @@ class Unicorn(SimStatePlugin):
         self._unicount = next(_unicounter)
         self._uc_state = None
         self.cache_key = hash(self)
-        _unicorn_tls.uc = None
 
     def set_state(self, state):
         SimStatePlugin.set_state(self, state)
@@ -473,34 +513,49 @@ class Unicorn(SimStatePlugin):
     def _reuse_unicorn(self):
         return not self._is_mips32
 
+    @staticmethod
+    def _uc_pool():
+        pool = getattr(_unicorn_tls, 'pool', None)
+        if pool is None:
+            pool = _unicorn_tls.pool = OrderedDict()
+        return pool
+
     @property
     def uc(self):
+        """
+        The Uc object of the current thread for the architecture and the cache key of this state.
+
+        Uc objects are kept in a pool, so that alternating between states of different projects or architectures does
+        not create new ones. Memory regions that only hold concrete data stay mapped between runs, and are only
+        remapped when the pages of the state differ from those that were mapped, see _validate_resident().
+        """
         new_id = next(_unicounter)
 
-        if (
-            not hasattr(_unicorn_tls, "uc") or
-            _unicorn_tls.uc is None or
-            _unicorn_tls.uc.arch != self.state.arch or
-            _unicorn_tls.uc.cache_key != self.cache_key
-        ):
-            _unicorn_tls.uc = Uniwrapper(self.state.arch, self.cache_key)
-        elif _unicorn_tls.uc.id != self._unicount:
-            if not self._reuse_unicorn:
-                _unicorn_tls.uc = Uniwrapper(self.state.arch, self.cache_key)
+        pool = self._uc_pool()
+        key = (self.state.arch, self.cache_key)
+        uc = pool.get(key, None)
+        if uc is None:
+            uc = pool[key] = Uniwrapper(self.state.arch, self.cache_key)
+            if len(pool) > UC_POOL_SIZE:
+                pool.popitem(last=False)
+        else:
+            pool.move_to_end(key)
+            if uc.id != self._unicount:
+                if not self._reuse_unicorn:
+                    uc = pool[key] = Uniwrapper(self.state.arch, self.cache_key)
+                else:
+                    #l.debug("Reusing unicorn state!")
+                    uc.reset(keep_resident=True)
             else:
                 #l.debug("Reusing unicorn state!")
-                _unicorn_tls.uc.reset()
-        else:
-            #l.debug("Reusing unicorn state!")
-            pass
+                pass
 
-        _unicorn_tls.uc.id = new_id
+        uc.id = new_id
         self._unicount = new_id
-        return _unicorn_tls.uc
+        return uc
 
-    @staticmethod
-    def delete_uc():
-        _unicorn_tls.uc = None
+    def delete_uc(self):
+        self._uc_pool().pop((self.state.arch, self.cache_key), None)
 
     @property
     def _uc_regs(self):
@@ -527,6 +582,21 @@ class Unicorn(SimStatePlugin):
     def set_tracking(self, track_bbls, track_stack):
         _UC_NATIVE.set_tracking(self._uc_state, track_bbls, track_stack)
 
+    def set_trace(self, entries, slide):
+        """
+        Check each block against a concrete trace before it is executed. Emulation stops before the first block that
+        does not follow the trace, and after the last entry of the trace. The number of entries that were followed is
+        in trace_idx after finish().
+
+        :param entries:     A writable buffer of uint64 trace entries in native byte order, the first of which is the
+                            address that emulation starts at, plus the slide.
+        :param int slide:   The difference between the addresses in the trace and the addresses in the state.
+        :return:            A ctypes array over the entries, which must be kept alive until emulation has finished.
+        """
+        entries = (ctypes.c_uint64 * len(entries)).from_buffer(entries)
+        _UC_NATIVE.set_trace(self._uc_state, entries, len(entries), slide & 0xffffffffffffffff)
+        return entries
+
     def hook(self):
         #l.debug('adding native hooks')
         _UC_NATIVE.hook(self._uc_state) # prefer to use native hooks
@@ -770,13 +840,7 @@ class Unicorn(SimStatePlugin):
         while addr < end_addr:
 
             try:
-                perm = self.state.memory.permissions(addr)
-                if perm.symbolic:
-                    perms.add(7)
-                elif options.ENABLE_NX not in self.state.options:
-                    perms.add(perm.args[0] | 4)
-                else:
-                    perms.add(perm.args[0])
+                perms.add(self._concrete_perm(self.state.memory.permissions(addr)))
             except SimMemoryMissingError:
                 missing_pages.append(addr)
 
@@ -815,6 +879,8 @@ class Unicorn(SimStatePlugin):
 
         data = bytearray(length)
         taint = [ ] # this is a list to reference a nonlocal variable. we're using the list like an Option<c array>
+        # whether the data only depends on concrete bytes in memory, and not on symbolic values or state options
+        concrete = True
 
         def _taint(pos, chunk_size):
             if not taint:
@@ -823,6 +889,8 @@ class Unicorn(SimStatePlugin):
             ctypes.memset(offset, 0x2, chunk_size) # mark them as TAINT_SYMBOLIC
 
         def _missing(pos, chunk_size, data=data):
+            nonlocal concrete
+            concrete = False
             if options.CGC_ZERO_FILL_UNCONSTRAINED_MEMORY not in self.state.options:
                 _taint(pos, chunk_size)
             else:
@@ -842,6 +910,7 @@ class Unicorn(SimStatePlugin):
             if mo.is_bytes:
                 data[mo_addr - start : mo_addr - start + chunk_size] = chunk
             else:
+                concrete = concrete and not chunk.symbolic
                 d = self._process_value(chunk, 'mem')
                 if d is None:
                     #print "TAINT: %x, %d" % (mo_addr, chunk_size)
@@ -870,8 +939,57 @@ class Unicorn(SimStatePlugin):
             uc.mem_write(start, bytes(data))
             self._mapped += 1
             _UC_NATIVE.activate(self._uc_state, start, length, taint[0] if taint else None)
+            if concrete:
+                # keep the region mapped for the next states, as long as their pages do not change
+                key = self._resident_key(start, length)
+                if key is not None:
+                    uc.resident[(start, length)] = key
             return True
 
+    def _concrete_perm(self, perm):
+        """
+        Get the permissions that a page is mapped with in unicorn.
+
+        :param perm:    The permissions of the page in memory, as an AST.
+        :return:        The permissions.
+        :rtype:         int
+        """
+        if perm.symbolic:
+            return 7
+        elif options.ENABLE_NX not in self.state.options:
+            return perm.args[0] | 4
+        else:
+            return perm.args[0]
+
+    def _resident_key(self, start, length):
+        """
+        Get the versions and permissions of the pages of a region in the memory of the state. A region that is mapped in
+        unicorn holds the data of the state as long as these do not change.
+
+        :param int start:   The start of the region.
+        :param int length:  The length of the region.
+        :return:            A tuple of (version, permissions) of each page, or None if any page is not in memory yet.
+        """
+        mem = self.state.memory.mem
+        pages = mem._pages
+        key = [ ]
+        for page_num in range(start // mem._page_size, (start + length + mem._page_size - 1) // mem._page_size):
+            page = pages.get(page_num, None)
+            if page is None:
+                return None
+            key.append((page.version, self._concrete_perm(page.permissions)))
+        return tuple(key)
+
+    def _validate_resident(self):
+        """
+        Unmap the regions that were left mapped by earlier runs, but whose pages have changed since, or differ in the
+        memory of this state.
+        """
+        uc = self.uc
+        for region, key in list(uc.resident.items()):
+            if self._resident_key(*region) != key:
+                uc.mem_unmap(*region)
+
     def uncache_region(self, addr, length):
         self._uncache_regions.append((addr, length))
 
@@ -897,6 +1015,8 @@ class Unicorn(SimStatePlugin):
             # options. this is to avoid some weird bugs in unicorn (e.g., it reports stepping 1 step while in reality it
             # did not step at all).
             self.delete_uc()
+        self._resident_synced = False
+        self._validate_resident()
         self._setup_unicorn()
         try:
             self.set_regs()
@@ -907,6 +1027,10 @@ class Unicorn(SimStatePlugin):
         # tricky: using unicorn handle from unicorn.Uc object
         self._uc_state = _UC_NATIVE.alloc(self.uc._uch, self.cache_key)
 
+        # resident regions are mapped already, so they must be activated here for writes to them to be synchronized
+        for start, length in self.uc.resident:
+            _UC_NATIVE.activate(self._uc_state, start, length, None)
+
         # set (cgc, for now) transmit syscall handler
         if UNICORN_HANDLE_TRANSMIT_SYSCALL in self.state.options and self.state.has_plugin('cgc'):
             if self.transmit_addr is None:
@@ -979,6 +1103,7 @@ class Unicorn(SimStatePlugin):
         self.get_regs()
         self.steps = _UC_NATIVE.step(self._uc_state)
         self.stop_reason = _UC_NATIVE.stop_reason(self._uc_state)
+        self.trace_idx = _UC_NATIVE.trace_idx(self._uc_state)
 
         # figure out why we stopped
         if self.stop_reason == STOP.STOP_SYMBOLIC_REG:
@@ -1018,6 +1143,16 @@ class Unicorn(SimStatePlugin):
 
         _UC_NATIVE.destroy(head)    # free the linked list
 
+        # the memory of the state holds the same data as the resident regions again
+        uc = self.uc
+        for region in list(uc.resident):
+            key = self._resident_key(*region)
+            if key is None:
+                uc.mem_unmap(*region)
+            else:
+                uc.resident[region] = key
+        self._resident_synced = True
+
         # adjust the countdowns
         #if self.steps >= 128:
         #   self.cooldown_symbolic_registers = 16
@@ -1036,7 +1171,7 @@ class Unicorn(SimStatePlugin):
             stdout.write_data(string)
             i += 1
 
-        if self.stop_reason in (STOP.STOP_NORMAL, STOP.STOP_SYSCALL):
+        if self.stop_reason in (STOP.STOP_NORMAL, STOP.STOP_SYSCALL, STOP.STOP_TRACE_DIVERGED, STOP.STOP_TRACE_END):
             self.countdown_nonunicorn_blocks = 0
         elif self.stop_reason == STOP.STOP_STOPPOINT:
             self.countdown_nonunicorn_blocks = 0
@@ -1072,15 +1207,14 @@ class Unicorn(SimStatePlugin):
 
         # get the address list out of the state
         if options.UNICORN_TRACK_BBL_ADDRS in self.state.options:
-            bbl_addrs = _UC_NATIVE.bbl_addrs(self._uc_state)
-            #bbl_addr_count = _UC_NATIVE.bbl_addr_count(self._uc_state)
-            # why is bbl_addr_count unused?
-            if self.steps:
-                self.state.history.recent_bbl_addrs = bbl_addrs[:self.steps]
+            # blocks that were rolled back are popped from the list, so there may be fewer addresses than steps
+            count = min(self.steps, _UC_NATIVE.bbl_addr_count(self._uc_state))
+            if count:
+                self.state.history.recent_bbl_addrs = _uint64_array(_UC_NATIVE.bbl_addrs(self._uc_state), count)
         # get the stack pointers
         if options.UNICORN_TRACK_STACK_POINTERS in self.state.options:
-            stack_pointers = _UC_NATIVE.stack_pointers(self._uc_state)
-            self.state.scratch.stack_pointer_list = stack_pointers[:self.steps]
+            self.state.scratch.stack_pointer_list = _uint64_array(_UC_NATIVE.stack_pointers(self._uc_state),
+                                                                  self.steps)
         # syscall counts
         self.state.history.recent_syscall_count = _UC_NATIVE.syscall_count(self._uc_state)
         # executed page set
@@ -1102,11 +1236,13 @@ class Unicorn(SimStatePlugin):
 
         # there's something we're not properly resetting for syscalls, so
         # we'll clear the state when they happen
-        if self.stop_reason not in (STOP.STOP_NORMAL, STOP.STOP_STOPPOINT, STOP.STOP_SYMBOLIC_MEM, STOP.STOP_SYMBOLIC_REG):
+        if self.stop_reason not in (STOP.STOP_NORMAL, STOP.STOP_STOPPOINT, STOP.STOP_SYMBOLIC_MEM, STOP.STOP_SYMBOLIC_REG,
+                                    STOP.STOP_TRACE_DIVERGED, STOP.STOP_TRACE_END):
             self.delete_uc()
 
         #l.debug("Resetting the unicorn state.")
-        self.uc.reset()
+        # if the run failed, resident regions may hold data that has not been synchronized with the memory of the state
+        self.uc.reset(keep_resident=self._resident_synced)
 
     def set_regs(self):
         ''' setting unicorn registers '''
@@ -0,0 +1,368 @@
+import io
+import sys
+import uuid
+import struct
+import pickle
+import hashlib
+import weakref
+import zlib
+import logging
+
+import claripy
+import cle
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+l = logging.getLogger(name=__name__)
+
+
+def _persistent(*pid):
+    """
+    Stands in for a shared object in pickles. It is replaced with _StateUnpickler.persistent_load() when loading them.
+    """
+    raise AngrVaultError("Shared objects of a serialized state can only be loaded with a StateSerializer.")
+
+
+class _StatePickler(pickle.Pickler):
+    """
+    A pickler that hands shared objects over to a StateSerializer.
+
+    On Python 3.8 and later, shared objects are replaced in reducer_override(), which, unlike persistent_id(), is not
+    called for the many ints, strings, and tuples in a state.
+    """
+
+    def __init__(self, serializer, file, root=None, held=None, inline_asts=False):
+        """
+        :param StateSerializer serializer:  The serializer.
+        :param file:                        The file to write to.
+        :param root:                        The object that is being stored in the pool, which is pickled inline.
+        :param dict held:                   Maps IDs of plugins that are serialized separately to their names.
+        :param bool inline_asts:            Whether ASTs are pickled inline.
+        """
+
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.serializer = serializer
+        self.root = root
+        self.held = { } if held is None else held
+        self.inline_asts = inline_asts
+
+    def _persistent_id(self, obj):
+        if obj is self.root:
+            return None
+        if id(obj) in self.held:
+            return 'plugin', self.held[id(obj)]
+        handler = self.serializer._handlers.get(type(obj), None)
+        if handler is None:
+            return None
+        return handler(obj, self)
+
+    if sys.version_info >= (3, 8):
+        def reducer_override(self, obj):
+            pid = self._persistent_id(obj)
+            return NotImplemented if pid is None else (_persistent, pid)
+    else:
+        def persistent_id(self, obj):
+            return self._persistent_id(obj)
+
+
+class _StateUnpickler(pickle.Unpickler):
+    """
+    An unpickler that loads shared objects through a StateSerializer.
+    """
+
+    def __init__(self, serializer, file, project, plugins=None):
+        """
+        :param StateSerializer serializer:  The serializer.
+        :param file:                        The file to read from.
+        :param project:                     The project that loaded states belong to.
+        :param dict plugins:                The plugins that were serialized separately, or None to skip them.
+        """
+
+        super().__init__(file)
+        self.serializer = serializer
+        self.project = project
+        self.plugins = plugins
+
+    def persistent_load(self, pid):
+        return self.serializer._persistent_load(pid, self)
+
+    def find_class(self, module, name):
+        if module == __name__ and name == '_persistent':
+            return lambda *pid: self.persistent_load(pid)
+        return super().find_class(module, name)
+
+
+class StateSerializer:
+    """
+    A compact serializer for SimStates, meant for storing large numbers of related states.
+
+    Objects that are shared between states are stored only once, in a pool that is shared between all states that are
+    serialized with the same serializer:
+
+    - claripy ASTs are stored by their hashes.
+    - Memory pages are stored by the hashes of their contents. Pages are made copy-on-write when they are serialized,
+      so that unchanged pages of later states are recognized without serializing them again.
+    - Memory backers other than the memory of the project's loader are stored once.
+
+    The project is never serialized. It is replaced with the project that is passed upon loading, or the project of
+    the latest serialized state. Serialized states and pooled objects are compressed, with lz4 if it is installed and
+    zlib otherwise.
+
+    The memory of a state is serialized separately from the other plugins, so that a state can be loaded without its
+    memory, e.g., to look at its history or its registers.
+
+    :ivar store:    The pool of shared objects, a mapping from string keys to bytes.
+    :ivar project:  The project that loaded states belong to.
+    """
+
+    MAGIC = b'ANGRSTAT'
+    VERSION = 1
+
+    CODEC_NONE = 0
+    CODEC_ZLIB = 1
+    CODEC_LZ4 = 2
+
+    # plugins that are serialized separately, and skipped when a state is loaded without its memory
+    MEMORY_PLUGINS = ('memory', 'memory_soot', 'memory_vex')
+
+    _HEADER = struct.Struct('<BII')
+
+    def __init__(self, store=None, project=None, codec=None, compression_level=1):
+        """
+        :param store:               A mapping from string keys to bytes to keep the pool of shared objects in, e.g., a
+                                    shelve.Shelf. A new dict by default.
+        :param angr.Project project: The project that loaded states belong to.
+        :param int codec:           The compression codec, one of the CODEC_* constants. lz4 if it is installed and
+                                    zlib otherwise by default.
+        :param int compression_level: The zlib compression level.
+        """
+
+        self.store = { } if store is None else store
+        self.project = project
+        if codec is None:
+            codec = self.CODEC_ZLIB if lz4 is None else self.CODEC_LZ4
+        if codec == self.CODEC_LZ4 and lz4 is None:
+            raise ImportError("Cannot import lz4. Please install lz4 to use the lz4 codec.")
+        self.codec = codec
+        self.compression_level = compression_level
+
+        # keys of pooled objects that are known to be in the store
+        self._stored = set()
+        # pooled objects that have been loaded, by their keys
+        self._loaded = weakref.WeakValueDictionary()
+        # the keys of pages and other pooled objects that have been stored or loaded
+        self._keys = weakref.WeakKeyDictionary()
+
+        self._handlers = {
+            SimPagedMemory: self._memory_pid,
+            ConcretePage: self._page_pid,
+            TreePage: self._page_pid,
+            ListPage: self._page_pid,
+            cle.Clemory: self._backer_pid,
+            Project: self._project_pid,
+        }
+        for cls in (claripy.ast.BV, claripy.ast.Bool, claripy.ast.FP, claripy.ast.Int, claripy.ast.Bits):
+            self._handlers[cls] = self._ast_pid
+
+    #
+    # Public methods
+    #
+
+    def dumps(self, state):
+        """
+        Serialize a state.
+
+        :param SimState state:  The state.
+        :return:                The serialized state.
+        :rtype:                 bytes
+        """
+
+        if state.project is not None:
+            self.project = state.project
+
+        memory = dict((name, plugin) for name, plugin in state.plugins.items() if name in self.MEMORY_PLUGINS)
+        held = dict((id(plugin), name) for name, plugin in memory.items())
+        main = self._compress(self._pickle(state, held=held))
+        mem = self._compress(self._pickle(memory))
+        return b''.join((self.MAGIC, self._HEADER.pack(self.VERSION, len(main), len(mem)), main, mem))
+
+    def loads(self, data, project=None, memory=True):
+        """
+        Load a serialized state.
+
+        :param bytes data:          The serialized state.
+        :param angr.Project project: The project that the state belongs to. The project of the serializer by default.
+        :param bool memory:         Whether to load the memory of the state. The memory plugins are missing from the
+                                    state otherwise.
+        :return:                    The state.
+        :rtype:                     SimState
+        """
+
+        if project is None:
+            project = self.project
+
+        view = memoryview(data)
+        if bytes(view[:len(self.MAGIC)]) != self.MAGIC:
+            raise AngrVaultError("The data does not hold a serialized state.")
+        version, main_size, mem_size = self._HEADER.unpack_from(view, len(self.MAGIC))
+        if version != self.VERSION:
+            raise AngrVaultError("Unsupported version %d of the serialized state format." % version)
+        main_start = len(self.MAGIC) + self._HEADER.size
+
+        if memory:
+            mem_start = main_start + main_size
+            plugins = self._unpickle(self._decompress(view[mem_start:mem_start + mem_size]), project)
+        else:
+            plugins = None
+        state = self._unpickle(self._decompress(view[main_start:main_start + main_size]), project,
+                               plugins=plugins)
+        if not memory:
+            for name in self.MEMORY_PLUGINS:
+                if name in state._active_plugins:
+                    state.release_plugin(name)
+        return state
+
+    def store_state(self, state):
+        """
+        Serialize a state into the store.
+
+        :param SimState state:  The state.
+        :return:                The key of the state in the store.
+        :rtype:                 str
+        """
+
+        key = 'state-' + uuid.uuid4().hex
+        self.store[key] = self.dumps(state)
+        return key
+
+    def load_state(self, key, project=None, memory=True, remove=False):
+        """
+        Load a state from the store.
+
+        :param str key:             The key of the state, as returned by store_state().
+        :param angr.Project project: The project that the state belongs to.
+        :param bool memory:         Whether to load the memory of the state.
+        :param bool remove:         Whether to remove the state from the store. Pooled objects are kept.
+        :return:                    The state.
+        :rtype:                     SimState
+        """
+
+        state = self.loads(self.store[key], project=project, memory=memory)
+        if remove:
+            del self.store[key]
+        return state
+
+    #
+    # Pickling
+    #
+
+    def _pickle(self, obj, root=None, held=None, inline_asts=False):
+        f = io.BytesIO()
+        _StatePickler(self, f, root=root, held=held, inline_asts=inline_asts).dump(obj)
+        return f.getvalue()
+
+    def _unpickle(self, data, project, plugins=None):
+        return _StateUnpickler(self, io.BytesIO(data), project, plugins=plugins).load()
+
+    def _pool(self, key, obj, data):
+        if key not in self._stored:
+            if key not in self.store:
+                self.store[key] = self._compress(data)
+            self._stored.add(key)
+        self._loaded[key] = obj
+
+    def _ast_pid(self, ast, pickler):
+        # leaves are smaller than references to them
+        if pickler.inline_asts or ast.depth == 1:
+            return None
+        key = 'ast-%x' % ast._hash
+        if key not in self._stored:
+            self._pool(key, ast, self._pickle(ast, root=ast, inline_asts=True))
+        return 'pool', key
+
+    def _page_pid(self, page, pickler):  # pylint:disable=unused-argument
+        key = self._keys.get(page, None)
+        if key is None:
+            data = self._pickle(page, root=page)
+            key = 'page-' + hashlib.blake2b(data, digest_size=16).hexdigest()
+            self._pool(key, page, data)
+            self._keys[page] = key
+        return 'pool', key
+
+    def _backer_pid(self, backer, pickler):  # pylint:disable=unused-argument
+        if self.project is not None and backer is self.project.loader.memory:
+            return 'loader_memory',
+        key = self._keys.get(backer, None)
+        if key is None:
+            key = 'backer-' + uuid.uuid4().hex
+            self._pool(key, backer, self._pickle(backer, root=backer))
+            self._keys[backer] = key
+        return 'pool', key
+
+    def _memory_pid(self, memory, pickler):  # pylint:disable=unused-argument
+        # pages must not be written to in place anymore, so that their keys remain valid
+        memory.freeze_pages()
+
+    def _project_pid(self, project, pickler):  # pylint:disable=unused-argument,no-self-use
+        return 'project',
+
+    def _persistent_load(self, pid, unpickler):
+        kind = pid[0]
+        if kind == 'pool':
+            key = pid[1]
+            try:
+                return self._loaded[key]
+            except KeyError:
+                pass
+            obj = self._unpickle(self._decompress(self.store[key]), unpickler.project)
+            self._loaded[key] = obj
+            self._stored.add(key)
+            if not key.startswith('ast-'):
+                self._keys[obj] = key
+            return obj
+        elif kind == 'project':
+            return unpickler.project
+        elif kind == 'loader_memory':
+            if unpickler.project is None:
+                raise AngrVaultError("Cannot load a state that refers to the memory of a loader without a project.")
+            return unpickler.project.loader.memory
+        elif kind == 'plugin':
+            if unpickler.plugins is None:
+                # a stand-in for a plugin that is not loaded. it is released right after the state is loaded.
+                return SimStatePlugin()
+            return unpickler.plugins[pid[1]]
+        else:
+            raise AngrVaultError("Unknown persistent ID %s." % (pid,))
+
+    #
+    # Compression
+    #
+
+    # compressed data starts with the codec that it is compressed with
+
+    def _compress(self, data):
+        if self.codec == self.CODEC_LZ4:
+            data = lz4.frame.compress(data)
+        elif self.codec == self.CODEC_ZLIB:
+            data = zlib.compress(data, self.compression_level)
+        return bytes((self.codec, )) + data
+
+    @classmethod
+    def _decompress(cls, data):
+        codec, data = data[0], memoryview(data)[1:]
+        if codec == cls.CODEC_LZ4:
+            if lz4 is None:
+                raise ImportError("Cannot import lz4. Please install lz4 to load states that are compressed with lz4.")
+            return lz4.frame.decompress(data)
+        elif codec == cls.CODEC_ZLIB:
+            return zlib.decompress(data)
+        return bytes(data)
+
+
+from .errors import AngrVaultError
+from .project import Project
+from .state_plugins.plugin import SimStatePlugin
+from .storage.paged_memory import SimPagedMemory, ConcretePage, TreePage, ListPage
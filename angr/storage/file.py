@@ -746,6 +746,30 @@ class SimFileDescriptorBase(SimStatePlugin):
         """
         raise NotImplementedError
 
+    def _copy_from_file(self, simfile, file_pos, pos, size):
+        """
+        Copy data from a plain SimFile into memory directly, without loading it first. This is only done if the read
+        cannot run into the end of the file, and the caller is responsible for advancing its position in the file.
+
+        :param simfile:     The SimFile to read from.
+        :param file_pos:    The position in the file to read from.
+        :param pos:         The address to write the read data into memory.
+        :param size:        The length of the read.
+        :return:            True if the data was copied, False if the read should be performed normally.
+        :rtype:             bool
+        """
+        if type(simfile) is not SimFile or self.state.solver.symbolic(size) or \
+                self.state.solver.symbolic(file_pos) or self.state.solver.symbolic(simfile.size):
+            return False
+        start = self.state.solver.eval(file_pos)
+        length = self.state.solver.eval(size)
+        if start + length > self.state.solver.eval(simfile.size):
+            return False
+        if length:
+            self.state.memory.copy_contents(pos, start, self.state.solver.BVV(length, self.state.arch.bits),
+                                            src_memory=simfile, return_data=False)
+        return True
+
     def _prep_read(self, size):
         return self._prep_generic(size, True)
     def _prep_write(self, size):
@@ -779,6 +803,13 @@ class SimFileDescriptor(SimFileDescriptorBase):
         self._pos = 0
         self.flags = flags
 
+    def read(self, pos, size, **kwargs):
+        size = self._prep_read(size)
+        if self._copy_from_file(self.file, self._pos, pos, size):
+            self._pos = self._pos + size
+            return size
+        return super(SimFileDescriptor, self).read(pos, size, **kwargs)
+
     def read_data(self, size, **kwargs):
         size = self._prep_read(size)
         data, realsize, self._pos = self.file.read(self._pos, size)
@@ -905,6 +936,13 @@ class SimFileDescriptorDuplex(SimFileDescriptorBase):
         self._read_pos = 0
         self._write_pos = 0
 
+    def read(self, pos, size, **kwargs):
+        size = self._prep_read(size)
+        if self._copy_from_file(self._read_file, self._read_pos, pos, size):
+            self._read_pos = self._read_pos + size
+            return size
+        return super(SimFileDescriptorDuplex, self).read(pos, size, **kwargs)
+
     def read_data(self, size, **kwargs):
         size = self._prep_read(size)
         data, realsize, self._read_pos = self._read_file.read(self._read_pos, size)
@@ -867,6 +867,24 @@ class SimMemory(SimStatePlugin):
     def _load(self, _addr, _size, condition=None, fallback=None, inspect=True, events=True, ret_on_segv=False):
         raise NotImplementedError()
 
+    def load_concrete_bytes(self, addr, size, inspect=True, disable_actions=False):  # pylint:disable=unused-argument,no-self-use
+        """
+        Load concrete bytes from memory as a bytes object, without building any claripy expression. This is a fast path
+        for callers that can operate on native bytes, and fall back to load() when it is not available.
+
+        The result is the longest concrete prefix of the `size` bytes at `addr`, i.e., it is shorter than `size` if
+        loading runs into a symbolic or an uninitialized byte. No breakpoints are triggered, no actions are created, and
+        uninitialized bytes are not filled, so the fast path is not available if a breakpoint or an action would
+        observe the load.
+
+        :param addr:                    The address to load from.
+        :param int size:                The maximum number of bytes to load.
+        :param bool inspect:            Whether the load would trigger SimInspect breakpoints.
+        :param bool disable_actions:    Whether the load would avoid creating SimActions.
+        :return:                        The concrete bytes, or None if the fast path is not available.
+        """
+        return None
+
     def find(self, addr, what, max_search=None, max_symbolic_bytes=None, default=None, step=1,
              disable_actions=False, inspect=True, chunk_size=None):
         """
@@ -904,7 +922,7 @@ class SimMemory(SimStatePlugin):
         raise NotImplementedError()
 
     def copy_contents(self, dst, src, size, condition=None, src_memory=None, dst_memory=None, inspect=True,
-                      disable_actions=False):
+                      disable_actions=False, return_data=True):
         """
         Copies data within a memory.
 
@@ -918,6 +936,8 @@ class SimMemory(SimStatePlugin):
         :param size:        A claripy expression representing the size of the copy
         :param condition:   A claripy expression representing a condition, if the write should be conditional. If this
                             is determined to be false, the size of the copy will be 0.
+        :param return_data: Whether to return the copied data. If False, None is returned, and memories that move their
+                            contents directly do not build a claripy expression of them.
         """
         dst = _raw_ast(dst)
         src = _raw_ast(src)
@@ -925,10 +945,10 @@ class SimMemory(SimStatePlugin):
         condition = _raw_ast(condition)
 
         return self._copy_contents(dst, src, size, condition=condition, src_memory=src_memory, dst_memory=dst_memory,
-                                   inspect=inspect, disable_actions=disable_actions)
+                                   inspect=inspect, disable_actions=disable_actions, return_data=return_data)
 
     def _copy_contents(self, _dst, _src, _size, condition=None, src_memory=None, dst_memory=None, inspect=True,
-                      disable_actions=False):
+                      disable_actions=False, return_data=True):
         raise NotImplementedError()
 
 
@@ -1,3 +1,5 @@
+import itertools
+
 import claripy
 import cle
 from sortedcontainers import SortedDict
@@ -9,9 +11,66 @@ from ..errors import SimMemoryError, SimSegfaultError, SimMemoryMissingError, Si
 
 from .. import sim_options as options
 from .memory_object import SimMemoryObject
+from .persistent_map import PersistentMap, PersistentSet
 
 l = logging.getLogger(name=__name__)
 
+# versions of pages, see BasePage.version
+_page_versions = itertools.count()
+
+
+class PageHistory:
+    """
+    The history of a page, recording which of its bytes have been written since the page was copied from its parent.
+
+    Memories share pages until one of them writes to a page, which then gets copied, so a page never changes once it
+    has been copied. Two pages can therefore only differ in the bytes that have been written to either of them since
+    their latest common ancestor.
+    """
+
+    __slots__ = ('parent', 'depth', 'written', )
+
+    # histories deeper than this are collapsed, so that long chains of copies do not keep all ancestors alive
+    MAX_DEPTH = 64
+
+    def __init__(self, parent=None, written=0):
+        if parent is not None and parent.depth >= self.MAX_DEPTH:
+            # skip over the nearest MAX_DEPTH // 2 ancestors, merging their writes into this history. the older
+            # ancestors are kept, so that this history still shares them with its relatives
+            for _ in range(self.MAX_DEPTH // 2):
+                written |= parent.written
+                parent = parent.parent
+
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        # a bitmap of the page offsets that have been written to
+        self.written = written
+
+    def written_since_common_ancestor(self, other):
+        """
+        Get the page offsets that have been written to in either history since their latest common ancestor.
+
+        :param PageHistory other:   The other history.
+        :return:                    A bitmap of page offsets, or None if the histories have no common ancestor.
+        """
+
+        ours = { }
+        written = 0
+        h = self
+        while h is not None:
+            ours[h] = written
+            written |= h.written
+            h = h.parent
+
+        written = 0
+        h = other
+        while h is not None:
+            if h in ours:
+                return ours[h] | written
+            written |= h.written
+            h = h.parent
+        return None
+
 
 class BasePage:
     """
@@ -39,6 +98,10 @@ class BasePage:
 
         self._page_addr = page_addr
         self._page_size = page_size
+        self._history = PageHistory()
+        # a number that is unique to the contents and permissions of this page in this process. it changes whenever
+        # the page is modified in place, so two pages with the same version are the same page, and hold the same data.
+        self.version = next(_page_versions)
 
         if permissions is None:
             perms = Page.PROT_READ|Page.PROT_WRITE
@@ -78,13 +141,58 @@ class BasePage:
             self.store_overwrite(state, new_mo, start, end)
         else:
             self.store_underwrite(state, new_mo, start, end)
+        self.mark_written(start, end)
+
+    def mark_written(self, start, end):
+        """
+        Record that the bytes between `start` and `end` have been written to.
+
+        :param start: the start address
+        :param end: the end address (non-inclusive)
+        """
+        if end > start:
+            self._history.written |= ((1 << (end - start)) - 1) << (start - self._page_addr)
+
+    def written_since_common_ancestor(self, other):
+        """
+        Get the offsets of the bytes that might differ between this page and `other`, which are the bytes written to
+        either page since their latest common ancestor.
+
+        :param BasePage other: the other page
+        :returns: a sorted list of page offsets, or None if the pages have no common ancestor
+        """
+        written = self._history.written_since_common_ancestor(other._history)
+        if written is None:
+            return None
+        bits = bin(written)[:1:-1]
+        return [ i for i, b in enumerate(bits) if b == '1' ]
 
     def copy(self):
-        return Page(
+        page = type(self)(
             self._page_addr, self._page_size,
             permissions=self.permissions,
             **self._copy_args()
         )
+        page._history = PageHistory(self._history)
+        return page
+
+    def __getstate__(self):
+        # histories and versions are only meaningful between pages in the same process
+        s = self.__dict__.copy()
+        del s['_history']
+        del s['version']
+        return s
+
+    def __setstate__(self, s):
+        self.__dict__.update(s)
+        self._history = PageHistory()
+        self.version = next(_page_versions)
+
+    def touch(self):
+        """
+        Give the page a new version, before it is modified in place.
+        """
+        self.version = next(_page_versions)
 
     #
     # Abstract functions
@@ -121,6 +229,24 @@ class BasePage:
         """
         raise NotImplementedError()
 
+    def load_concrete(self, state, start, end):
+        """
+        Return the longest run of concrete bytes that starts at `start` and ends no later than `end`.
+
+        :param start: the start address
+        :param end: the end address (non-inclusive)
+        :returns: a bytes object, which is empty if the byte at `start` is missing or symbolic
+        """
+        data = [ ]
+        cur = start
+        for _, mo in self.load_slice(state, start, end):
+            if not mo.includes(cur) or not ConcretePage._is_concrete_mo(mo):
+                break
+            stop = min(end, mo.last_addr + 1)
+            data.append(ConcretePage._mo_bytes(mo, cur, stop))
+            cur = stop
+        return b''.join(data)
+
     def _copy_args(self):
         raise NotImplementedError()
 
@@ -319,6 +445,324 @@ class ListPage(BasePage):
     def _copy_args(self):
         return { 'storage': list(self._storage), 'sinkhole': self._sinkhole }
 
+class ConcretePage(BasePage):
+    """
+    Page object, implemented with a bytearray holding concrete data and a sidecar holding symbolic memory objects.
+
+    Each byte of the page is tracked in a mask as either missing, concrete, or symbolic. Concrete bytes are stored in
+    the bytearray, and the mask remembers where each stored concrete object starts, so that memory objects of the same
+    granularity as the stored ones can be created on demand. They are cached until the bytes they cover are
+    overwritten, so loading the same object twice returns the same memory object. Storing and loading concrete data therefore only
+    involves slice operations. Symbolic bytes are kept as references to their memory objects in a small dict, which is
+    turned into a list (as in ListPage) once the page holds many symbolic bytes, and back into a dict once the page is
+    entirely overwritten with concrete data.
+    """
+
+    MISSING = 0
+    CONCRETE = 1
+    SYMBOLIC = 2
+    CONCRETE_START = 3
+
+    # maximum number of symbolic bytes to keep in the sidecar dict before switching to a list
+    MAX_SIDECAR_SIZE = 64
+
+    def __init__(self, *args, **kwargs):
+        data = kwargs.pop("data", None)
+        mask = kwargs.pop("mask", None)
+        symbolic = kwargs.pop("symbolic", None)
+        mos = kwargs.pop("mos", None)
+
+        super(ConcretePage, self).__init__(*args, **kwargs)
+        self._data = bytearray(self._page_size) if data is None else data
+        self._mask = bytearray(self._page_size) if mask is None else mask
+        self._symbolic = { } if symbolic is None else symbolic
+        # concrete memory objects created by load_mo(), indexed by their start offsets
+        self._mos = { } if mos is None else mos
+
+    def __getstate__(self):
+        s = super(ConcretePage, self).__getstate__()
+        del s['_mos']
+        return s
+
+    def __setstate__(self, s):
+        super(ConcretePage, self).__setstate__(s)
+        self._mos = { }
+
+    @staticmethod
+    def _is_concrete_mo(mo):
+        if mo.is_bytes:
+            return True
+        o = mo.object
+        return o.op == 'BVV' and not o.annotations and o.size() == mo.length * 8
+
+    @staticmethod
+    def _mo_bytes(mo, start, end):
+        """
+        Get the concrete bytes of a concrete memory object between the absolute addresses `start` and `end`.
+        """
+        if mo.is_bytes:
+            return mo.object[start - mo.base:end - mo.base]
+        shift = (mo.base + mo.length - end) * 8
+        return ((mo.object.args[0] >> shift) & ((1 << ((end - start) * 8)) - 1)).to_bytes(end - start, 'big')
+
+    def _find_first(self, values, start, end):
+        """
+        Get the offset of the first byte in [start, end) whose mask value is in `values`, or `end` if there is none.
+        """
+        for v in values:
+            i = self._mask.find(v, start, end)
+            if i != -1:
+                end = i
+        return end
+
+    def _run_end(self, i, end):
+        """
+        Get the end of the run of missing, concrete, or symbolic bytes that starts at offset `i`.
+        """
+        m = self._mask[i]
+        if m == self.MISSING:
+            return self._find_first((self.CONCRETE, self.SYMBOLIC, self.CONCRETE_START), i, end)
+        elif m == self.SYMBOLIC:
+            return self._find_first((self.MISSING, self.CONCRETE, self.CONCRETE_START), i, end)
+        return self._find_first((self.MISSING, self.SYMBOLIC), i, end)
+
+    def _set_symbolic(self, mo, s, e):
+        sidecar = self._symbolic
+        if type(sidecar) is dict:
+            if len(sidecar) + (e - s) <= self.MAX_SIDECAR_SIZE:
+                for i in range(s, e):
+                    sidecar[i] = mo
+                return
+            # demote the sidecar to a list
+            lst = [ None ] * self._page_size
+            for i, old_mo in sidecar.items():
+                lst[i] = old_mo
+            self._symbolic = sidecar = lst
+        sidecar[s:e] = [ mo ] * (e - s)
+
+    def _clear_symbolic(self, s, e):
+        sidecar = self._symbolic
+        if type(sidecar) is dict:
+            for i in [ i for i in sidecar if s <= i < e ]:
+                del sidecar[i]
+        elif self.SYMBOLIC not in self._mask:
+            # the page is fully concrete again. promote it.
+            self._symbolic = { }
+        else:
+            sidecar[s:e] = [ None ] * (e - s)
+
+    def _invalidate_mos(self, s, e):
+        """
+        Drop the cached memory objects that overlap with [s, e).
+        """
+        mos = self._mos
+        if e - s < len(mos):
+            # the object containing s may start before it
+            start = self._mask.rfind(self.CONCRETE_START, 0, s + 1)
+            if start != -1:
+                mos.pop(start, None)
+            for i in range(s + 1, e):
+                mos.pop(i, None)
+        else:
+            for start in [ start for start, mo in mos.items() if start < e and start + mo.length > s ]:
+                del mos[start]
+
+    def _store_range(self, mo, s, e, concrete=None):
+        if concrete is None:
+            concrete = self._is_concrete_mo(mo)
+        pa = self._page_addr
+        mask = self._mask
+        if self._mos:
+            self._invalidate_mos(s, e)
+        # bytes after the stored range that belonged to an older concrete object now start a new one
+        if e < self._page_size and mask[e] == self.CONCRETE:
+            mask[e] = self.CONCRETE_START
+        if concrete:
+            self._data[s:e] = self._mo_bytes(mo, pa + s, pa + e)
+            mask[s:e] = bytes((self.CONCRETE,)) * (e - s)
+            mask[s] = self.CONCRETE_START
+            if self._symbolic:
+                self._clear_symbolic(s, e)
+        else:
+            self._set_symbolic(mo, s, e)
+            mask[s:e] = bytes((self.SYMBOLIC,)) * (e - s)
+
+    def keys(self):
+        return [ self._page_addr + i for i, v in enumerate(self._mask) if v ]
+
+    def replace_mo(self, state, old_mo, new_mo):
+        start, end = self._resolve_range(old_mo)
+        s, e = start - self._page_addr, end - self._page_addr
+        if self._is_concrete_mo(old_mo):
+            # concrete memory objects are created on the fly. replace all concrete bytes that are covered by it
+            i = s
+            while i < e:
+                j = self._run_end(i, e)
+                if self._mask[i] != self.MISSING and self._mask[i] != self.SYMBOLIC:
+                    self._store_range(new_mo, i, j)
+                i = j
+        else:
+            for i in range(s, e):
+                if self._mask[i] == self.SYMBOLIC and self._symbolic[i] is old_mo:
+                    self._store_range(new_mo, i, i + 1, concrete=False)
+
+    def store_overwrite(self, state, new_mo, start, end):
+        self._store_range(new_mo, start - self._page_addr, end - self._page_addr)
+
+    def store_underwrite(self, state, new_mo, start, end):
+        s, e = start - self._page_addr, end - self._page_addr
+        concrete = self._is_concrete_mo(new_mo)
+        i = self._mask.find(self.MISSING, s, e)
+        while i != -1:
+            j = self._run_end(i, e)
+            self._store_range(new_mo, i, j, concrete=concrete)
+            i = self._mask.find(self.MISSING, j, e)
+
+    def load_mo(self, state, page_idx):
+        """
+        Loads a memory object from memory.
+
+        :param page_idx: the index into the page
+        :returns: a tuple of the object
+        """
+        i = page_idx - self._page_addr
+        m = self._mask[i]
+        if m == self.MISSING:
+            return None
+        elif m == self.SYMBOLIC:
+            return self._symbolic[i]
+        s = self._mask.rfind(self.CONCRETE_START, 0, i + 1)
+        mo = self._mos.get(s, None)
+        if mo is None:
+            e = self._find_first((self.MISSING, self.SYMBOLIC, self.CONCRETE_START), i + 1, self._page_size)
+            mo = self._mos[s] = SimMemoryObject(claripy.BVV(bytes(self._data[s:e])), self._page_addr + s)
+        return mo
+
+    def load_slice(self, state, start, end):
+        """
+        Return the memory objects overlapping with the provided slice.
+
+        :param start: the start address
+        :param end: the end address (non-inclusive)
+        :returns: tuples of (starting_addr, memory_object)
+        """
+        items = [ ]
+        if start > self._page_addr + self._page_size or end < self._page_addr:
+            l.warning("Calling load_slice on the wrong page.")
+            return items
+
+        pa = self._page_addr
+        i = max(start, pa) - pa
+        e = min(end, pa + self._page_size) - pa
+        mask = self._mask
+        while i < e:
+            m = mask[i]
+            if m == self.SYMBOLIC:
+                mo = self._symbolic[i]
+                if not items or items[-1][1] is not mo:
+                    items.append((pa + i, mo))
+                i += 1
+                continue
+            j = self._run_end(i, e)
+            if m != self.MISSING:
+                # concrete runs are served as a single memory object, regardless of how they were stored
+                items.append((pa + i, SimMemoryObject(claripy.BVV(bytes(self._data[i:j])), pa + i)))
+            i = j
+        return items
+
+    def load_bytes(self, start, end):
+        """
+        Return the concrete bytes between `start` and `end` if all of them are concrete.
+
+        :param start: the start address
+        :param end: the end address (non-inclusive)
+        :returns: a bytes object, or None if any byte in the range is missing or symbolic
+        """
+        s, e = start - self._page_addr, end - self._page_addr
+        m = self._mask[s]
+        if m == self.MISSING or m == self.SYMBOLIC or self._run_end(s, e) != e:
+            return None
+        return bytes(self._data[s:e])
+
+    def load_concrete(self, state, start, end):
+        s, e = start - self._page_addr, end - self._page_addr
+        m = self._mask[s]
+        if m == self.MISSING or m == self.SYMBOLIC:
+            return b''
+        return bytes(self._data[s:self._run_end(s, e)])
+
+    def load_runs(self, start, end):
+        """
+        Return the contents between `start` and `end` as runs of concrete bytes and symbolic memory objects, without
+        creating any memory object or claripy expression.
+
+        :param start: the start address
+        :param end: the end address (non-inclusive)
+        :returns: a list of tuples of (starting_addr, length, content), where content is either a bytes object or a
+                  SimMemoryObject, or None if any byte in the range is missing
+        """
+        pa = self._page_addr
+        s, e = start - pa, end - pa
+        mask = self._mask
+        if mask.find(self.MISSING, s, e) != -1:
+            return None
+
+        runs = [ ]
+        i = s
+        while i < e:
+            if mask[i] == self.SYMBOLIC:
+                mo = self._symbolic[i]
+                j = i + 1
+                while j < e and mask[j] == self.SYMBOLIC and self._symbolic[j] is mo:
+                    j += 1
+                runs.append((pa + i, j - i, mo))
+            else:
+                j = self._run_end(i, e)
+                runs.append((pa + i, j - i, bytes(self._data[i:j])))
+            i = j
+        return runs
+
+    def changed_keys(self, other, offsets=None):
+        """
+        Return the addresses of all bytes that may differ between this page and another ConcretePage.
+
+        :param offsets: the page offsets to compare, or None to compare the entire page
+        """
+        changes = set()
+        if offsets is not None:
+            for i in offsets:
+                if self._byte_changed(other, i):
+                    changes.add(self._page_addr + i)
+            return changes
+
+        if self._data == other._data and self._mask == other._mask and not self._symbolic and not other._symbolic:
+            return changes
+
+        pa = self._page_addr
+        chunk = 64
+        for c in range(0, self._page_size, chunk):
+            our_mask = self._mask[c:c+chunk]
+            if self._data[c:c+chunk] == other._data[c:c+chunk] and our_mask == other._mask[c:c+chunk] \
+                    and self.SYMBOLIC not in our_mask:
+                continue
+            for i in range(c, min(c + chunk, self._page_size)):
+                if self._byte_changed(other, i):
+                    changes.add(pa + i)
+        return changes
+
+    def _byte_changed(self, other, i):
+        m, their_m = self._mask[i], other._mask[i]
+        if m == self.SYMBOLIC or their_m == self.SYMBOLIC:
+            return m != their_m or self._symbolic[i] is not other._symbolic[i]
+        elif (m == self.MISSING) != (their_m == self.MISSING):
+            return True
+        return m != self.MISSING and (m != their_m or self._data[i] != other._data[i])
+
+    def _copy_args(self):
+        symbolic = self._symbolic.copy() if type(self._symbolic) is dict else list(self._symbolic)
+        return { 'data': bytearray(self._data), 'mask': bytearray(self._mask), 'symbolic': symbolic,
+                 'mos': self._mos.copy() }
+
 Page = ListPage
 
 #pylint:disable=unidiomatic-typecheck
@@ -333,10 +777,10 @@ class SimPagedMemory:
         self._permissions_backer = permissions_backer # saved for copying
         self._executable_pages = False if permissions_backer is None else permissions_backer[0]
         self._permission_map = { } if permissions_backer is None else permissions_backer[1]
-        self._pages = { } if pages is None else pages
-        self._initialized = set() if initialized is None else initialized
+        self._pages = PersistentMap() if pages is None else self._persistent_map(pages)
+        self._initialized = PersistentSet() if initialized is None else self._persistent_set(initialized)
         self._page_size = 0x1000 if page_size is None else page_size
-        self._symbolic_addrs = dict() if symbolic_addrs is None else symbolic_addrs
+        self._symbolic_addrs = PersistentMap() if symbolic_addrs is None else self._persistent_map(symbolic_addrs)
         self.state = None
         self._preapproved_stack = range(0)
         self._check_perms = check_permissions
@@ -346,6 +790,14 @@ class SimPagedMemory:
         self._hash_mapping = ChainMap() if hash_mapping is None else hash_mapping
         self._updated_mappings = set()
 
+    @staticmethod
+    def _persistent_map(d):
+        return d if type(d) is PersistentMap else PersistentMap(d)
+
+    @staticmethod
+    def _persistent_set(s):
+        return s if type(s) is PersistentSet else PersistentSet(s)
+
     def _page_align_down(self, x):
         return x - (x % self._page_size)
 
@@ -391,25 +843,72 @@ class SimPagedMemory:
     def __setstate__(self, s):
         self._cowed = set()
         self.__dict__.update(s)
+        # older pickles hold plain dicts and sets
+        self._pages = self._persistent_map(self._pages)
+        self._initialized = self._persistent_set(self._initialized)
+        self._symbolic_addrs = self._persistent_map(self._symbolic_addrs)
 
     def branch(self):
         new_name_mapping = self._name_mapping.new_child() if options.REVERSE_MEMORY_NAME_MAP in self.state.options else self._name_mapping
         new_hash_mapping = self._hash_mapping.new_child() if options.REVERSE_MEMORY_HASH_MAP in self.state.options else self._hash_mapping
 
-        new_pages = dict(self._pages)
+        # the page map, the set of initialized pages, and the symbolic addresses are shared with the new memory until
+        # either side writes to them. pages themselves are copied on write through _cowed.
+        new_pages = self._pages.copy()
         self._cowed = set()
         m = SimPagedMemory(memory_backer=self._memory_backer,
                            permissions_backer=self._permissions_backer,
                            pages=new_pages,
-                           initialized=set(self._initialized),
+                           initialized=self._initialized.copy(),
                            page_size=self._page_size,
                            name_mapping=new_name_mapping,
                            hash_mapping=new_hash_mapping,
-                           symbolic_addrs=dict(self._symbolic_addrs),
+                           symbolic_addrs=self._symbolic_addrs.copy(),
                            check_permissions=self._check_perms)
         m._preapproved_stack = self._preapproved_stack
         return m
 
+    def freeze_pages(self):
+        """
+        Make sure that none of the current pages is modified in place anymore, so that they can be shared with other
+        owners. Pages are copied before they are written to again.
+        """
+        self._cowed = set()
+
+    def checkpoint(self):
+        """
+        Record the contents of the memory, so that they can be restored with rollback(). The pages are shared with the
+        checkpoint until they are written to, so that neither recording nor restoring the contents copies any page.
+
+        :return: The checkpoint.
+        """
+        # pages must be copied before they are written to again
+        self._cowed = set()
+        checkpoint = (self._pages.copy(), self._initialized.copy(), self._symbolic_addrs.copy(), self._name_mapping,
+                      self._hash_mapping)
+        self._branch_mappings(self._name_mapping, self._hash_mapping)
+        return checkpoint
+
+    def rollback(self, checkpoint):
+        """
+        Restore the contents of the memory that were recorded by checkpoint().
+
+        :param checkpoint: The checkpoint returned by checkpoint().
+        """
+        pages, initialized, symbolic_addrs, name_mapping, hash_mapping = checkpoint
+        self._pages = pages.copy()
+        self._initialized = initialized.copy()
+        self._symbolic_addrs = symbolic_addrs.copy()
+        self._cowed = set()
+        self._branch_mappings(name_mapping, hash_mapping)
+
+    def _branch_mappings(self, name_mapping, hash_mapping):
+        self._name_mapping = name_mapping.new_child() if options.REVERSE_MEMORY_NAME_MAP in self.state.options \
+            else name_mapping
+        self._hash_mapping = hash_mapping.new_child() if options.REVERSE_MEMORY_HASH_MAP in self.state.options \
+            else hash_mapping
+        self._updated_mappings = set()
+
     def __getitem__(self, addr):
         page_num = addr // self._page_size
         page_idx = addr
@@ -484,6 +983,111 @@ class SimPagedMemory:
 
         return result
 
+    def load_concrete(self, addr, num_bytes):
+        """
+        Load concrete bytes from paged memory as a bytes object, without creating any claripy expression.
+
+        Loading stops at the first byte that is symbolic, uninitialized, or unreadable, so the result is the longest
+        concrete prefix of the requested range, and it may be shorter than `num_bytes`.
+
+        :param int addr:        Address to start loading.
+        :param int num_bytes:   Maximum number of bytes to load.
+        :return:                The concrete bytes.
+        :rtype:                 bytes
+        """
+
+        if self.byte_width != 8:
+            return b''
+
+        chunks = [ ]
+        cur, end = addr, addr + num_bytes
+        while cur < end:
+            page_num = cur // self._page_size
+            page_end = min(end, (page_num + 1) * self._page_size)
+            try:
+                page = self._get_page(page_num)
+            except KeyError:
+                break
+            if self.allow_segv and not page.concrete_permissions & Page.PROT_READ:
+                break
+            data = page.load_concrete(self.state, cur, page_end)
+            chunks.append(data)
+            if len(data) != page_end - cur:
+                break
+            cur = page_end
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+    def copy_contents(self, dst, src, size, src_memory=None):
+        """
+        Copy memory by moving the contents of pages directly, without loading them as a claripy expression and storing
+        them again. Concrete bytes are copied as byte spans, and symbolic memory objects are rebased to the destination,
+        so that their expressions are kept as they are.
+
+        Nothing is copied if any source byte is uninitialized or unreadable, if a destination page is not writable, if
+        the source is not held in concrete pages, or if reverse mappings of memory contents are maintained. Callers
+        should fall back to loading and storing the data in these cases. Overlapping ranges are copied as if the source
+        were read entirely before the destination is written.
+
+        :param int dst:                     Address to copy to.
+        :param int src:                     Address to copy from.
+        :param int size:                    Number of bytes to copy.
+        :param SimPagedMemory src_memory:   The paged memory to copy from, or None to copy within this memory.
+        :return:                            True if the contents were copied, False otherwise.
+        :rtype:                             bool
+        """
+
+        src_memory = self if src_memory is None else src_memory
+        if self.byte_width != 8 or src_memory.byte_width != 8:
+            return False
+        if self.state is not None and (options.REVERSE_MEMORY_NAME_MAP in self.state.options or
+                                       options.REVERSE_MEMORY_HASH_MAP in self.state.options or
+                                       options.MEMORY_SYMBOLIC_BYTES_MAP in self.state.options):
+            return False
+
+        # collect the source first, in case the ranges overlap
+        runs = [ ]
+        cur, end = src, src + size
+        while cur < end:
+            page_num = cur // src_memory._page_size
+            page_end = min(end, (page_num + 1) * src_memory._page_size)
+            try:
+                page = src_memory._get_page(page_num)
+            except KeyError:
+                return False
+            if type(page) is not ConcretePage or \
+                    (src_memory.allow_segv and not page.concrete_permissions & Page.PROT_READ):
+                return False
+            page_runs = page.load_runs(cur, page_end)
+            if page_runs is None:
+                return False
+            runs.extend(page_runs)
+            cur = page_end
+
+        allow_segv = self.allow_segv
+        if allow_segv:
+            for page_base in self._containing_pages(dst, dst + size):
+                page = self._pages.get(page_base // self._page_size, None)
+                if page is None or not page.concrete_permissions & Page.PROT_WRITE:
+                    return False
+
+        delta = dst - src
+        rebased = { }
+        for addr, length, content in runs:
+            if type(content) is bytes:
+                mo = SimMemoryObject(content, addr + delta)
+            else:
+                mo = rebased.get(id(content), None)
+                if mo is None:
+                    mo = SimMemoryObject(content.object, content.base + delta, length=content.length)
+                    rebased[id(content)] = mo
+            start, stop = addr + delta, addr + delta + length
+            for page_base in self._containing_pages(start, stop):
+                page = self._get_page(page_base // self._page_size, write=True, create=not allow_segv)
+                page_start, page_end = max(start, page_base), min(stop, page_base + self._page_size)
+                page.store_overwrite(self.state, mo, page_start, page_end)
+                page.mark_written(page_start, page_end)
+        return True
+
     #
     # Page management
     #
@@ -492,7 +1096,7 @@ class SimPagedMemory:
         if self.state is not None:
             self.state._inspect('memory_page_map', BP_BEFORE, mapped_address=page_num*self._page_size)
 
-        pg = Page(
+        pg = self._page_class()(
             page_num*self._page_size, self._page_size,
             executable=self._executable_pages, permissions=permissions
         )
@@ -502,6 +1106,13 @@ class SimPagedMemory:
             self.state._inspect_getattr('mapped_page', pg)
         return pg
 
+    def _page_class(self):
+        # concrete pages serve memory objects that are created on the fly, which does not play well with the reverse
+        # hash mapping and with non-8-bit bytes
+        if self.byte_width != 8 or (self.state is not None and options.REVERSE_MEMORY_HASH_MAP in self.state.options):
+            return Page
+        return ConcretePage
+
     def _initialize_page(self, n, new_page):
         if n in self._initialized:
             return False
@@ -623,11 +1234,14 @@ class SimPagedMemory:
             self._cowed.add(page_num)
             return page
 
-        if write and page_num not in self._cowed:
-            page = page.copy()
-            self._symbolic_addrs[page_num] = set(self._symbolic_addrs[page_num])
-            self._cowed.add(page_num)
-            self._pages[page_num] = page
+        if write:
+            if page_num not in self._cowed:
+                page = page.copy()
+                self._symbolic_addrs[page_num] = set(self._symbolic_addrs[page_num])
+                self._cowed.add(page_num)
+                self._pages[page_num] = page
+            else:
+                page.touch()
 
         return page
 
@@ -695,6 +1309,19 @@ class SimPagedMemory:
             if our_page is their_page:
                 continue
 
+            # only the bytes written to either page since they were forked might differ
+            offsets = our_page.written_since_common_ancestor(their_page)
+
+            if type(our_page) is ConcretePage and type(their_page) is ConcretePage:
+                candidates.update(our_page.changed_keys(their_page, offsets=offsets))
+                continue
+
+            if offsets is not None:
+                pa = our_page._page_addr
+                candidates.update(pa + i for i in offsets
+                                  if our_page.load_mo(self.state, pa + i) is not their_page.load_mo(self.state, pa + i))
+                continue
+
             our_keys = set(our_page.keys())
             their_keys = set(their_page.keys())
             changes = (our_keys - their_keys) | (their_keys - our_keys) | {
@@ -799,7 +1426,9 @@ class SimPagedMemory:
 
         new = SimMemoryObject(new_content, old.base, byte_width=self.byte_width)
         for p in self._containing_pages_mo(old):
-            self._get_page(p//self._page_size, write=True).replace_mo(self.state, old, new)
+            page = self._get_page(p//self._page_size, write=True)
+            page.replace_mo(self.state, old, new)
+            page.mark_written(max(p, old.base), min(p + self._page_size, old.base + old.length))
 
         if isinstance(new.object, claripy.ast.BV):
             for b in range(old.base, old.base+old.length):
@@ -1028,7 +1657,8 @@ class SimPagedMemory:
         page_num = addr // self._page_size
 
         try:
-            page = self._get_page(page_num)
+            # the page may be shared with other states, so it is copied before its permissions are changed
+            page = self._get_page(page_num, write=permissions is not None)
         except KeyError:
             raise SimMemoryMissingError("page does not exist at given address")
 
@@ -1041,6 +1671,7 @@ class SimPagedMemory:
                 raise SimMemoryError("Unknown permissions argument type of {0}.".format(type(permissions)))
 
             page.permissions = permissions
+            page.touch()
 
         return page.permissions
 
@@ -1129,7 +1760,7 @@ class SimPagedMemory:
             for page_addr in range(addr[0], addr[1], self._page_size):
                 white_list_page_number.append(self._page_id(page_addr))
 
-        new_page_dict = {}
+        new_page_dict = PersistentMap()
 
         flushed = []
         # cycle over all the keys ( the page number )
@@ -1142,7 +1773,7 @@ class SimPagedMemory:
                 flushed.append((p._page_addr, p._page_size))
 
         self._pages = new_page_dict
-        self._initialized = set()
+        self._initialized = PersistentSet()
         return flushed
 
 
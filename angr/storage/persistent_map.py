@@ -0,0 +1,275 @@
+from collections.abc import MutableMapping, MutableSet
+
+
+class _Node:
+    """
+    An inner node of a PersistentMap. Each slot holds nothing, a (key, value) tuple, or another node.
+    """
+
+    __slots__ = ('owner', 'slots', )
+
+    def __init__(self, owner, slots=None):
+        self.owner = owner
+        self.slots = [ None ] * PersistentMap.WIDTH if slots is None else slots
+
+
+class _Collision:
+    """
+    A leaf of a PersistentMap holding all keys whose hashes are fully identical.
+    """
+
+    __slots__ = ('owner', 'pairs', )
+
+    def __init__(self, owner, pairs):
+        self.owner = owner
+        self.pairs = pairs
+
+
+class PersistentMap(MutableMapping):
+    """
+    A dict-like mapping with O(1) copies, implemented as a hash array mapped trie with path copying.
+
+    Copying a PersistentMap shares the whole trie between the copies. A write only copies the nodes on the path from
+    the root to the modified key, and only the first time this path is written after a copy: every node remembers
+    which map created it, and a map updates the nodes that it owns in place.
+    """
+
+    BITS = 5
+    WIDTH = 1 << BITS
+    SLOT_MASK = WIDTH - 1
+    HASH_BITS = 64
+    HASH_MASK = (1 << HASH_BITS) - 1
+
+    __slots__ = ('_root', '_len', '_owner', )
+
+    def __init__(self, items=None):
+        self._owner = object()
+        self._root = _Node(self._owner)
+        self._len = 0
+        if items is not None:
+            self.update(items)
+
+    def copy(self):
+        """
+        Return a copy of this map in constant time. Both maps will copy the shared nodes on their next writes.
+        """
+        m = PersistentMap.__new__(PersistentMap)
+        m._root = self._root
+        m._len = self._len
+        m._owner = object()
+        self._owner = object()
+        return m
+
+    #
+    # Pickling
+    #
+
+    def __getstate__(self):
+        return list(self.items())
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    #
+    # Mapping interface
+    #
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for k, _ in self._iter_pairs(self._root):
+            yield k
+
+    def items(self):
+        return list(self._iter_pairs(self._root))
+
+    def values(self):
+        return [ v for _, v in self._iter_pairs(self._root) ]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __getitem__(self, key):
+        h = hash(key) & self.HASH_MASK
+        node = self._root
+        while True:
+            entry = node.slots[h & self.SLOT_MASK]
+            if entry is None:
+                raise KeyError(key)
+            t = type(entry)
+            if t is _Node:
+                node = entry
+                h >>= self.BITS
+            elif t is _Collision:
+                for k, v in entry.pairs:
+                    if k == key:
+                        return v
+                raise KeyError(key)
+            elif entry[0] == key:
+                return entry[1]
+            else:
+                raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        h = hash(key) & self.HASH_MASK
+        self._root = self._assoc(self._root, 0, h, key, value)
+
+    def __delitem__(self, key):
+        h = hash(key) & self.HASH_MASK
+        self._root = self._dissoc(self._root, 0, h, key)
+
+    def clear(self):
+        self._root = _Node(self._owner)
+        self._len = 0
+
+    def __repr__(self):
+        return "<PersistentMap with %d items>" % self._len
+
+    #
+    # Private methods
+    #
+
+    def _editable(self, node):
+        if node.owner is self._owner:
+            return node
+        return _Node(self._owner, list(node.slots))
+
+    def _iter_pairs(self, node):
+        for entry in node.slots:
+            if entry is None:
+                continue
+            t = type(entry)
+            if t is _Node:
+                yield from self._iter_pairs(entry)
+            elif t is _Collision:
+                yield from entry.pairs
+            else:
+                yield entry
+
+    def _assoc(self, node, shift, h, key, value):
+        idx = (h >> shift) & self.SLOT_MASK
+        entry = node.slots[idx]
+        if entry is None:
+            node = self._editable(node)
+            node.slots[idx] = (key, value)
+            self._len += 1
+            return node
+
+        t = type(entry)
+        if t is _Node:
+            new_entry = self._assoc(entry, shift + self.BITS, h, key, value)
+        elif t is _Collision:
+            pairs = [ p for p in entry.pairs if p[0] != key ]
+            if len(pairs) == len(entry.pairs):
+                self._len += 1
+            pairs.append((key, value))
+            new_entry = _Collision(self._owner, pairs)
+        elif entry[0] == key:
+            if entry[1] is value:
+                return node
+            new_entry = (key, value)
+        else:
+            new_entry = self._split(entry, shift + self.BITS, h, key, value)
+            self._len += 1
+
+        if new_entry is not entry:
+            node = self._editable(node)
+            node.slots[idx] = new_entry
+        return node
+
+    def _split(self, pair, shift, h, key, value):
+        """
+        Create the subtree holding an existing pair and a new one that share the same slot at the previous level.
+        """
+        if shift >= self.HASH_BITS:
+            return _Collision(self._owner, [ pair, (key, value) ])
+        other_h = hash(pair[0]) & self.HASH_MASK
+        node = _Node(self._owner)
+        idx, other_idx = (h >> shift) & self.SLOT_MASK, (other_h >> shift) & self.SLOT_MASK
+        if idx == other_idx:
+            node.slots[idx] = self._split(pair, shift + self.BITS, h, key, value)
+        else:
+            node.slots[idx] = (key, value)
+            node.slots[other_idx] = pair
+        return node
+
+    def _dissoc(self, node, shift, h, key):
+        idx = (h >> shift) & self.SLOT_MASK
+        entry = node.slots[idx]
+        if entry is None:
+            raise KeyError(key)
+
+        t = type(entry)
+        if t is _Node:
+            new_entry = self._dissoc(entry, shift + self.BITS, h, key)
+            if not any(new_entry.slots):
+                new_entry = None
+        elif t is _Collision:
+            pairs = [ p for p in entry.pairs if p[0] != key ]
+            if len(pairs) == len(entry.pairs):
+                raise KeyError(key)
+            new_entry = _Collision(self._owner, pairs) if pairs else None
+        elif entry[0] == key:
+            new_entry = None
+        else:
+            raise KeyError(key)
+
+        if t is not _Node or new_entry is not entry:
+            node = self._editable(node)
+            node.slots[idx] = new_entry
+        if t is not _Node:
+            self._len -= 1
+        return node
+
+
+class PersistentSet(MutableSet):
+    """
+    A set with O(1) copies, backed by a PersistentMap.
+    """
+
+    __slots__ = ('_map', )
+
+    def __init__(self, items=None):
+        self._map = PersistentMap()
+        if items is not None:
+            for item in items:
+                self._map[item] = True
+
+    def copy(self):
+        s = PersistentSet.__new__(PersistentSet)
+        s._map = self._map.copy()
+        return s
+
+    def __getstate__(self):
+        return list(self._map)
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def __contains__(self, item):
+        return item in self._map
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def __len__(self):
+        return len(self._map)
+
+    def add(self, value):
+        if value not in self._map:
+            self._map[value] = True
+
+    def discard(self, value):
+        if value in self._map:
+            del self._map[value]
+
+    def clear(self):
+        self._map.clear()
+
+    def __repr__(self):
+        return "<PersistentSet with %d items>" % len(self._map)
@@ -47,6 +47,8 @@ class VaultUnpickler(pickle.Unpickler):
 class Vault(collections.abc.MutableMapping):
     """
     The vault is a serializer for angr.
+
+    SimStates are serialized with the vault's state_serializer, an angr.state_serializer.StateSerializer, if it is set.
     """
 
     #
@@ -88,6 +90,9 @@ class Vault(collections.abc.MutableMapping):
         self.unsafe_key_baseclasses = {
             claripy.ast.Base, SimType
         }
+        self.state_serializer = None
+        # storage may be accessed from other threads through read() and write()
+        self._io_lock = threading.Lock()
 
     def _get_persistent_id(self, o):
         """
@@ -151,8 +156,41 @@ class Vault(collections.abc.MutableMapping):
             return self._object_cache[oid]
         except KeyError:
             l.debug("... cached failed")
+            return self._deserialize(oid, self.read(oid))
+
+    def read(self, oid):
+        """
+        Read the serialized form of an object without deserializing it. It can be deserialized with deserialize() later,
+        e.g., on another thread.
+
+        :param oid: The ID of the object.
+        :return:    The serialized object.
+        """
+
+        with self._io_lock:
             with self._read_context(oid) as u:
-                return VaultUnpickler(self, u).load()
+                return u.read()
+
+    def deserialize(self, oid, data):
+        """
+        Load an object that has been read with read(), as load() does. Objects that it references are loaded right away.
+
+        :param oid:     The ID of the object.
+        :param data:    The serialized object.
+        :return:        The object.
+        """
+
+        try:
+            return self._object_cache[oid]
+        except KeyError:
+            return self._deserialize(oid, data)
+
+    def _deserialize(self, oid, data):
+        if data.startswith(StateSerializer.MAGIC):
+            if self.state_serializer is None:
+                raise AngrVaultError("%s is a serialized state, but the vault has no state serializer." % oid)
+            return self.state_serializer.loads(data)
+        return VaultUnpickler(self, io.BytesIO(data)).load()
 
     def store(self, o):
 
@@ -176,17 +214,50 @@ class Vault(collections.abc.MutableMapping):
         if actual_id in self.storing:
             return actual_id
 
-        if self.is_stored(actual_id):
+        with self._io_lock:
+            stored = self.is_stored(actual_id)
+        if stored:
             l.debug("... already stored")
             return actual_id
 
-        with self._write_context(actual_id) as output:
-            self.storing.add(actual_id)
-            VaultPickler(self, output, assigned_objects=(o,)).dump(o)
-            self.stored.add(actual_id)
+        self.storing.add(actual_id)
+        self.write(actual_id, self._serialize(o))
 
         return actual_id
 
+    def serialize(self, o):
+        """
+        Serialize an object as store() does, without storing it yet. Objects that it references are stored right away.
+        The serialized object can be stored with write() later, e.g., on another thread.
+
+        :param o:   The object.
+        :return:    A tuple of the ID of the object and its serialized form.
+        """
+
+        actual_id = self._get_persistent_id(o) or "TMP-"+str(uuid.uuid4())
+        self.storing.add(actual_id)
+        return actual_id, self._serialize(o)
+
+    def _serialize(self, o):
+        if self.state_serializer is not None and isinstance(o, SimState):
+            return self.state_serializer.dumps(o)
+        f = io.BytesIO()
+        VaultPickler(self, f, assigned_objects=(o,)).dump(o)
+        return f.getvalue()
+
+    def write(self, oid, data):
+        """
+        Store an object that has been serialized with serialize().
+
+        :param oid:     The ID of the object.
+        :param data:    The serialized object.
+        """
+
+        with self._io_lock:
+            with self._write_context(oid) as output:
+                output.write(data)
+        self.stored.add(oid)
+
     def dumps(self, o):
         """
         Returns a serialized string representing the object, post-deduplication.
@@ -357,3 +428,4 @@ from .errors import AngrVaultError
 from .project import Project
 from .sim_type import SimType
 from .sim_state import SimState
+from .state_serializer import StateSerializer
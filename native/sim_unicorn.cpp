@@ -51,6 +51,8 @@ typedef enum stop {
 	STOP_ZERO_DIV,
 	STOP_NODECODE,
 	STOP_HLT,
+	STOP_TRACE_DIVERGED,
+	STOP_TRACE_END,
 } stop_t;
 
 typedef struct block_entry {
@@ -146,6 +148,13 @@ public:
 	bool track_bbls;
 	bool track_stack;
 
+	// the concrete trace that executed blocks are checked against. trace[trace_idx] is the address of the next block,
+	// plus trace_slide. trace_idx_committed is the index after the last committed block.
+	uint64_t *trace;
+	uint64_t trace_count;
+	uint64_t trace_idx, trace_idx_committed;
+	uint64_t trace_slide;
+
 	State(uc_engine *_uc, uint64_t cache_key):uc(_uc)
 	{
 		hooked = false;
@@ -159,6 +168,8 @@ public:
 		transmit_sysno = -1;
 		vex_guest = VexArch_INVALID;
 		syscall_count = 0;
+		trace = NULL;
+		trace_count = trace_idx = trace_idx_committed = trace_slide = 0;
 		uc_context_alloc(uc, &saved_regs);
 		executed_pages_iterator = NULL;
 
@@ -233,6 +244,7 @@ public:
 		stop_reason = STOP_NOSTART;
 		max_steps = step;
 		cur_steps = -1;
+		trace_idx = trace_idx_committed = 0;
 		executed_pages.clear();
 
 		// error if pc is 0
@@ -297,6 +309,12 @@ public:
 			case STOP_NODECODE:
 				msg = "instruction decoding error";
 				break;
+			case STOP_TRACE_DIVERGED:
+				msg = "diverged from the trace";
+				break;
+			case STOP_TRACE_END:
+				msg = "reached the end of the trace";
+				break;
 			default:
 				msg = "unknown error";
 		}
@@ -337,10 +355,32 @@ public:
 			auto stop_point = stop_points.lower_bound(current_address);
 			if (stop_point != stop_points.end() && *stop_point < current_address + real_size) {
 				stop(STOP_STOPPOINT);
+			} else if (trace != NULL) {
+				check_trace(current_address);
 			}
 		}
 	}
 
+	/*
+	 * check the block that is about to be executed against the trace. blocks that do not follow the trace, and
+	 * blocks past the end of the trace, are not executed.
+	 */
+	void check_trace(uint64_t current_address) {
+		if (trace_idx >= trace_count) {
+			stop(STOP_TRACE_END);
+		} else if (trace[trace_idx] != current_address + trace_slide) {
+			stop(STOP_TRACE_DIVERGED);
+		} else {
+			trace_idx++;
+		}
+	}
+
+	void set_trace(uint64_t *_trace, uint64_t count, uint64_t slide) {
+		trace = count ? _trace : NULL;
+		trace_count = count;
+		trace_slide = slide;
+	}
+
 	/*
 	 * record current memory write
 	 */
@@ -389,6 +429,7 @@ public:
 		// clear memory rollback status
 		mem_writes.clear();
 		cur_steps++;
+		trace_idx_committed = trace_idx;
 	}
 
 	/*
@@ -430,6 +471,7 @@ public:
 		// restore registers
 		uc_context_restore(uc, saved_regs);
 		bbl_addrs.pop_back();
+		trace_idx = trace_idx_committed;
 	}
 
 	/*
@@ -1429,3 +1471,17 @@ extern "C"
 bool simunicorn_in_cache(State *state, uint64_t address) {
 	return state->in_cache(address);
 }
+
+//
+// Trace checking
+//
+
+extern "C"
+void simunicorn_set_trace(State *state, uint64_t *trace, uint64_t count, uint64_t slide) {
+	state->set_trace(trace, count, slide);
+}
+
+extern "C"
+uint64_t simunicorn_trace_idx(State *state) {
+	return state->trace_idx;
+}
@@ -3,7 +3,10 @@ import angr
 import logging
 l = logging.getLogger("angr.tests")
 
+import io
 import os
+import sqlite3
+import tempfile
 test_location = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'binaries', 'tests')
 
 def test_block_cache():
@@ -15,5 +18,72 @@ def test_block_cache():
     b = p.factory.block(p.entry)
     assert p.factory.block(p.entry).vex is not b.vex
 
+def test_persistent_block_cache():
+    tmp_dir = tempfile.mkdtemp(prefix='test_persistent_block_cache')
+    cache_path = os.path.join(tmp_dir, 'irsbs.sqlite')
+
+    p = angr.Project(os.path.join(test_location, "x86_64", "fauxware"), persistent_translation_cache=cache_path)
+    engine = p.factory.default_engine
+    b = p.factory.block(p.entry, opt_level=1)
+    assert engine._persistent_cache_misses == 1
+    assert engine._persistent_cache_hits == 0
+    assert len(engine._persistent_cache) == 1
+
+    # a fresh project must pick up the block lifted by the previous one
+    p2 = angr.Project(os.path.join(test_location, "x86_64", "fauxware"), persistent_translation_cache=cache_path)
+    engine2 = p2.factory.default_engine
+    b2 = p2.factory.block(p2.entry, opt_level=1)
+    assert engine2._persistent_cache_hits == 1
+    assert engine2._persistent_cache_misses == 0
+    assert b2.vex is not b.vex
+    assert b2.vex.size == b.vex.size
+    assert str(b2.vex) == str(b.vex)
+
+    # different lifting parameters must not hit
+    p2.factory.block(p2.entry, opt_level=0)
+    assert engine2._persistent_cache_misses == 1
+
+    # eviction by size
+    engine2._persistent_cache.max_size = 0
+    engine2._persistent_cache.evict()
+    assert len(engine2._persistent_cache) == 0
+
+def test_persistent_block_cache_data_refs():
+    tmp_dir = tempfile.mkdtemp(prefix='test_persistent_block_cache')
+    cache_path = os.path.join(tmp_dir, 'irsbs.sqlite')
+
+    # mov rax, [rip+0x10]; ret
+    code = b'\x48\x8b\x05\x10\x00\x00\x00\xc3'
+    main_opts = {'backend': 'blob', 'arch': 'amd64', 'base_addr': 0x400000, 'entry_point': 0x400000}
+    p = angr.Project(io.BytesIO(code), main_opts=main_opts, persistent_translation_cache=cache_path)
+    engine = p.factory.default_engine
+    irsb = engine.lift_vex(addr=0x400000, clemory=p.loader.memory, collect_data_refs=True)
+    assert engine._persistent_cache_misses == 1
+    assert any(ref.data_addr == 0x400017 for ref in irsb.data_refs)
+
+    # lifts that collect data references, as CFGFast does, are cached as well
+    p2 = angr.Project(io.BytesIO(code), main_opts=main_opts, persistent_translation_cache=cache_path)
+    engine2 = p2.factory.default_engine
+    irsb2 = engine2.lift_vex(addr=0x400000, clemory=p2.loader.memory, collect_data_refs=True)
+    assert engine2._persistent_cache_hits == 1
+    assert [ (ref.data_addr, ref.ins_addr) for ref in irsb2.data_refs ] == \
+           [ (ref.data_addr, ref.ins_addr) for ref in irsb.data_refs ]
+
+    # but they are not handed out to lifts that do not collect them, and the other way around
+    engine2.lift_vex(addr=0x400000, clemory=p2.loader.memory)
+    engine2.lift_vex(addr=0x400000, clemory=p2.loader.memory, collect_data_refs=True, cross_insn_opt=False)
+    assert engine2._persistent_cache_misses == 2
+    assert len(engine2._persistent_cache) == 3
+
+    # failing evictions do not fail lifting
+    def evict():
+        raise sqlite3.OperationalError("database is locked")
+    engine2._persistent_cache.evict = evict
+    engine2._persistent_cache.evict_interval = 1
+    engine2.lift_vex(addr=0x400000, clemory=p2.loader.memory, opt_level=0)
+    assert len(engine2._persistent_cache) == 4
+
 if __name__ == "__main__":
     test_block_cache()
+    test_persistent_block_cache()
+    test_persistent_block_cache_data_refs()
@@ -1,4 +1,6 @@
 import os
+import pickle
+import random
 import angr
 import nose
 
@@ -7,6 +9,9 @@ arches = {'i386', 'x86_64'}
 
 def main():
     test_cfg_get_any_node()
+    test_cfg_nodes_in_range()
+    test_cfg_index_tracks_graph()
+    test_cfg_node_range_index()
 
 def test_cfg_get_any_node():
     for arch in arches:
@@ -22,5 +27,101 @@ def run_cfg_get_any_node(arch):
             node2 = cfg.get_any_node(addr=node1.addr, anyaddr=True)
             nose.tools.assert_is_not_none(node2)
 
+def test_cfg_nodes_in_range():
+    for arch in arches:
+        run_cfg_nodes_in_range(arch)
+
+def run_cfg_nodes_in_range(arch):
+    test_file = os.path.join(test_location, arch, 'hello_world')
+    proj = angr.Project(test_file, auto_load_libs=False)
+    cfg = proj.analyses.CFGFast()
+
+    all_nodes = list(cfg.model.nodes())
+    for node in all_nodes:
+        if not node.size:
+            continue
+        # the index must return exactly the nodes a linear scan would find
+        for addr in (node.addr, node.addr + node.size - 1):
+            expected = { id(n) for n in all_nodes if n.size and n.addr <= addr < n.addr + n.size }
+            nodes = cfg.model.get_all_nodes(addr, anyaddr=True)
+            nose.tools.assert_equal({ id(n) for n in nodes if n.size }, expected)
+            nose.tools.assert_in(cfg.model.get_any_node(addr, anyaddr=True), nodes)
+
+        nodes = cfg.model.nodes_in_range(node.addr, node.addr + node.size)
+        nose.tools.assert_true(any(n is node for n in nodes))
+        nose.tools.assert_equal([ n.addr for n in nodes ], sorted(n.addr for n in nodes))
+        nose.tools.assert_true(all(n.addr < node.addr + node.size for n in nodes))
+
+    nose.tools.assert_equal(cfg.model.nodes_in_range(0, 1), [ ])
+
+def test_cfg_index_tracks_graph():
+    model = angr.knowledge_plugins.cfg.CFGModel("CFGFast")
+    a = angr.knowledge_plugins.cfg.CFGNode(0x1000, 0x10, model, block_id=0x1000)
+    b = angr.knowledge_plugins.cfg.CFGNode(0x1010, 0x8, model, block_id=0x1010)
+    model.graph.add_node(a)
+    model.add_node(a.addr, a)
+    model.generate_index()
+
+    # b only exists in the graph
+    model.graph.add_edge(a, b, jumpkind='Ijk_Boring')
+    nose.tools.assert_equal(model.get_all_nodes(0x1010), [ b ])
+    nose.tools.assert_is(model.get_any_node(0x1014, anyaddr=True), b)
+
+    model.graph.remove_node(b)
+    nose.tools.assert_equal(model.get_all_nodes(0x1010), [ ])
+    nose.tools.assert_equal(model.nodes_in_range(0x1000, 0x1020), [ a ])
+
+    # replacing the graph rebuilds the index
+    model.graph = model.graph.copy()
+    model.graph.add_node(b)
+    nose.tools.assert_is(model.get_any_node(0x1017, anyaddr=True), b)
+
+    # the model can be pickled with its index
+    model2 = pickle.loads(pickle.dumps(model))
+    nose.tools.assert_is_none(model2.graph.node_index)
+    nose.tools.assert_equal(len(model2.nodes_in_range(0x1000, 0x1020)), 2)
+
+def test_cfg_node_range_index():
+    model = angr.knowledge_plugins.cfg.CFGModel("CFGFast")
+    random.seed(0)
+
+    nodes = [ ]
+    index = angr.knowledge_plugins.cfg.cfg_model.CFGNodeRangeIndex()
+    for i in range(2000):
+        if nodes and random.random() < 0.3:
+            index.discard(nodes.pop(random.randrange(len(nodes))))
+        else:
+            addr = random.choice([ 0x400000, 0x7fffffff0000, 0xfffffffffffff000 ]) + random.randrange(0x800)
+            size = random.choice([ None, 0, 1, 4, 0x10, 0x40, random.randrange(1, 0x1000) ])
+            node = angr.knowledge_plugins.cfg.CFGNode(addr, size, model, block_id=i)
+            nodes.append(node)
+            index.add(node)
+        if i % 10:
+            continue
+
+        # compare with a linear scan
+        index2 = angr.knowledge_plugins.cfg.cfg_model.CFGNodeRangeIndex(nodes)
+        for _ in range(20):
+            addr = random.choice(nodes).addr + random.randrange(-0x10, 0x100)
+            expected = sorted((n for n in nodes if n.addr == addr or (n.size and n.addr < addr < n.addr + n.size)),
+                              key=lambda n: n.addr)
+            for idx in (index, index2):
+                nose.tools.assert_equal(sorted(map(id, idx.containing(addr))), sorted(map(id, expected)))
+                nose.tools.assert_equal([ n.addr for n in idx.containing(addr) ], [ n.addr for n in expected ])
+
+            end = addr + random.randrange(1, 0x100)
+            expected = [ n for n in nodes if n.addr < end and (n.addr >= addr or (n.size and addr < n.addr + n.size)) ]
+            for idx in (index, index2):
+                nose.tools.assert_equal(sorted(map(id, idx.overlapping(addr, end))), sorted(map(id, expected)))
+
+    # a large node only slows down lookups until it is removed
+    small = [ angr.knowledge_plugins.cfg.CFGNode(0x1000 + i * 0x10, 0x10, model, block_id=i) for i in range(0x100) ]
+    large = angr.knowledge_plugins.cfg.CFGNode(0x1000, 0x1000, model, block_id=0x1000)
+    index = angr.knowledge_plugins.cfg.cfg_model.CFGNodeRangeIndex(small + [ large ])
+    nose.tools.assert_equal(len(index._starts_ending_after(0x1f08, 0x1f08)), 2)
+    index.discard(large)
+    nose.tools.assert_equal(index._starts_ending_after(0x1f08, 0x1f08), [ 0x1f00 ])
+    nose.tools.assert_equal(list(index.containing(0x1f08)), [ small[0xf0] ])
+
 if __name__ == "__main__":
     main()
@@ -1,6 +1,7 @@
 import os
 import logging
 import sys
+import tempfile
 
 import nose.tools
 
@@ -478,6 +479,31 @@ def test_segment_list_6():
     nose.tools.assert_equal(seg_list._list[1].sort, 'code')
 
 
+def test_segment_list_7():
+    seg_list = SegmentList()
+
+    seg_list.occupy(0, 10, "code")
+    seg_list.occupy(10, 10, "data")
+    seg_list.occupy(30, 10, "code")
+
+    # release a range in the middle of a segment
+    seg_list.release(2, 3)
+    nose.tools.assert_equal(len(seg_list), 4)
+    nose.tools.assert_equal((seg_list._list[0].start, seg_list._list[0].end), (0, 2))
+    nose.tools.assert_equal((seg_list._list[1].start, seg_list._list[1].end), (5, 10))
+    nose.tools.assert_equal(seg_list._list[1].sort, 'code')
+    nose.tools.assert_false(seg_list.is_occupied(3))
+    nose.tools.assert_equal(seg_list.occupied_size, 27)
+
+    # release a range that spans several segments and a gap
+    seg_list.release(8, 25)
+    nose.tools.assert_equal(len(seg_list), 3)
+    nose.tools.assert_equal((seg_list._list[1].start, seg_list._list[1].end), (5, 8))
+    nose.tools.assert_equal((seg_list._list[2].start, seg_list._list[2].end), (33, 40))
+    nose.tools.assert_equal(seg_list.next_free_pos(5), 8)
+    nose.tools.assert_equal(seg_list.occupied_size, 12)
+
+
 #
 # Serialization
 #
@@ -775,6 +801,137 @@ def test_cfg_with_patches():
     nose.tools.assert_equal(len(not_patched_func.block_addrs_set), 10)
 
 
+def test_cfg_update_with_patches():
+
+    path = os.path.join(test_location, 'x86_64', 'fauxware')
+    proj = angr.Project(path, auto_load_libs=False)
+
+    kb = angr.KnowledgeBase(proj)
+    cfg = proj.analyses.CFGFast(kb=kb, use_patches=True, data_references=True)
+    auth_func_addr = kb.functions['authenticate'].addr
+    main_func = kb.functions['main']
+    main_blocks = set(main_func.block_addrs_set)
+
+    # patch the second instruction of authenticate() to ret, and update the CFG incrementally
+    patch_addr = kb.functions['authenticate']._get_block(auth_func_addr).instruction_addrs[1]
+    kb.patches.add_patch(patch_addr, b"\xc3")
+    cfg.update(patches=[ kb.patches.get_patch(patch_addr) ])
+
+    patched_func = kb.functions['authenticate']
+    nose.tools.assert_equal(len(patched_func.block_addrs_set), 1)
+    nose.tools.assert_equal(len(patched_func._get_block(auth_func_addr).instruction_addrs), 2)
+    # other functions are kept
+    nose.tools.assert_equal(set(kb.functions['main'].block_addrs_set), main_blocks)
+
+    # the result is the same as recovering the CFG from scratch
+    kb_full = angr.KnowledgeBase(proj)
+    kb_full.patches.add_patch(patch_addr, b"\xc3")
+    cfg_full = proj.analyses.CFGFast(kb=kb_full, use_patches=True, data_references=True)
+    nose.tools.assert_equal(sorted(kb.functions), sorted(kb_full.functions))
+    nose.tools.assert_equal(sorted((n.addr, n.size) for n in cfg.graph.nodes()),
+                            sorted((n.addr, n.size) for n in cfg_full.graph.nodes()))
+    nose.tools.assert_equal(sorted((src.addr, dst.addr, data['jumpkind'])
+                                   for src, dst, data in cfg.graph.edges(data=True)),
+                            sorted((src.addr, dst.addr, data['jumpkind'])
+                                   for src, dst, data in cfg_full.graph.edges(data=True)))
+
+    # new function starts
+    cfg.update(function_starts=[ main_func.addr + 0x10 ])
+    nose.tools.assert_in(main_func.addr + 0x10, kb.functions)
+
+
+def test_cfg_update_rebuilds_touched_functions_only():
+
+    # main() calls f() and g(), g() calls f(), and h() is not called by anyone
+    main = b"\xe8\x1b\x00\x00\x00\xe8\x36\x00\x00\x00\xc3"
+    f = b"\x55\x48\x89\xe5\xb8\x01\x00\x00\x00\x5d\xc3"
+    g = b"\xb8\x02\x00\x00\x00\xe8\xd6\xff\xff\xff\xc3"
+    h = b"\x55\x48\x89\xe5\x31\xc0\x5d\xc3"
+    code = b"".join(func + b"\xcc" * (0x20 - len(func)) for func in (main, f, g, h))
+    path = os.path.join(tempfile.mkdtemp(), "blob")
+    with open(path, "wb") as fp:
+        fp.write(code)
+
+    def load_project():
+        return angr.Project(path, main_opts={'backend': 'blob', 'arch': 'amd64', 'base_addr': 0x400000,
+                                             'entry_point': 0x400000})
+
+    def summary(cfg):
+        return (sorted((n.addr, n.size) for n in cfg.graph.nodes()),
+                sorted((src.addr, dst.addr, data['jumpkind']) for src, dst, data in cfg.graph.edges(data=True)),
+                { addr: (sorted(func.block_addrs_set), func.returning) for addr, func in cfg.kb.functions.items() },
+                sorted((src, dst, data['type']) for src, dst, data in cfg.kb.functions.callgraph.edges(data=True)),
+                )
+
+    for patch_addr, patch in ((0x400020, b"\xc3"), (0x400045, b"\x90" * 5), (0x400060, b"\xc3")):
+        proj = load_project()
+        kb = angr.KnowledgeBase(proj)
+        cfg = proj.analyses.CFGFast(kb=kb, use_patches=True, normalize=True, function_starts=[ 0x400060 ])
+        functions = dict(kb.functions.items())
+
+        kb.patches.add_patch(patch_addr, patch)
+        cfg.update(patches=[ kb.patches.get_patch(patch_addr) ])
+
+        # functions that the patch does not touch are kept as they are
+        patched_func_addr = patch_addr & ~0x1f
+        for addr, func in functions.items():
+            if addr not in (patched_func_addr, 0x400000):
+                nose.tools.assert_is(kb.functions[addr], func)
+
+        # the result is the same as recovering the CFG from scratch
+        proj_full = load_project()
+        kb_full = angr.KnowledgeBase(proj_full)
+        kb_full.patches.add_patch(patch_addr, patch)
+        cfg_full = proj_full.analyses.CFGFast(kb=kb_full, use_patches=True, normalize=True,
+                                              function_starts=[ 0x400060 ])
+        nose.tools.assert_equal(summary(cfg), summary(cfg_full))
+
+
+def test_parallel_cfg_recovery():
+
+    # 0x0:   a switch through a jump table at 0x30 to 0x820 - 0x835, and a call to 0x800, which does not return
+    # 0x40:  calls 0x810 and tail-jumps to 0x840
+    # 0x50:  calls 0x0 and 0x40
+    code = bytearray(b"\xcc" * 0x1000)
+    for offset, insns in ((0x0, "554889e583ff03771383e703488d151d000000486304ba4801d0ffe0e8df070000b8010000005dc3"),
+                          (0x30, "f0070000f7070000fe07000005080000"),
+                          (0x40, "554889e5e8c70700005de9f1070000"),
+                          (0x50, "554889e5bf01000000e8a2ffffffe8ddffffff5dc3"),
+                          (0x800, "554889e5ebfe"),
+                          (0x810, "554889e5b8020000005dc3"),
+                          (0x820, "b80a0000005dc3b80b0000005dc3b80c0000005dc3b80d0000005dc3"),
+                          (0x840, "b805000000c3"),
+                          ):
+        insns = bytes.fromhex(insns)
+        code[offset:offset + len(insns)] = insns
+    path = os.path.join(tempfile.mkdtemp(), "blob")
+    with open(path, "wb") as fp:
+        fp.write(code)
+
+    def recover_cfg(**kwargs):
+        proj = angr.Project(path, main_opts={'backend': 'blob', 'arch': 'amd64', 'base_addr': 0x400000,
+                                             'entry_point': 0x400000})
+        return proj.analyses.CFGFast(kb=angr.KnowledgeBase(proj), **kwargs)
+
+    def summary(cfg):
+        return (sorted((n.addr, n.size) for n in cfg.graph.nodes()),
+                sorted((src.addr, dst.addr, data['jumpkind']) for src, dst, data in cfg.graph.edges(data=True)),
+                { addr: (sorted(func.block_addrs_set), func.returning) for addr, func in cfg.kb.functions.items() },
+                { addr: sorted(jump.resolved_targets) for addr, jump in cfg.jump_tables.items() },
+                )
+
+    cfg = recover_cfg()
+    nose.tools.assert_equal(cfg.jump_tables[0x400009].resolved_targets, [ 0x400820, 0x400827, 0x40082e, 0x400835 ])
+    nose.tools.assert_in(0x400840, cfg.kb.functions[0x400040].block_addrs_set)
+    nose.tools.assert_true(cfg.kb.functions[0x400050].returning)
+
+    # the jump table, the calls, and the tail jump cross partition boundaries
+    for workers in (2, 3, 4):
+        cfg_parallel = recover_cfg(workers=workers)
+        nose.tools.assert_is_not_none(cfg_parallel._partitions)
+        nose.tools.assert_equal(summary(cfg_parallel), summary(cfg))
+
+
 def test_unresolvable_targets():
 
     path = os.path.join(test_location, 'cgc', 'CADET_00002')
@@ -839,6 +996,9 @@ def run_all():
     test_data_references()
     test_function_leading_blocks_merging()
     test_cfg_with_patches()
+    test_cfg_update_with_patches()
+    test_cfg_update_rebuilds_touched_functions_only()
+    test_parallel_cfg_recovery()
     test_indirect_jump_to_outside()
 
 
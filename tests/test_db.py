@@ -1,9 +1,11 @@
 
 import os
+import pickle
 import tempfile
 
 import angr
 from angr.angrdb import AngrDB
+from angr.knowledge_plugins.cfg.cfg_model import CFGModel
 
 test_location = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'binaries', 'tests')
 
@@ -141,7 +143,96 @@ def test_angrdb_save_multiple_times():
     assert proj1.kb.comments[proj.entry] == "Comment 22222222222222222222222"
 
 
+def test_angrdb_columnar_cfg():
+    bin_path = os.path.join(test_location, "x86_64", "fauxware")
+
+    proj = angr.Project(bin_path, auto_load_libs=False)
+    cfg = proj.analyses.CFGFast(data_references=True, cross_references=True, normalize=True)  # type: angr.analyses.CFGFast
+
+    dtemp = tempfile.mkdtemp()
+    db_file = os.path.join(dtemp, "fauxware.adb")
+    AngrDB(proj).dump(db_file, columnar_cfg=True)
+
+    new_proj = AngrDB().load(db_file)
+    new_cfg = new_proj.kb.cfgs['CFGFast']
+    assert new_cfg.lazy
+    assert len(new_proj.kb.functions) == len(proj.kb.functions)
+
+    # looking up a node does not create the graph
+    main = proj.kb.functions['main']
+    new_node = new_cfg.get_any_node(main.addr)
+    assert new_node.size == cfg.model.get_any_node(main.addr).size
+    assert new_node.function_address == main.addr
+    assert new_cfg.lazy
+
+    assert len(new_cfg.graph) == len(cfg.model.graph)
+    assert not new_cfg.lazy
+    assert new_cfg.get_any_node(main.addr) is new_node
+    for node in cfg.model.nodes():
+        new_node = new_cfg.get_any_node(node.addr)
+        assert new_node.size == node.size
+        assert new_node.function_address == node.function_address
+        assert list(new_node.instruction_addrs) == list(node.instruction_addrs)
+        assert sorted((n.addr, jk) for n, jk in new_cfg.get_successors_and_jumpkind(new_node, excluding_fakeret=False)) \
+            == sorted((n.addr, jk) for n, jk in cfg.model.get_successors_and_jumpkind(node, excluding_fakeret=False))
+
+    for addr, memory_data in cfg.model.memory_data.items():
+        new_memory_data = new_cfg.memory_data[addr]
+        assert memory_data.size == new_memory_data.size
+        assert memory_data.sort == new_memory_data.sort
+        assert memory_data.content == new_memory_data.content
+
+    assert cfg.model.insn_addr_to_memory_data.keys() == new_cfg.insn_addr_to_memory_data.keys()
+
+    # load it from a memory-mapped file
+    cfg_file = os.path.join(dtemp, "fauxware.cfg")
+    with open(cfg_file, "wb") as f:
+        f.write(cfg.model.serialize_columnar())
+    mapped_cfg = CFGModel.load_columnar(cfg_file)
+    assert mapped_cfg.get_node(main.addr).addr == main.addr
+    assert mapped_cfg.graph.number_of_edges() == cfg.model.graph.number_of_edges()
+
+
+def test_columnar_cfg_edge_attributes_and_pickling():
+    # main calls f twice
+    code = b"\xe8\x0b\x00\x00\x00\xe8\x06\x00\x00\x00\xc3" + b"\x90" * 5 + b"\x31\xc0\xc3"
+    path = os.path.join(tempfile.mkdtemp(), "blob")
+    with open(path, "wb") as f:
+        f.write(code)
+    proj = angr.Project(path, main_opts={'backend': 'blob', 'arch': 'amd64', 'base_addr': 0x400000,
+                                         'entry_point': 0x400000})
+    cfg = proj.analyses.CFGFast(normalize=True)
+    src, dst, data = next(iter(cfg.model.graph.edges(data=True)))
+    data['stmt_id'] = -2
+    data['outside'] = True
+    data['kind'] = "call"
+    data['note'] = None
+
+    model = CFGModel.parse_columnar(cfg.model.serialize_columnar(), loader=proj.loader)
+    assert model.lazy
+    edges = dict(((s.addr, d.addr), data) for s, d, data in model.graph.edges(data=True))
+    assert edges[(src.addr, dst.addr)] == data
+    assert len(edges) == cfg.model.graph.number_of_edges()
+
+    # a lazy model is materialized before it is pickled
+    model = CFGModel.parse_columnar(cfg.model.serialize_columnar(), loader=proj.loader)
+    model_copy = pickle.loads(pickle.dumps(model, -1))
+    assert model_copy.graph.number_of_edges() == cfg.model.graph.number_of_edges()
+    assert model_copy.get_any_node(src.addr).addr == src.addr
+
+    # values that cannot be stored in columns are rejected
+    data['note'] = object()
+    try:
+        cfg.model.serialize_columnar()
+    except NotImplementedError:
+        pass
+    else:
+        assert False, "an edge attribute of an unsupported type was serialized"
+
+
 if __name__ == "__main__":
     test_angrdb_fauxware()
     test_angrdb_open_multiple_times()
     test_angrdb_save_multiple_times()
+    test_angrdb_columnar_cfg()
+    test_columnar_cfg_edge_attributes_and_pickling()
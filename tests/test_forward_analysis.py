@@ -0,0 +1,112 @@
+import networkx
+import nose
+
+from angr.analyses.forward_analysis import ForwardAnalysis
+from angr.analyses.forward_analysis.job_info import JobInfo, JobInfoQueue
+from angr.analyses.forward_analysis.visitors.graph import GraphVisitor
+
+
+class _GraphVisitor(GraphVisitor):
+    def __init__(self, graph):
+        super(_GraphVisitor, self).__init__()
+        self.graph = graph
+        self.reset()
+
+    def successors(self, node):
+        return list(self.graph.successors(node))
+
+    def predecessors(self, node):
+        return list(self.graph.predecessors(node))
+
+    def sort_nodes(self, nodes=None):
+        return sorted(self.graph.nodes() if nodes is None else nodes)
+
+
+class _ConstantCounter(ForwardAnalysis):
+    """
+    Count the number of times each node can be reached from node 0, up to a bound.
+    """
+    def __init__(self, graph, bound):
+        super(_ConstantCounter, self).__init__(order_jobs=True, allow_merging=True,
+                                               graph_visitor=_GraphVisitor(graph))
+        self.bound = bound
+        self.output = { }
+        self._analyze()
+
+    def _pre_analysis(self):
+        pass
+
+    def _intra_analysis(self):
+        pass
+
+    def _post_analysis(self):
+        pass
+
+    def _initial_abstract_state(self, node):
+        return 1
+
+    def _merge_states(self, node, *states):
+        merged = min(sum(states), self.bound)
+        return merged, merged == states[0]
+
+    def _run_on_node(self, node, state):
+        changed = self.output.get(node, None) != state
+        self.output[node] = state
+        return changed, state
+
+
+def test_job_info_queue():
+    queue = JobInfoQueue(key=lambda job_info: job_info.job)
+    job_infos = [ JobInfo(i, job) for i, job in enumerate([ 3, 1, 2, 1 ]) ]
+    for job_info in job_infos:
+        queue.push(job_info)
+
+    nose.tools.assert_equal(len(queue), 4)
+    # jobs with the same key are popped in the reverse order of insertion
+    nose.tools.assert_equal([ job_info.key for job_info in queue ], [ 3, 1, 2, 0 ])
+    nose.tools.assert_is(queue[1], job_infos[1])
+
+    nose.tools.assert_true(queue.remove(job_infos[3]))
+    nose.tools.assert_false(queue.remove(job_infos[3]))
+    nose.tools.assert_not_in(job_infos[3], queue)
+    nose.tools.assert_is(queue.peek(), job_infos[1])
+
+    # pushing a job that is in the queue again replaces its old entry
+    queue.push(job_infos[0])
+    nose.tools.assert_equal(len(queue), 3)
+    nose.tools.assert_equal([ queue.pop().key for _ in range(3) ], [ 1, 2, 0 ])
+    nose.tools.assert_raises(IndexError, queue.pop)
+
+    queue = JobInfoQueue()
+    for job_info in job_infos:
+        queue.push(job_info)
+    nose.tools.assert_equal([ queue.pop().key for _ in range(4) ], [ 0, 1, 2, 3 ])
+
+
+def test_graph_visitor_worklist():
+    graph = networkx.DiGraph([ (0, 1), (1, 2), (2, 1), (2, 3) ])
+    visitor = _GraphVisitor(graph)
+
+    nose.tools.assert_equal(visitor.next_node(), 0)
+    nose.tools.assert_equal(visitor.next_node(), 1)
+    visitor.revisit_node(0)
+    visitor.revisit_successors(2)
+    nose.tools.assert_equal([ visitor.next_node() for _ in range(4) ], [ 0, 1, 2, 3 ])
+    nose.tools.assert_is_none(visitor.next_node())
+
+
+def test_visit_counts():
+    graph = networkx.DiGraph([ (0, 1), (1, 2), (2, 1), (2, 3) ])
+    analysis = _ConstantCounter(graph, 4)
+
+    nose.tools.assert_equal(analysis.output, { 0: 1, 1: 4, 2: 4, 3: 4 })
+    visit_counts = analysis.visit_counts
+    nose.tools.assert_equal(visit_counts[0], 1)
+    nose.tools.assert_equal(visit_counts[1], 4)
+    nose.tools.assert_equal(sum(visit_counts.values()), 9)
+
+
+if __name__ == "__main__":
+    test_job_info_queue()
+    test_graph_visitor_worklist()
+    test_visit_counts()
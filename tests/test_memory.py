@@ -1,10 +1,11 @@
 import time
 import os
+import pickle
 
 import claripy
 import nose
 
-from angr.storage.paged_memory import SimPagedMemory
+from angr.storage.paged_memory import SimPagedMemory, ConcretePage
 from angr import SimState, SIM_PROCEDURES
 from angr import options as o
 from angr.state_plugins import SimSystemPosix, SimLightRegisters
@@ -52,6 +53,83 @@ def test_copy():
     nose.tools.assert_equal(sorted(s.solver.eval_upto(ret_x, 100)), list(range(10)))
     nose.tools.assert_equal(sorted(s.solver.eval_upto(result, 100, cast_to=bytes, extra_constraints=[ret_x==3])), [ b"ABCXX" ])
 
+def test_copy_contents_direct():
+    s = SimState(arch="AMD64")
+    x = s.solver.BVS('x', 32)
+    data = bytes(range(256)) * 32
+    s.memory.store(0x10f00, data)
+    s.memory.store(0x10f10, x)
+
+    # copies across page boundaries, without loading the source as one expression
+    copied = s.memory.copy_contents(0x20080, 0x10f00, len(data))
+    nose.tools.assert_true(s.solver.is_true(copied == s.memory.load(0x10f00, len(data))))
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(0x20080, 0x10), data[:0x10])
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(0x20094, len(data)), data[0x14:])
+    nose.tools.assert_true(s.memory.mem[0x20090].object is x)
+    nose.tools.assert_true(s.memory.load(0x20090, 4) is x)
+    nose.tools.assert_true(s.solver.is_true(s.memory.load(0x20082, 4) == s.memory.load(0x10f02, 4)))
+    nose.tools.assert_true(0x20080 + len(data) - 1 in s.scratch.dirty_addrs)
+
+    # partial copies of a symbolic memory object keep the expression
+    s.memory.copy_contents(0x30002, 0x10f11, 2)
+    nose.tools.assert_true(s.memory.mem[0x30002].object is x)
+    nose.tools.assert_true(s.memory.load(0x30002, 2) is x[23:8])
+
+    # overlapping copies behave like memmove
+    s.memory.store(0x40000, b"ABCDEFGH")
+    copied = s.memory.copy_contents(0x40002, 0x40000, 6)
+    nose.tools.assert_equal(s.solver.eval(copied, cast_to=bytes), b"ABCDEF")
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(0x40000, 8), b"ABABCDEF")
+    s.memory.copy_contents(0x40000, 0x40002, 6)
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(0x40000, 8), b"ABCDEFEF")
+
+    # copies from uninitialized memory fall back to loading and storing it
+    s.memory.store(0x50000, b"AB")
+    s.memory.copy_contents(0x60000, 0x50000, 4)
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x60000, 2), cast_to=bytes), b"AB")
+    nose.tools.assert_true(s.memory.load(0x60002, 2).symbolic)
+
+    # so do copies that breakpoints observe
+    reads = [ ]
+    s.inspect.b('mem_read', action=lambda state: reads.append(state.inspect.mem_read_address))
+    s.memory.copy_contents(0x70000, 0x40000, 8)
+    nose.tools.assert_equal(len(reads), 1)
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(0x70000, 8, inspect=False), b"ABCDEFEF")
+
+def test_copy_contents_without_data():
+    s = SimState(arch="AMD64")
+    s.register_plugin('posix', SimSystemPosix(stdin=SimFile(name='stdin', content=b'ABCDEFGHIJKLMNOP', has_end=True)))
+    x = s.solver.BVS('x', 32)
+    s.memory.store(0x10000, b"ABCDEFGH")
+    s.memory.store(0x10008, x)
+
+    # nothing is loaded when the data is not asked for
+    def load(*args, **kwargs):
+        raise AssertionError("Unexpected load")
+    s.memory.load = load
+    s.posix.stdin.load = load
+    try:
+        nose.tools.assert_is_none(s.memory.copy_contents(0x20000, 0x10000, 12, return_data=False))
+
+        memcpy = SIM_PROCEDURES['libc']['memcpy']()
+        memcpy.execute(s, arguments=(s.solver.BVV(0x30000, 64), s.solver.BVV(0x10000, 64), s.solver.BVV(12, 64)))
+
+        # reads that stay inside a file are copied from the file directly
+        nose.tools.assert_equal(s.solver.eval(s.posix.get_fd(0).read(0x40000, 8)), 8)
+    finally:
+        del s.memory.load
+        del s.posix.stdin.load
+
+    for addr in (0x20000, 0x30000):
+        nose.tools.assert_equal(s.memory.load_concrete_bytes(addr, 8), b"ABCDEFGH")
+        nose.tools.assert_true(s.memory.load(addr + 8, 4) is x)
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(0x40000, 8), b"ABCDEFGH")
+
+    # reads that may run into the end of the file are loaded and stored
+    realsize = s.posix.get_fd(0).read(0x40008, 16)
+    nose.tools.assert_equal(s.solver.eval_upto(realsize, 2), [ 8 ])
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x40000, 16), cast_to=bytes), b"ABCDEFGHIJKLMNOP")
+
 def _concrete_memory_tests(s):
     # Store a 4-byte variable to memory directly...
     s.memory.store(100, s.solver.BVV(0x1337, 32))
@@ -479,6 +557,45 @@ def test_abstract_memory_find():
     nose.tools.assert_equal(list(r_model.regions.keys()), ['global'])
     nose.tools.assert_true(claripy.backends.vsa.identical(r_model.regions['global'], s_expected))
 
+def test_concrete_memory_find():
+    s = SimState(arch="AMD64")
+    s.memory.store(0x1000, b"A" * 0x1000 + b"BCD\x00")
+
+    # matches in concrete memory are found without any symbolic conditions
+    r, c, i = s.memory.find(0x1000, b"BCD", max_search=0x2000)
+    nose.tools.assert_false(r.symbolic)
+    nose.tools.assert_equal(s.solver.eval(r), 0x2000)
+    nose.tools.assert_equal((c, i), ([ ], [ 0x1000 ]))
+
+    # the stride is respected
+    r, _, i = s.memory.find(0x1000, b"\x00", max_search=0x2000, step=2)
+    nose.tools.assert_equal(s.solver.eval(r), 0x1000 + 0x1004)
+    # "AB" is only at an odd offset, so only the uninitialized bytes after the string may match
+    r, _, i = s.memory.find(0x1000, b"AB", max_search=0x1008, step=2)
+    nose.tools.assert_equal(i, [ 0x1004, 0x1006 ])
+
+    # matches beyond max_search are not found
+    r, c, i = s.memory.find(0x1000, b"BCD", max_search=0x1002, default=0)
+    nose.tools.assert_equal(i, [ ])
+    nose.tools.assert_equal(s.solver.eval(r), 0)
+
+    # symbolic conditions are built from the first symbolic byte onward
+    x = s.solver.BVS('x', 8)
+    s.memory.store(0x2000, b"A" * 0x300)
+    s.memory.store(0x2300, x)
+    s.memory.store(0x2301, b"\x00")
+    r, c, i = s.memory.find(0x2000, b"\x00", max_search=0x400)
+    nose.tools.assert_equal(i, [ 0x300, 0x301 ])
+    nose.tools.assert_equal(s.solver.eval_upto(r, 3, extra_constraints=[ x != 0 ]), [ 0x2301 ])
+    nose.tools.assert_equal(sorted(s.solver.eval_upto(r, 3)), [ 0x2300, 0x2301 ])
+
+    # the results match the symbolic search
+    s2 = s.copy()
+    s2.inspect.b('mem_read', action=lambda state: None)
+    r2, c2, i2 = s2.memory.find(0x2000, b"\x00", max_search=0x400)
+    nose.tools.assert_equal(i2, i)
+    nose.tools.assert_false(s2.solver.satisfiable(extra_constraints=[ r2 != r ]))
+
 #@nose.tools.timed(10)
 def test_registers():
     s = SimState(arch='AMD64')
@@ -618,6 +735,120 @@ def test_load_bytes():
     items = s.memory.mem.load_objects(0x8000, 0x2000)
     assert len(items) == 0
 
+def test_concrete_page():
+    s = SimState(arch='AMD64')
+    s.memory.store(0x4000, b'ABCDEFGH')
+    s.memory.store(0x4002, s.solver.BVV(0x5859, 16))
+    page = s.memory.mem._pages[0x4000 // s.memory.mem._page_size]
+    nose.tools.assert_is_instance(page, ConcretePage)
+
+    # concrete memory objects keep the extent of the original stores
+    mo = s.memory.mem[0x4000]
+    nose.tools.assert_equal((mo.base, mo.length), (0x4000, 2))
+    mo = s.memory.mem[0x4003]
+    nose.tools.assert_equal((mo.base, mo.length), (0x4002, 2))
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x4000, 8), cast_to=bytes), b'ABXYEFGH')
+
+    # and are created only once until they are overwritten
+    nose.tools.assert_is(s.memory.mem[0x4002], mo)
+    s.memory.store(0x4001, b'Z')
+    nose.tools.assert_is(s.memory.mem[0x4002], mo)
+    mo = s.memory.mem[0x4000]
+    nose.tools.assert_equal((mo.base, mo.length), (0x4000, 1))
+    s.memory.store(0x4000, b'AB')
+    nose.tools.assert_is_not(s.memory.mem[0x4000], mo)
+    nose.tools.assert_equal(s.solver.eval(s.memory.mem[0x4001].bytes_at(0x4001, 1), cast_to=bytes), b'B')
+
+    # symbolic bytes in the middle of a concrete run
+    x = s.solver.BVS('x', 16)
+    s.memory.store(0x4003, x)
+    nose.tools.assert_equal(len(s.memory.mem.load_objects(0x4000, 8)), 3)
+    nose.tools.assert_true(s.memory.load(0x4000, 8).symbolic)
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x4005, 3), cast_to=bytes), b'FGH')
+
+    # copies do not share data
+    s2 = s.copy()
+    s2.memory.store(0x4000, b'abcdefgh')
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x4005, 3), cast_to=bytes), b'FGH')
+    nose.tools.assert_equal(s2.solver.eval(s2.memory.load(0x4000, 8), cast_to=bytes), b'abcdefgh')
+    nose.tools.assert_equal(s.memory.changed_bytes(s2.memory), set(range(0x4000, 0x4008)))
+
+    # the reverse hash mapping requires memory objects to be stable
+    s = SimState(arch='AMD64', add_options={o.REVERSE_MEMORY_HASH_MAP})
+    s.memory.store(0x4000, b'ABCDEFGH')
+    nose.tools.assert_not_is_instance(s.memory.mem._pages[0x4000 // s.memory.mem._page_size], ConcretePage)
+
+def test_changed_bytes_history():
+    for options in (set(), { o.REVERSE_MEMORY_HASH_MAP }):
+        s = SimState(arch='AMD64', add_options=options)
+        x = s.solver.BVS('x', 32)
+        s.memory.store(0x4000, b'A' * 0x2000)
+        s.memory.store(0x4800, x)
+
+        s1 = s.copy()
+        s2 = s.copy()
+        s1.memory.store(0x4010, b'BB')
+        s2.memory.store(0x5ffe, b'CCCC')
+        # bytes that are written with their old values do not differ
+        s2.memory.store(0x4020, b'AA')
+        s2.memory.store(0x4801, x[23:16])
+
+        page_num = 0x4000 // s.memory.mem._page_size
+        page1, page2 = s1.memory.mem._pages[page_num], s2.memory.mem._pages[page_num]
+        nose.tools.assert_equal(page1.written_since_common_ancestor(page2), [ 0x10, 0x11, 0x20, 0x21, 0x801 ])
+        nose.tools.assert_equal(page1.written_since_common_ancestor(s.memory.mem._pages[page_num]), [ 0x10, 0x11 ])
+
+        expected = { 0x4010, 0x4011, 0x5ffe, 0x5fff, 0x6000, 0x6001 }
+        nose.tools.assert_equal(s1.memory.changed_bytes(s2.memory), expected)
+        nose.tools.assert_equal(s2.memory.changed_bytes(s1.memory), expected)
+
+        # histories are followed through chains of copies
+        s3 = s1.copy()
+        for i in range(100):
+            s3.memory.store(0x4100 + i, b'D')
+            s3 = s3.copy()
+        nose.tools.assert_equal(s3.memory.changed_bytes(s2.memory), expected | set(range(0x4100, 0x4164)))
+        nose.tools.assert_equal(s3.memory.changed_bytes(s.memory), { 0x4010, 0x4011 } | set(range(0x4100, 0x4164)))
+
+        # pages without a common ancestor are compared entirely
+        s4 = pickle.loads(pickle.dumps(s1, -1))
+        nose.tools.assert_is_none(s4.memory.mem._pages[page_num].written_since_common_ancestor(page2))
+        nose.tools.assert_equal(s4.memory.changed_bytes(s2.memory) - { 0x4800, 0x4801, 0x4802, 0x4803 }, expected)
+
+def test_page_versions():
+    s = SimState(arch='AMD64')
+    s.memory.store(0x4000, b'A' * 0x10)
+    page_num = 0x4000 // s.memory.mem._page_size
+    version = s.memory.mem._pages[page_num].version
+
+    # copies share pages, and their versions, until they are written to
+    s1 = s.copy()
+    nose.tools.assert_equal(s1.memory.mem._pages[page_num].version, version)
+    s1.memory.store(0x4000, b'B')
+    nose.tools.assert_not_equal(s1.memory.mem._pages[page_num].version, version)
+    nose.tools.assert_equal(s.memory.mem._pages[page_num].version, version)
+
+    # pages that are written to in place get new versions too, as do pages whose permissions change
+    version = s1.memory.mem._pages[page_num].version
+    s1.memory.store(0x4001, b'B')
+    nose.tools.assert_not_equal(s1.memory.mem._pages[page_num].version, version)
+    version = s1.memory.mem._pages[page_num].version
+    s1.memory.permissions(0x4000, 1)
+    nose.tools.assert_not_equal(s1.memory.mem._pages[page_num].version, version)
+
+    # changing the permissions of a shared page copies it first
+    version = s.memory.mem._pages[page_num].version
+    permissions = s.solver.eval(s.memory.permissions(0x4000))
+    s3 = s.copy()
+    s3.memory.permissions(0x4000, 1)
+    nose.tools.assert_equal(s.solver.eval(s3.memory.permissions(0x4000)), 1)
+    nose.tools.assert_equal(s.solver.eval(s.memory.permissions(0x4000)), permissions)
+    nose.tools.assert_equal(s.memory.mem._pages[page_num].version, version)
+
+    # versions are not pickled
+    s2 = pickle.loads(pickle.dumps(s, -1))
+    nose.tools.assert_not_equal(s2.memory.mem._pages[page_num].version, s.memory.mem._pages[page_num].version)
+
 def test_fast_memory():
     s = SimState(arch='AMD64', add_options={o.FAST_REGISTERS, o.FAST_MEMORY})
 
@@ -729,14 +960,20 @@ if __name__ == '__main__':
     test_fast_memory()
     test_light_memory()
     test_load_bytes()
+    test_concrete_page()
+    test_changed_bytes_history()
+    test_page_versions()
     test_false_condition()
     test_symbolic_write()
     test_fullpage_write()
     test_memory()
     test_copy()
+    test_copy_contents_direct()
+    test_copy_contents_without_data()
     test_cased_store()
     test_abstract_memory()
     test_abstract_memory_find()
+    test_concrete_memory_find()
     test_registers()
     test_concrete_memset()
     test_paged_memory_membacker_equal_size()
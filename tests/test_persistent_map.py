@@ -0,0 +1,75 @@
+import pickle
+
+import nose
+
+from angr.storage.persistent_map import PersistentMap, PersistentSet
+from angr import SimState
+
+
+class CollidingKey:
+    def __init__(self, v):
+        self.v = v
+
+    def __hash__(self):
+        return 1
+
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and other.v == self.v
+
+
+def test_persistent_map():
+    m = PersistentMap()
+    for i in range(1000):
+        m[i * 0x1001] = i
+    nose.tools.assert_equal(len(m), 1000)
+    nose.tools.assert_equal(m[0x1001 * 500], 500)
+    nose.tools.assert_not_in(3, m)
+
+    m2 = m.copy()
+    m2[0] = 'changed'
+    del m2[0x1001]
+    m2[-1] = 'negative'
+    nose.tools.assert_equal(m[0], 0)
+    nose.tools.assert_equal(m[0x1001], 1)
+    nose.tools.assert_not_in(-1, m)
+    nose.tools.assert_equal(m2[0], 'changed')
+    nose.tools.assert_not_in(0x1001, m2)
+    nose.tools.assert_equal(len(m), 1000)
+    nose.tools.assert_equal(len(m2), 1000)
+    nose.tools.assert_raises(KeyError, m2.__delitem__, 0x1001)
+
+    # keys with identical hashes
+    for i in range(5):
+        m[CollidingKey(i)] = i
+    m3 = m.copy()
+    del m3[CollidingKey(2)]
+    nose.tools.assert_equal(m[CollidingKey(2)], 2)
+    nose.tools.assert_not_in(CollidingKey(2), m3)
+    nose.tools.assert_equal(m3[CollidingKey(4)], 4)
+
+    nose.tools.assert_equal(dict(pickle.loads(pickle.dumps(m2)).items()), dict(m2.items()))
+
+def test_persistent_set():
+    s = PersistentSet([1, 2, 3])
+    s2 = s.copy()
+    s2.add(4)
+    s.discard(1)
+    nose.tools.assert_equal(sorted(s), [2, 3])
+    nose.tools.assert_equal(sorted(s2), [1, 2, 3, 4])
+
+def test_paged_memory_branch():
+    s = SimState(arch='AMD64')
+    for i in range(64):
+        s.memory.store(0x100000 + i * 0x1000, b'A')
+    s2 = s.copy()
+    s2.memory.store(0x100000, b'B')
+    s2.memory.store(0x900000, b'C')
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x100000, 1), cast_to=bytes), b'A')
+    nose.tools.assert_equal(s2.solver.eval(s2.memory.load(0x100000, 1), cast_to=bytes), b'B')
+    nose.tools.assert_not_in(0x900000 // 0x1000, s.memory.mem._pages)
+    nose.tools.assert_is(s.memory.mem._pages[0x101], s2.memory.mem._pages[0x101])
+
+if __name__ == '__main__':
+    test_persistent_map()
+    test_persistent_set()
+    test_paged_memory_branch()
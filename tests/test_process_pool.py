@@ -0,0 +1,93 @@
+import io
+import os
+import concurrent.futures
+
+import nose
+
+import angr
+from angr.exploration_techniques.process_pool import _dumps
+
+location = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'binaries', 'tests')
+
+
+def _run(proj, technique=None):
+    simgr = proj.factory.simulation_manager()
+    if technique is not None:
+        simgr.use_technique(technique)
+    simgr.run()
+    return simgr
+
+def test_process_pool():
+    proj = angr.Project(os.path.join(location, 'x86_64', 'fauxware'), auto_load_libs=False)
+
+    simgr = _run(proj)
+    technique = angr.exploration_techniques.ProcessPool(workers=2, batch_size=2)
+    try:
+        pooled = _run(proj, technique)
+    finally:
+        technique.shutdown()
+
+    # the same states end up in the same stashes, in the same order
+    nose.tools.assert_equal(sorted(simgr.stashes), sorted(pooled.stashes))
+    for stash in simgr.stashes:
+        nose.tools.assert_equal([ s.addr for s in simgr.stashes[stash] ], [ s.addr for s in pooled.stashes[stash] ])
+    nose.tools.assert_equal(len(pooled.deadended), 3)
+
+    for state, pooled_state in zip(simgr.deadended, pooled.deadended):
+        nose.tools.assert_equal(list(state.history.bbl_addrs), list(pooled_state.history.bbl_addrs))
+        nose.tools.assert_equal(state.posix.dumps(1), pooled_state.posix.dumps(1))
+    nose.tools.assert_in(b'SOSNEAKY', b''.join(s.posix.dumps(0) for s in pooled.deadended))
+
+def test_process_pool_shared_pages():
+    # mov rax, 0x600000; mov byte [rax], 0x41; cmp rdi, 0; je +3; mov byte [rax], 0x42; jmp $
+    code = bytes.fromhex('48c7c000006000c600414883ff007403c60042ebfe')
+    proj = angr.Project(io.BytesIO(code), main_opts={'backend': 'blob', 'arch': 'amd64', 'base_addr': 0x400000,
+                                                     'entry_point': 0x400000})
+    state = proj.factory.blank_state()
+    state.memory.store(0x700000, b'?')
+
+    simgr = proj.factory.simulation_manager(state)
+    technique = angr.exploration_techniques.ProcessPool(workers=1)
+    simgr.use_technique(technique)
+    try:
+        simgr.step()
+    finally:
+        technique.shutdown()
+    nose.tools.assert_equal(len(simgr.active), 2)
+
+    # the successors share the untouched page with their parent. writing to either side must not affect the other.
+    state.memory.store(0x700000, b'Z')
+    for succ in simgr.active:
+        nose.tools.assert_equal(succ.solver.eval(succ.memory.load(0x700000, 1), cast_to=bytes), b'?')
+    simgr.active[0].memory.store(0x700000, b'Y')
+    nose.tools.assert_equal(simgr.active[1].solver.eval(simgr.active[1].memory.load(0x700000, 1), cast_to=bytes), b'?')
+
+def test_process_pool_unresolved_refs():
+    # mov rax, 1; jmp $
+    code = bytes.fromhex('48c7c001000000ebfe')
+    proj = angr.Project(io.BytesIO(code), main_opts={'backend': 'blob', 'arch': 'amd64', 'base_addr': 0x400000,
+                                                     'entry_point': 0x400000})
+    state = proj.factory.blank_state()
+    simgr = proj.factory.simulation_manager(state)
+    technique = angr.exploration_techniques.ProcessPool(workers=1)
+
+    # the result of a worker refers to an object that the manager does not know about
+    class WorkerOnly:
+        pass
+    worker_only = WorkerOnly()
+    data = _dumps(('ok', 0, worker_only), [ (('object', 'WorkerOnly', 0), worker_only) ])
+    future = concurrent.futures.Future()
+    future.set_result([ data ])
+    technique._shared = [ ]
+    technique._next_counter = 0
+    technique._pending[id(state)] = (state, 0, future, 0)
+
+    # the state is stepped locally instead
+    succ = technique.successors(simgr, state)
+    nose.tools.assert_equal([ s.addr for s in succ.flat_successors ], [ 0x400007 ])
+    nose.tools.assert_equal(succ.flat_successors[0].solver.eval(succ.flat_successors[0].regs.rax), 1)
+
+if __name__ == '__main__':
+    test_process_pool()
+    test_process_pool_shared_pages()
+    test_process_pool_unresolved_refs()
@@ -0,0 +1,49 @@
+import sys
+import subprocess
+
+import nose
+
+import angr
+from angr.procedures.definitions import SimLibraries, SimLibrary
+from angr.procedures.definitions.library_index import VERSION, LIBRARY_INDEX
+
+
+def test_library_index_up_to_date():
+    nose.tools.assert_equal(VERSION, SimLibraries.INDEX_VERSION)
+    nose.tools.assert_equal(angr.SIM_LIBRARIES.build_index(), LIBRARY_INDEX)
+
+
+def test_lazy_sim_libraries():
+    # importing angr does not load any library definitions
+    code = "import angr; L = angr.SIM_LIBRARIES; " \
+           "print(L.is_loaded('libc.so.6'), 'libc.so.6' in L, 'libfoo.so' in L, L.is_loaded('libc.so.6'), " \
+           "L['libc.so.6'] is L['libc.so'], L.is_loaded('libc.so.6'), L.is_loaded('kernel32.dll'))"
+    output = subprocess.check_output([ sys.executable, "-c", code ], stderr=subprocess.DEVNULL)
+    nose.tools.assert_equal(output.split(), [ b'False', b'True', b'False', b'False', b'True', b'True', b'False' ])
+
+
+def test_sim_libraries_mapping():
+    libraries = angr.SIM_LIBRARIES
+    names = set(name for names in LIBRARY_INDEX.values() for name in names)
+    nose.tools.assert_true(names.issubset(set(libraries)))
+    nose.tools.assert_equal(len(libraries), len(set(libraries)))
+
+    lib = SimLibrary()
+    lib.set_library_names('libangrtest.so')
+    try:
+        nose.tools.assert_is(libraries['libangrtest.so'], lib)
+        nose.tools.assert_true(libraries.is_loaded('libangrtest.so'))
+        nose.tools.assert_in('libangrtest.so', list(libraries))
+    finally:
+        del libraries['libangrtest.so']
+    nose.tools.assert_not_in('libangrtest.so', libraries)
+    nose.tools.assert_is_none(libraries.get('libangrtest.so'))
+
+    nose.tools.assert_is(libraries['linux'], libraries.get('linux'))
+    nose.tools.assert_true(all(isinstance(lib, SimLibrary) for lib in libraries.values()))
+
+
+if __name__ == "__main__":
+    test_library_index_up_to_date()
+    test_lazy_sim_libraries()
+    test_sim_libraries_mapping()
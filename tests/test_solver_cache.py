@@ -0,0 +1,80 @@
+import nose
+
+import claripy
+from angr import SimState, sim_options as o
+from angr.state_plugins.solver import global_solver_cache
+
+
+def _make_state():
+    s = SimState(arch='AMD64', add_options={ o.GLOBAL_SOLVER_CACHE })
+    return s
+
+
+def test_global_solver_cache():
+    global_solver_cache.clear()
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+
+    s0 = _make_state()
+    s0.solver.add(x > 10, x < 20)
+    nose.tools.assert_equal(s0.solver.min(x), 11)
+    nose.tools.assert_equal(global_solver_cache.hits, 0)
+
+    # a sibling state with the same constraints, added in a different order, reuses the results
+    s1 = _make_state()
+    s1.solver.add(x < 20, x > 10)
+    nose.tools.assert_equal(s1.solver.min(x), 11)
+    nose.tools.assert_equal(global_solver_cache.hits, 1)
+    nose.tools.assert_equal(global_solver_cache.hit_rate, 0.5)
+
+    # different extra constraints are different queries
+    nose.tools.assert_equal(s1.solver.min(x, extra_constraints=(x > 15,)), 16)
+    nose.tools.assert_false(s1.solver.satisfiable(extra_constraints=(x == 5,)))
+    nose.tools.assert_equal(global_solver_cache.hits, 1)
+
+    # a model kept for the constraints answers eval() when it satisfies the extra constraints
+    s2 = _make_state()
+    s2.solver.add(x > 10, x < 20)
+    v = s2.solver.eval(x)
+    nose.tools.assert_true(11 <= v <= 19)
+    s3 = _make_state()
+    s3.solver.add(x > 10, x < 20)
+    hits = global_solver_cache.hits
+    nose.tools.assert_equal(s3.solver.eval(x + y, extra_constraints=(x == v, y == 0)), v)
+    nose.tools.assert_true(s3.solver.satisfiable(extra_constraints=(x == v,)))
+    nose.tools.assert_equal(global_solver_cache.hits, hits + 2)
+
+    # states without the option do not use the cache
+    s4 = SimState(arch='AMD64')
+    s4.solver.add(x > 10, x < 20)
+    nose.tools.assert_equal(s4.solver.min(x), 11)
+    nose.tools.assert_equal(global_solver_cache.hits, hits + 2)
+
+    global_solver_cache.clear()
+
+
+def test_global_solver_cache_bound():
+    global_solver_cache.clear()
+    max_size = global_solver_cache.max_size
+    global_solver_cache.max_size = 2
+    try:
+        x = claripy.BVS('x', 32)
+        s = _make_state()
+        s.solver.add(x > 10)
+        for i in range(4):
+            nose.tools.assert_equal(s.solver.min(x, extra_constraints=(x > 10 + i,)), 11 + i)
+        nose.tools.assert_equal(len(global_solver_cache._results), 2)
+        # the oldest results are evicted first
+        s.solver.min(x, extra_constraints=(x > 10,))
+        nose.tools.assert_equal(global_solver_cache.hits, 0)
+        s.solver.min(x, extra_constraints=(x > 13,))
+        nose.tools.assert_equal(global_solver_cache.hits, 1)
+    finally:
+        global_solver_cache.max_size = max_size
+        global_solver_cache.clear()
+
+
+if __name__ == "__main__":
+    test_global_solver_cache()
+    test_global_solver_cache_bound()
@@ -63,8 +63,79 @@ def test_palindrome2():
         for state in pg.cut
     )
 
+def _looping_simgr(n):
+    project = angr.load_shellcode(b"\xeb\xfe", arch="amd64")
+    state = project.factory.blank_state()
+    states = [ ]
+    for i in range(n):
+        s = state.copy()
+        s.globals['i'] = i
+        states.append(s)
+    return project.factory.simulation_manager(states)
+
+def _index(state):
+    return state.globals['i']
+
+def test_background_spilling():
+    simgr = _looping_simgr(40)
+    spiller = angr.exploration_techniques.Spiller(min=2, max=4, staging_min=2, staging_max=4, priority_key=_index,
+                                                  background_threads=2, prefetch=3)
+    simgr.use_technique(spiller)
+
+    simgr.step()
+    spiller.flush()
+    assert [ _index(s) for s in simgr.active ] == [ 0, 1, 2, 3 ]
+    assert [ _index(s) for s in simgr.spill_stage ] == [ 4, 5, 6, 7 ]
+    assert spiller._ever_pickled == 32
+    # the states with the highest priorities are prefetched
+    assert [ prio for prio, _, _ in spiller._prefetched ] == [ 8, 9, 10 ]
+
+    # prefetched states do not overtake spilled states with better priorities
+    extra = simgr.active[0].copy()
+    extra.globals['i'] = -1
+    spiller._pickle([ extra ])
+    unpickled = spiller._unpickle(2)
+    assert [ _index(s) for s in unpickled ] == [ -1, 8 ]
+    # the spilled state that was read along with them is prefetched now
+    assert [ prio for prio, _, _ in spiller._prefetched ] == [ 9, 10, 11 ]
+    simgr.active.extend(unpickled)
+
+    # all states come back eventually
+    seen = [ ]
+    while simgr.active:
+        seen.extend(_index(s) for s in simgr.active)
+        simgr.drop(stash='active')
+        simgr.step()
+    assert sorted(seen) == [ -1 ] + list(range(40))
+    assert spiller._ever_unpickled == spiller._ever_pickled
+
+def test_spilling_by_rss():
+    simgr = _looping_simgr(20)
+    # any process exceeds a single byte of resident memory
+    spiller = angr.exploration_techniques.Spiller(min=2, max=10, staging_min=2, staging_max=10, priority_key=_index,
+                                                  max_rss=1)
+    simgr.use_technique(spiller)
+
+    simgr.step()
+    assert len(simgr.active) == 2
+    assert len(simgr.spill_stage) == 2
+    assert spiller._ever_pickled == 16
+
+    # no states are loaded while there are states to step
+    simgr.drop(stash='spill_stage')
+    simgr.step()
+    assert len(simgr.active) == 2
+    assert spiller._ever_unpickled == 0
+
+    spiller.max_rss = None
+    simgr.step()
+    assert len(simgr.active) == 2
+    assert spiller._ever_unpickled == 6
+
 if __name__ == '__main__':
     setup()
     test_basic()
     test_palindrome2()
+    test_background_spilling()
+    test_spilling_by_rss()
     teardown()
@@ -213,6 +213,121 @@ def test_state_pickle():
     s = pickle.loads(sp)
     nose.tools.assert_equal(s.solver.eval(s.memory.load(100, 10), cast_to=bytes), b"AAABAABABC")
 
+def test_state_checkpoint():
+    s = SimState(arch="AMD64")
+    s.memory.store(0x1000, b"ABCD")
+    s.regs.rax = 10
+    x = s.solver.BVS('x', 32)
+    memory, solver = s.memory, s.solver
+
+    cp = s.checkpoint()
+    for i in range(3):
+        s.memory.store(0x1000, b"XY")
+        s.memory.store(0x5000, x)
+        s.regs.rax = 20 + i
+        nose.tools.assert_equal(s.solver.eval(s.memory.load(0x1000, 4), cast_to=bytes), b"XYCD")
+
+        s.rollback()
+        nose.tools.assert_equal(s.solver.eval(s.memory.load(0x1000, 4), cast_to=bytes), b"ABCD")
+        nose.tools.assert_not_in(0x5000, s.memory.mem)
+        nose.tools.assert_equal(s.solver.eval(s.regs.rax), 10)
+
+    # memory, registers and the solver are rolled back in place
+    s.add_constraints(x == 1)
+    s.rollback(cp)
+    nose.tools.assert_is(s.memory, memory)
+    nose.tools.assert_is(s.solver, solver)
+    nose.tools.assert_equal(len(s.solver.constraints), 0)
+
+    # so are the options and all other plugins
+    s.globals['a'] = 1
+    fd = s.posix.open(b'/tmp/checkpoint', 1)
+    cp = s.checkpoint()
+    s.options.add(angr.options.TRACK_MEMORY_ACTIONS)
+    s.globals['a'] = 2
+    s.posix.close(fd)
+    s.posix.get_fd(1).write_data(b"hello")
+    s.add_constraints(x == 2)
+    s.rollback(cp)
+    nose.tools.assert_not_in(angr.options.TRACK_MEMORY_ACTIONS, s.options)
+    nose.tools.assert_equal(s.globals['a'], 1)
+    nose.tools.assert_is_not_none(s.posix.get_fd(fd))
+    nose.tools.assert_equal(s.posix.dumps(1), b"")
+    nose.tools.assert_true(s.solver.satisfiable(extra_constraints=(x == 1, )))
+
+    # plugins that are added after the checkpoint are dropped
+    s.register_plugin('checkpoint_test', angr.state_plugins.SimStateGlobals())
+    s.rollback(cp)
+    nose.tools.assert_false(s.has_plugin('checkpoint_test'))
+
+    # checkpoints can be nested, and copies of the state are independent of them
+    s.memory.store(0x1000, b"1")
+    cp2 = s.checkpoint()
+    s2 = s.copy()
+    s.memory.store(0x1000, b"2")
+    s.rollback(cp2)
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x1000, 1), cast_to=bytes), b"1")
+    s.rollback(cp)
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x1000, 1), cast_to=bytes), b"A")
+    nose.tools.assert_equal(s2.solver.eval(s2.memory.load(0x1000, 1), cast_to=bytes), b"1")
+
+    nose.tools.assert_raises(angr.errors.SimStateError, s2.rollback)
+
+    # memory models that cannot record their contents are reported
+    s3 = SimState(arch="AMD64", mode="static")
+    nose.tools.assert_raises(angr.errors.SimStateError, s3.checkpoint)
+
+def test_state_lazy_plugin_copy():
+    from angr.sim_state import lazy_copy_counters
+    lazy_copy_counters.clear()
+
+    s = SimState(arch="AMD64")
+    s.globals['a'] = 1
+    s.libc.max_str_len = 10
+    s.callstack.func_addr = 0x400000
+    globals_plugin = s.globals
+
+    # plugins that can be copied lazily are shared with the copies until they are accessed
+    copies = [ s.copy() for _ in range(3) ]
+    nose.tools.assert_equal(lazy_copy_counters.deferred['globals'], 3)
+    nose.tools.assert_equal(lazy_copy_counters.copied['globals'], 0)
+    for c in copies:
+        nose.tools.assert_true(c.has_plugin('globals'))
+        nose.tools.assert_not_in('globals', c._active_plugins)
+
+    copies[0].globals['a'] = 2
+    nose.tools.assert_equal(lazy_copy_counters.copied['globals'], 1)
+    nose.tools.assert_equal(s.globals['a'], 1)
+    nose.tools.assert_equal(copies[1].globals['a'], 1)
+    copies[1].globals['a'] = 3
+    nose.tools.assert_equal(copies[0].globals['a'], 2)
+    nose.tools.assert_equal(copies[2].globals['a'], 1)
+    nose.tools.assert_equal(lazy_copy_counters.copied['globals'], 3)
+    # the last state sharing the plugin takes it without copying it
+    nose.tools.assert_equal(lazy_copy_counters.taken['globals'], 1)
+    nose.tools.assert_is(copies[2].globals, globals_plugin)
+    nose.tools.assert_is(copies[2].callstack.state.callstack, copies[2].callstack)
+    nose.tools.assert_equal(lazy_copy_counters.copy_rate('globals'), 1.)
+
+    # copies of copies share the plugins as well
+    c = copies[0].copy()
+    nose.tools.assert_equal(c.libc.max_str_len, 10)
+    nose.tools.assert_equal(c.callstack.func_addr, 0x400000)
+    nose.tools.assert_equal(c.globals['a'], 2)
+    nose.tools.assert_equal(lazy_copy_counters.copy_rate('libc'), 0.25)
+
+    # shared plugins are taken before the state is pickled
+    c2 = pickle.loads(pickle.dumps(copies[1]))
+    nose.tools.assert_equal(c2.libc.max_str_len, 10)
+    nose.tools.assert_equal(c2.globals['a'], 3)
+
+    # replacing a shared plugin does not copy it
+    copies[1].register_plugin('callstack', angr.state_plugins.CallStack())
+    nose.tools.assert_equal(copies[1].callstack.func_addr, 0)
+    nose.tools.assert_equal(s.callstack.func_addr, 0x400000)
+
+    lazy_copy_counters.clear()
+
 def test_global_condition():
     s = SimState(arch="AMD64")
 
@@ -307,6 +422,8 @@ if __name__ == '__main__':
     test_state_merge_optimal_nostrongrefstate()
     test_state_merge_static()
     test_state_pickle()
+    test_state_checkpoint()
+    test_state_lazy_plugin_copy()
     test_global_condition()
     test_successors_catch_arbitrary_interrupts()
     test_bypass_errored_irstmt()
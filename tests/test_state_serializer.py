@@ -0,0 +1,111 @@
+import gc
+import io
+import pickle
+
+import nose
+
+import angr
+from angr.state_serializer import StateSerializer
+
+
+def _make_state():
+    p = angr.load_shellcode(b"\x90" * 16, arch="amd64")
+    s = p.factory.full_init_state()
+    x = s.solver.BVS('x', 64)
+    s.memory.store(0x1000, b"ABCDEFGH")
+    s.memory.store(0x2000, x * 3 + 1)
+    s.regs.rax = x
+    s.add_constraints(x > 5)
+    return s
+
+
+def _pickled_size(state):
+    # the project is only referenced, just like in the pool. projects loaded from streams cannot be pickled
+    f = io.BytesIO()
+    pickler = pickle.Pickler(f, -1)
+    pickler.persistent_id = lambda obj: 'project' if obj is state.project else None
+    pickler.dump(state)
+    return len(f.getvalue())
+
+
+def test_state_serializer():
+    s = _make_state()
+    serializer = StateSerializer()
+    data = serializer.dumps(s)
+    nose.tools.assert_less(len(data), _pickled_size(s) // 10)
+
+    s2 = serializer.loads(data)
+    nose.tools.assert_is(s2.project, s.project)
+    nose.tools.assert_equal(s2.solver.eval(s2.memory.load(0x1000, 8), cast_to=bytes), b"ABCDEFGH")
+    nose.tools.assert_is(s2.memory.load(0x2000, 8, endness='Iend_BE'), s.memory.load(0x2000, 8, endness='Iend_BE'))
+    nose.tools.assert_equal(s2.solver.min(s2.regs.rax), 6)
+    nose.tools.assert_equal(s2.addr, s.addr)
+
+    # pages and ASTs are shared between states in the pool
+    pool_size = len(serializer.store)
+    copies = [ ]
+    for i in range(10):
+        c = s.copy()
+        c.memory.store(0x1000 + i, b"!")
+        c.regs.rbx = i
+        copies.append(c)
+    blobs = [ serializer.dumps(c) for c in copies ]
+    # one page of memory and one page of registers of each copy were written to
+    nose.tools.assert_equal(len(serializer.store), pool_size + 20)
+
+    # the original state is not modified by writes to a copy that is loaded from the pool
+    s.memory.store(0x1000, b"X")
+    del copies
+    gc.collect()
+    for i, blob in enumerate(blobs):
+        c = serializer.loads(blob)
+        nose.tools.assert_equal(c.solver.eval(c.memory.load(0x1000 + i, 1), cast_to=bytes), b"!")
+        nose.tools.assert_equal(c.solver.eval(c.memory.load(0x1000, 1), cast_to=bytes), b"!" if i == 0 else b"A")
+        nose.tools.assert_equal(c.solver.eval(c.regs.rbx), i)
+        c.memory.store(0x1007, b"?")
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x1000, 8), cast_to=bytes), b"XBCDEFGH")
+
+    # states can be loaded without their memory
+    c = serializer.loads(blobs[3], memory=False)
+    nose.tools.assert_false(c.has_plugin('memory'))
+    nose.tools.assert_equal(c.solver.eval(c.regs.rbx), 3)
+
+    # the pool can be used from another serializer, e.g., after it is stored on disk
+    serializer2 = StateSerializer(store=pickle.loads(pickle.dumps(serializer.store)), project=s.project)
+    c = serializer2.loads(blobs[4])
+    nose.tools.assert_equal(c.solver.eval(c.memory.load(0x1000, 8), cast_to=bytes), b"ABCD!FGH")
+    nose.tools.assert_equal(c.solver.min(c.regs.rax), 6)
+
+    nose.tools.assert_raises(angr.errors.AngrVaultError, serializer.loads, b"not a state")
+
+
+def test_vault_state_serializer():
+    s = _make_state()
+    v = angr.vaults.VaultDict()
+    v.state_serializer = StateSerializer()
+    sid = v.store(s)
+    nose.tools.assert_true(v._dict[sid].startswith(StateSerializer.MAGIC))
+    del s
+    gc.collect()
+    s = v.load(sid)
+    nose.tools.assert_equal(s.solver.eval(s.memory.load(0x1000, 8), cast_to=bytes), b"ABCDEFGH")
+
+
+def test_spiller_state_serializer():
+    s = _make_state()
+    spiller = angr.exploration_techniques.Spiller()
+    nose.tools.assert_is_not_none(spiller._vault.state_serializer)
+    spiller._pickle([ s, s.copy() ])
+    del s
+    gc.collect()
+
+    states = spiller._unpickle(2)
+    nose.tools.assert_equal(len(states), 2)
+    for s in states:
+        nose.tools.assert_equal(s.solver.eval(s.memory.load(0x1000, 8), cast_to=bytes), b"ABCDEFGH")
+
+
+if __name__ == "__main__":
+    test_state_serializer()
+    test_vault_state_serializer()
+    test_spiller_state_serializer()
@@ -934,6 +934,50 @@ def test_string_without_null():
     s.memory.store(str_addr, str_)
     nose.tools.assert_equal(s.solver.eval(s.mem[str_addr].string.resolved, cast_to=bytes), b"abcd")
 
+def test_concrete_fast_paths():
+    s = SimState(arch="AMD64", mode="symbolic")
+    a_addr = s.solver.BVV(0x1000, 64)
+    b_addr = s.solver.BVV(0x2000, 64)
+    c_addr = s.solver.BVV(0x3000, 64)
+    long_str = b"A" * 300 + b"needle"
+    s.memory.store(a_addr, long_str + b"\x00")
+    s.memory.store(b_addr, b"needle\x00")
+    s.memory.store(c_addr, b"NEEDLE\x00")
+
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(a_addr, 0x1000), long_str + b"\x00")
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(0x1000, 4), b"AAAA")
+
+    num_constraints = len(s.solver.constraints)
+    nose.tools.assert_equal(s.solver.eval(strlen(s, arguments=[a_addr])), len(long_str))
+    nose.tools.assert_equal(s.solver.eval(strstr(s, arguments=[a_addr, b_addr])), 0x1000 + 300)
+    nose.tools.assert_equal(s.solver.eval(strstr(s, arguments=[b_addr, c_addr])), 0)
+    nose.tools.assert_equal(s.solver.eval(strchr(s, arguments=[a_addr, s.solver.BVV(ord("n"), 64)])), 0x1000 + 300)
+    nose.tools.assert_equal(s.solver.eval(strchr(s, arguments=[b_addr, s.solver.BVV(0, 64)])), 0x2000 + 6)
+    nose.tools.assert_equal(s.solver.eval(strcmp(s, arguments=[b_addr, c_addr])), 1)
+    nose.tools.assert_equal(s.solver.eval(strncmp(s, arguments=[b_addr, a_addr, s.solver.BVV(3, 64)])), 1)
+    strcasecmp = SIM_LIBRARIES['libc.so.6'].get('strcasecmp', 'AMD64')
+    nose.tools.assert_equal(s.solver.eval(strcasecmp.execute(s, arguments=[b_addr, c_addr]).ret_expr), 0)
+
+    strcpy(s, arguments=[c_addr, b_addr])
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(c_addr, 7), b"needle\x00")
+    memset(s, arguments=[c_addr, s.solver.BVV(0x141, 64), s.solver.BVV(3, 64)])
+    memcpy(s, arguments=[a_addr, c_addr, s.solver.BVV(5, 64)])
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(a_addr, 8), b"AAAdlAAA")
+    # the results are computed without adding any constraint
+    nose.tools.assert_equal(len(s.solver.constraints), num_constraints)
+
+    # the fast paths stop at symbolic bytes
+    s.memory.store(a_addr + 4, s.solver.BVS("sym", 8))
+    nose.tools.assert_equal(s.memory.load_concrete_bytes(a_addr, 8), b"AAAd")
+    nose.tools.assert_true(s.solver.symbolic(strlen(s.copy(), arguments=[a_addr])))
+
+    # and they are not taken if a breakpoint would observe the loads
+    reads = [ ]
+    s.inspect.b('mem_read', when=angr.BP_AFTER, action=lambda state: reads.append(state.inspect.mem_read_address))
+    nose.tools.assert_is_none(s.memory.load_concrete_bytes(b_addr, 7))
+    nose.tools.assert_equal(s.solver.eval(strlen(s, arguments=[b_addr])), 6)
+    nose.tools.assert_true(reads)
+
 
 if __name__ == '__main__':
     test_getc()
@@ -951,3 +995,4 @@ if __name__ == '__main__':
     test_strncpy()
     test_strstr_inconsistency()
     test_string_without_null()
+    test_concrete_fast_paths()
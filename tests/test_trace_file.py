@@ -0,0 +1,122 @@
+import io
+import os
+import array
+import pickle
+import shutil
+import tempfile
+
+import nose
+import angr
+
+from angr.misc import TraceFile
+from angr.exploration_techniques.tracer import TracerDesyncError
+from angr.engines.unicorn import TraceCheck
+from angr.state_plugins.unicorn_engine import _UC_NATIVE, STOP
+
+
+def _check_trace(trace, addrs):
+    nose.tools.assert_equal(len(trace), len(addrs))
+    nose.tools.assert_equal(list(trace), addrs)
+    nose.tools.assert_equal(trace[0], addrs[0])
+    nose.tools.assert_equal(trace[-1], addrs[-1])
+    nose.tools.assert_equal(trace[5:12], addrs[5:12])
+    nose.tools.assert_raises(IndexError, trace.__getitem__, len(addrs))
+
+    for value, start in ((addrs[0], 0), (0x400010, 1), (0x400010, 40), (0x400ff0, 0), (0x400ff0, 100)):
+        nose.tools.assert_equal(trace.index(value, start), addrs.index(value, start))
+    nose.tools.assert_raises(ValueError, trace.index, 0x400ff0, 0, addrs.index(0x400ff0))
+    # addresses that only appear at unaligned offsets are not found
+    nose.tools.assert_raises(ValueError, trace.index, 0x1000000000004000)
+
+    copy = pickle.loads(pickle.dumps(trace))
+    nose.tools.assert_equal(list(copy), addrs)
+    copy.close()
+
+
+def test_trace_file():
+    addrs = [ 0x400000 + (i % 17) * 0x10 for i in range(200) ] + [ 0x400ff0 ] * 3
+    d = tempfile.mkdtemp()
+    try:
+        raw = os.path.join(d, 'raw')
+        with open(raw, 'wb') as f:
+            array.array('Q', addrs).tofile(f)
+        with TraceFile(raw) as trace:
+            _check_trace(trace, addrs)
+
+        for codec in (TraceFile.CODEC_NONE, TraceFile.CODEC_ZLIB):
+            with TraceFile.write(os.path.join(d, 'chunked'), iter(addrs), chunk_size=16, codec=codec,
+                                 cached_chunks=2) as trace:
+                nose.tools.assert_equal(trace.codec, codec)
+                _check_trace(trace, addrs)
+                nose.tools.assert_equal(len(trace._chunks), 2)
+
+        with TraceFile.write(os.path.join(d, 'empty'), []) as trace:
+            nose.tools.assert_equal(len(trace), 0)
+            nose.tools.assert_equal(list(trace), [])
+            nose.tools.assert_raises(ValueError, trace.index, 0)
+
+        with open(os.path.join(d, 'bad'), 'wb') as f:
+            f.write(b'\0' * 12)
+        nose.tools.assert_raises(angr.errors.AngrTracerError, TraceFile, os.path.join(d, 'bad'))
+    finally:
+        shutil.rmtree(d)
+
+
+def test_tracer_trace_file():
+    # mov ecx, 3; 1: dec ecx; jnz 1b; nop
+    p = angr.load_shellcode(b'\xb9\x03\x00\x00\x00\xff\xc9\x75\xfc\x90', arch='amd64')
+    addrs = [ 0, 5, 5, 9 ]
+    d = tempfile.mkdtemp()
+    try:
+        raw = os.path.join(d, 'raw')
+        with open(raw, 'wb') as f:
+            array.array('Q', addrs).tofile(f)
+        for trace in (raw, TraceFile.write(os.path.join(d, 'chunked'), addrs, chunk_size=3)):
+            simgr = p.factory.simulation_manager(p.factory.entry_state())
+            simgr.use_technique(angr.exploration_techniques.Tracer(trace))
+            simgr.run()
+            nose.tools.assert_equal(len(simgr.traced), 1)
+            nose.tools.assert_equal(simgr.traced[0].addr, 9)
+            nose.tools.assert_equal(simgr.traced[0].globals['trace_idx'], 3)
+    finally:
+        shutil.rmtree(d)
+
+
+def test_tracer_unicorn_trace_check():
+    # mov ecx, 200; 1: dec ecx; jnz 1b; nop
+    # unicorn does not start at address 0
+    p = angr.Project(io.BytesIO(b'\xb9\xc8\x00\x00\x00\xff\xc9\x75\xfc\x90'),
+                     main_opts={'backend': 'blob', 'arch': 'amd64', 'base_addr': 0x400000, 'entry_point': 0x400000})
+    addrs = [ 0x400000 ] + [ 0x400005 ] * 199 + [ 0x400009 ]
+
+    simgr = p.factory.simulation_manager(p.factory.entry_state(add_options=angr.options.unicorn))
+    simgr.use_technique(angr.exploration_techniques.Tracer(addrs))
+    simgr.run()
+    nose.tools.assert_equal(len(simgr.traced), 1)
+    nose.tools.assert_equal(simgr.traced[0].addr, 0x400009)
+    nose.tools.assert_equal(simgr.traced[0].globals['trace_idx'], 200)
+
+    bad = list(addrs)
+    bad[100] = 0x400020
+    if _UC_NATIVE is not None:
+        # unicorn stops right before the block that diverges
+        check = TraceCheck(memoryview(array.array('Q', bad)), 0)
+        succ, = p.factory.entry_state(add_options=angr.options.unicorn).step(trace_check=check).flat_successors
+        nose.tools.assert_equal(succ.unicorn.stop_reason, STOP.STOP_TRACE_DIVERGED)
+        nose.tools.assert_equal(check.checked, 100)
+        nose.tools.assert_equal(succ.addr, 0x400005)
+
+    simgr = p.factory.simulation_manager(p.factory.entry_state(add_options=angr.options.unicorn))
+    simgr.use_technique(angr.exploration_techniques.Tracer(bad))
+    with nose.tools.assert_raises(Exception) as cm:
+        simgr.run()
+    if _UC_NATIVE is not None:
+        nose.tools.assert_is_instance(cm.exception, TracerDesyncError)
+        nose.tools.assert_equal(cm.exception.deviating_trace_idx, 100)
+        nose.tools.assert_equal(cm.exception.deviating_addr, 0x400005)
+
+
+if __name__ == "__main__":
+    test_trace_file()
+    test_tracer_trace_file()
+    test_tracer_unicorn_trace_check()
@@ -1,9 +1,15 @@
+import os
+import pickle
+import shutil
+import tempfile
+
 import nose
 
 import claripy
 
 import angr
 from angr.sim_type import SimTypeFunction, SimTypeInt, SimTypePointer, SimTypeChar, SimStruct, SimTypeFloat, SimUnion, SimTypeDouble, SimTypeLongLong, SimTypeLong, SimTypeNum
+from angr.sim_type import intern_type, parse_cache
 from angr.utils.library import convert_cproto_to_py
 
 
@@ -188,6 +194,119 @@ def test_varargs():
     nose.tools.assert_equal(len(sig.arg_names), 1)
     nose.tools.assert_not_in('...', sig._init_str())
 
+def test_intern_type():
+    a = intern_type(SimTypeFunction([ SimTypePointer(SimTypeChar()), SimTypeInt() ], SimTypeInt(), arg_names=[ 's', 'n' ]))
+    b = intern_type(SimTypeFunction([ SimTypePointer(SimTypeChar()), SimTypeInt() ], SimTypeInt(), arg_names=[ 's', 'n' ]))
+    nose.tools.assert_is(a, b)
+    nose.tools.assert_is(a.args[1], a.returnty)
+    nose.tools.assert_is(a.args[0].pts_to, intern_type(SimTypeChar()))
+
+    # the interned type is not modified
+    char = SimTypeChar()
+    ptr = SimTypePointer(char)
+    args = [ ptr ]
+    d = intern_type(SimTypeFunction(args, SimTypeInt(), arg_names=[ 's' ]))
+    nose.tools.assert_is(d.args[0], a.args[0])
+    nose.tools.assert_is(args[0], ptr)
+    nose.tools.assert_is(ptr.pts_to, char)
+
+    # shared chars are not resized when they are used
+    state = angr.SimState(arch='AMD64')
+    state.memory.store(0x1000, b'A')
+    nose.tools.assert_equal(a.args[0].pts_to.extract(state, 0x1000, concrete=True), b'A')
+    nose.tools.assert_is(a.args[0].pts_to._size, SimTypeChar()._size)
+
+    # labels and argument names are part of the identity of a type
+    nose.tools.assert_is_not(intern_type(SimTypeInt(label='x')), intern_type(SimTypeInt()))
+    c = intern_type(SimTypeFunction([ SimTypePointer(SimTypeChar()), SimTypeInt() ], SimTypeInt(), arg_names=[ 'p', 'n' ]))
+    nose.tools.assert_is_not(a, c)
+    nose.tools.assert_is(a.args[0], c.args[0])
+
+    # named structs are never merged, and their members are left alone
+    field = SimTypeInt()
+    s0 = intern_type(SimStruct({ 'a': field }, name='intern_type'))
+    s1 = intern_type(SimStruct({ 'a': SimTypeInt() }, name='intern_type'))
+    nose.tools.assert_is_not(s0, s1)
+    nose.tools.assert_is(s0.fields['a'], field)
+    anon = SimStruct({ 'a': field })
+    s2 = intern_type(anon)
+    nose.tools.assert_is(s2.fields['a'], a.returnty)
+    nose.tools.assert_is(anon.fields['a'], field)
+
+def test_parse_cache():
+    defn = "struct pcnode { int data; struct pcnode *next; }; int pc_walk(struct pcnode *node, struct timeval *tv);"
+
+    parse_cache.clear()
+    defns, types = angr.types.parse_file(defn)
+    nose.tools.assert_equal(parse_cache.misses, 1)
+    defns_1, types_1 = angr.types.parse_file(defn)
+    nose.tools.assert_equal(parse_cache.hits, 1)
+    # callers get their own copies
+    nose.tools.assert_equal(repr(defns['pc_walk']), repr(defns_1['pc_walk']))
+    nose.tools.assert_is_not(defns['pc_walk'], defns_1['pc_walk'])
+    nose.tools.assert_is(defns_1['pc_walk'].args[0].pts_to, types_1['struct pcnode'])
+    defns_1['pc_walk'].args.pop()
+    nose.tools.assert_equal(len(angr.types.parse_defns(defn)['pc_walk'].args), 2)
+
+    ty = angr.types.parse_type('unsigned long *')
+    nose.tools.assert_is_not(ty, angr.types.parse_type('unsigned long *'))
+    nose.tools.assert_equal(ty, angr.types.parse_type('unsigned long *'))
+
+    # registering a struct changes what the definition refers to
+    angr.types.register_types(types['struct pcnode'])
+    try:
+        sig = angr.types.parse_defns("int pc_len(struct pcnode *node);")['pc_len']
+        nose.tools.assert_is(sig.args[0].pts_to, types['struct pcnode'])
+    finally:
+        del angr.types.ALL_TYPES['struct pcnode']
+
+    # results are shared through the disk
+    path = tempfile.mkdtemp()
+    parse_cache.path = path
+    try:
+        parse_cache.clear()
+        angr.types.parse_file(defn)
+        parse_cache.clear()
+        defns, types = angr.types.parse_file(defn)
+        nose.tools.assert_equal((parse_cache.hits, parse_cache.misses), (1, 0))
+        node = types['struct pcnode']
+        nose.tools.assert_is(node.fields['next'].pts_to, node)
+        nose.tools.assert_is(defns['pc_walk'].args[0].pts_to, node)
+        nose.tools.assert_is(defns['pc_walk'].args[1].pts_to, angr.types.ALL_TYPES['struct timeval'])
+
+        # files that do not hold types are not loaded
+        for filename in os.listdir(path):
+            with open(os.path.join(path, filename), 'wb') as f:
+                pickle.dump((parse_cache.VERSION, filename[:-len('.pickle')], os.system), f)
+        parse_cache.clear()
+        angr.types.parse_file(defn)
+        nose.tools.assert_equal((parse_cache.hits, parse_cache.misses), (0, 1))
+    finally:
+        parse_cache.path = None
+        parse_cache.clear()
+        shutil.rmtree(path)
+
+def test_parse_cache_registered_typedefs():
+    parse_cache.clear()
+    angr.types.register_types({ 'pc_word_t': SimTypeInt(signed=False) })
+    try:
+        nose.tools.assert_equal(angr.types.parse_type('pc_word_t'), SimTypeInt(signed=False))
+
+        # the typedef now resolves to another type
+        angr.types.register_types({ 'pc_word_t': SimTypeLongLong(signed=True) })
+        nose.tools.assert_equal(angr.types.parse_type('pc_word_t'), SimTypeLongLong(signed=True))
+        nose.tools.assert_equal(angr.types.parse_defns('pc_word_t pc_get(void);')['pc_get'].returnty,
+                                SimTypeLongLong(signed=True))
+
+        # same names, different types, different keys on disk
+        angr.types.register_types({ 'pc_word_t': SimTypeInt(signed=True) })
+        keys = parse_cache.make_keys('type', 'pc_word_t', False, 'pc_word_t')
+        angr.types.register_types({ 'pc_word_t': SimTypeInt(signed=False) })
+        nose.tools.assert_not_equal(parse_cache.make_keys('type', 'pc_word_t', False, 'pc_word_t')[1], keys[1])
+    finally:
+        del angr.types.ALL_TYPES['pc_word_t']
+        parse_cache.clear()
+
 
 if __name__ == '__main__':
     test_type_annotation()
@@ -199,3 +318,6 @@ if __name__ == '__main__':
     test_union_struct_referencing_each_other()
     test_top_type()
     test_arg_names()
+    test_intern_type()
+    test_parse_cache()
+    test_parse_cache_registered_typedefs()
@@ -2,8 +2,11 @@ import nose
 import angr
 import pickle
 import re
+import io
+import array
 from angr import options as so
 from nose.plugins.attrib import attr
+from angr.state_plugins.unicorn_engine import _UC_NATIVE
 
 import os
 test_location = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
@@ -310,6 +313,74 @@ def test_single_step():
     nose.tools.assert_equal(len(successors2), 1)
     nose.tools.assert_equal(successors2[0].addr, step5)
 
+def test_bbl_addr_array():
+    # mov ecx, 200; 1: dec ecx; jnz 1b; nop
+    # unicorn does not start at address 0
+    p = angr.Project(io.BytesIO(b'\xb9\xc8\x00\x00\x00\xff\xc9\x75\xfc\x90'),
+                     main_opts={'backend': 'blob', 'arch': 'amd64', 'base_addr': 0x400000, 'entry_point': 0x400000})
+    s = p.factory.entry_state(add_options=so.unicorn | {so.UNICORN_TRACK_STACK_POINTERS})
+    if _UC_NATIVE is None:
+        return
+    succ, = s.step(n=300).flat_successors
+    nose.tools.assert_equal(succ.history.recent_block_count, 200)
+
+    # the addresses of blocks that were executed in unicorn are copied into arrays in bulk
+    addrs = succ.history.recent_bbl_addrs
+    nose.tools.assert_is_instance(addrs, array.array)
+    nose.tools.assert_equal(list(addrs), [ 0x400000 ] + [ 0x400005 ] * 199)
+    nose.tools.assert_is_instance(succ.scratch.stack_pointer_list, array.array)
+    nose.tools.assert_equal(len(succ.scratch.stack_pointer_list), 200)
+    nose.tools.assert_equal(set(succ.scratch.stack_pointer_list), { s.solver.eval(s.regs.rsp) })
+
+    # histories keep the arrays when they are copied or pickled, and later blocks are appended to them
+    nose.tools.assert_is_instance(succ.history.copy({}).recent_bbl_addrs, array.array)
+    nose.tools.assert_equal(pickle.loads(pickle.dumps(succ.history)).recent_bbl_addrs, addrs)
+    nose.tools.assert_equal(list(succ.history.bbl_addrs)[-2:], [ 0x400005, 0x400005 ])
+    succ.history.recent_bbl_addrs.append(0x400009)
+    nose.tools.assert_equal(succ.history.addr, 0x400009)
+
+def test_resident_regions():
+    if _UC_NATIVE is None:
+        return
+
+    # 0x400000: mov ecx, 200; mov rax, 0x600000; 1: inc qword [rax]; dec ecx; jnz 1b; nop
+    # 0x400020: mov ecx, 200; mov rax, 0x600000; 1: mov rdx, [rax]; dec ecx; jnz 1b; nop
+    code = b'\xb9\xc8\x00\x00\x00\x48\xc7\xc0\x00\x00\x60\x00\x48\xff\x00\xff\xc9\x75\xf9\x90'.ljust(0x20, b'\0') + \
+           b'\xb9\xc8\x00\x00\x00\x48\xc7\xc0\x00\x00\x60\x00\x48\x8b\x10\xff\xc9\x75\xf9\x90'
+    p = angr.Project(io.BytesIO(code),
+                     main_opts={'backend': 'blob', 'arch': 'amd64', 'base_addr': 0x400000, 'entry_point': 0x400000})
+    p.hook(0x400013, angr.SIM_PROCEDURES['stubs']['PathTerminator']())
+    p.hook(0x400033, angr.SIM_PROCEDURES['stubs']['PathTerminator']())
+    s = p.factory.entry_state(add_options=so.unicorn)
+    s.memory.store(0x600000, b'\0' * 0x10000)
+    # states that are copied from s share the cache key of its unicorn plugin
+    s.get_plugin('unicorn')
+
+    def run(state, addr):
+        state.regs.ip = addr
+        succ, = state.step().flat_successors
+        nose.tools.assert_equal(succ.unicorn.steps, 200)
+        return succ, state.solver.eval(succ.memory.load(0x600000, 8, endness='Iend_LE'))
+
+    # the code page is partially symbolic, so it is mapped on every run. the data is mapped once per version of its
+    # pages.
+    a, value = run(s.copy(), 0x400000)
+    nose.tools.assert_equal((a.unicorn._mapped, value), (2, 200))
+    a, value = run(a.copy(), 0x400000)
+    nose.tools.assert_equal((a.unicorn._mapped, value), (1, 400))
+
+    b, value = run(s.copy(), 0x400020)
+    nose.tools.assert_equal((b.unicorn._mapped, value), (2, 0))
+    c, value = run(s.copy(), 0x400020)
+    nose.tools.assert_equal((c.unicorn._mapped, value), (1, 0))
+
+    # data that is written outside of unicorn is mapped again
+    c.memory.store(0x600000, b'\x05')
+    c, value = run(c, 0x400000)
+    nose.tools.assert_equal((c.unicorn._mapped, value), (2, 205))
+    a, value = run(a.copy(), 0x400000)
+    nose.tools.assert_equal((a.unicorn._mapped, value), (2, 600))
+
 if __name__ == '__main__':
     #import logging
     #logging.getLogger('angr.state_plugins.unicorn_engine').setLevel('DEBUG')
@@ -1,8 +1,12 @@
+import gc
 import os
+import weakref
+from collections import Counter
 
 import nose
 
 import angr
+from angr.exploration_techniques.unique import _Counts, _Sketch
 
 location = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'binaries', 'tests')
 
@@ -36,6 +40,81 @@ def test_unique():
         for arch in find[binary]:
             yield run_unique, binary, arch
 
+def test_unique_sketches():
+    p = angr.load_shellcode(b'\x90', arch='amd64')
+    technique = angr.exploration_techniques.UniqueSearch()
+
+    def make_state(*steps):
+        state = p.factory.blank_state()
+        for addrs in steps:
+            state.register_plugin('history', state.history.make_child())
+            state.history.recent_bbl_addrs.extend(addrs)
+        return state
+
+    # sketches are computed from those of ancestors
+    common = list(range(0x1000, 0x1040, 4))
+    loop = [ 0x2000, 0x2004 ] * 20
+    parent = make_state(common)
+    technique._add(parent)
+    child = parent.copy()
+    child.register_plugin('history', parent.history.make_child())
+    child.history.recent_bbl_addrs.extend(loop)
+    full = _Sketch(_Counts(), technique._minhash.empty).child(common + loop, technique._minhash)
+    sketch = technique._sketch(child.history)
+    nose.tools.assert_equal(sketch.counts.to_dict(), full.counts.to_dict())
+    nose.tools.assert_equal(sketch.counts.to_dict(), Counter(common + loop))
+    nose.tools.assert_equal(sketch.signature, full.signature)
+
+    # count maps share those of their ancestors, and long chains are flattened
+    counts = _Counts()
+    for i in range(_Counts.MAX_DEPTH * 2):
+        counts = _Counts(counts, { i % 3: i })
+    nose.tools.assert_less(counts.depth, _Counts.MAX_DEPTH)
+    nose.tools.assert_equal(counts.to_dict(), { 0: 63, 1: 61, 2: 62 })
+    nose.tools.assert_equal(counts[1], 61)
+    nose.tools.assert_equal(counts[5], 0)
+
+    # the state that is least similar to the others is explored first
+    similar = [ make_state(common, loop[:n]) for n in (30, 32, 34, 36) ]
+    novel = make_state([ 0x3000 + i * 4 for i in range(16) ])
+    deferred = similar + [ novel ]
+    for state in deferred:
+        technique._add(state)
+    nose.tools.assert_is(technique._pop(deferred), novel)
+    nose.tools.assert_not_in(novel, deferred)
+    nose.tools.assert_in(technique._pop(deferred), similar)
+    nose.tools.assert_equal(len(deferred), 3)
+
+    # the queue does not keep states alive, and states that are dropped from the stash are skipped
+    kept = deferred[0]
+    refs = [ weakref.ref(s) for s in deferred[1:] ]
+    del similar, novel, state
+    deferred[:] = [ kept ]
+    gc.collect()
+    nose.tools.assert_true(all(ref() is None for ref in refs))
+    nose.tools.assert_is(technique._pop(deferred), kept)
+    nose.tools.assert_equal(deferred, [ ])
+    nose.tools.assert_is(technique._pop(deferred), None)
+    nose.tools.assert_equal(len(technique._queue), 0)
+
+def test_unique_shellcode():
+    # test rdi, rdi; je 1f; inc rsi; 1: nop
+    p = angr.load_shellcode(b'\x48\x85\xff\x74\x03\x48\xff\xc6\x90', arch='amd64')
+    p.hook(8, angr.SIM_PROCEDURES['stubs']['PathTerminator']())
+    simgr = p.factory.simulation_manager(p.factory.blank_state())
+    technique = angr.exploration_techniques.UniqueSearch()
+    simgr.use_technique(technique)
+    simgr.run()
+
+    nose.tools.assert_equal(len(simgr.deadended), 2)
+    nose.tools.assert_equal(len(simgr.active), 0)
+    nose.tools.assert_equal(len(simgr.stashes['deferred']), 0)
+    nose.tools.assert_equal(len(technique._queue), 0)
+    nose.tools.assert_equal(len(technique._sketches), 0)
+    nose.tools.assert_equal(len(technique._positions), 0)
+
 if __name__ == "__main__":
+    test_unique_sketches()
+    test_unique_shellcode()
     for test_func, test_binary, test_arch in test_unique():
         test_func(test_binary, test_arch)